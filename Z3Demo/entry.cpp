@@ -5,6 +5,7 @@
 #include <random>
 #include <cmath>
 #include <algorithm>
+#include <cctype>
 #include <thread>      // std::this_thread::sleep_for
 #include <chrono>      // std::chrono::seconds
 
@@ -21,6 +22,54 @@ bool almostEqual(double a, double b, double epsilon = 0.01/*std::numeric_limits<
 
 using json = nlohmann::json;
 
+// id of the dimension created by the last *Dimension call, reported by BATCHDIM
+static int g_lastDimensionId = 0;
+
+// Commands sent by the Python tools carry {"requestId", "outputDir"}: every file the
+// command writes goes to outputDir, so several requests can be in flight without
+// overwriting each other's results. Commands without it use the shared data dir.
+static const char* kDefaultDataDir = "D:/AI_AUTODIM_DATA";
+static std::string g_resultDir = kDefaultDataDir;
+
+static void BeginRequest(const json& params)
+{
+	g_resultDir = kDefaultDataDir;
+	if (params.is_object() && params.contains("outputDir") && params["outputDir"].is_string())
+	{
+		g_resultDir = params["outputDir"].get<std::string>();
+		CreateDirectoryA(g_resultDir.c_str(), NULL); // normally created by the caller already
+	}
+}
+
+static std::string ResultPath(const char* fileName)
+{
+	return g_resultDir + "/" + fileName;
+}
+
+// Full path of the part fileOpen opened last. cvxFileInqOpen only reports the file
+// name, so a part of the same name in another folder must not count as "already opened".
+static std::string g_openedPath;
+
+static std::string NormalizedPath(std::string path)
+{
+	std::replace(path.begin(), path.end(), '\\', '/');
+	std::transform(path.begin(), path.end(), path.begin(), [](unsigned char c) { return static_cast<char>(std::tolower(c)); });
+	return path;
+}
+
+// Write a result file under a temporary name and rename it into place, so the
+// Python side never picks up a half-written file (MoveFileEx is atomic on one volume).
+static bool PublishTextFile(const std::string& path, const std::string& text)
+{
+	std::string tmp = path + ".tmp";
+	std::ofstream out(tmp, std::ios::binary | std::ios::trunc);
+	if (!out.is_open())
+		return false;
+	out << text;
+	out.close();
+	return MoveFileExA(tmp.c_str(), path.c_str(), MOVEFILE_REPLACE_EXISTING | MOVEFILE_WRITE_THROUGH) != 0;
+}
+
 szwMatrix computeFrame(double spread = 100.0) {
 	static std::random_device rd;
 	static std::mt19937 gen(rd());
@@ -66,6 +115,7 @@ extern "C" __declspec(dllexport)
 int createAssemblyTree(const char* jsonParams) {
 	try {
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 		std::string partPath = params["partPath"];
 		std::string saveDir = params["saveDir"];
 		int depth = params["depth"];
@@ -124,7 +174,7 @@ int createAssemblyTree(const char* jsonParams) {
 			WriteLog("[console]Assembly created");
 			json result;
 			result["return code"] = 0;
-			WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+			WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		}
 		return 0;
 	}
@@ -132,7 +182,7 @@ int createAssemblyTree(const char* jsonParams) {
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -141,6 +191,7 @@ int insertComponent(const char* jsonParams)
 {
 	try {
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 		std::string path = params["path"];
 
 		evxErrors err;
@@ -156,7 +207,7 @@ int insertComponent(const char* jsonParams)
 			WriteLog("[console]Insert component");
 			json result;
 			result["return code"] = 0;
-			WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+			WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		}
 		return 0;
 	}
@@ -164,7 +215,7 @@ int insertComponent(const char* jsonParams)
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -173,6 +224,7 @@ int activateFile(const char* jsonParams)
 {
 	try {
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 		std::string filePath = params["filePath"];
 
 		evxErrors err;
@@ -182,7 +234,7 @@ int activateFile(const char* jsonParams)
 			WriteLog("[console]Activate file");
 			json result;
 			result["return code"] = 0;
-			WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+			WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		}
 		return 0;
 	}
@@ -190,7 +242,7 @@ int activateFile(const char* jsonParams)
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -199,6 +251,7 @@ int inqActiveFile(const char* jsonParams)
 {
 	try {
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 		evxErrors err = ZW_API_NO_ERROR;
 		std::string fileName;
 		vxLongName activeFileName;
@@ -209,7 +262,7 @@ int inqActiveFile(const char* jsonParams)
 			WriteLog("[console]{activeFile=%s}", activeFileName);
 			json result;
 			result["return code"] = 0;
-			WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+			WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		}
 		return 0;
 	}
@@ -217,7 +270,7 @@ int inqActiveFile(const char* jsonParams)
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -226,6 +279,7 @@ int newFile(const char* jsonParams)
 {
 	try {
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 		std::string savePath = params["savePath"];
 
 		evxErrors err;
@@ -239,7 +293,7 @@ int newFile(const char* jsonParams)
 			WriteLog("[console]New file");
 			json result;
 			result["return code"] = 0;
-			WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+			WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		}
 		return 0;
 	}
@@ -247,7 +301,7 @@ int newFile(const char* jsonParams)
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -256,6 +310,7 @@ int inqActiveDir(const char* jsonParams)
 {
 	try {
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 		evxErrors err = ZW_API_NO_ERROR;
 		vxPath activeFileDir;
 		activeFileDir[0] = 0;
@@ -265,7 +320,7 @@ int inqActiveDir(const char* jsonParams)
 			WriteLog("[console]{activeDir=%s}", activeFileDir);
 			json result;
 			result["return code"] = 0;
-			WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+			WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		}
 		return 0;
 	}
@@ -273,7 +328,7 @@ int inqActiveDir(const char* jsonParams)
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -282,6 +337,7 @@ int inqActiveDir(const char* jsonParams)
 extern "C" __declspec(dllexport) int autoDimension(const char* jsonParams) {
 	try {
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 		std::string path = params["path"].get<std::string>();
 		int vuId = params["vuId"].get<int>(); //if vuId == 0, dimension all views
 
@@ -317,7 +373,7 @@ extern "C" __declspec(dllexport) int autoDimension(const char* jsonParams) {
 				WriteLog("[console]Auto dimension");
 				json result;
 				result["return code"] = 0;
-				WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+				WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 			}
 		}
 		else 
@@ -332,7 +388,7 @@ extern "C" __declspec(dllexport) int autoDimension(const char* jsonParams) {
 					WriteLog("[console]Auto dimension");
 					json result;
 					result["return code"] = 0;
-					WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+					WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 				}
 			}
 		}
@@ -345,7 +401,7 @@ extern "C" __declspec(dllexport) int autoDimension(const char* jsonParams) {
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -353,6 +409,7 @@ extern "C" __declspec(dllexport) int autoDimension(const char* jsonParams) {
 extern "C" __declspec(dllexport) int fileExport(const char* jsonParams) {
 	try {
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 
 		std::string path = params["path"].get<std::string>();
 		int type = params["type"].get<int>();
@@ -484,22 +541,28 @@ extern "C" __declspec(dllexport) int fileExport(const char* jsonParams) {
 			break;
 		}
 
-		if (err == ZW_API_NO_ERROR) {
+		// report the export itself, not the re-activation after it
+		evxErrors exportErr = err;
+		json result;
+		if (exportErr == ZW_API_NO_ERROR) {
 			WriteLog("[console] export complete.");
-			json result;
 			result["return code"] = 0;
-			WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
 		}
+		else {
+			WriteLog("export err code = %i", static_cast<int>(exportErr));
+			result["return code"] = 1;
+		}
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 
 		err = cvxRootActivate2(NULL, NULL);
 
-		return static_cast<int>(err);
+		return static_cast<int>(exportErr);
 	}
 	catch (const std::exception& e) {
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -508,6 +571,7 @@ extern "C" __declspec(dllexport) int fileOpen(const char* jsonParams) {
 	json result;
 	try {
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 
 		std::string filePath = params["filePath"].get<std::string>();
 		vxLongPath openPath;
@@ -524,26 +588,34 @@ extern "C" __declspec(dllexport) int fileOpen(const char* jsonParams) {
 
 		if (!strcmp(fileName.c_str(), openFileName))
 		{
-			WriteLog("[console] file already opened.");
-			result["return code"] = -1;
-			WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
-			return ZW_API_NO_ERROR;
+			if (NormalizedPath(filePath) == g_openedPath)
+			{
+				WriteLog("[console] file already opened.");
+				result["return code"] = -1;
+				WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
+				return ZW_API_NO_ERROR;
+			}
+			// same name, other folder (or not opened by us): close it and open the requested part
+			WriteLog("[console] %s is open from another folder, closing it.", openFileName);
+			cvxFileClose2(openFileName, 2);
 		}
 
 		cvxFileClose2(openPath, 2);
 		err = cvxFileOpen(openPath);
 		if (err == ZW_API_NO_ERROR)
-		{
 			WriteLog("[console] open complete.");
-			result["return code"] = 0;
-			WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
-		}
+		else
+			WriteLog("[console] open failed: %d", static_cast<int>(err));
+		g_openedPath = err == ZW_API_NO_ERROR ? NormalizedPath(filePath) : std::string();
+		// always publish: a missing result file means the command never reached ZW3D
+		result["return code"] = err == ZW_API_NO_ERROR ? 0 : 1;
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return static_cast<int>(err);
 	}
 	catch(const std::exception& e){
 		WriteLog("JSON parse err: %s", e.what());
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;  
 	}
 }
@@ -551,22 +623,21 @@ extern "C" __declspec(dllexport) int fileOpen(const char* jsonParams) {
 extern "C" __declspec(dllexport) int fileSaveOrClose(const char* jsonParams) {
 	try {
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 		int close = params["close"].get<int>();
 		evxErrors err = cvxFileSave3(close, 1, 0);
 		if (err == ZW_API_NO_ERROR)
-		{
 			WriteLog("[console] save complete.");
-			json result;
-			result["return code"] = 0;
-			WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
-		}
+		json result;
+		result["return code"] = err == ZW_API_NO_ERROR ? 0 : 1;
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return static_cast<int>(err);
 	}
 	catch (const std::exception& e) {
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -633,6 +704,7 @@ extern "C" __declspec(dllexport) int standardViewCreate(const char* jsonParams)
 		std::string prefixName = (lastDotPos == std::string::npos) ? actFile : actFile.substr(0, lastDotPos);
 
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 		std::string path = params["path"].get<std::string>();
 		/* rootName get from path */
 		size_t lastSlashPos = path.find_last_of("/\\");
@@ -691,7 +763,7 @@ extern "C" __declspec(dllexport) int standardViewCreate(const char* jsonParams)
 			WriteLog("[console] std view created.");
 			json result;
 			result["return code"] = 0;
-			WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+			WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		}
 		return static_cast<int>(err);
 	}
@@ -699,7 +771,7 @@ extern "C" __declspec(dllexport) int standardViewCreate(const char* jsonParams)
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -730,6 +802,7 @@ extern "C" __declspec(dllexport) int linearOffsetDimension(const char* jsonParam
 	try {
 		//assume the view is active
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 
 		int lineId1 = params["id1"].get<int>();
 		int lineId2 = params["id2"].get<int>();
@@ -762,7 +835,9 @@ extern "C" __declspec(dllexport) int linearOffsetDimension(const char* jsonParam
 			dataOff.firstPoint.definingPoint = 0;
 			dataOff.secondPoint.definingPoint = 0;
 			dataOff.textPoint = { NULL, ZW_CRITICAL_FREE_POINT, 0, &textPoint };
-			err = ZwDrawingDimensionLinearOffsetCreate(dataOff, NULL);
+			szwEntityHandle outOff;
+			err = ZwDrawingDimensionLinearOffsetCreate(dataOff, &outOff);
+			if (err == ZW_API_NO_ERROR) g_lastDimensionId = ZwApiHandleToId(outOff);
 
 			if (err != ZW_API_NO_ERROR) {
 				WriteLog("err code = %i, line to line", static_cast<int>(err));
@@ -771,7 +846,7 @@ extern "C" __declspec(dllexport) int linearOffsetDimension(const char* jsonParam
 			WriteLog("[console] linear offset dimension created.{%i, %i}", lineId1, lineId2);
 			json result;
 			result["return code"] = 0;
-			WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+			WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 			return static_cast<int>(err);
 		}
 		else {
@@ -828,6 +903,7 @@ extern "C" __declspec(dllexport) int linearOffsetDimension(const char* jsonParam
 
 			szwEntityHandle out;
 			err = ZwDrawingDimensionLinearCreate(data, &out);
+			if (err == ZW_API_NO_ERROR) g_lastDimensionId = ZwApiHandleToId(out);
 
 			if (err != ZW_API_NO_ERROR) {
 				WriteLog("err code = %i", static_cast<int>(err));
@@ -837,7 +913,7 @@ extern "C" __declspec(dllexport) int linearOffsetDimension(const char* jsonParam
 			WriteLog("[console] distance dimension created.{%i, %i}", lineId1, lineId2);
 			json result;
 			result["return code"] = 0;
-			WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+			WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 			return static_cast<int>(err);
 		}
 	}
@@ -845,7 +921,7 @@ extern "C" __declspec(dllexport) int linearOffsetDimension(const char* jsonParam
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -855,6 +931,7 @@ extern "C" __declspec(dllexport) int linearDimension(const char* jsonParams) {
 	try {
 		//assume the view is active
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 
 		int lineId = params["id"].get<int>();
 
@@ -882,6 +959,7 @@ extern "C" __declspec(dllexport) int linearDimension(const char* jsonParams) {
 
 		szwEntityHandle out;
 		err = ZwDrawingDimensionLinearCreate(data, &out);
+		if (err == ZW_API_NO_ERROR) g_lastDimensionId = ZwApiHandleToId(out);
 
 		if (err != ZW_API_NO_ERROR) {
 			WriteLog("err code = %i", static_cast<int>(err));
@@ -889,14 +967,14 @@ extern "C" __declspec(dllexport) int linearDimension(const char* jsonParams) {
 		WriteLog("[console] linear dimension created. {%i}", lineId);
 		json result;
 		result["return code"] = 0;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return static_cast<int>(err);
 	}
 	catch (const std::exception& e) {
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -961,14 +1039,14 @@ extern "C" __declspec(dllexport) int drwGetEntData(const char* jsonParams) {
 		WriteLog("[console]Get drawing entities data");
 		json result;
 		result["return code"] = 0;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return static_cast<int>(err);
 	}
 	catch (const std::exception& e) {
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -985,35 +1063,26 @@ extern "C" __declspec(dllexport) int standardViewDimension(const char* jsonParam
 		std::string prefixName = (lastDotPos == std::string::npos) ? actFile : actFile.substr(0, lastDotPos);
 
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 		std::string path = params["path"].get<std::string>();
 		/* rootName get from path */
 		size_t lastSlashPos = path.find_last_of("/\\");
 		std::string fileName = (lastSlashPos == std::string::npos) ? path : path.substr(lastSlashPos + 1);
 		lastDotPos = fileName.find_last_of('.');
 		std::string rootName = (lastDotPos == std::string::npos) ? fileName : fileName.substr(0, lastDotPos);
+		/* the drawing lives next to the part, so same-named parts in different folders get their own */
+		std::string drawingPath = ((lastSlashPos == std::string::npos) ? "" : path.substr(0, lastSlashPos + 1)) + rootName + ".Z3DRW";
 
 		ezwErrors err;
 
 		/* target check class, keep in the sheet environment */
 		if (suffixName != "Z3DRW")
 		{
-			if (suffixName == "Z3ASM" || suffixName == "Z3PRT")
-			{
-				WriteLog("newFile: %s", (rootName + ".Z3DRW").c_str());
-				err = cvxFileOpen((rootName + ".Z3DRW").c_str());
-				if (err != 0)
-				{
-					cvxFileNew((rootName + ".Z3DRW").c_str());
-				}
-			}
-			else
+			WriteLog("newFile: %s", drawingPath.c_str());
+			err = cvxFileOpen(drawingPath.c_str());
+			if (err != 0)
 			{
-				WriteLog("newFile: %s", (rootName + ".Z3DRW").c_str());
-				err = cvxFileOpen((rootName + ".Z3DRW").c_str());
-				if (err != 0)
-				{
-					cvxFileNew((rootName + ".Z3DRW").c_str());
-				}
+				cvxFileNew(drawingPath.c_str());
 			}
 		}
 
@@ -1175,7 +1244,7 @@ extern "C" __declspec(dllexport) int standardViewDimension(const char* jsonParam
 			WriteLog("err code = %i", static_cast<int>(err));
 		}
 		vxLongPath exportPath;
-		strcpy_s(exportPath, sizeof(vxLongPath), "D:/AI_AUTODIM_DATA/stdvu_output.png");
+		strcpy_s(exportPath, sizeof(vxLongPath), ResultPath("stdvu_output.png").c_str());
 		err = cvxFileExport(eType, exportPath, &data);
 		//export end
 
@@ -1184,14 +1253,9 @@ extern "C" __declspec(dllexport) int standardViewDimension(const char* jsonParam
 		}
 		WriteLog("[console] std view created.");
 
-		std::ofstream out("D:/AI_AUTODIM_DATA/stdvu_output.json");
-		if (out.is_open()) {
-			out << viewGeom.dump(4);
-			out.close();
-
-			std::ofstream done("D:/AI_AUTODIM_DATA/stdvu_output.done");
-			done << "done";
-			done.close();
+		// json first, then the .done marker: the marker only appears once the json is complete
+		if (PublishTextFile(ResultPath("stdvu_output.json"), viewGeom.dump(4))) {
+			PublishTextFile(ResultPath("stdvu_output.done"), "done");
 		}
 		else {
 			WriteLog("Failed to write result to file.");
@@ -1199,7 +1263,7 @@ extern "C" __declspec(dllexport) int standardViewDimension(const char* jsonParam
 
 		json result;
 		result["return code"] = 0;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 
 		return static_cast<int>(err);
 	}
@@ -1207,7 +1271,7 @@ extern "C" __declspec(dllexport) int standardViewDimension(const char* jsonParam
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -1304,6 +1368,7 @@ extern "C" __declspec(dllexport) int RadialDimension(const char* jsonParams) {
 	try
 	{
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 
 		int lineId = params["id"].get<int>();
 
@@ -1326,8 +1391,9 @@ extern "C" __declspec(dllexport) int RadialDimension(const char* jsonParams) {
 		}
 		data.textPoint = { NULL, ZW_CRITICAL_FREE_POINT, 0, &textPoint };
 
-		//szwEntityHandle out;
-		err = ZwDrawingDimensionRadialCreate(data, nullptr);
+		szwEntityHandle out;
+		err = ZwDrawingDimensionRadialCreate(data, &out);
+		if (err == ZW_API_NO_ERROR) g_lastDimensionId = ZwApiHandleToId(out);
 
 		if (err != ZW_API_NO_ERROR) {
 			WriteLog("err code = %i", static_cast<int>(err));
@@ -1335,14 +1401,14 @@ extern "C" __declspec(dllexport) int RadialDimension(const char* jsonParams) {
 		WriteLog("[console] radial dimension created. {%i}", lineId);
 		json result;
 		result["return code"] = 0;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return static_cast<int>(err);
 	}
 	catch (const std::exception& e) {
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -1351,6 +1417,7 @@ extern "C" __declspec(dllexport) int ArcLengthDimension(const char* jsonParams)
 	try
 	{
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 
 		int lineId = params["arc id"].get<int>();
 
@@ -1374,6 +1441,7 @@ extern "C" __declspec(dllexport) int ArcLengthDimension(const char* jsonParams)
 
 		szwEntityHandle out;
 		err = ZwDrawingDimensionArcCreate(data,&out);
+		if (err == ZW_API_NO_ERROR) g_lastDimensionId = ZwApiHandleToId(out);
 
 		if (err != ZW_API_NO_ERROR) {
 			WriteLog("err code = %i", static_cast<int>(err));
@@ -1381,14 +1449,14 @@ extern "C" __declspec(dllexport) int ArcLengthDimension(const char* jsonParams)
 		WriteLog("[console] arc length dimension created. {%i}", lineId);
 		json result;
 		result["return code"] = 0;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return static_cast<int>(err);
 	}
 	catch (const std::exception& e) {
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
@@ -1397,6 +1465,7 @@ extern "C" __declspec(dllexport) int HoleCalloutDimension(const char* jsonParams
 	try
 	{
 		json params = json::parse(jsonParams);
+		BeginRequest(params);
 
 		int holeId = params["hole curve id"].get<int>();
 		int vuId = params["view id"].get<int>();
@@ -1416,9 +1485,10 @@ extern "C" __declspec(dllexport) int HoleCalloutDimension(const char* jsonParams
 		data.count = 1;
 
 		int count_out = 0;
-		//szwEntityHandle* out;
-		err = ZwDrawingDimensionHoleCalloutCreate(data, &count_out, nullptr);
-		//ZwEntityHandleListFree(count_out, &out);
+		szwEntityHandle* out = nullptr;
+		err = ZwDrawingDimensionHoleCalloutCreate(data, &count_out, &out);
+		if (err == ZW_API_NO_ERROR && count_out > 0) g_lastDimensionId = ZwApiHandleToId(out[0]);
+		if (out) ZwEntityHandleListFree(count_out, &out);
 
 		if (err != ZW_API_NO_ERROR) {
 			WriteLog("err code = %i", static_cast<int>(err));
@@ -1426,19 +1496,92 @@ extern "C" __declspec(dllexport) int HoleCalloutDimension(const char* jsonParams
 		WriteLog("[console] hole callout dimension created., {%i}", holeId);
 		json result;
 		result["return code"] = 0;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return static_cast<int>(err);
 	}
 	catch (const std::exception& e) {
 		WriteLog("JSON parse err: %s", e.what());
 		json result;
 		result["return code"] = 1;
-		WriteResultToJsonFile("D:/AI_AUTODIM_DATA/zw3d_result.json", result);
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
 		return -1;
 	}
 }
 
 
+extern "C" __declspec(dllexport) int batchDimension(const char* jsonParams) {
+	// {"ops": [{"op": "LINDIM", "params": {...}}, ...]} -> one result per op
+	json result;
+	try {
+		json params = json::parse(jsonParams);
+		BeginRequest(params);
+		result["results"] = json::array();
+		int index = 0;
+		for (const auto& op : params["ops"])
+		{
+			std::string name = op["op"].get<std::string>();
+			json subParams = op["params"];
+			subParams["outputDir"] = g_resultDir; // keep the sub-commands in this request's directory
+			std::string opParams = subParams.dump();
+			g_lastDimensionId = 0;
+
+			int err = -2; // unknown op
+			if (name == "LINDIM") err = linearDimension(opParams.c_str());
+			else if (name == "LINOFFSETDIM") err = linearOffsetDimension(opParams.c_str());
+			else if (name == "RADIALDIM") err = RadialDimension(opParams.c_str());
+			else if (name == "ARCLENDIM") err = ArcLengthDimension(opParams.c_str());
+			else if (name == "HOLECALLOUTDIM") err = HoleCalloutDimension(opParams.c_str());
+
+			json entry;
+			entry["index"] = index++;
+			entry["op"] = name;
+			entry["status"] = (err == ZW_API_NO_ERROR) ? "ok" : "error";
+			entry["error code"] = err;
+			entry["handle"] = g_lastDimensionId;
+			result["results"].push_back(entry);
+		}
+		WriteLog("[console] batch dimension done. {%i}", index);
+		result["return code"] = 0;
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
+		return 0;
+	}
+	catch (const std::exception& e) {
+		WriteLog("JSON parse err: %s", e.what());
+		result["return code"] = 1;
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
+		return -1;
+	}
+}
+
+
+// ENTCHECK: which of the given entity ids are not in the active file, e.g. a cached view whose drawing
+// was closed without saving. {"ids": [...]} -> zw3d_result.json {"return code": 0, "missing": [...]}
+extern "C" __declspec(dllexport) int entityCheck(const char* jsonParams) {
+	try {
+		json params = json::parse(jsonParams);
+		BeginRequest(params);
+		json result;
+		result["missing"] = json::array();
+		for (const auto& id : params["ids"])
+		{
+			szwEntityHandle hdl;
+			if (id.get<int>() == 0 || ZwApiIdtoHandle(id.get<int>(), &hdl) != ZW_API_NO_ERROR)
+				result["missing"].push_back(id);
+		}
+		WriteLog("[console] entity check: %i missing.", static_cast<int>(result["missing"].size()));
+		result["return code"] = 0;
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
+		return ZW_API_NO_ERROR;
+	}
+	catch (const std::exception& e) {
+		WriteLog("JSON parse err: %s", e.what());
+		json result;
+		result["return code"] = 1;
+		WriteResultToJsonFile(ResultPath("zw3d_result.json").c_str(), result);
+		return -1;
+	}
+}
+
 extern "C" __declspec(dllexport) int ZW3D_V1Init() {
 	ZwCommandFunctionLoad("mycommand", MyCommand, ZW_LICENSE_CODE_GENERAL);//ע
 
@@ -1456,6 +1599,8 @@ extern "C" __declspec(dllexport) int ZW3D_V1Init() {
 	ZwCommandFunctionLoad("RADIALDIM", RadialDimension, ZW_LICENSE_CODE_GENERAL);
 	ZwCommandFunctionLoad("ARCLENDIM", ArcLengthDimension, ZW_LICENSE_CODE_GENERAL);
 	ZwCommandFunctionLoad("HOLECALLOUTDIM", HoleCalloutDimension, ZW_LICENSE_CODE_GENERAL);
+	ZwCommandFunctionLoad("BATCHDIM", batchDimension, ZW_LICENSE_CODE_GENERAL);
+	ZwCommandFunctionLoad("ENTCHECK", entityCheck, ZW_LICENSE_CODE_GENERAL);
 
 	ZwCommandFunctionLoad("ASMTREE", createAssemblyTree, ZW_LICENSE_CODE_GENERAL);
 	ZwCommandFunctionLoad("COMPINSERT", insertComponent, ZW_LICENSE_CODE_GENERAL);
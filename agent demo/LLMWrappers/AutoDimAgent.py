@@ -43,6 +43,7 @@ Stage 6: Optimize dimensions
 - Apply symmetry or coordinate dimensions where features are symmetric or aligned (if features are symmetric, only annotate one of them).
 - If there are any symmetric features, tell me about them.
 - Avoid redundant or unnecessary annotations; auxiliary entities should not be directly dimensioned unless required.
+- Dimensions that follow from others (closed chains) are refused; each dimension tool result lists under "constraints" the features that are still not located or sized.
 
 Stage 7: Adjust annotation placement
 - Place dimension texts and extension lines so they do not overlap or occlude geometry.
@@ -76,7 +77,8 @@ Available tools:
 "linear dimension": for linear length dimension, 
 "linear offset dimension": for distance dimension (offset from feature to the datum line), 
 "radial dimension": for measuring arc radius, 
-"hole callout dimension": for comprehensive hole information dimension 
+"hole callout dimension": for comprehensive hole information dimension,
+"batch dimension": for creating many of the above dimensions in a single call once the plan is fixed
 }
 '''
 
@@ -88,6 +90,7 @@ class GPTAutoDimAgent:
     def attach_from_wrapper(self, other: GPTToolWrapper):
         self.wrapper._tools_defs = other._registered_defs
         self.wrapper._registry   = other._registered_exec
+        self.wrapper._aregistry  = other._aregistry
 
     def run(self, system_prompt: str, user_prompt: str,
             history: Optional[List[Dict[str, Any]]] = None,
@@ -97,11 +100,78 @@ class GPTAutoDimAgent:
         msgs.append({"role":"user","content":user_prompt})
         return self.wrapper.run_dialog(msgs, tool_choice=tool_choice, parallel_tool_calls=parallel_tool_calls)
 
+RULE_DRAFT_PROMPT = (
+    "A rule-based planner produced the draft plan below (datums, labeled entities, skipped entities and the "
+    "zw3d_batch_dim operations). Review it against the drawing: keep what is correct, fix or add what is "
+    "missing, remove what is redundant, then apply the final plan with a single zw3d_batch_dim call.\n"
+)
+
+SYMMETRY_PROMPT = (
+    "Symmetry and repeated features of this view. Repeated holes and mirrored entities were removed from the "
+    "metadata above; each pattern is represented by one hole. Dimension a pattern once (representative, count, "
+    "pitch) instead of every member:\n"
+)
+
+CONTOURS_PROMPT = (
+    "Closed contours of this view, largest first: the outer profile, holes, slots, pockets and islands, with the "
+    "contour each one lies in and its boundary entities. Dimension each feature as a whole (size once, located "
+    "from the datums) rather than segment by segment:\n"
+)
+
+INCREMENTAL_PROMPT = (
+    "The part was edited since it was last dimensioned. The metadata above only holds the added or changed "
+    "entities ({dirty}) and the lines the kept dimensions start from. The {kept} dimensions of unchanged "
+    "entities listed below were already re-applied; do not repeat them. Dimension only the added or changed "
+    "entities, from the same datums:\n"
+)
+
+TILE_PROMPT = (
+    "This view is too large for one plan and was split into {count} regions along its features; this is "
+    "region {number} (x {x0:g} to {x1:g}, y {y0:g} to {y1:g}). The metadata above only holds the entities of this "
+    "region and the datum lines of the whole view ({datums}). Dimension only these entities and locate every "
+    "feature from those datums. The other regions and the overall dimensions of the part are planned "
+    "separately; do not dimension them.\n"
+)
+
+PARALLEL_PAIRS_PROMPT = (
+    "Parallel line pairs of this view, candidates for linear offset dimensions (id1, id2, perpendicular "
+    "distance, overlap length, direction in degrees), best candidates first:\n"
+)
+
+
 class GPTAutoDimensionAgent:
-    """工程图自动标注 Agent。"""
-    def __init__(self, wrapper: GPTToolWrapper, model: str = None):
+    """工程图自动标注 Agent。
+
+    planner（或环境变量 AUTO_DIM_PLANNER）:
+    - "auto"（默认）：简单视图（tools.zw3d_planner.is_simple）直接用规则规划，不调用 LLM；其余视图把规则草案交给 LLM 审核
+    - "rules"：只用规则规划
+    - "review"：总是把规则草案交给 LLM 审核
+    - "llm"：原流程，LLM 从零规划
+
+    geometry_format（或环境变量 AUTO_DIM_GEOMETRY_FORMAT），提示词里的几何数据格式:
+    - "compact"（默认）：tools.zw3d_encoding 紧凑表格
+    - "relative"：紧凑表格，坐标相对视图左下角
+    - "json"：原 stdvu_output.json 缩进格式
+
+    LLM 的标注工具调用在发送给 ZW3D 前由 tools.zw3d_validator.PlanValidator 校验（AUTO_DIM_VALIDATE=0 关闭）；
+    校验器同时用 tools.zw3d_constraints.ConstraintCounter 统计自由度，拒绝冗余尺寸（AUTO_DIM_CONSTRAINTS=0 关闭）；
+    通过校验的调用在发送前由 TextPlacer 排布文字位置，避开视图几何和已落地的标注（与批量规划一致）。
+
+    零件修改后重新出图（std_view_result 带 "path"/"view type"）时，与 tools.zw3d_diff.DimensionHistory
+    里上一版的视图比对：未变实体的标注直接重映射后重放，只有新增/修改的实体交给 LLM；
+    规则规划（毫秒级）仍对整个视图运行，只执行旧标注未覆盖的部分。
+    若 STDVUDIM 命中 tools.zw3d_extract_cache（同一视图 id），旧标注仍在图上，不再重放。
+
+    需要 LLM 的大视图（去掉阵列/镜像重复后超过 AUTO_DIM_TILE_ENTITIES 个实体）由 tools.zw3d_tiling
+    按特征分区：各区带上整个视图的基准线并行规划（工具调用只记录不执行），合并去重、去冗余后一次性执行。
+    """
+    def __init__(self, wrapper: GPTToolWrapper, model: str = None, planner: Optional[str] = None,
+                 geometry_format: Optional[str] = None):
         self.wrapper = wrapper
         self.model = model or os.environ.get("MODEL_NAME", "gpt-5")
+        self.planner = planner or os.environ.get("AUTO_DIM_PLANNER", "auto")
+        self.geometry_format = geometry_format or os.environ.get("AUTO_DIM_GEOMETRY_FORMAT", "compact")
+        self.geometry = None  # 最近一次读取的完整视图几何（ViewGeometry）
 
     @staticmethod
     def _extract_json(text: str) -> Dict[str, Any]:
@@ -120,14 +190,125 @@ class GPTAutoDimensionAgent:
                 return {}
         return {}
 
-    def generate_dimension_plan(self, std_view_result: Dict[str, Any]) -> Dict[str, Any]:
-        from tools.deepseek_wrapper import read_with_done_check
-        geometry_data = read_with_done_check(std_view_result.get("geom_data"), std_view_result.get("done_path"))
+    def generate_dimension_plan(self, std_view_result: Dict[str, Any], journal=None) -> Dict[str, Any]:
+        if journal is not None and journal.initial:
+            # 崩溃恢复：沿用日志里的初始消息。.done 已被消费，直接读几何文件重建校验器；
+            # 已确认的调用由 run_dialog 重新登记到校验器，之后的调用照常校验、去重、放置文字
+            validator = None
+            geom_path = std_view_result.get("geom_data")
+            if geom_path and os.path.exists(geom_path):
+                from tools.zw3d_analysis import find_symmetry
+                from tools.zw3d_geometry import ViewGeometry
+                with open(geom_path, "r", encoding="utf-8") as f:
+                    self.geometry = ViewGeometry.from_json(f.read())
+                validator = self._validator(find_symmetry(self.geometry))
+            return self._finish(self.wrapper.run_dialog(list(journal.initial), tool_choice="auto",
+                                                        parallel_tool_calls=False, journal=journal,
+                                                        validator=validator))
+        from tools.zw3d_geometry import ViewGeometry
+        geometry = ViewGeometry.load(std_view_result.get("geom_data"), std_view_result.get("done_path"))
+        self.geometry = geometry
+        history, key, diff, kept = self._previous(std_view_result, geometry)
+
+        from tools.zw3d_analysis import (find_symmetry, format_pairs, format_symmetry, parallel_pairs,
+                                         representatives)
+        symmetry = find_symmetry(geometry)
+
+        draft = None
+        if self.planner != "llm" or (diff is not None and not diff.dirty):
+            from tools.zw3d_planner import is_simple, rule_plan
+            draft = rule_plan(geometry, symmetry=symmetry)
+            if diff is not None:
+                draft = self._uncovered(draft, kept, geometry)
+            forced = self.planner == "rules" or (diff is not None and not diff.dirty)
+            if forced or (self.planner == "auto" and is_simple(geometry)):
+                # auto：约束计数显示规则规划不完整时不落地，草稿交给模型复核
+                res = self._apply_rule_plan(draft, kept=kept, replay=diff is None or not diff.same_view,
+                                            symmetry=symmetry, review=not forced)
+                if res is not None:
+                    if history is not None and key and res["result"]["ok"]:
+                        history.save(key, self.geometry, res["operations"])
+                    return res
+
+        from tools.zw3d_tiling import TILE_ENTITIES
+        if diff is None and journal is None and 0 < TILE_ENTITIES < len(representatives(geometry, symmetry)):
+            res = self._plan_tiles(std_view_result, symmetry, draft)
+            if history is not None and key and res["result"]["ok"]:
+                history.save(key, self.geometry, res["operations"])
+            return res
+
+        validator = self._validator(symmetry)
+
+        if diff is not None and kept and not diff.same_view:
+            # 增量：先重放保留的标注并登记到校验器（避免模型重复标注）
+            replayed = self._apply_operations(kept)
+            if not replayed["ok"]:
+                # 重放未全部成功：只登记已落地的，整张视图交给模型重新规划
+                kept = self._succeeded(kept, replayed)
+                print(f"⚠️ 旧标注重放失败，{len(kept)} 项已落地，改为整体规划")
+                diff = None
+                if draft is not None:
+                    from tools.zw3d_planner import rule_plan
+                    draft = self._uncovered(rule_plan(self.geometry, symmetry=symmetry), kept, self.geometry)
+            if validator is not None and kept:
+                validator.done(validator.check("zw3d_batch_dim", {"operations": kept}), {"ok": True})
+
+        contour_text = ""
+        if diff is not None:
+            # 增量：提示词只含新增/修改的实体
+            from tools.zw3d_diff import operation_ids
+            from tools.zw3d_geometry import LINE
+            context = {i for op in kept for i in operation_ids(op)
+                       if i in geometry and int(geometry.get(i)["type"]) == LINE}
+            geometry = geometry.select(sorted(set(diff.dirty) | context))
+            symmetry_text = INCREMENTAL_PROMPT.format(dirty=", ".join(map(str, diff.dirty)), kept=len(kept)) + \
+                json.dumps(kept, ensure_ascii=False)
+        else:
+            # 对称/阵列：重复的孔和镜像实体只保留代表，其余以摘要形式告诉模型
+            keep = representatives(geometry, symmetry)
+            if len(keep) < len(geometry):
+                geometry = geometry.select(keep)
+            symmetry_text = format_symmetry(symmetry)
+            if symmetry_text:
+                symmetry_text = SYMMETRY_PROMPT + symmetry_text
+            # 轮廓/特征：外轮廓、孔、槽、型腔及其嵌套关系，模型无需再从线段推断
+            from tools.zw3d_topology import contours, format_contours
+            contour_text = format_contours(contours(self.geometry))
+
+        pairs = parallel_pairs(geometry)
+
+        texts = [symmetry_text, contour_text and CONTOURS_PROMPT + contour_text,
+                 len(pairs) and PARALLEL_PAIRS_PROMPT + format_pairs(pairs),
+                 draft is not None and RULE_DRAFT_PROMPT + json.dumps(draft, ensure_ascii=False)]
+        messages = self._messages(geometry, texts, self._image(std_view_result))
+
+        start = len(validator.applied) if validator is not None else 0
+        result = self.wrapper.run_dialog(messages, tool_choice="auto", parallel_tool_calls=False, journal=journal,
+                                         validator=validator)
+        # 没有校验器时不知道模型实际落地了哪些标注，保留旧记录（下次仍与旧版本比对）
+        if history is not None and key and validator is not None:
+            history.save(key, self.geometry, kept + validator.applied[start:])
+        return self._finish(result)
 
+    def _validator(self, symmetry):
+        """self.geometry 的 PlanValidator（AUTO_DIM_VALIDATE=0 时为 None）。"""
+        if os.environ.get("AUTO_DIM_VALIDATE", "1") == "0":
+            return None
+        from tools.zw3d_validator import PlanValidator
+        constraints = None
+        if os.environ.get("AUTO_DIM_CONSTRAINTS", "1") != "0":
+            from tools.zw3d_constraints import ConstraintCounter
+            constraints = ConstraintCounter(self.geometry, symmetry=symmetry)
+        return PlanValidator(self.geometry, constraints=constraints, place=True)
+
+    @staticmethod
+    def _image(std_view_result: Dict[str, Any]) -> str:
         with open(std_view_result.get("img_path"), "rb") as f:
-            img_base64 = base64.b64encode(f.read()).decode("utf-8")
+            return base64.b64encode(f.read()).decode("utf-8")
 
-        messages = [{"role": "system", "content": AUTO_DIM_SYS_PROMPT},
+    def _messages(self, geometry, texts: List[Any], img_base64: str) -> List[Dict[str, Any]]:
+        """对话初始消息：几何数据、texts 中非空的补充说明、视图图片。"""
+        return [{"role": "system", "content": AUTO_DIM_SYS_PROMPT},
             {
                 "role": "user",
                 "content": [
@@ -135,9 +316,10 @@ class GPTAutoDimensionAgent:
                         "type": "text",
                         "text": (
                                 "The following is the metadata of the engineering drawing:\n"
-                                + json.dumps(geometry_data, ensure_ascii=False, indent=2)
+                                + self._geometry_text(geometry)
                         )
                     },
+                    *({"type": "text", "text": text} for text in texts if text),
                     {
                         "type": "image_url",
                         "image_url": {
@@ -150,8 +332,190 @@ class GPTAutoDimensionAgent:
             }
         ]
 
-        result = self.wrapper.run_dialog(messages, tool_choice="auto", parallel_tool_calls=False)
-        save_full_messages(result["messages"], prefix="dimension_flow")
+    def _recording_wrapper(self, ops: List[Dict[str, Any]]):
+        """wrapper 的副本：标注工具调用只记录到 ops，不发送给 ZW3D（其它工具照常执行）。"""
+        import copy
+        from tools import zw3d_command_tool as zw3d
+        from tools.zw3d_batch import _RecordingTool
+        wrapper = copy.copy(self.wrapper)
+        wrapper._registry = dict(self.wrapper._registry)
+        wrapper._aregistry, wrapper._loop = {}, None
+        for cls in [*zw3d.DIMENSION_TOOLS.values(), zw3d.ZW3DCommandBatchDim]:
+            tool = _RecordingTool(cls(), ops)
+            wrapper._registry[tool.name] = tool.run
+        return wrapper
+
+    def _plan_tiles(self, std_view_result: Dict[str, Any], symmetry: Dict[str, Any],
+                    draft: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """大视图分区并行规划（tools.zw3d_tiling），合并后一次性执行。"""
+        from tools.zw3d_analysis import format_pairs, format_symmetry, parallel_pairs, representatives
+        from tools.zw3d_planner import rule_plan
+        from tools.zw3d_tiling import TILE_ENTITIES, merge_regions, partition, plan_regions, split_draft
+        from tools.zw3d_topology import contours, format_contours
+        geometry = self.geometry
+        datums = (draft or rule_plan(geometry, symmetry=symmetry))["datums"]
+        tiles = partition(geometry, TILE_ENTITIES, keep=representatives(geometry, symmetry),
+                          datums=[datums.get("horizontal"), datums.get("vertical")])
+        regions = tiles["regions"]
+        shared, drafts = split_draft(draft, tiles) if draft is not None else ([], [None] * len(regions))
+        img_base64 = self._image(std_view_result)
+        validate = os.environ.get("AUTO_DIM_VALIDATE", "1") != "0"
+        print(f"🧩 大视图分区规划：{len(regions)} 个区域，每区至多 {TILE_ENTITIES} 个实体")
+
+        def plan_region(k: int, region: Dict[str, Any]) -> Dict[str, Any]:
+            sub = geometry.select(region["entities"] + tiles["datums"])
+            ids = set(region["entities"])
+            patterns = [p for p in symmetry.get("patterns", []) if p["representative"] in ids]
+            pairs = parallel_pairs(sub)
+            x0, y0, x1, y1 = region["bbox"]
+            texts = [TILE_PROMPT.format(count=len(regions), number=k + 1, x0=x0, y0=y0, x1=x1, y1=y1,
+                                        datums=", ".join(map(str, tiles["datums"]))),
+                     patterns and SYMMETRY_PROMPT + format_symmetry({"patterns": patterns}),
+                     CONTOURS_PROMPT + format_contours(contours(sub)),
+                     len(pairs) and PARALLEL_PAIRS_PROMPT + format_pairs(pairs),
+                     drafts[k] is not None and RULE_DRAFT_PROMPT + json.dumps(drafts[k], ensure_ascii=False)]
+            ops: List[Dict[str, Any]] = []
+            validator = None
+            if validate:
+                from tools.zw3d_validator import PlanValidator
+                validator = PlanValidator(sub)
+            result = self._recording_wrapper(ops).run_dialog(self._messages(sub, texts, img_base64),
+                                                             tool_choice="auto", parallel_tool_calls=False,
+                                                             validator=validator)
+            return {**result, "operations": ops}
+
+        plans = plan_regions(regions, plan_region)
+        merged = merge_regions(geometry, [p["operations"] for p in plans], shared=shared, symmetry=symmetry,
+                               constraints=os.environ.get("AUTO_DIM_CONSTRAINTS", "1") != "0")
+        operations = merged["operations"]
+        applied = self._apply_operations(operations) if operations else {"ok": True, "data": None}
+        print(f"🧩 合并：{len(operations)} 项标注，去掉 {len(merged['dropped'])} 项重复/冗余")
+        res = self._finish({"messages": [m for p in plans for m in p["messages"]],
+                            "response": "\n".join(p.get("response") or "" for p in plans)})
+        return {**res, "planner": "tiles", "operations": operations, "result": applied,
+                "regions": [{"entities": len(r["entities"]), "operations": len(p["operations"])}
+                            for r, p in zip(regions, plans)],
+                "dropped": merged["dropped"]}
+
+    @staticmethod
+    def _previous(std_view_result: Dict[str, Any], geometry):
+        """(history, key, diff, kept)：上一版可复用时 diff 为 tools.zw3d_diff.ViewDiff，kept 为重映射后的标注。"""
+        from tools.zw3d_diff import MIN_REUSE, DimensionHistory, diff_views, remap_operations
+        path, view_type = std_view_result.get("path"), std_view_result.get("view type")
+        history = DimensionHistory()
+        if not path or history.root == "0":
+            return None, None, None, []
+        key = DimensionHistory.key(path, view_type)
+        previous = history.load(key)
+        if previous is None:
+            return history, key, None, []
+        diff = diff_views(previous[0], geometry)
+        if diff.reuse < MIN_REUSE:
+            print(f"♻️ 与上一版差异过大（复用 {diff.reuse:.0%}），重新规划整个视图")
+            return history, key, None, []
+        kept, dropped = remap_operations(previous[1], diff)
+        print(f"♻️ 增量标注：{diff.summary()}，保留 {len(kept)} 项、丢弃 {len(dropped)} 项旧标注")
+        return history, key, diff, kept
+
+    @staticmethod
+    def _uncovered(draft: Dict[str, Any], kept: List[Dict[str, Any]], geometry) -> Dict[str, Any]:
+        """去掉规则规划中已由 kept 覆盖（测量内容相同，见 dimension_key）的标注（labeled 与 operations 一一对应）。"""
+        from tools.zw3d_validator import dimension_key, view_tolerance
+        tol = view_tolerance(geometry)
+        key = lambda op: dimension_key(op["type"], op.get("args") or {}, tol)
+        done = {key(op) for op in kept}
+        pairs = [(item, op) for item, op in zip(draft["labeled"], draft["operations"]) if key(op) not in done]
+        return {**draft, "labeled": [item for item, _ in pairs], "operations": [op for _, op in pairs]}
+
+    def _geometry_text(self, geometry) -> str:
+        """提示词中的几何数据；紧凑格式且 AUTO_DIM_TOKEN_REPORT=1 时打印相对缩进 JSON 节省的 token。"""
+        if self.geometry_format == "json":
+            return json.dumps(geometry.to_json(), ensure_ascii=False, indent=2)
+        from tools.zw3d_encoding import encode_geometry, token_report
+        text = encode_geometry(geometry, relative=self.geometry_format == "relative")
+        if os.environ.get("AUTO_DIM_TOKEN_REPORT", "0") != "1":
+            return text  # 统计要重新序列化并分词两种格式，默认不做
+        try:
+            report = token_report(geometry, text, model=self.model)
+            print(f"🧮 几何数据 token：{report['json']} → {report['compact']}（节省 {report['saved']:.0%}）")
+        except Exception:
+            pass  # tiktoken 编码表不可用时不影响标注
+        return text
+
+    def _apply_operations(self, operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """通过 wrapper 注册的 zw3d_batch_dim（若有）一次性执行全部操作；ok 由返回码和逐项 status 决定。"""
+        batch = self.wrapper._registry.get("zw3d_batch_dim")
+        if batch is not None:
+            data = batch(operations=operations)
+        else:
+            from tools.zw3d_command_tool import execute_plan
+            data = execute_plan(operations)
+        return {"ok": self._batch_ok(data), "data": data}
+
+    @staticmethod
+    def _batch_ok(data: Any) -> bool:
+        """返回码为 0 且每项操作 status 均为 ok；没有逐项结果时看工具返回的 ok（错误结果为 ok=False）。"""
+        if not isinstance(data, dict):
+            return False
+        results = data.get("results")
+        if isinstance(results, list):
+            return data.get("return code", 0) == 0 and all(r.get("status") == "ok" for r in results)
+        return bool(data.get("ok")) and data.get("return code", 0) == 0
+
+    @staticmethod
+    def _succeeded(operations: List[Dict[str, Any]], applied: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """operations 中已落地的部分（按逐项结果；没有逐项结果时整体成功才算）。"""
+        if applied["ok"]:
+            return list(operations)
+        data = applied.get("data")
+        results = data.get("results") if isinstance(data, dict) else None
+        if not isinstance(results, list):
+            return []
+        done = {r.get("index") for r in results if r.get("status") == "ok"}
+        return [op for i, op in enumerate(operations) if i in done]
+
+    def _apply_rule_plan(self, draft: Dict[str, Any], kept: List[Dict[str, Any]] = (),
+                         replay: bool = True, symmetry: Optional[Dict[str, Any]] = None,
+                         review: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        规则规划直接落地：先整体排布文字位置（避开 kept 中已保留的标注），再与 kept 一起一次性执行。
+        replay=False 表示 kept 已在图上（复用了缓存的同一视图），只执行新标注。
+        落地前用 ConstraintCounter 检查 kept + 草稿是否完整；review=True 且不完整时不执行，返回 None。
+        """
+        constraints = None
+        if self.geometry is not None and os.environ.get("AUTO_DIM_CONSTRAINTS", "1") != "0":
+            from tools.zw3d_constraints import ConstraintCounter, format_status
+            counter = ConstraintCounter(self.geometry, symmetry=symmetry)
+            counter.add_all(list(kept) + draft["operations"])
+            status = counter.status()
+            constraints = format_status(status)
+            if review and status["features"]:
+                print("⚠️ 规则规划不完整，交给模型复核：", constraints)
+                return None
+        if self.geometry is not None:
+            from tools.zw3d_placement import place_texts
+            draft = {**draft, "operations": place_texts(self.geometry, draft["operations"],
+                                                        fixed=kept)["operations"]}
+        operations = list(kept) + draft["operations"]
+        todo = operations if replay else draft["operations"]
+        applied = self._apply_operations(todo) if todo else {"ok": True, "data": None}
+        print("⚙️ 规则规划：", len(draft["operations"]), "项标注，未调用 LLM",
+              *([f"（另保留 {len(kept)} 项旧标注）"] if kept else []))
+        return {
+            "response": json.dumps(draft["labeled"], ensure_ascii=False),
+            "json": {"labeled": draft["labeled"], "skipped": draft["skipped"], "datums": draft["datums"]},
+            "messages": [],
+            "planner": "rules",
+            "operations": operations,
+            "result": applied,
+            "constraints": constraints,
+        }
+
+    def _finish(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        # 多视图并行规划时各视图同一秒结束，文件名带上视图 id 以免互相覆盖
+        view_id = getattr(self.geometry, "view_id", None)
+        save_full_messages(result["messages"], prefix="dimension_flow" if view_id is None
+                           else f"dimension_flow_v{view_id}")
         raw_text = result.get("response","") or ""
         parsed = self._extract_json(raw_text)
 
@@ -3,13 +3,18 @@
 - 自动注册工具
 - 处理 tool_calls 并以 role="tool"+tool_call_id 回传
 - 在调用 "zw3d_stdvucrt_dim" 且 return code == 1 时自动触发 GPTAutoDimensionAgent
+- 可选 journal（tools.zw3d_journal.Journal）：崩溃后从最后一个已确认的工具调用继续，不重新请求模型
+- 可选 validator（tools.zw3d_validator.PlanValidator）：标注工具调用在发送给 ZW3D 前先本地校验/修正，
+  结果中附带 fixes 与 constraints（冗余/缺失尺寸统计）
 """
 from __future__ import annotations
 from typing import Any, Dict, List, Optional, Callable
 from openai import OpenAI
 import json, os, traceback
+import asyncio, contextlib, threading
 import tiktoken
 import time, json
+from types import SimpleNamespace
 
 LOG_PATH = os.getenv("AUTO_DIM_TOOL_LOG", "tool_calls.jsonl")
 
@@ -53,6 +58,8 @@ class GPTToolWrapper:
         self.client = OpenAI(api_key=api_key or os.environ.get("OPENAI_API_KEY"))
         self._tools_defs: List[Dict[str, Any]] = []
         self._registry: Dict[str, Callable[..., Any]] = {}
+        self._aregistry: Dict[str, Callable[..., Any]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
 
     def _log_jsonl(self, obj: dict):
         """安全写日志"""
@@ -68,6 +75,9 @@ class GPTToolWrapper:
         def _exec(**kwargs):
             return tool_obj.run(**kwargs)
         self._registry[tool_obj.name] = _exec
+        # 提供 arun 的工具（ZW3D 命令）可在同一轮内并发执行
+        if hasattr(tool_obj, "arun"):
+            self._aregistry[tool_obj.name] = tool_obj.arun
 
     # 暴露（给 Agent 共享）
     @property
@@ -77,13 +87,138 @@ class GPTToolWrapper:
     def _registered_exec(self):
         return self._registry
 
+    # 工具执行（带日志）
+    def _log_tool_start(self, tc, name, args):
+        self._log_jsonl({
+            "event": "tool_start",
+            "tool_call_id": tc.id,
+            "name": name,
+            "args": args,
+            "ts": time.time()
+        })
+
+    def _log_tool_end(self, tc, name, result, error):
+        self._log_jsonl({
+            "event": "tool_end",
+            "tool_call_id": tc.id,
+            "name": name,
+            "result": result if error is None else None,
+            "error": error,
+            "ts": time.time()
+        })
+
+    def _tool_failed(self, e, name, tc, messages):
+        print ("exception:", name, tc.id, count_messages_tokens(messages))
+        return {"ok": False, "error": f"{type(e).__name__}: {e}", "trace": traceback.format_exc()}
+
+    def _validated(self, tc, name, args, validator):
+        """(args, verdict, rejection)：校验不通过时 rejection 为直接回传给模型的结果，不再执行工具。"""
+        if validator is None:
+            return args, None, None
+        verdict = validator.check(name, args)
+        if verdict["ok"]:
+            return verdict["args"], verdict, None
+        rejection = validator.rejection(verdict)
+        self._log_tool_start(tc, name, args)
+        self._log_tool_end(tc, name, rejection, rejection["error"])
+        return args, verdict, rejection
+
+    @staticmethod
+    def _with_fixes(result, verdict, validator):
+        if verdict is None:
+            return result
+        validator.done(verdict, result)
+        if verdict["fixes"] and isinstance(result, dict):
+            result = {**result, "fixes": verdict["fixes"]}
+        if verdict.get("constraints") and isinstance(result, dict):
+            result = {**result, "constraints": verdict["constraints"]}
+        return result
+
+    def _execute_tool(self, tc, name, args, messages, validator=None):
+        args, verdict, rejection = self._validated(tc, name, args, validator)
+        if rejection is not None:
+            return rejection
+        exec_fn = self._registry.get(name)
+        self._log_tool_start(tc, name, args)
+        try:
+            result = exec_fn(**args) if exec_fn else {"ok": False, "error": f"Unknown tool: {name}"}
+            error = None
+        except Exception as e:
+            result = self._tool_failed(e, name, tc, messages)
+            error = str(e)
+        self._log_tool_end(tc, name, result, error)
+        return self._with_fixes(result, verdict, validator)
+
+    async def _aexecute_tool(self, tc, name, args, messages, validator=None):
+        args, verdict, rejection = self._validated(tc, name, args, validator)
+        if rejection is not None:
+            return rejection
+        self._log_tool_start(tc, name, args)
+        try:
+            result = await self._aregistry[name](**args)
+            error = None
+        except Exception as e:
+            result = self._tool_failed(e, name, tc, messages)
+            error = str(e)
+        self._log_tool_end(tc, name, result, error)
+        return self._with_fixes(result, verdict, validator)
+
+    def _async_loop(self) -> asyncio.AbstractEventLoop:
+        """后台事件循环（常驻线程），跨轮次复用，ZW3D 连接无需每轮重建。"""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        return self._loop
+
+    def _execute_tool_calls(self, calls, messages, concurrent: bool = False, journal=None,
+                            validator=None) -> List[Any]:
+        """执行一轮的全部 tool_calls；若允许并行且全部支持 arun，则用 asyncio 并发执行，结果保持原顺序。
+        有 journal 时：已确认的调用直接复用结果，其余调用先写入 plan 记录再执行。
+        有 validator 时：每个调用执行前先校验，不通过的调用不发送给 ZW3D。"""
+        if journal is not None:
+            pending = [c for c in calls if not journal.acked(c[0].id)]
+            for tc, name, args in pending:
+                journal.plan(tc.id, name, args)
+            fresh = iter(self._execute_tool_calls(pending, messages, concurrent, validator=validator))
+            outcomes = []
+            for tc, name, args in calls:
+                if journal.acked(tc.id):
+                    result = journal.result(tc.id)
+                    if validator is not None:  # 恢复时重建已完成标注的去重状态
+                        validator.done(validator.check(name, args), result)
+                    outcomes.append(result)
+                else:
+                    outcomes.append(next(fresh))
+            return outcomes
+        if concurrent and len(calls) > 1 and all(name in self._aregistry for _, name, _ in calls):
+            async def _gather():
+                return await asyncio.gather(*(self._aexecute_tool(tc, name, args, messages, validator)
+                                              for tc, name, args in calls))
+            return asyncio.run_coroutine_threadsafe(_gather(), self._async_loop()).result()
+        return [self._execute_tool(tc, name, args, messages, validator) for tc, name, args in calls]
+
     # 主循环
     def run_dialog(self, messages: List[Dict[str, Any]], tool_choice: Any = "auto",
-                   parallel_tool_calls: bool = False, max_rounds: int = 100) -> Dict[str, Any]:
+                   parallel_tool_calls: bool = False, max_rounds: int = 100, journal=None,
+                   validator=None) -> Dict[str, Any]:
         rounds = 0
         last_raw = None
+        if journal is not None:
+            journal.begin(messages)
         while rounds < max_rounds:
             rounds += 1
+            if journal is not None and journal.has_replay():
+                # 恢复：重放已记录的 assistant 消息，不重新请求模型
+                assistant = journal.next_assistant()
+                messages.append(assistant)
+                tool_calls = assistant.get("tool_calls") or []
+                if not tool_calls:
+                    return {"messages": messages, "response": assistant.get("content") or "", "raw": None}
+                calls = [(SimpleNamespace(id=tc["id"]), tc["function"]["name"],
+                          json.loads(tc["function"]["arguments"] or "{}")) for tc in tool_calls]
+                self._handle_tool_calls(calls, messages, parallel_tool_calls, journal, validator)
+                continue
+
             kwargs = dict(model=self.model, messages=messages)
             if self._tools_defs:
                 kwargs["tools"] = self._tools_defs
@@ -98,71 +233,61 @@ class GPTToolWrapper:
 
             last_raw = resp
             reply = resp.choices[0].message
-            messages.append({
+            assistant = {
                 "role": "assistant",
                 "content": reply.content or "",
                 "tool_calls": [tc.model_dump() for tc in (reply.tool_calls or [])]
-            })
+            }
+            messages.append(assistant)
+            if journal is not None:
+                journal.assistant(assistant)
 
             if not reply.tool_calls:
+                if journal is not None:
+                    journal.finish()
                 print (count_messages_tokens(messages))
                 return {"messages": messages, "response": reply.content or "", "raw": last_raw}
 
-            for tc in reply.tool_calls:
-                name = tc.function.name
-                args = json.loads(tc.function.arguments or "{}")
-                exec_fn = self._registry.get(name)
-
-                # === 日志：开始 ===
-                self._log_jsonl({
-                    "event": "tool_start",
-                    "tool_call_id": tc.id,
-                    "name": name,
-                    "args": args,
-                    "ts": time.time()
-                })
-
-                # 执行工具
-                try:
-                    result = exec_fn(**args) if exec_fn else {"ok": False, "error": f"Unknown tool: {name}"}
-                    error = None
-                except Exception as e:
-                    result = {"ok": False, "error": f"{type(e).__name__}: {e}", "trace": traceback.format_exc()}
-                    print ("exception:", name, tc.id, count_messages_tokens(messages))
-                    error = str(e)
-
-                # === 日志：结束 ===
-                self._log_jsonl({
-                    "event": "tool_end",
-                    "tool_call_id": tc.id,
-                    "name": name,
-                    "result": result if error is None else None,
-                    "error": error,
-                    "ts": time.time()
-                })
-
-                # 条件触发自动标注 Agent
-                try:
-                    if (name == "zw3d_stdvucrt_dim"
-                        # and isinstance(result, dict)
-                        and (result.get("data") or {}).get("return code") == 1):
-                        # and result.get("return code") == 1):
-                        from LLMWrappers.AutoDimAgent import GPTAutoDimensionAgent
-                        # 控制台与 GUI 可见提示
-                        print("⚙️ 已进入自动标注 Agent，正在生成标注计划...")
-                        # messages.append({"role":"assistant","content":"⚙️ 已进入自动标注 Agent，正在生成标注计划..."})
-                        auto_agent = GPTAutoDimensionAgent(wrapper=self, model=self.model)
-                        auto_res = auto_agent.generate_dimension_plan(result.get("data", {}))
-                        packed = result.get("data", {}).copy()
-                        packed["auto_dimension"] = auto_res
-                        result = {"ok": True, "data": packed}
-                except Exception as _e:
-                    result = {"ok": False, "error": f"auto_dim_failed: {_e}"}
-
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tc.id,
-                    "content": json.dumps(result, ensure_ascii=False)
-                })
+            calls = [(tc, tc.function.name, json.loads(tc.function.arguments or "{}")) for tc in reply.tool_calls]
+            self._handle_tool_calls(calls, messages, parallel_tool_calls, journal, validator)
         print (messages, count_messages_tokens(messages))
         return {"messages": messages, "response": "(工具调用轮次已达上限)", "raw": last_raw}
+
+    def _handle_tool_calls(self, calls, messages, parallel_tool_calls: bool, journal=None, validator=None) -> None:
+        """执行一轮 tool_calls（含自动标注触发），并把结果以 role="tool" 追加到 messages。"""
+        outcomes = self._execute_tool_calls(calls, messages, concurrent=parallel_tool_calls, journal=journal,
+                                            validator=validator)
+
+        for (tc, name, args), result in zip(calls, outcomes):
+            if journal is not None and journal.acked(tc.id):
+                # 已确认的结果里已经包含自动标注的输出
+                messages.append({"role": "tool", "tool_call_id": tc.id,
+                                 "content": json.dumps(result, ensure_ascii=False)})
+                continue
+            # 条件触发自动标注 Agent
+            try:
+                if (name == "zw3d_stdvucrt_dim"
+                    # and isinstance(result, dict)
+                    and (result.get("data") or {}).get("return code") == 1):
+                    # and result.get("return code") == 1):
+                    from LLMWrappers.AutoDimAgent import GPTAutoDimensionAgent
+                    # 控制台与 GUI 可见提示
+                    print("⚙️ 已进入自动标注 Agent，正在生成标注计划...")
+                    # messages.append({"role":"assistant","content":"⚙️ 已进入自动标注 Agent，正在生成标注计划..."})
+                    auto_agent = GPTAutoDimensionAgent(wrapper=self, model=self.model)
+                    # 子对话的 journal 用完即关闭（刷盘并释放文件句柄）
+                    with journal.child(tc.id) if journal is not None else contextlib.nullcontext() as child:
+                        auto_res = auto_agent.generate_dimension_plan(result.get("data", {}), journal=child)
+                    packed = result.get("data", {}).copy()
+                    packed["auto_dimension"] = auto_res
+                    result = {"ok": True, "data": packed}
+            except Exception as _e:
+                result = {"ok": False, "error": f"auto_dim_failed: {_e}"}
+
+            messages.append({
+                "role": "tool",
+                "tool_call_id": tc.id,
+                "content": json.dumps(result, ensure_ascii=False)
+            })
+            if journal is not None:
+                journal.ack(tc.id, result)
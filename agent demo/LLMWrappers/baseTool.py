@@ -48,7 +48,8 @@ def discover_tools(module) -> List["Tool"]:
     for name in dir(module):
         obj = getattr(module, name)
         try:
-            if inspect.isclass(obj) and issubclass(obj, Tool) and obj is not Tool:
+            if (inspect.isclass(obj) and issubclass(obj, Tool) and obj is not Tool
+                    and not inspect.isabstract(obj)):
                 tools.append(obj())
         except Exception:
             pass
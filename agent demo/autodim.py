@@ -0,0 +1,141 @@
+"""
+Headless auto-dimension command line.
+
+    python autodim.py batch D:/parts --out D:/drawings --endpoints 127.0.0.1:7000,127.0.0.1:7001
+
+``batch`` walks a directory of .Z3PRT files and runs open -> STDVUDIM -> plan
+-> dimension -> FILEEXPORT for each part (see ``tools/zw3d_batch.py``).
+Progress goes to ``<out>/manifest.jsonl``; rerunning the same command resumes
+where it stopped. With ``--journal-dir`` the LLM dialog of every part is
+journaled too, so a part interrupted mid-dialog resumes without repeating
+the model calls already made.
+
+    python autodim.py replay tool_calls.jsonl --simulator --report replay.json
+
+``replay`` re-executes the ZW3D tool calls of a recorded ``AUTO_DIM_TOOL_LOG``
+without the LLM and compares per-tool latency with the recording, or with an
+earlier ``--report`` given as ``--baseline`` (see ``tools/zw3d_replay.py``).
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tools.zw3d_batch import PLANNERS, BatchRunner, Manifest, find_parts, format_report, llm_planner
+from tools.zw3d_pool import ZW3DWorkerPool, endpoints_from_env, session_for
+from tools import zw3d_replay
+from tools.zw3d_session import SessionServer, use_session
+from tools.zw3d_simulator import ZW3DSimulator
+
+
+def batch(args) -> int:
+    parts = find_parts(args.parts_dir, args.pattern)
+    if not parts:
+        print(f"no {args.pattern} files under {args.parts_dir}", file=sys.stderr)
+        return 1
+    endpoints = args.endpoints.split(",") if args.endpoints else endpoints_from_env()
+    manifest = Manifest(args.manifest or os.path.join(args.out, "manifest.jsonl"))
+    os.makedirs(args.out, exist_ok=True)
+    planner = PLANNERS[args.planner]
+    if args.journal_dir and args.planner == "llm":
+        planner = functools.partial(llm_planner, journal_dir=args.journal_dir)
+    with ZW3DWorkerPool(endpoints) as pool:
+        runner = BatchRunner(parts, args.out, pool, planner, manifest=manifest,
+                             jobs=args.jobs, view_type=args.view_type, export_type=args.export_type,
+                             export_suffix=args.export_suffix,
+                             root=args.parts_dir,
+                             views=[int(v) for v in args.views.split(",")] if args.views else ())
+        report = runner.run()
+    print(format_report(report))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["failed"] == 0 and report["partial"] == 0 else 2
+
+
+def replay(args) -> int:
+    calls = zw3d_replay.load_trace(args.trace)
+    if not calls:
+        print(f"no tool calls in {args.trace}", file=sys.stderr)
+        return 1
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    server = None
+    if args.simulator:
+        sim = ZW3DSimulator(tempfile.mkdtemp(prefix="zw3d_replay_"), latency=args.latency, seed=0)
+        server = SessionServer(handler=sim).start()
+        endpoint = server.endpoint
+    else:
+        endpoint = args.endpoint or endpoints_from_env()[0]
+    session = session_for(endpoint)
+    try:
+        with use_session(session):
+            start = time.perf_counter()
+            done = zw3d_replay.Replayer(pace=args.pace).replay(calls)
+            wall = time.perf_counter() - start
+    finally:
+        session.close()
+        if server is not None:
+            server.stop()
+    report = zw3d_replay.Replayer.report(done, wall, baseline)
+    print(zw3d_replay.format_report(report))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    slow = zw3d_replay.slower_than(report, args.max_slowdown) if args.max_slowdown is not None else []
+    if slow:
+        print(f"slower than the reference by more than {args.max_slowdown:.0%}: {', '.join(slow)}",
+              file=sys.stderr)
+    return 0 if not slow and report["regressions"] == 0 else 2
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="autodim", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("batch", help="auto-dimension every part of a directory")
+    p.add_argument("parts_dir")
+    p.add_argument("--out", required=True, help="directory for exported drawings and the manifest")
+    p.add_argument("--pattern", default="*.Z3PRT")
+    p.add_argument("--endpoints", help="comma separated host:port list (default: ZW3D_ENDPOINTS)")
+    p.add_argument("--jobs", type=int, help="parts in flight at once (default: one per endpoint)")
+    p.add_argument("--planner", choices=sorted(PLANNERS), default="llm")
+    p.add_argument("--view-type", type=int, default=1, help="STDVUDIM view type, 1 = TOP")
+    p.add_argument("--views", help="comma separated view types planned in parallel and merged, e.g. 2,1,6")
+    p.add_argument("--export-type", type=int, default=2, help="FILEEXPORT type, 2 = PDF")
+    p.add_argument("--export-suffix", default=".pdf")
+    p.add_argument("--manifest", help="progress file (default: <out>/manifest.jsonl)")
+    p.add_argument("--journal-dir", default=os.getenv("AUTO_DIM_JOURNAL_DIR"),
+                   help="journal the LLM dialog of every part here, to resume it after a crash")
+    p.add_argument("--report", help="also write the final report as JSON")
+    p.set_defaults(func=batch)
+
+    p = sub.add_parser("replay", help="re-execute a recorded tool_calls.jsonl without the LLM")
+    p.add_argument("trace", help="AUTO_DIM_TOOL_LOG file written by GPTToolWrapper")
+    target = p.add_mutually_exclusive_group()
+    target.add_argument("--endpoint", help="host:port of a ZW3D session (default: first of ZW3D_ENDPOINTS)")
+    target.add_argument("--simulator", action="store_true", help="replay against an in-process simulator")
+    p.add_argument("--latency", type=float, default=0.0, help="simulator latency per command, seconds")
+    p.add_argument("--pace", action="store_true", help="keep the recorded gaps between calls")
+    p.add_argument("--baseline", help="earlier --report to compare with instead of the recording")
+    p.add_argument("--max-slowdown", type=float, help="fail if a tool's p50 is slower by more than this (0.2 = 20%%)")
+    p.add_argument("--report", help="also write the report as JSON")
+    p.set_defaults(func=replay)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,9 @@ import os
 from PIL import Image, ImageTk
 import html
 import json
+import glob
+import hashlib
+import contextlib
 from datetime import datetime
 import tiktoken
 import sys
@@ -25,6 +28,7 @@ import tkinter.messagebox as messagebox
 # from tools.zw3d_command_tool import ZW3DCommandStdVuCreate, ZW3DCommandSave
 from LLMWrappers.baseTool import register_all_tools
 import tools.zw3d_command_tool as tools_module
+from tools.zw3d_journal import Journal
 
 class GUIAPP:
     def __init__(self, root, wrapper):
@@ -228,7 +232,10 @@ class GUIAPP:
         threading.Thread(target=self.animate_thinking, args=(thinking_label,)).start()
 
         try:
-            response = self.wrapper.run_dialog(prompt)
+            journal = self.open_journal(prompt)
+            with journal if journal is not None else contextlib.nullcontext():
+                response = self.wrapper.run_dialog(prompt, journal=journal)
+            self.discard_journal(journal)
             formatted = self.preprocess_response(response)
             self.stop_thinking.set()
             self.animate_typing(thinking_label, formatted)
@@ -242,6 +249,27 @@ class GUIAPP:
             self.input_text.config(state='normal')
             self.send_button.config(state='normal')
 
+    def open_journal(self, prompt):
+        """设置了 AUTO_DIM_JOURNAL_DIR 时按提示内容记录对话；程序崩溃后重发同一条命令即从断点继续。"""
+        journal_dir = os.getenv("AUTO_DIM_JOURNAL_DIR")
+        if not journal_dir:
+            return None
+        digest = hashlib.sha1(json.dumps(prompt, ensure_ascii=False, sort_keys=True, default=str)
+                              .encode("utf-8")).hexdigest()[:12]
+        return Journal(os.path.join(journal_dir, f"chat_{digest}.jsonl"))
+
+    @staticmethod
+    def discard_journal(journal):
+        # 对话正常结束后删除记录（含子代理的记录），以免之后再发同一条命令时只回放旧结果
+        if journal is None:
+            return
+        base, ext = os.path.splitext(journal.path)
+        for path in [journal.path] + glob.glob(glob.escape(base) + ".*" + ext):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
     def animate_typing(self, label, full_text):
         label.config(text="")
         def type_char(i=0):
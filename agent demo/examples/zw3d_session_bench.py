@@ -0,0 +1,50 @@
+"""Compare one-process-per-command against the persistent ZW3D session.
+
+Runs entirely against the local stand-in server, so it works on Linux:
+
+    python examples/zw3d_session_bench.py --commands 40
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools import zw3d_session
+from tools.zw3d_session import ProcessTransport, SessionServer, SocketTransport, ZW3DSession, parse_endpoint
+
+PAYLOAD = {"id": 268, "start point": {"x": 0, "y": 0}, "end point": {"x": 100, "y": 0},
+           "text point": {"x": 50, "y": -10}}
+
+
+def bench(session: ZW3DSession, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        result = session.execute("LINDIM", PAYLOAD)
+        assert result["return code"] == 0, result
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--commands", type=int, default=40)
+    args = parser.parse_args()
+
+    with SessionServer() as server:
+        spawn = ZW3DSession(ProcessTransport(zw3d_session.__file__, host=server.endpoint), verbose=False)
+        persistent = ZW3DSession(SocketTransport(*parse_endpoint(server.endpoint)), verbose=False)
+
+        t_spawn = bench(spawn, args.commands)
+        t_session = bench(persistent, args.commands)
+        persistent.close()
+
+    n = args.commands
+    print(f"process per command: {t_spawn:.3f}s  ({t_spawn / n * 1000:.2f} ms/cmd)")
+    print(f"persistent session:  {t_session:.3f}s  ({t_session / n * 1000:.2f} ms/cmd)")
+    print(f"speedup: {t_spawn / t_session:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,16 @@ import json
 # Load environment variables
 load_dotenv()
 
+# ZW3D tools create per-request result directories; keep them out of the working tree
+os.environ.setdefault("ZW3D_DATA_DIR", tempfile.mkdtemp(prefix="zw3d_data_"))
+# simulators of different tests would share cached extractions; tests that need the cache pass their own
+os.environ.setdefault("ZW3D_EXTRACT_CACHE", "0")
+
+@pytest.fixture(autouse=True)
+def fresh_zw3d_states(monkeypatch):
+    """Every test starts without the open files of earlier tests' ZW3D instances (``state_for``)."""
+    monkeypatch.setattr("tools.zw3d_state._states", {})
+
 # Initialize Anthropic client
 anthropic = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
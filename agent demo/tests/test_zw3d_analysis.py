@@ -0,0 +1,155 @@
+"""Tests for the geometric view analysis."""
+
+import math
+import random
+import time
+
+import numpy as np
+
+from tools.zw3d_analysis import (find_symmetry, format_pairs, format_symmetry, hole_patterns, mirror_axes,
+                                 parallel_pairs, representatives)
+from tools.zw3d_geometry import ViewGeometry
+from tools.zw3d_planner import rule_plan
+from tools.zw3d_simulator import synthetic_view
+from zw3d_helpers import circle, line, plate, view
+
+
+def lines_view(segments):
+    return view(*(line(i + 1, (x1, y1), (x2, y2)) for i, (x1, y1, x2, y2) in enumerate(segments)), view_id=1)
+
+
+def random_lines(n, seed=0, size=1000.0):
+    rng = random.Random(seed)
+    segments = []
+    for _ in range(n):
+        x, y = rng.uniform(0, size), rng.uniform(0, size)
+        a = rng.choice([0.0, math.pi / 2, math.pi / 4, rng.uniform(0, math.pi), math.pi - 1e-4])
+        r = rng.uniform(5, 100)
+        segments.append((x, y, x + r * math.cos(a), y + r * math.sin(a)))
+    return lines_view(segments)
+
+
+def brute_force(geometry, angle_tol):
+    lines = geometry.lines
+    d = lines["end"] - lines["start"]
+    ang = np.mod(np.arctan2(d[:, 1], d[:, 0]), math.pi)
+    found = set()
+    for i in range(len(lines)):
+        for j in range(i + 1, len(lines)):
+            diff = abs(ang[i] - ang[j])
+            if min(diff, math.pi - diff) > angle_tol:
+                continue
+            u = d[i] / np.hypot(*d[i])
+            v = lines["mid"][j] - lines["mid"][i]
+            offset = abs(u[0] * v[1] - u[1] * v[0])
+            if offset > 1e-3:
+                found.add(tuple(sorted((int(lines["id"][i]), int(lines["id"][j])))))
+    return found
+
+
+def test_all_pairs_match_brute_force():
+    geometry = random_lines(150, seed=1)
+    tol = math.radians(0.5)
+    pairs = parallel_pairs(geometry, angle_tol=tol, neighbors=len(geometry))
+    got = {tuple(sorted((int(p["id1"]), int(p["id2"])))) for p in pairs}
+    assert got == brute_force(geometry, tol)
+
+
+def test_plate_pairs_are_ranked():
+    # a 100 x 40 rectangle with a 60 long rib 10 above the bottom edge
+    geometry = lines_view([(0, 0, 100, 0), (100, 0, 100, 40), (100, 40, 0, 40), (0, 40, 0, 0),
+                           (20, 10, 80, 10)])
+    pairs = parallel_pairs(geometry)
+    table = {(int(p["id1"]), int(p["id2"])): p for p in pairs}
+    assert set(table) == {(1, 3), (2, 4), (1, 5), (3, 5)}
+    assert table[(1, 3)]["distance"] == 40 and table[(2, 4)]["distance"] == 100
+    assert table[(1, 5)]["distance"] == 10 and table[(1, 5)]["overlap"] == 60
+    # full overlap first, the nearest of those first
+    assert (int(pairs[0]["id1"]), int(pairs[0]["id2"])) == (1, 5)
+    assert format_pairs(pairs, limit=2).splitlines()[1].startswith("1 5 10 60")
+
+
+def test_outer_edges_are_paired_across_many_lines():
+    view = synthetic_view(entities=200, seed=0)
+    geometry = ViewGeometry.from_json(view)
+    pairs = parallel_pairs(geometry, neighbors=1)
+    bottom, right, top, left = (e["id"] for e in view["entities"][:4])
+    keys = {(int(p["id1"]), int(p["id2"])) for p in pairs}
+    assert (min(bottom, top), max(bottom, top)) in keys
+    assert (min(left, right), max(left, right)) in keys
+
+
+def test_five_thousand_lines_in_milliseconds():
+    geometry = random_lines(5000, seed=3, size=5000.0)
+    parallel_pairs(geometry)
+    start = time.perf_counter()
+    pairs = parallel_pairs(geometry)
+    assert time.perf_counter() - start < 0.1  # ~10 ms on a normal machine; loose for CI
+    assert len(pairs) > 5000
+
+
+def plate_view(holes):
+    """A 200 x 100 plate (ids 1-4) with circles (cx, cy, r) from id 10 on."""
+    return plate(*(circle(10 + i, (cx, cy), r) for i, (cx, cy, r) in enumerate(holes)), width=200, height=100)
+
+
+def test_grid_of_holes_and_mirror_axes():
+    holes = [(x, y, 5) for y in (30, 70) for x in (40, 80, 120, 160)]
+    geometry = plate_view(holes)
+    findings = find_symmetry(geometry)
+    axes = {a["axis"]: a for a in findings["mirror_axes"]}
+    assert axes["vertical"]["at"] == 100 and axes["vertical"]["score"] == 1.0
+    assert axes["horizontal"]["at"] == 50
+    (grid,) = findings["patterns"]
+    assert grid["kind"] == "grid" and (grid["rows"], grid["cols"]) == (2, 4)
+    assert grid["pitch"] == [40, 40] and grid["count"] == 8 and grid["representative"] == 10
+    keep = representatives(geometry, findings)
+    assert 10 in keep and not set(keep) & set(range(11, 18))
+    assert "grid pattern of 8 holes R5" in format_symmetry(findings)
+
+
+def test_asymmetric_view_has_no_axis():
+    geometry = plate_view([(30, 30, 5), (150, 60, 8)])
+    assert mirror_axes(geometry) == []
+    assert hole_patterns(geometry) == []
+
+
+def test_linear_row_needs_equal_pitch():
+    assert hole_patterns(plate_view([(20, 50, 4), (50, 50, 4), (80, 50, 4)]))[0]["pitch"] == 30
+    assert hole_patterns(plate_view([(20, 50, 4), (50, 50, 4), (90, 50, 4)])) == []
+
+
+def test_bolt_circle_full_and_partial():
+    bolts = [(100 + 30 * math.cos(a), 50 + 30 * math.sin(a), 3)
+             for a in np.radians(np.arange(0, 360, 60) + 15)]
+    (bolt,) = hole_patterns(plate_view([(100, 50, 12)] + bolts))
+    assert bolt["kind"] == "circular" and bolt["count"] == 6
+    assert bolt["center"] == [100, 50] and abs(bolt["angle_step"] - 60) < 1e-6
+    assert abs(bolt["pitch_radius"] - 30) < 1e-6
+    # three of four holes on a quarter grid: the pivot is the centre hole, not the centroid
+    partial = [(100 + 30 * math.cos(a), 50 + 30 * math.sin(a), 3) for a in np.radians([0, 90, 180])]
+    (arc_pattern,) = hole_patterns(plate_view([(100, 50, 12)] + partial))
+    assert arc_pattern["kind"] == "circular" and arc_pattern["center"] == [100, 50]
+
+
+def test_planner_locates_pattern_once():
+    holes = [(x, 50, 5) for x in (40, 80, 120, 160)]
+    geometry = plate_view(holes)
+    plain = rule_plan(geometry)
+    plan = rule_plan(geometry, symmetry=find_symmetry(geometry))
+    assert len(plan["operations"]) < len(plain["operations"])
+    pitch = [op for op in plan["operations"] if op["type"] == "linearoffset"
+             and {op["args"]["id1"], op["args"]["id2"]} == {10, 11}]
+    assert len(pitch) == 1
+    reasons = {s["id"]: s["reason"] for s in plan["skipped"]}
+    assert all("linear pattern" in reasons[i] for i in (12, 13))
+    assert not any(o["args"].get("id2") in (12, 13) for o in plan["operations"])
+
+
+def test_symmetry_on_large_view_is_fast():
+    geometry = ViewGeometry.from_json(synthetic_view(entities=5000, seed=2))
+    find_symmetry(geometry)
+    start = time.perf_counter()
+    findings = find_symmetry(geometry)
+    assert time.perf_counter() - start < 0.5
+    assert len(representatives(geometry, findings)) <= len(geometry)
@@ -0,0 +1,123 @@
+"""Tests for the asyncio ZW3D command executor."""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from LLMWrappers.GPT5Wrapper import GPTToolWrapper
+from tools import zw3d_command_tool as zw3d
+from tools.zw3d_async import ZW3DAsyncExecutor, set_executor
+from tools.zw3d_session import SessionServer, parse_command
+
+
+class SlowTransport:
+    """In-memory transport that records how many commands overlap."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.sent = []
+
+    async def execute(self, cmd, timeout=20):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        self.sent.append(cmd)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        return {"stdout": cmd, "stderr": "", "return code": 0}
+
+    async def close(self):
+        pass
+
+
+def executor_with(transports, **kwargs):
+    return ZW3DAsyncExecutor(default_target="a", verbose=False,
+                             transport_factory=lambda target: transports[target], **kwargs)
+
+
+def test_per_target_limit_and_overlap_across_targets():
+    transports = {"a": SlowTransport(), "b": SlowTransport()}
+
+    async def main():
+        ex = executor_with(transports, limit=2)
+        tasks = [ex.submit("FILEEXPORT", {"path": f"{i}.pdf"}, target=t) for i in range(4) for t in "ab"]
+        return await asyncio.gather(*tasks)
+
+    start = time.perf_counter()
+    results = asyncio.run(main())
+    elapsed = time.perf_counter() - start
+    assert all(r["return code"] == 0 for r in results)
+    assert transports["a"].peak == 2 and transports["b"].peak == 2
+    # 8 commands of 50 ms on 2 targets x 2 slots -> about 2 waves
+    assert elapsed < 0.2
+
+
+def test_conflict_key_serialises_same_file():
+    transports = {"a": SlowTransport()}
+
+    async def main():
+        ex = executor_with(transports, limit=4)
+        await asyncio.gather(*(ex.submit("FILEEXPORT", {"path": "x.pdf"}, key="x.pdf") for _ in range(3)))
+
+    asyncio.run(main())
+    assert transports["a"].peak == 1
+
+
+def test_cancel_all():
+    transports = {"a": SlowTransport(delay=5)}
+
+    async def main():
+        ex = executor_with(transports)
+        task = ex.submit("LINDIM", {})
+        await asyncio.sleep(0.01)
+        assert ex.cancel_all() == 1
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return ex.stats
+
+    stats = asyncio.run(main())
+    assert stats["cancelled"] == 1
+
+
+def test_tool_arun_over_session_socket():
+    calls = []
+
+    def handler(command, params):
+        calls.append(command)
+        return {"stdout": "", "stderr": "", "return code": 0}
+
+    async def main(endpoint):
+        set_executor(ZW3DAsyncExecutor(default_target=endpoint, verbose=False))
+        tool = zw3d.ZW3DCommandLinearDim()
+        pt = {"x": 0, "y": 0}
+        return await asyncio.gather(*(tool.arun(id=i, start_point=pt, end_point=pt, text_point=pt)
+                                      for i in range(10)))
+
+    with SessionServer(handler=handler) as server:
+        results = asyncio.run(main(server.endpoint))
+    assert [r["return code"] for r in results] == [0] * 10
+    assert calls == ["LINDIM"] * 10
+
+
+def test_run_dialog_executes_parallel_calls_concurrently(monkeypatch):
+    transports = {"a": SlowTransport(delay=0.1)}
+    ex = executor_with(transports, limit=4)
+    monkeypatch.setattr("tools.zw3d_async.get_executor", lambda: ex)
+
+    wrapper = GPTToolWrapper(api_key="test")
+    wrapper._log_jsonl = lambda obj: None
+    wrapper.register_tool(zw3d.ZW3DCommandExp())
+    calls = [(SimpleNamespace(id=f"call_{i}"), "zw3d_exp", {"path": f"D:/out/{i}.pdf", "type": 2, "subType": 0})
+             for i in range(4)]
+
+    start = time.perf_counter()
+    results = wrapper._execute_tool_calls(calls, [], concurrent=True)
+    assert time.perf_counter() - start < 0.3
+    sent = [parse_command(r["stdout"]) for r in results]
+    assert [name for name, _ in sent] == ["FILEEXPORT"] * 4
+    assert [params["path"] for _, params in sent] == [f"D:/out/{i}.pdf" for i in range(4)]
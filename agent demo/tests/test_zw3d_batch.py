@@ -0,0 +1,222 @@
+"""Tests for the headless batch pipeline, run against simulator instances."""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import autodim
+from tools import zw3d_command_tool as zw3d
+from LLMWrappers.AutoDimAgent import GPTAutoDimensionAgent
+from tools.zw3d_batch import (BatchRunner, Manifest, _RecordingTool, find_parts, format_report, journal_path,
+                              llm_planner)
+from tools.zw3d_geometry import ViewGeometry
+from tools.zw3d_results import write_atomic
+from tools.zw3d_pool import ZW3DWorkerPool
+from tools.zw3d_results import read_json_result
+from tools.zw3d_session import SessionServer
+from tools.zw3d_simulator import ZW3DSimulator, synthetic_view
+from zw3d_helpers import FakeToolCall
+
+
+def line_planner(view):
+    """Dimension every line of the view."""
+    geometry = read_json_result(view["geom_data"], view["done_path"], timeout=5)
+    return [{"type": "linear", "args": {"id": e["id"], "start_point": {"x": 0, "y": 0},
+                                        "end_point": {"x": 1, "y": 0}, "text_point": {"x": 0, "y": 1}}}
+            for e in geometry["entities"] if e["type"] == "line"]
+
+
+@pytest.fixture
+def parts_dir(tmp_path):
+    d = tmp_path / "parts"
+    (d / "sub").mkdir(parents=True)
+    for name in ("a.Z3PRT", "b.z3prt", "sub/c.Z3PRT", "notes.txt"):
+        (d / name).write_text("")
+    return d
+
+
+@pytest.fixture
+def endpoints(tmp_path):
+    sims = [ZW3DSimulator(str(tmp_path / f"sim{i}"), entities=12, image_size=(16, 16), latency=0.01)
+            for i in range(2)]
+    servers = [SessionServer(handler=sim).start() for sim in sims]
+    yield [s.endpoint for s in servers], sims
+    for s in servers:
+        s.stop()
+
+
+def test_find_parts(parts_dir):
+    assert [p.rsplit("/", 1)[1] for p in find_parts(str(parts_dir))] == ["a.Z3PRT", "b.z3prt", "c.Z3PRT"]
+
+
+def test_batch_runs_every_stage_and_resumes(parts_dir, tmp_path, endpoints):
+    eps, sims = endpoints
+    out = str(tmp_path / "out")
+    parts = find_parts(str(parts_dir))
+    with ZW3DWorkerPool(eps) as pool:
+        report = BatchRunner(parts, out, pool, line_planner, verbose=False).run()
+    assert report["ok"] == 3 and report["failed"] == 0
+    assert set(report["stages"]) == {"open", "view", "plan", "dimension", "export"}
+    assert report["parts_per_hour"] > 0
+    assert sum(s.counts["BATCHDIM"] for s in sims) == 3
+    assert sum(s.counts["FILEEXPORT"] for s in sims) == 3
+
+    records = [json.loads(l) for l in open(f"{out}/manifest.jsonl")]
+    assert {r["part"] for r in records} == set(parts)
+    assert all(r["dimensions"] > 0 and r["failed_ops"] == 0 for r in records)
+
+    with ZW3DWorkerPool(eps) as pool:
+        again = BatchRunner(parts, out, pool, line_planner, verbose=False).run()
+    assert again["processed"] == 0 and again["skipped"] == 3
+
+
+def test_failed_part_is_recorded_and_retried(parts_dir, tmp_path, endpoints):
+    eps, _ = endpoints
+    out = str(tmp_path / "out")
+    parts = find_parts(str(parts_dir))
+    calls = []
+
+    def planner(view):
+        calls.append(view)
+        if len(calls) == 1:
+            raise RuntimeError("planner failed")
+        return line_planner(view)
+
+    with ZW3DWorkerPool(eps[:1]) as pool:
+        runner = BatchRunner(parts, out, pool, planner, verbose=False)
+        first = runner.run()
+        assert first["ok"] == 2 and first["failed"] == 1
+        assert not runner.manifest.done(parts[0])
+        second = runner.run()
+    assert second["processed"] == 1 and second["ok"] == 1
+    assert all(Manifest(f"{out}/manifest.jsonl").done(p) for p in parts)
+
+
+def test_part_with_failed_dimensions_is_partial(parts_dir, tmp_path, endpoints, monkeypatch):
+    eps, _ = endpoints
+    out = str(tmp_path / "out")
+    parts = find_parts(str(parts_dir))
+    execute_plan = zw3d.execute_plan
+
+    def first_op_fails(operations, chunk_size=0):
+        result = execute_plan(operations, chunk_size)
+        result["results"][0].update({"status": "error", "error code": -2})
+        result["ok"] = False
+        return result
+
+    with ZW3DWorkerPool(eps) as pool:
+        runner = BatchRunner(parts, out, pool, line_planner, verbose=False)
+        monkeypatch.setattr(zw3d, "execute_plan", first_op_fails)
+        first = runner.run()
+        assert first["ok"] == 0 and first["partial"] == 3 and first["failed"] == 0
+        assert "dimension" in first["stages"] and "3 partial" in format_report(first)
+        assert all(r["status"] == "partial" and r["failed_ops"] == 1 for r in runner.manifest.records.values())
+        assert not any(runner.manifest.done(p) for p in parts)
+        monkeypatch.setattr(zw3d, "execute_plan", execute_plan)
+        second = runner.run()
+    assert second["processed"] == 3 and second["ok"] == 3 and second["partial"] == 0
+
+
+def test_cli(parts_dir, tmp_path, endpoints):
+    eps, _ = endpoints
+    out = tmp_path / "cli"
+    code = autodim.main(["batch", str(parts_dir), "--out", str(out), "--endpoints", ",".join(eps),
+                         "--planner", "none", "--report", str(tmp_path / "report.json")])
+    assert code == 0
+    assert json.loads((tmp_path / "report.json").read_text())["ok"] == 3
+
+
+def test_exports_mirror_the_part_folders(tmp_path, endpoints):
+    eps, _ = endpoints
+    d = tmp_path / "same"
+    for name in ("a.Z3PRT", "x/a.Z3PRT", "y/a.Z3PRT"):
+        (d / name).parent.mkdir(parents=True, exist_ok=True)
+        (d / name).write_text("")
+    out = str(tmp_path / "out")
+    with ZW3DWorkerPool(eps) as pool:
+        runner = BatchRunner(find_parts(str(d)), out, pool, line_planner, verbose=False)
+        assert runner.run()["ok"] == 3
+    exports = sorted(r["export"] for r in runner.manifest.records.values())
+    assert exports == [f"{out}/a.pdf", f"{out}/x/a.pdf", f"{out}/y/a.pdf"]
+    # a part outside the root keeps its name and gets a path hash
+    other = runner.export_path(str(tmp_path / "elsewhere" / "a.Z3PRT"))
+    assert other.startswith(f"{out}/a_") and other not in exports
+
+
+def test_failure_reported_in_the_result_file(parts_dir, tmp_path):
+    sim = ZW3DSimulator(str(tmp_path / "sim"), entities=12, image_size=(16, 16), latency=0.01)
+
+    def handler(command, payload):
+        raw = sim(command, payload)
+        if command == "FILEEXPORT":
+            # the export failed, the root re-activation after it did not
+            write_atomic(f"{payload['outputDir']}/zw3d_result.json", json.dumps({"return code": 1}))
+        return raw
+
+    out = str(tmp_path / "out")
+    with SessionServer(handler=handler) as server, ZW3DWorkerPool([server.endpoint]) as pool:
+        report = BatchRunner(find_parts(str(parts_dir)), out, pool, line_planner, verbose=False).run()
+    assert report["ok"] == 0 and report["failed"] == 3
+    records = Manifest(f"{out}/manifest.jsonl").records.values()
+    assert all("FILEEXPORT failed (1)" in r["error"] for r in records)
+
+
+def test_recorded_batches_use_plan_types():
+    ops = []
+    tool = _RecordingTool(zw3d.ZW3DCommandBatchDim(), ops)
+    tool.run(operations=[{"type": "zw3d_radialdim", "args": {"id": 5}}, {"type": "linear", "args": {"id": 1}}])
+    _RecordingTool(zw3d.ZW3DCommandRadialDimension(), ops).run(id=6)
+    assert [op["type"] for op in ops] == ["radial", "linear", "radial"]
+
+
+def test_journal_path_is_stable_per_part_and_view(tmp_path):
+    a = journal_path(str(tmp_path), {"path": "D:/parts/a.Z3PRT", "view type": 1})
+    assert a == journal_path(str(tmp_path), {"path": "d:\\parts\\A.Z3PRT", "view type": 1})
+    assert a != journal_path(str(tmp_path), {"path": "D:/parts/a.Z3PRT", "view type": 2})
+    assert a != journal_path(str(tmp_path), {"path": "D:/other/a.Z3PRT", "view type": 1})
+
+
+def test_llm_planner_resumes_from_its_journal(tmp_path, monkeypatch):
+    monkeypatch.setattr("LLMWrappers.GPT5Wrapper.count_messages_tokens", lambda messages: 0)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    geom = synthetic_view(entities=12)
+    lines = [e for e in geom["entities"] if e["type"] == "line"][:2]
+    view = {"path": str(tmp_path / "a.Z3PRT"), "view type": 1,
+            "geom_data": str(tmp_path / "stdvu_output.json"), "done_path": str(tmp_path / "stdvu_output.done")}
+    (tmp_path / "stdvu_output.json").write_text(json.dumps(geom))
+
+    def call(i, e):
+        args = {"id": e["id"], "start_point": dict(zip("xy", e["points"]["start"])),
+                "end_point": dict(zip("xy", e["points"]["end"])), "text_point": {"x": 0, "y": 0}}
+        return FakeToolCall(f"c{i}", "zw3d_lineardim", args)
+
+    turns = [[call(0, lines[0])], [call(1, lines[1])], None]
+    requested = []
+
+    def create(**kwargs):
+        if len(requested) == stop_after:
+            raise KeyboardInterrupt  # the process dies waiting for the model
+        tool_calls = turns[len(requested)]
+        requested.append(tool_calls)
+        message = SimpleNamespace(content="" if tool_calls else "done", tool_calls=tool_calls)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    def generate(self, std_view_result, journal=None):
+        self.wrapper.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        self.wrapper._log_jsonl = lambda obj: None
+        if journal is None or not journal.initial:
+            self.geometry = ViewGeometry.load(std_view_result["geom_data"], std_view_result["done_path"])
+        return self.wrapper.run_dialog([{"role": "user", "content": "plan"}], journal=journal)
+
+    monkeypatch.setattr(GPTAutoDimensionAgent, "generate_dimension_plan", generate)
+    stop_after = 1
+    (tmp_path / "stdvu_output.done").write_text("")
+    with pytest.raises(KeyboardInterrupt):
+        llm_planner(view, journal_dir=str(tmp_path / "journals"))
+
+    stop_after = None
+    (tmp_path / "stdvu_output.done").write_text("")  # STDVUDIM runs again on the rerun
+    ops = llm_planner(view, journal_dir=str(tmp_path / "journals"))
+    assert len(requested) == 3  # the first turn came from the journal
+    assert [op["args"]["id"] for op in ops] == [lines[0]["id"], lines[1]["id"]]
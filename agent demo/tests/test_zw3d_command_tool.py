@@ -0,0 +1,160 @@
+"""Tests for the ZW3D command tools, run against the local stand-in server."""
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from tools import zw3d_command_tool as zw3d
+from tools.zw3d_results import get_watcher, write_atomic
+from tools.zw3d_session import SessionServer, SocketTransport, ZW3DSession, parse_endpoint, set_session
+
+
+def serve(handler):
+    server = SessionServer(handler=handler).start()
+    session = ZW3DSession(SocketTransport(*parse_endpoint(server.endpoint)), verbose=False)
+    old = set_session(session)
+
+    def stop():
+        set_session(old)
+        session.close()
+        server.stop()
+    return stop
+
+
+@pytest.fixture
+def batch_server():
+    calls = []
+
+    def handler(command, params):
+        calls.append((command, params))
+        if command != "BATCHDIM":
+            return {"stdout": "", "stderr": "", "return code": 0}
+        results = [{"index": i, "op": op["op"], "status": "ok", "error code": 0, "handle": 9000 + i}
+                   for i, op in enumerate(params["ops"])]
+        return {"stdout": json.dumps({"results": results}), "stderr": "", "return code": 0}
+
+    stop = serve(handler)
+    yield calls
+    stop()
+
+
+PLAN = [
+    {"type": "linear", "args": {"id": 268, "start_point": {"x": 0, "y": 0}, "end_point": {"x": 80, "y": 0},
+                                "text_point": {"x": 40, "y": -10}}},
+    {"type": "zw3d_radialdim", "args": {"id": 666, "point": {"x": 5, "y": 0}, "text_point": {"x": 20, "y": 20}}},
+    {"type": "holecallout", "args": {"hole_curve_id": 578, "view_id": 12, "text_point": {"x": 1, "y": 1}}},
+]
+
+
+def test_batch_dim_single_round_trip(batch_server):
+    result = zw3d.ZW3DCommandBatchDim().run(operations=PLAN)
+    assert len(batch_server) == 1
+    command, params = batch_server[0]
+    assert command == "BATCHDIM"
+    assert [op["op"] for op in params["ops"]] == ["LINDIM", "RADIALDIM", "HOLECALLOUTDIM"]
+    # each op carries exactly the payload the single tool would have sent
+    assert params["ops"][1]["params"] == {"id": 666, "point": {"x": 5, "y": 0}, "text point": {"x": 20, "y": 20}}
+    assert [r["handle"] for r in result["results"]] == [9000, 9001, 9002]
+    assert result["ok"] is True
+
+
+def test_batch_dim_rejects_unknown_type(batch_server):
+    with pytest.raises(ValueError):
+        zw3d.ZW3DCommandBatchDim().run(operations=[{"type": "angular", "args": {}}])
+    assert batch_server == []
+
+
+def test_execute_plan_chunks_and_reindexes(batch_server):
+    result = zw3d.execute_plan(PLAN, chunk_size=2)
+    assert len(batch_server) == 2
+    assert [r["index"] for r in result["results"]] == [0, 1, 2]
+    assert result["return code"] == 0 and result["ok"] is True
+
+
+def test_execute_plan_reports_failed_operations():
+    def handler(command, params):
+        # the DLL returns 0 for the call even when single dimensions fail
+        results = [{"index": i, "op": op["op"], "status": "failed" if op["op"] == "RADIALDIM" else "ok",
+                    "error code": 1 if op["op"] == "RADIALDIM" else 0, "handle": None}
+                   for i, op in enumerate(params["ops"])]
+        return {"stdout": json.dumps({"results": results}), "stderr": "", "return code": 0}
+
+    stop = serve(handler)
+    try:
+        result = zw3d.execute_plan(PLAN, chunk_size=2)
+    finally:
+        stop()
+    assert result["return code"] == 0 and result["ok"] is False
+    assert [r["status"] for r in result["results"]] == ["ok", "failed", "ok"]
+
+
+def test_batch_dim_without_per_op_results(tmp_path, monkeypatch):
+    monkeypatch.setattr(zw3d, "RESULT_FILE", str(tmp_path / "missing.json"))
+    stop = serve(lambda c, p: {"stdout": "", "stderr": "", "return code": 0})
+    try:
+        result = zw3d.ZW3DCommandBatchDim().run(operations=PLAN[:1])
+    finally:
+        stop()
+    assert result["results"][0]["status"] == "unknown" and result["ok"] is False
+
+
+def test_each_call_gets_its_own_output_dir():
+    seen = []
+
+    def handler(command, params):
+        # behave like the DLL: write the result into the request's directory
+        seen.append(params)
+        results = [{"index": i, "op": op["op"], "status": "ok", "error code": 0, "handle": len(seen)}
+                   for i, op in enumerate(params["ops"])]
+        with open(f"{params['outputDir']}/zw3d_result.json", "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f)
+        return {"stdout": "", "stderr": "", "return code": 0}
+
+    stop = serve(handler)
+    try:
+        first = zw3d.ZW3DCommandBatchDim().run(operations=PLAN[:1])
+        second = zw3d.ZW3DCommandBatchDim().run(operations=PLAN[:1])
+    finally:
+        stop()
+    assert seen[0]["requestId"] != seen[1]["requestId"]
+    assert seen[0]["outputDir"] != seen[1]["outputDir"]
+    assert first["results"][0]["handle"] == 1 and second["results"][0]["handle"] == 2
+
+
+def test_request_store_gc(tmp_path):
+    store = zw3d.RequestStore(str(tmp_path), max_age=60, max_dirs=3, gc_every=0, min_age=10)
+    ids = [store.new()[0] for _ in range(5)]
+    for i, request_id in enumerate(ids):
+        store.close(request_id)
+        os.utime(store.path(request_id), (1000 + i, 1000 + i))
+    # a burst of requests does not remove the ones that have just returned
+    assert store.gc(now=1000 + 5) == 0
+    assert store.gc(now=1000 + 30) == 2
+    assert sorted(os.listdir(tmp_path)) == sorted(ids[2:])
+    assert store.gc(now=1000 + 1000) == 3
+    assert os.listdir(tmp_path) == []
+
+
+def test_request_store_keeps_directories_in_use(tmp_path):
+    store = zw3d.RequestStore(str(tmp_path), max_age=60, max_dirs=0, gc_every=0, min_age=0)
+    sent, waited, done = (store.new()[0] for _ in range(3))
+    store.close(waited)
+    store.close(done)
+    for request_id in (sent, waited, done):
+        os.utime(store.path(request_id), (1000, 1000))
+    marker = f"{store.path(waited)}/stdvu_output.done"
+    waiter = threading.Thread(target=get_watcher().wait, args=(marker, 5))
+    waiter.start()
+    while get_watcher().pending == 0:
+        time.sleep(0.01)
+    # the request still running in ZW3D and the result being waited for stay
+    assert store.gc(now=1000 + 1000) == 1
+    assert sorted(os.listdir(tmp_path)) == sorted([sent, waited])
+    write_atomic(marker, "done")
+    waiter.join()
+    store.close(sent)
+    os.utime(store.path(waited), (1000, 1000))
+    assert store.gc(now=1000 + 1000) == 2
@@ -0,0 +1,122 @@
+"""Tests for redundancy and completeness checks of dimension plans."""
+
+import time
+
+from tools.zw3d_analysis import find_symmetry
+from tools.zw3d_constraints import ConstraintCounter, format_status
+from tools.zw3d_geometry import ViewGeometry
+from tools.zw3d_planner import rule_plan
+from tools.zw3d_simulator import synthetic_view
+from tools.zw3d_validator import PlanValidator
+from zw3d_helpers import arc, circle, line, plate, view, xy
+
+
+def chamfered(*extra):
+    """The 100 x 50 plate with a 10 x 10 chamfer (5) at the top right."""
+    return view(line(1, (0, 0), (100, 0)), line(2, (100, 0), (100, 40)), line(5, (100, 40), (90, 50)),
+                line(3, (90, 50), (0, 50)), line(4, (0, 50), (0, 0)), *extra)
+
+
+def offset(id1, id2, p, q, text):
+    return {"id1": id1, "id2": id2, "first_point": xy(*p), "second_point": xy(*q), "text_point": xy(*text)}
+
+
+def linear(i, p, q, text):
+    return {"id": i, "start_point": xy(*p), "end_point": xy(*q), "text_point": xy(*text)}
+
+
+def test_closed_chain_and_second_radius_are_redundant():
+    c = ConstraintCounter(chamfered(circle(10, (30, 25), 5)))
+    assert c.add("linear", linear(1, (0, 0), (100, 0), (50, -10))) is None
+    assert c.add("linearoffset", offset(4, 10, (0, 25), (30, 25), (15, 60))) is None
+    reason = c.add("linearoffset", offset(10, 2, (30, 25), (100, 25), (65, 60)))
+    assert reason.startswith("closes a chain: the x distance 30 to 100")
+    assert c.add("holecallout", {"hole_curve_id": 10, "view_id": 7, "text_point": xy(40, 40)}) is None
+    assert "radius 5 of 1 circle already follows from the holecallout" in \
+        c.add("radial", {"id": 10, "point": xy(35, 25), "text_point": xy(45, 30)})
+    status = c.status()
+    # height, hole y and the chamfer (two legs) are missing
+    assert status["unlocated"] == {"x": [5, 3], "y": [2, 5, 3, 4, 10]} and status["dof"] == 4
+    assert status["features"] == ["C0 outer: x position, y position", "C1 hole: y position"]
+    assert c.add("linear", linear(4, (0, 50), (0, 0), (-10, 25))) is None
+    assert c.add("linearoffset", offset(1, 10, (30, 0), (30, 25), (110, 12))) is None
+    # the chamfer length waits for one leg, then fixes the other
+    assert c.add("linear", linear(5, (100, 40), (90, 50), (100, 50))) is None
+    assert c.status()["dof"] == 1
+    assert c.add("linear", linear(2, (100, 0), (100, 40), (110, 20))) is None
+    assert c.status()["dof"] == 0 and c.status()["features"] == []
+    assert c.add("linear", linear(3, (90, 50), (0, 50), (45, 60))).startswith("closes a chain")
+    assert format_status(c.status()) == "fully dimensioned"
+
+
+def test_slot_width_gives_the_radius():
+    slot = [arc(11, (40, 30), 3, (0, 1), (0, -1), (-1, 0)), line(12, (40, 33), (50, 33)),
+            line(13, (40, 27), (50, 27)), arc(14, (50, 30), 3, (0, -1), (0, 1), (1, 0))]
+    c = ConstraintCounter(plate(*slot))
+    plan = rule_plan(c.geometry)["operations"]
+    for op in plan:
+        c.add(op["type"], op["args"])
+    # the rule plan locates the first end, gives the length and calls out the radius
+    assert c.status()["features"] == [] and c.status()["dof"] == 0
+    c = ConstraintCounter(c.geometry)
+    for op in plan:
+        if op["args"].get("id2") != 11:
+            c.add(op["type"], op["args"])
+    status = c.status()
+    assert status["features"] == ["C1 slot: x position, y position"] and status["dof"] == 2
+    c = ConstraintCounter(plate(*slot))
+    assert c.add("linearoffset", offset(12, 13, (45, 33), (45, 27), (60, 30))) is None
+    assert "already follows from the linearoffset dimension of 12 and 13" in c.add("radial", {"id": 14, "point": xy(53, 30),
+                                                                 "text_point": xy(60, 40)})
+
+
+def test_pattern_members_follow_the_pitch():
+    holes = [circle(10 + k, (20 + 15 * k, 25), 2) for k in range(4)]
+    geometry = plate(*holes)
+    symmetry = find_symmetry(geometry)
+    assert symmetry["patterns"][0]["ids"] == [10, 11, 12, 13]
+    c = ConstraintCounter(geometry, symmetry=symmetry)
+    assert c.add("linearoffset", offset(4, 10, (0, 25), (20, 25), (10, 60))) is None
+    before = c.status()
+    assert before["features"][1] == "C1 hole: y position, radius 2 (4x), pitch of holes 10 11 12 13"
+    assert c.add("linearoffset", offset(10, 11, (20, 25), (35, 25), (27, 60))) is None
+    after = c.status()
+    assert after["dof"] == before["dof"] - 1 and "pitch" not in after["features"][1]
+    assert c.add("linearoffset", offset(4, 13, (0, 25), (65, 25), (30, 70))).startswith("closes a chain")
+
+
+def test_validator_drops_redundant_operations():
+    geometry = plate(circle(10, (30, 25), 5))
+    v = PlanValidator(geometry, constraints=ConstraintCounter(geometry))
+    ops = [{"type": "linear", "args": linear(1, (0, 0), (100, 0), (50, -10))},
+           {"type": "linearoffset", "args": offset(4, 10, (0, 25), (30, 25), (15, 60))},
+           {"type": "linearoffset", "args": offset(10, 2, (30, 25), (100, 25), (65, 60))}]
+    verdict = v.check("zw3d_batch_dim", {"operations": ops})
+    assert verdict["ok"] and len(verdict["args"]["operations"]) == 2
+    assert verdict["fixes"] == ["operation 2: redundant, closes a chain: the x distance 30 to 100 already "
+                                "follows from the other dimensions; dropped"]
+    v.done(verdict, {"ok": True})
+    assert verdict["constraints"] == "3 dimensions missing: C0 outer: y position; C1 hole: y position, radius 5"
+    # the dropped dimension is refused as a single call too
+    single = v.check("zw3d_linearoffsetdim", offset(10, 2, (30, 25), (100, 25), (65, 60)))
+    assert not single["ok"] and single["errors"][0].startswith("redundant: closes a chain")
+    # a failed call releases its dimensions
+    height = v.check("zw3d_lineardim", linear(4, (0, 50), (0, 0), (-10, 25)))
+    v.done(height, {"stdout": "", "stderr": "LINDIM failed", "return code": 5})
+    assert v.check("zw3d_lineardim", linear(4, (0, 50), (0, 0), (-10, 25)))["ok"]
+
+
+def test_large_plan_is_checked_quickly():
+    geometry = ViewGeometry.from_json(synthetic_view(entities=5000, seed=1))
+    symmetry = find_symmetry(geometry)
+    operations = rule_plan(geometry, symmetry=symmetry)["operations"]
+    start = time.perf_counter()
+    c = ConstraintCounter(geometry, symmetry=symmetry)
+    redundant = c.add_all(operations)
+    status = c.status()
+    assert time.perf_counter() - start < 2.0  # ~0.5 s on a normal machine, most of it the first status
+    assert len(redundant) < len(operations) and status["dof"] >= 0
+    # later checks reuse the contours
+    start = time.perf_counter()
+    c.status()
+    assert time.perf_counter() - start < 0.5
@@ -0,0 +1,221 @@
+"""Tests for incremental re-dimensioning of an edited part."""
+
+import json
+import time
+
+from LLMWrappers.AutoDimAgent import GPTAutoDimensionAgent
+from tools.zw3d_analysis import find_symmetry
+from tools.zw3d_diff import DimensionHistory, diff_views, operation_ids, remap_operations
+from tools.zw3d_geometry import ViewGeometry
+from tools.zw3d_planner import rule_plan
+from tools.zw3d_simulator import synthetic_view
+
+
+def circles(view):
+    return [e for e in view["entities"] if e["type"] == "circle"]
+
+
+def set_radius(e, r):
+    cx, cy = e["points"]["center"]
+    e["points"].update({"0degree": [cx + r, cy], "90degree": [cx, cy + r],
+                        "180degree": [cx - r, cy], "270degree": [cx, cy - r]})
+
+
+def edited(view, shift=(0.0, 0.0), renumber=0):
+    """The view after an ECO (a new drawing view): first hole resized, second removed, a new hole."""
+    view = json.loads(json.dumps(view))
+    view["view id"] += 1
+    holes = circles(view)
+    set_radius(holes[0], 2.5)
+    view["entities"].remove(holes[1])
+    new = json.loads(json.dumps(holes[2]))
+    new["id"] = max(e["id"] for e in view["entities"]) + 1
+    new["points"]["center"] = [new["points"]["center"][0] + 12, new["points"]["center"][1]]
+    set_radius(new, 1.5)
+    view["entities"].append(new)
+    ids = holes[0]["id"] + renumber, holes[1]["id"], new["id"] + renumber
+    for e in view["entities"]:
+        e["id"] += renumber
+        e["points"] = {k: [p[0] + shift[0], p[1] + shift[1]] for k, p in e["points"].items()}
+    return (view, *ids)
+
+
+def test_diff_finds_offset_and_edits_despite_renumbering():
+    old = synthetic_view(entities=60, seed=3)
+    new, resized, removed, added = edited(old, shift=(40.0, -15.0), renumber=1000)
+    diff = diff_views(ViewGeometry.from_json(old), ViewGeometry.from_json(new))
+    assert diff.offset.tolist() == [40.0, -15.0]
+    assert diff.dirty == sorted([resized, added])
+    assert diff.removed == [removed]
+    assert list(diff.changed.values()) == [resized]
+    assert len(diff.unchanged) == len(old["entities"]) - 2
+    assert all(new_id == old_id + 1000 for old_id, new_id in diff.unchanged.items())
+
+
+def test_remap_keeps_dimensions_of_unchanged_entities():
+    old = synthetic_view(entities=30, seed=2)
+    new, resized, removed, added = edited(old, shift=(5.0, 5.0), renumber=500)
+    plan = rule_plan(ViewGeometry.from_json(old))
+    diff = diff_views(ViewGeometry.from_json(old), ViewGeometry.from_json(new))
+    kept, dropped = remap_operations(plan["operations"], diff)
+    assert len(kept) + len(dropped) == len(plan["operations"]) and dropped
+    stale = {resized - 500, removed}
+    for op in dropped:
+        assert stale & set(v for k, v in op["args"].items() if k in ("id", "id1", "id2", "hole_curve_id"))
+    before = {(round(op["args"]["text_point"]["x"], 3), round(op["args"]["text_point"]["y"], 3))
+              for op in plan["operations"]}
+    for op in kept:
+        x, y = op["args"]["text_point"]["x"] - 5.0, op["args"]["text_point"]["y"] - 5.0
+        assert (round(x, 3), round(y, 3)) in before
+        assert all(v > 500 for k, v in op["args"].items() if k in ("id", "id1", "id2", "hole_curve_id"))
+
+
+def test_large_drawing_diff_is_fast():
+    old = synthetic_view(entities=5000, seed=1)
+    new, *_ = edited(old, shift=(100.0, 0.0), renumber=7)
+    a, b = ViewGeometry.from_json(old), ViewGeometry.from_json(new)
+    start = time.perf_counter()
+    diff = diff_views(a, b)
+    assert time.perf_counter() - start < 1.0  # ~0.1 s on a normal machine
+    assert len(diff.dirty) == 2
+
+
+def test_agent_replans_only_the_edit(tmp_path, monkeypatch):
+    monkeypatch.setenv("ZW3D_DIM_HISTORY", str(tmp_path / "history"))
+    applied = []
+
+    class Wrapper:
+        _registry = {"zw3d_batch_dim": lambda operations: applied.append(operations) or {"ok": True}}
+
+        def run_dialog(self, *args, **kwargs):
+            raise AssertionError("the LLM must not be called")
+
+    def run(view):
+        (tmp_path / "v.json").write_text(json.dumps(view))
+        (tmp_path / "v.done").write_text("")
+        agent = GPTAutoDimensionAgent(wrapper=Wrapper(), planner="rules")
+        return agent.generate_dimension_plan({"geom_data": str(tmp_path / "v.json"),
+                                              "done_path": str(tmp_path / "v.done"),
+                                              "img_path": str(tmp_path / "missing.png"),
+                                              "path": "D:/parts/plate.Z3PRT", "view type": 1})
+
+    view = synthetic_view(entities=30, seed=2)
+    first = run(view)
+    new, resized, removed, added = edited(view, shift=(10.0, 0.0))
+    second = run(new)
+    ids = lambda op: {v for k, v in op["args"].items() if k in ("id", "id1", "id2", "hole_curve_id")}
+    # unchanged dimensions are replayed first, as they were (moved with the view)
+    kept = [op for op in first["operations"] if not ids(op) & {resized, removed}]
+    assert [ids(op) for op in second["operations"][:len(kept)]] == [ids(op) for op in kept]
+    assert second["operations"][0]["args"]["start_point"]["x"] == first["operations"][0]["args"]["start_point"]["x"] + 10
+    assert not any(removed in ids(op) for op in second["operations"])
+    # what planning the edited view from scratch gives, plus the kept dimensions it would not make
+    geometry = ViewGeometry.from_json(new)
+    full = rule_plan(geometry, symmetry=find_symmetry(geometry))["operations"]
+    signature = lambda ops: {(op["type"], tuple(sorted(ids(op)))) for op in ops}
+    assert signature(full) <= signature(second["operations"]) <= signature(full) | signature(kept)
+    assert applied == [first["operations"], second["operations"]]
+    # the history now holds the edited revision
+    geometry, operations = DimensionHistory().load(DimensionHistory.key("D:/parts/plate.Z3PRT", 1))
+    assert len(geometry) == len(new["entities"]) and operations == second["operations"]
+    # an unchanged re-run of the same view (a cached extraction) has nothing to plan or apply
+    third = run(new)
+    assert third["operations"] == second["operations"] and not third["json"]["labeled"]
+    assert len(applied) == 2
+    # a new view of the unchanged part gets everything re-applied
+    new["view id"] += 1
+    fourth = run(new)
+    assert applied[-1] == fourth["operations"] and len(fourth["operations"]) == len(second["operations"])
+
+
+def test_llm_sees_only_the_edit(tmp_path, monkeypatch):
+    monkeypatch.setenv("ZW3D_DIM_HISTORY", str(tmp_path / "history"))
+    monkeypatch.setattr("LLMWrappers.AutoDimAgent.save_full_messages", lambda *args, **kwargs: None)
+    view = synthetic_view(entities=60, seed=3)
+    old_plan = rule_plan(ViewGeometry.from_json(view))["operations"]
+    history = DimensionHistory()
+    history.save(DimensionHistory.key("D:/parts/plate.Z3PRT", 1), ViewGeometry.from_json(view), old_plan)
+    new, resized, removed, added = edited(view, shift=(0.0, 20.0))
+    (tmp_path / "v.json").write_text(json.dumps(new))
+    (tmp_path / "v.done").write_text("")
+    (tmp_path / "v.png").write_bytes(b"png")
+    applied, dialogs = [], []
+
+    class Wrapper:
+        _registry = {"zw3d_batch_dim": lambda operations: applied.append(operations) or {"ok": True}}
+
+        def run_dialog(self, messages, validator=None, **kwargs):
+            dialogs.append(messages)
+            op = {"type": "holecallout", "args": {"hole_curve_id": added, "view_id": 100,
+                                                  "text_point": {"x": 0, "y": 0}}}
+            verdict = validator.check("zw3d_batch_dim", {"operations": [op]})
+            validator.done(verdict, {"ok": True})
+            # a kept dimension is refused as a duplicate
+            assert not validator.check("zw3d_batch_dim", {"operations": applied[0][:1]})["ok"]
+            return {"response": "{}", "messages": messages}
+
+    agent = GPTAutoDimensionAgent(wrapper=Wrapper(), planner="llm")
+    agent.generate_dimension_plan({"geom_data": str(tmp_path / "v.json"), "done_path": str(tmp_path / "v.done"),
+                                   "img_path": str(tmp_path / "v.png"), "path": "D:/parts/plate.Z3PRT",
+                                   "view type": 1})
+    kept, _ = remap_operations(old_plan, diff_views(ViewGeometry.from_json(view), ViewGeometry.from_json(new)))
+    assert applied == [kept]  # replayed before the dialog
+    content = dialogs[0][1]["content"]
+    table = content[0]["text"]
+    assert f"{resized} " in table and f"{added} " in table and "circles:" in table
+    assert len(table.splitlines()) < len(new["entities"]) / 2
+    assert content[1]["text"].startswith("The part was edited")
+    _, operations = history.load(DimensionHistory.key("D:/parts/plate.Z3PRT", 1))
+    assert operations[:len(kept)] == kept and operations[-1]["args"]["hole_curve_id"] == added
+
+
+def test_failed_operations_are_not_remembered(tmp_path, monkeypatch):
+    monkeypatch.setenv("ZW3D_DIM_HISTORY", str(tmp_path / "history"))
+    monkeypatch.setattr("LLMWrappers.AutoDimAgent.save_full_messages", lambda *args, **kwargs: None)
+    key = DimensionHistory.key("D:/parts/plate.Z3PRT", 1)
+    view = synthetic_view(entities=60, seed=3)
+    (tmp_path / "v.png").write_bytes(b"png")
+    applied, dialogs = [], []
+
+    def batch(operations):
+        # BATCHDIM returns 0 for the call; the second dimension of every batch fails
+        applied.append(operations)
+        return {"stderr": "", "return code": 0, "ok": False,
+                "results": [{"index": i, "status": "error" if i == 1 else "ok"} for i in range(len(operations))]}
+
+    class Wrapper:
+        _registry = {"zw3d_batch_dim": batch}
+
+        def run_dialog(self, messages, validator=None, **kwargs):
+            dialogs.append(messages)
+            return {"response": "{}", "messages": messages}
+
+    def run(view, planner):
+        (tmp_path / "v.json").write_text(json.dumps(view))
+        (tmp_path / "v.done").write_text("")
+        agent = GPTAutoDimensionAgent(wrapper=Wrapper(), planner=planner)
+        return agent.generate_dimension_plan({"geom_data": str(tmp_path / "v.json"),
+                                              "done_path": str(tmp_path / "v.done"),
+                                              "img_path": str(tmp_path / "v.png"),
+                                              "path": "D:/parts/plate.Z3PRT", "view type": 1})
+
+    res = run(view, "rules")
+    assert not res["result"]["ok"] and DimensionHistory().load(key) is None
+    # a replay that fails is not taken as done: the whole view goes to the model, not only the edit
+    old_plan = rule_plan(ViewGeometry.from_json(view))["operations"]
+    DimensionHistory().save(key, ViewGeometry.from_json(view), old_plan)
+    new, *_ = edited(view, shift=(0.0, 20.0))
+    run(new, "llm")
+    assert len(applied) == 2 and len(dialogs) == 1
+    texts = [part["text"] for part in dialogs[0][1]["content"] if part["type"] == "text"]
+    assert not any(t.startswith("The part was edited") for t in texts)
+    assert len(texts[0].splitlines()) > len(new["entities"]) / 2
+    # only the replayed dimensions that were created are remembered
+    _, operations = DimensionHistory().load(key)
+    assert operations == applied[1][:1] + applied[1][2:]
+
+
+def test_tool_names_count_as_plan_types():
+    op = {"type": "zw3d_linearoffsetdim", "args": {"id1": 4, "id2": 10}}
+    assert operation_ids(op) == [4, 10]
+    assert operation_ids({"type": "zw3d_radialdim", "args": {"id": 20}}) == [20]
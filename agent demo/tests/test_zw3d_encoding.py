@@ -0,0 +1,77 @@
+"""Tests for the compact prompt encoding of view geometry."""
+
+import json
+import re
+
+import numpy as np
+
+from tools import zw3d_encoding
+from tools.zw3d_encoding import decode_geometry, encode_geometry, token_report
+from tools.zw3d_geometry import ViewGeometry
+from tools.zw3d_simulator import synthetic_view
+
+
+def by_id(geometry):
+    e = geometry.entities
+    return e[np.argsort(e["id"])]
+
+
+def assert_same(a, b, tol):
+    a, b = by_id(a), by_id(b)
+    assert a["id"].tolist() == b["id"].tolist() and a["type"].tolist() == b["type"].tolist()
+    for field in ("start", "end", "mid", "center", "radius"):
+        assert np.allclose(a[field], b[field], atol=tol, equal_nan=True), field
+
+
+def test_round_trip_with_arcs_and_circles():
+    view = synthetic_view(entities=60, seed=4, origin=(312.3456, 87.65))
+    geometry = ViewGeometry.from_json(view)
+    text = encode_geometry(geometry)
+    assert text.splitlines()[0] == "view 100 (view 1), 60 entities, coordinates in mm"
+    decoded = decode_geometry(text)
+    assert (decoded.view_id, decoded.view) == (100, 1)
+    assert_same(geometry, decoded, 1e-2)
+
+
+def test_relative_coordinates_are_shorter_and_decode_back():
+    geometry = ViewGeometry.from_json(synthetic_view(entities=60, seed=4, origin=(5312.25, 4087.5)))
+    absolute, relative = encode_geometry(geometry), encode_geometry(geometry, relative=True)
+    assert relative.splitlines()[1].startswith("origin 5312.25 4087.5")
+    assert len(relative) < len(absolute)
+    assert_same(geometry, decode_geometry(relative), 1e-2)
+
+
+def test_clockwise_arc_is_written_counter_clockwise():
+    # upper half circle given clockwise (start on the left)
+    arc = {"id": 1, "type": "arc", "points": {"center": [0, 0], "start": [-10, 0], "end": [10, 0],
+                                              "middle": [0, 10]}}
+    geometry = ViewGeometry.from_json({"view id": 1, "view": 1, "entities": [arc]})
+    assert encode_geometry(geometry).splitlines()[-1] == "1 0 0 10 10 0 -10 0"
+    decoded = decode_geometry(encode_geometry(geometry))
+    assert np.allclose(decoded.get(1)["mid"], [0, 10])
+
+
+def test_compact_form_saves_most_tokens(monkeypatch):
+    # tiktoken needs to download its tables; count words and punctuation instead
+    monkeypatch.setattr(zw3d_encoding, "count_tokens",
+                        lambda text, model=None: len(re.findall(r"\w+|[^\w\s]", text)))
+    geometry = ViewGeometry.from_json(synthetic_view(entities=500, seed=1))
+    report = token_report(geometry)
+    assert report["compact"] < report["json"] / 3 and report["saved"] > 0.66
+    assert len(encode_geometry(geometry)) < len(json.dumps(geometry.to_json(), indent=2)) / 8
+
+
+def test_agent_counts_tokens_only_when_asked(monkeypatch, capsys):
+    from LLMWrappers.AutoDimAgent import GPTAutoDimensionAgent
+
+    reports = []
+    monkeypatch.setattr(zw3d_encoding, "token_report",
+                        lambda geometry, text, model=None: reports.append(text) or
+                        {"json": 100, "compact": 10, "saved": 0.9})
+    geometry = ViewGeometry.from_json(synthetic_view(entities=50, seed=0))
+    agent = GPTAutoDimensionAgent(wrapper=None, geometry_format="compact")
+    text = agent._geometry_text(geometry)
+    assert text == encode_geometry(geometry) and reports == [] and capsys.readouterr().out == ""
+    monkeypatch.setenv("AUTO_DIM_TOKEN_REPORT", "1")
+    assert agent._geometry_text(geometry) == text and reports == [text]
+    assert "90%" in capsys.readouterr().out
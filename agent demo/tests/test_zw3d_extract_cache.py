@@ -0,0 +1,107 @@
+"""Tests for the content-addressed STDVUDIM extraction cache."""
+
+import asyncio
+import json
+import os
+
+from tools import zw3d_command_tool as zw3d
+from tools.zw3d_async import ZW3DAsyncExecutor
+from tools.zw3d_extract_cache import ExtractCache
+from tools.zw3d_results import read_json_result
+from tools.zw3d_session import SessionServer, SocketTransport, ZW3DSession, parse_endpoint, set_session
+from tools.zw3d_simulator import ZW3DSimulator
+
+
+def test_key_follows_content_view_and_version(tmp_path):
+    part = tmp_path / "plate.Z3PRT"
+    part.write_bytes(b"rev A")
+    cache = ExtractCache(str(tmp_path / "cache"))
+    key = cache.key(str(part), 1, 0, 0)
+    assert key == cache.key(str(part), 1, 0.0, 0.0)
+    assert key != cache.key(str(part), 2, 0, 0) != cache.key(str(part), 1, 10, 0)
+    assert key != ExtractCache(str(tmp_path / "cache"), version="other").key(str(part), 1, 0, 0)
+    # another part with the same content has its own drawing, also under the same name in another folder
+    (tmp_path / "other.Z3PRT").write_bytes(b"rev A")
+    assert key != cache.key(str(tmp_path / "other.Z3PRT"), 1, 0, 0)
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "plate.Z3PRT").write_bytes(b"rev A")
+    assert key != cache.key(str(tmp_path / "sub" / "plate.Z3PRT"), 1, 0, 0)
+    part.write_bytes(b"rev B")
+    os.utime(part, ns=(1, 1))
+    assert key != cache.key(str(part), 1, 0, 0)
+    assert cache.key(str(tmp_path / "missing.Z3PRT"), 1, 0, 0) is None
+
+
+def test_lru_eviction_by_size(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "stdvu_output.json").write_text(json.dumps({"view id": 7, "entities": [{"id": 1}], "pad": "x" * 950}))
+    (src / "stdvu_output.png").write_bytes(b"y" * 1000)
+    cache = ExtractCache(str(tmp_path / "cache"), max_bytes=7000)  # room for three entries
+    assert not cache.put("incomplete", str(tmp_path), {})
+    for i, key in enumerate("abc"):
+        assert cache.put(key, str(src), {"n": i})
+        os.utime(tmp_path / "cache" / key, (100 + i, 100 + i))
+    # a becomes the most recent; the ids to look for in the drawing are stored with it
+    assert cache.restore("a", str(tmp_path / "out")) == {"n": 0, "view id": 7, "probe": [1]}
+    assert (tmp_path / "out" / "stdvu_output.done").exists()
+    cache.put("d", str(src), {"n": 3})
+    assert sorted(os.listdir(tmp_path / "cache")) == ["a", "c", "d"]
+    assert cache.restore("b", str(tmp_path / "out")) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_repeat_run_skips_extraction(tmp_path, monkeypatch):
+    part = tmp_path / "plate.Z3PRT"
+    part.write_bytes(b"rev A")
+    cache = ExtractCache(str(tmp_path / "cache"))
+    monkeypatch.setattr(zw3d.ZW3DCommandStdVuDim, "cache", cache)
+    sim = ZW3DSimulator(str(tmp_path / "sim"), entities=30, image_size=(32, 24))
+    with SessionServer(handler=sim) as server:
+        session = ZW3DSession(SocketTransport(*parse_endpoint(server.endpoint)), verbose=False)
+        old = set_session(session)
+        try:
+            def view():
+                data = zw3d.ZW3DCommandStdVuDim().run(path=str(part), type=1, x=0, y=0)["data"]
+                return data, read_json_result(data["geom_data"], data["done_path"], timeout=5)
+
+            first, geometry = view()
+            cache.join(5)
+            second, again = view()
+            assert not first["cached"] and second["cached"]
+            assert again == geometry and os.path.getsize(second["img_path"]) > 0
+            assert sim.counts["STDVUDIM"] == 1
+            # the drawing holding the cached view, next to the part, is active
+            assert sim.active == str(tmp_path / "plate.Z3DRW").replace("\\", "/")
+            assert sim.counts["ENTCHECK"] == 1
+
+            part.write_bytes(b"rev B")
+            os.utime(part, ns=(1, 1))
+            third, changed = view()
+            assert not third["cached"] and sim.counts["STDVUDIM"] == 2
+
+            # the async path shares the cache
+            cache.join(5)
+            async def arun():
+                executor = ZW3DAsyncExecutor(default_target=server.endpoint, verbose=False)
+                try:
+                    return await zw3d.ZW3DCommandStdVuDim().arun(executor=executor, path=str(part), type=1,
+                                                                 x=0, y=0)
+                finally:
+                    await executor.close()
+
+            fourth = asyncio.run(arun())["data"]
+            assert fourth["cached"] and sim.counts["STDVUDIM"] == 2
+            assert read_json_result(fourth["geom_data"], fourth["done_path"], timeout=5) == changed
+
+            # ZW3D restarted and the drawing was never saved: the cached ids are gone, extract again
+            sim.drawings.clear()
+            fifth, fresh = view()
+            assert not fifth["cached"] and sim.counts["STDVUDIM"] == 3
+            assert fresh["view id"] != changed["view id"]
+            cache.join(5)
+            sixth, _ = view()
+            assert sixth["cached"] and sim.counts["STDVUDIM"] == 3
+        finally:
+            set_session(old)
+            session.close()
@@ -0,0 +1,62 @@
+"""Tests for the array-backed view geometry."""
+
+import json
+
+import numpy as np
+import pytest
+
+from tools.zw3d_geometry import ARC, CIRCLE, LINE, GeometryError, ViewGeometry
+from tools.zw3d_simulator import synthetic_view
+
+
+def test_round_trip_keeps_format_and_order():
+    view = synthetic_view(entities=40, seed=3)
+    geometry = ViewGeometry.from_json(json.dumps(view))
+    assert len(geometry) == len(view["entities"])
+    assert geometry.to_json() == json.loads(json.dumps(view))
+
+
+def test_groups_are_zero_copy_slices():
+    view = synthetic_view(entities=40, seed=3)
+    geometry = ViewGeometry.from_json(view)
+    counts = {t: sum(e["type"] == t for e in view["entities"]) for t in ("line", "arc", "circle")}
+    assert (len(geometry.lines), len(geometry.arcs), len(geometry.circles)) == \
+        (counts["line"], counts["arc"], counts["circle"])
+    assert np.shares_memory(geometry.circles, geometry.entities)
+    assert (geometry.lines["type"] == LINE).all() and (geometry.arcs["type"] == ARC).all()
+    assert np.isnan(geometry.lines["radius"]).all()
+
+
+def test_id_lookup_and_select():
+    view = synthetic_view(entities=20, seed=1)
+    geometry = ViewGeometry.from_json(view)
+    circle = next(e for e in view["entities"] if e["type"] == "circle")
+    row = geometry.get(circle["id"])
+    assert row["type"] == CIRCLE
+    assert row["radius"] == pytest.approx(circle["points"]["0degree"][0] - circle["points"]["center"][0])
+    assert geometry.entity(circle["id"]) == circle
+    assert circle["id"] in geometry and -1 not in geometry
+
+    ids = [e["id"] for e in view["entities"][:5]]
+    sub = geometry.select(ids)
+    assert [e["id"] for e in sub.to_json()["entities"]] == ids
+
+
+def test_bbox_and_errors():
+    geometry = ViewGeometry.from_json(synthetic_view(entities=10, seed=0))
+    xmin, ymin, xmax, ymax = geometry.bbox()
+    assert (xmin, ymin) == (0.0, 0.0) and xmax > 0 and ymax > 0
+    with pytest.raises(GeometryError, match="'middle'"):
+        ViewGeometry.from_json({"entities": [{"id": 1, "type": "line", "points": {"start": [0, 0], "end": [1, 0]}}]})
+
+
+def test_untyped_entities_are_skipped():
+    view = synthetic_view(entities=10, seed=0)
+    # splines, ellipses and points come from the DLL as a bare id
+    view["entities"][3:3] = [{"id": 9001}, {"id": 9002, "type": "spline", "points": {}}]
+    geometry = ViewGeometry.from_json(view)
+    assert len(geometry) == len(view["entities"]) - 2 and 9001 not in geometry
+    assert geometry.unsupported == [9001, 9002]
+    assert geometry.select(geometry.ids[:2]).unsupported == [9001, 9002]
+    assert [e["id"] for e in geometry.to_json()["entities"]] == \
+        [e["id"] for e in view["entities"] if "type" in e and e["type"] != "spline"]
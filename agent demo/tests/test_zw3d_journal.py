@@ -0,0 +1,150 @@
+"""Tests for the run_dialog write-ahead journal and crash-resume."""
+
+import json
+
+import pytest
+
+from LLMWrappers.GPT5Wrapper import GPTToolWrapper
+from tools.zw3d_journal import Journal, JournalMismatch
+from zw3d_helpers import FakeToolCall, ScriptedClient, plate
+
+
+class Counter:
+    name = "count"
+
+    def __init__(self, crash_at=None):
+        self.seen = []
+        self.crash_at = crash_at
+
+    def get_tool_definition(self):
+        return {"type": "function", "function": {"name": self.name, "parameters": {"type": "object"}}}
+
+    def run(self, n):
+        if n == self.crash_at:
+            raise KeyboardInterrupt  # simulated process death, not a tool error
+        self.seen.append(n)
+        return {"ok": True, "data": n * 10}
+
+
+TURNS = [
+    ("", [FakeToolCall("c1", "count", {"n": 1}), FakeToolCall("c2", "count", {"n": 2})]),
+    ("", [FakeToolCall("c3", "count", {"n": 3})]),
+    ("done", None),
+]
+
+
+@pytest.fixture(autouse=True)
+def no_token_count(monkeypatch):
+    # tiktoken downloads its encodings on first use
+    monkeypatch.setattr("LLMWrappers.GPT5Wrapper.count_messages_tokens", lambda messages: 0)
+
+
+def make_wrapper(tool, turns=TURNS):
+    wrapper = GPTToolWrapper(api_key="test")
+    wrapper._log_jsonl = lambda obj: None
+    wrapper.client = ScriptedClient(turns)
+    wrapper.register_tool(tool)
+    return wrapper
+
+
+def test_resume_skips_model_and_acked_calls(tmp_path):
+    path = str(tmp_path / "dialog.jsonl")
+    crashing = Counter(crash_at=3)
+    wrapper = make_wrapper(crashing)
+    with pytest.raises(KeyboardInterrupt):
+        with Journal(path) as journal:
+            wrapper.run_dialog([{"role": "user", "content": "go"}], journal=journal)
+    assert crashing.seen == [1, 2]
+    assert wrapper.client.calls == 2
+
+    tool = Counter()
+    wrapper = make_wrapper(tool, turns=TURNS[2:])
+    with Journal(path) as journal:
+        result = wrapper.run_dialog([{"role": "user", "content": "go"}], journal=journal)
+    assert result["response"] == "done"
+    assert tool.seen == [3]  # planned but never acknowledged -> executed again
+    assert wrapper.client.calls == 1  # only the turn after the crash is requested
+    tool_msgs = [m for m in result["messages"] if m["role"] == "tool"]
+    assert [json.loads(m["content"])["data"] for m in tool_msgs] == [10, 20, 30]
+
+    # a finished journal replays the whole dialog without the model or the tools
+    tool = Counter()
+    wrapper = make_wrapper(tool, turns=[])
+    with Journal(path) as journal:
+        assert journal.finished
+        result = wrapper.run_dialog([{"role": "user", "content": "go"}], journal=journal)
+    assert result["response"] == "done" and tool.seen == []
+
+
+def test_journal_rejects_other_dialog(tmp_path):
+    path = str(tmp_path / "dialog.jsonl")
+    with Journal(path) as journal:
+        journal.begin([{"role": "user", "content": "a"}])
+    with Journal(path) as journal:
+        with pytest.raises(JournalMismatch):
+            journal.begin([{"role": "user", "content": "b"}])
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    path = tmp_path / "dialog.jsonl"
+    with Journal(str(path)) as journal:
+        journal.begin([{"role": "user", "content": "a"}])
+        journal.plan("c1", "count", {"n": 1})
+        journal.ack("c1", {"ok": True})
+    with open(path, "ab") as f:
+        f.write(b'{"t":"ack","c":"c2","r":')
+    with Journal(str(path)) as journal:
+        assert journal.acked("c1") and not journal.acked("c2")
+        assert journal.initial == [{"role": "user", "content": "a"}]
+        journal.ack("c2", {"ok": True})
+    with Journal(str(path)) as journal:
+        assert journal.acked("c2")
+
+
+def test_auto_dimension_child_journal_is_closed(tmp_path, monkeypatch):
+    from LLMWrappers.AutoDimAgent import GPTAutoDimensionAgent
+
+    children = []
+
+    def generate(self, std_view_result, journal=None):
+        children.append(journal)
+        return {"operations": []}
+
+    monkeypatch.setattr(GPTAutoDimensionAgent, "generate_dimension_plan", generate)
+
+    class StdVu(Counter):
+        name = "zw3d_stdvucrt_dim"
+
+        def run(self, n):
+            return {"ok": True, "data": {"return code": 1}}
+
+    wrapper = make_wrapper(StdVu(), turns=[("", [FakeToolCall("c1", "zw3d_stdvucrt_dim", {"n": 1})]), ("done", None)])
+    with Journal(str(tmp_path / "dialog.jsonl")) as journal:
+        wrapper.run_dialog([{"role": "user", "content": "go"}], journal=journal)
+        assert children[0].path == str(tmp_path / "dialog.c1.jsonl")
+        assert children[0]._f.closed
+
+
+def test_resumed_auto_dimension_dialog_is_validated(tmp_path, monkeypatch):
+    from LLMWrappers.AutoDimAgent import GPTAutoDimensionAgent
+    from tools.zw3d_validator import PlanValidator
+
+    monkeypatch.setattr("LLMWrappers.AutoDimAgent.save_full_messages", lambda *args, **kwargs: None)
+    (tmp_path / "v.json").write_text(json.dumps(plate().to_json()))
+    calls = []
+
+    class Wrapper:
+        def run_dialog(self, messages, **kwargs):
+            calls.append((messages, kwargs))
+            return {"response": "{}", "messages": messages}
+
+    initial = [{"role": "user", "content": "dimension this view"}]
+    with Journal(str(tmp_path / "dialog.jsonl")) as journal:
+        journal.begin(initial)
+    # the .done marker was consumed before the crash; the geometry file is still there
+    with Journal(str(tmp_path / "dialog.jsonl")) as journal:
+        GPTAutoDimensionAgent(wrapper=Wrapper()).generate_dimension_plan(
+            {"geom_data": str(tmp_path / "v.json"), "done_path": str(tmp_path / "v.done")}, journal=journal)
+    (messages, kwargs), = calls
+    assert messages == initial and kwargs["journal"] is journal
+    assert isinstance(kwargs["validator"], PlanValidator)
@@ -0,0 +1,100 @@
+"""Tests for planning several views in parallel and merging their dimensions."""
+
+import json
+import time
+
+from tools.zw3d_batch import BatchRunner
+from tools.zw3d_geometry import ViewGeometry
+from tools.zw3d_multiview import BACK, FRONT, ISO, TOP, format_merge, layout, merge_plans
+from tools.zw3d_pool import ZW3DWorkerPool
+from tools.zw3d_session import SessionServer
+from tools.zw3d_simulator import ZW3DSimulator
+from zw3d_helpers import circle, line, rectangle, view as geometry_of, xy
+
+
+def view(view_id, view_type, ox, oy, w, h, extra=()):
+    """A w x h rectangle at (ox, oy), ids view_id + 1..4, and extra entities given relative to it."""
+    entities = rectangle(view_id + 1, (ox, oy), w, h)
+    for i, (kind, *p) in enumerate(extra):
+        eid = view_id + 5 + i
+        if kind == "circle":
+            (cx, cy), r = p
+            entities.append(circle(eid, (ox + cx, oy + cy), r))
+        else:
+            (x1, y1), (x2, y2) = p
+            entities.append(line(eid, (ox + x1, oy + y1), (ox + x2, oy + y2)))
+    return geometry_of(*entities, view_id=view_id, view_type=view_type)
+
+
+def span(i, p, q, text):
+    return {"type": "linear", "args": {"id": i, "start_point": xy(*p), "end_point": xy(*q), "text_point": xy(*text)}}
+
+
+def test_features_are_dimensioned_in_one_view():
+    # 100 x 50 x 20 block with a 10 mm hole at x = 30, y = 25, drilled along z
+    top = view(1000, TOP, 0, 300, 100, 50, [("circle", (30, 25), 5)])
+    front = view(2000, FRONT, 0, 0, 100, 20, [("line", (25, 0), (25, 20)), ("line", (35, 0), (35, 20))])
+    # seen from the back, x runs to the left: the hole is at 65..75
+    back = view(3000, BACK, 400, 0, 100, 20, [("line", (65, 0), (65, 20)), ("line", (75, 0), (75, 20))])
+    iso = view(4000, ISO, 300, 300, 80, 60)
+    plans = [
+        {"view type": FRONT, "geometry": front, "operations": [
+            span(2001, (0, 0), (100, 0), (50, -10)),          # length: kept
+            span(2002, (100, 0), (100, 20), (110, 10)),       # height: kept
+            span(2006, (25, 10), (35, 10), (30, 30)),         # hole width between hidden lines
+        ]},
+        {"view type": TOP, "geometry": top, "operations": [
+            span(1001, (0, 300), (100, 300), (50, 290)),      # length again
+            span(1002, (100, 300), (100, 350), (110, 325)),   # width: kept
+            {"type": "holecallout", "args": {"hole_curve_id": 1005, "view_id": 1000, "text_point": xy(45, 340)}},
+            {"type": "linearoffset", "args": {"id1": 1004, "id2": 1005, "first_point": xy(0, 325),
+                                              "second_point": xy(30, 325), "text_point": xy(15, 360)}},
+        ]},
+        {"view type": BACK, "geometry": back, "operations": [
+            span(3006, (465, 10), (475, 10), (470, 30)),      # the hole once more, mirrored
+            span(3003, (500, 20), (400, 20), (450, 30)),      # length
+            span(3006, (465, 0), (500, 0), (480, -10)),       # hole to the left face (x 0..35): new
+        ]},
+        {"view type": ISO, "geometry": iso, "operations": [span(4001, (300, 300), (380, 300), (340, 290))]},
+    ]
+    merged = merge_plans(plans)
+    kept = [op["args"].get("id", op["args"].get("hole_curve_id", op["args"].get("id2"))) for op in merged["operations"]]
+    assert kept == [2001, 2002, 1002, 1005, 1005, 3006, 4001]
+    front_v, top_v, back_v, iso_v = merged["views"]
+    # the callout is kept in the top view, so the width between hidden lines goes
+    assert front_v["duplicates"] == [{"index": 2, "type": "linear", "of": TOP}]
+    assert [d["index"] for d in top_v["duplicates"]] == [0]
+    assert [d["index"] for d in back_v["duplicates"]] == [0, 1] and not iso_v["duplicates"]
+    assert merged["duplicates"] == 4
+    assert format_merge(merged).splitlines()[0] == "front (view 2000): 2 dimensions, 1 already in top"
+
+
+def test_layout_places_views_apart():
+    places = layout([FRONT, TOP, 99], spacing=100, origin=(50, 50))
+    assert places == {FRONT: (50, 50), TOP: (50, -50), 99: (50, -150)}
+
+
+def outline_planner(view):
+    """Length and height of the plate, after a fixed LLM-like delay."""
+    time.sleep(0.4)
+    geometry = ViewGeometry.load(view["geom_data"], view["done_path"])
+    bottom, right = geometry.get(geometry.ids[0]), geometry.get(geometry.ids[1])
+    (x0, y0), (x1, _), (_, y1) = bottom["start"], bottom["end"], right["end"]
+    return [span(int(bottom["id"]), (x0, y0), (x1, y0), ((x0 + x1) / 2, y0 - 10)),
+            span(int(right["id"]), (x1, y0), (x1, y1), (x1 + 10, (y0 + y1) / 2))]
+
+
+def test_six_views_take_about_as_long_as_one(tmp_path):
+    sim = ZW3DSimulator(str(tmp_path / "sim"), entities=12, image_size=(16, 16), latency=0.01)
+    part = tmp_path / "block.Z3PRT"
+    part.write_text("")
+    out = str(tmp_path / "out")
+    with SessionServer(handler=sim) as server, ZW3DWorkerPool([server.endpoint]) as pool:
+        report = BatchRunner([str(part)], out, pool, outline_planner, views=[1, 2, 3, 4, 5, 6],
+                             verbose=False).run()
+    assert report["ok"] == 1
+    (record,) = [json.loads(line) for line in open(f"{out}/manifest.jsonl")]
+    assert sim.counts["STDVUDIM"] == 6 and sim.counts["BATCHDIM"] == 1
+    assert record["stages"]["plan"] < 6 * 0.4 / 2  # ~0.4 s: the views are planned side by side
+    # every view shows two of the three outline dimensions; each is kept once
+    assert record["dimensions"] == 3 and sum(v["duplicates"] for v in record["views"]) == 9
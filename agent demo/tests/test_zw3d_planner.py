@@ -0,0 +1,123 @@
+"""Tests for the rule-based dimension planner."""
+
+import json
+
+from LLMWrappers.AutoDimAgent import GPTAutoDimensionAgent
+from tools import zw3d_command_tool as zw3d
+from tools.zw3d_batch import PLANNERS, BatchRunner, find_parts
+from tools.zw3d_constraints import ConstraintCounter
+from tools.zw3d_geometry import ARC, ViewGeometry
+from tools.zw3d_planner import is_simple, rule_plan
+from tools.zw3d_pool import ZW3DWorkerPool
+from tools.zw3d_session import SessionServer
+from tools.zw3d_simulator import ZW3DSimulator, synthetic_view
+from tools.zw3d_topology import contours
+from zw3d_helpers import rectangle
+
+
+def test_plan_covers_every_entity_with_valid_operations():
+    view = synthetic_view(entities=30, seed=2)
+    geometry = ViewGeometry.from_json(view)
+    plan = rule_plan(geometry)
+
+    # the datums are the outer contour's bottom and left edges
+    border = {e["id"]: e["points"] for e in view["entities"][:4]}
+    assert border[plan["datums"]["horizontal"]]["start"][1] == 0
+    assert border[plan["datums"]["vertical"]]["start"][0] == 0
+
+    kinds = [item["type"] for item in plan["labeled"]]
+    assert kinds[:2] == ["linear", "linear"]
+    assert "holecallout" in kinds and "linearoffset" in kinds
+    assert [op["type"] for op in plan["operations"]] == kinds
+
+    ids = {e["id"] for e in view["entities"]}
+    covered = {item["id"] for item in plan["labeled"]} | {item["id"] for item in plan["skipped"]}
+    assert covered == ids
+    # every operation is accepted by the batch tool as is
+    payload = zw3d.ZW3DCommandBatchDim().payload(plan["operations"])
+    assert len(payload["ops"]) == len(plan["operations"])
+    assert rule_plan(geometry) == plan  # deterministic
+
+
+def test_slots_are_located_and_their_length_given():
+    geometry = ViewGeometry.from_json(synthetic_view(entities=30, seed=0))
+    slots = [c for c in contours(geometry)["contours"] if c["kind"] == "slot"]
+    assert slots
+    plan = rule_plan(geometry)
+    for c in slots:
+        first, second = sorted((i for i in c["entities"] if geometry.get(i)["type"] == ARC),
+                               key=lambda i: tuple(geometry.get(i)["center"]))
+        # one end is located from the datums (a coordinate shared with another slot once), the other
+        # follows from the slot length
+        located = {op["args"]["id1"] for op in plan["operations"]
+                   if op["type"] == "linearoffset" and op["args"]["id2"] == first}
+        assert located and located <= set(plan["datums"].values())
+        assert any(op["args"].get("id1") == first and op["args"].get("id2") == second
+                   for op in plan["operations"])
+    counter = ConstraintCounter(geometry)
+    counter.add_all(plan["operations"])
+    assert not counter.status()["features"]
+
+
+def test_is_simple():
+    assert is_simple(ViewGeometry.from_json(synthetic_view(entities=30)))
+    assert not is_simple(ViewGeometry.from_json(synthetic_view(entities=300)))
+
+
+def test_agent_uses_rules_without_llm(tmp_path):
+    view = synthetic_view(entities=20, seed=1)
+    (tmp_path / "v.json").write_text(json.dumps(view))
+    (tmp_path / "v.done").write_text("")
+    applied = []
+
+    class Wrapper:
+        _registry = {"zw3d_batch_dim": lambda operations: applied.append(operations) or {"ok": True}}
+
+        def run_dialog(self, *args, **kwargs):
+            raise AssertionError("the LLM must not be called for a simple view")
+
+    agent = GPTAutoDimensionAgent(wrapper=Wrapper(), planner="auto")
+    res = agent.generate_dimension_plan({"geom_data": str(tmp_path / "v.json"), "done_path": str(tmp_path / "v.done"),
+                                         "img_path": str(tmp_path / "missing.png")})
+    assert res["planner"] == "rules"
+    assert applied == [res["operations"]]
+    assert [item["type"] for item in res["json"]["labeled"]] == [op["type"] for op in res["operations"]]
+    assert res["constraints"] == "fully dimensioned"
+
+
+def test_incomplete_rule_plan_goes_to_review(tmp_path, monkeypatch):
+    monkeypatch.setattr("LLMWrappers.AutoDimAgent.save_full_messages", lambda *args, **kwargs: None)
+    # a plate with a rectangular pocket: axis-aligned and small, but the rules do not locate pockets
+    entities = rectangle(1, (0, 0), 100, 60) + rectangle(5, (30, 20), 40, 20)
+    (tmp_path / "v.json").write_text(json.dumps({"view id": 7, "view": 1, "entities": entities}))
+    (tmp_path / "v.done").write_text("")
+    (tmp_path / "v.png").write_bytes(b"png")
+    applied, dialogs = [], []
+
+    class Wrapper:
+        _registry = {"zw3d_batch_dim": lambda operations: applied.append(operations) or {"ok": True}}
+
+        def run_dialog(self, messages, **kwargs):
+            dialogs.append(messages)
+            return {"response": "{}", "messages": messages}
+
+    assert is_simple(ViewGeometry.from_json({"view id": 7, "view": 1, "entities": entities}))
+    agent = GPTAutoDimensionAgent(wrapper=Wrapper(), planner="auto")
+    res = agent.generate_dimension_plan({"geom_data": str(tmp_path / "v.json"), "done_path": str(tmp_path / "v.done"),
+                                         "img_path": str(tmp_path / "v.png")})
+    assert "planner" not in res and not applied and len(dialogs) == 1
+    texts = [part["text"] for part in dialogs[0][1]["content"] if part["type"] == "text"]
+    assert any(t.startswith("A rule-based planner") for t in texts)  # the draft goes along for review
+
+
+def test_batch_with_rules_planner(tmp_path):
+    parts = tmp_path / "parts"
+    parts.mkdir()
+    for name in ("a.Z3PRT", "b.Z3PRT"):
+        (parts / name).write_text("")
+    sim = ZW3DSimulator(str(tmp_path / "sim"), entities=16, image_size=(16, 16))
+    with SessionServer(handler=sim) as server, ZW3DWorkerPool([server.endpoint]) as pool:
+        report = BatchRunner(find_parts(str(parts)), str(tmp_path / "out"), pool, PLANNERS["rules"],
+                             verbose=False).run()
+    assert report["ok"] == 2
+    assert sim.counts["BATCHDIM"] == 2
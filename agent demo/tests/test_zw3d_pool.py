@@ -0,0 +1,134 @@
+"""Tests for the multi-instance ZW3D worker pool."""
+
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from LLMWrappers.GPT5Wrapper import GPTToolWrapper
+from tools import zw3d_command_tool as zw3d
+from tools.zw3d_pool import NoWorkersAvailable, WorkerDied, ZW3DWorker, ZW3DWorkerPool
+from tools.zw3d_session import ProcessTransport, SessionServer, ZW3DSession
+from tools.zw3d_tiling import plan_regions
+from tools.zw3d_simulator import ZW3DSimulator
+
+
+@pytest.fixture
+def instances(tmp_path):
+    sims = [ZW3DSimulator(str(tmp_path / str(i)), entities=10, image_size=(16, 16), latency=0.05)
+            for i in range(2)]
+    servers = [SessionServer(handler=sim).start() for sim in sims]
+    yield sims, servers
+    for server in servers:
+        server.stop()
+
+
+def dimension_part(path):
+    zw3d.ZW3DCommandOpen().run(filePath=path)
+    zw3d.ZW3DCommandExp().run(path=path + ".pdf", type=2, subType=0)
+    return path
+
+
+def open_part(path):
+    zw3d.ZW3DCommandOpen().run(filePath=path)
+    return path
+
+
+def test_jobs_spread_over_instances(instances):
+    sims, servers = instances
+    parts = [f"D:/parts/p{i}.Z3PRT" for i in range(6)]
+    with ZW3DWorkerPool([s.endpoint for s in servers]) as pool:
+        start = time.perf_counter()
+        assert pool.map(dimension_part, parts) == parts
+        elapsed = time.perf_counter() - start
+    # 6 jobs x 2 commands x 50 ms: ~0.6 s serial, ~0.3 s on two instances
+    assert elapsed < 0.5
+    assert [sim.counts["FILEOPEN"] for sim in sims] == [3, 3]
+    # all commands of a job went to the same instance
+    assert [sim.counts["FILEEXPORT"] for sim in sims] == [3, 3]
+
+
+def test_affinity_routes_same_file_to_same_instance(instances):
+    sims, servers = instances
+    with ZW3DWorkerPool([s.endpoint for s in servers]) as pool:
+        for path in ("D:/parts/a.Z3PRT", "D:/parts/b.Z3PRT", "d:\\parts\\A.Z3PRT"):
+            pool.run(path, open_part, path)
+        assert pool.stats["affinity_hits"] == 1
+        # back on the instance where a.Z3PRT is still active: the re-open is skipped
+        assert sum(w.state.skipped for w in pool.workers) == 1
+        # FILEEXPORT activates the exported root, so after it the open is sent again
+        pool.run("D:/parts/a.Z3PRT", dimension_part, "D:/parts/a.Z3PRT")
+        pool.run("D:/parts/a.Z3PRT", open_part, "D:/parts/a.Z3PRT")
+        assert sum(w.state.skipped for w in pool.workers) == 2
+    assert sorted(sim.counts["FILEOPEN"] for sim in sims) == [1, 2]
+
+
+def test_dead_instance_job_is_rerun_elsewhere(instances):
+    sims, servers = instances
+    with ZW3DWorkerPool([s.endpoint for s in servers], revive_after=60) as pool:
+        pool.run("D:/parts/a.Z3PRT", dimension_part, "D:/parts/a.Z3PRT")
+        worker = next(w for w in pool.workers if w.jobs)
+        dead = pool.workers.index(worker)
+        servers[dead].stop()
+        worker.session.transport.close()
+
+        assert pool.run("D:/parts/a.Z3PRT", dimension_part, "D:/parts/a.Z3PRT") == "D:/parts/a.Z3PRT"
+        assert not worker.alive
+        assert pool.stats["retried"] == 1 and pool.stats["deaths"] == 1
+        assert sims[1 - dead].counts["FILEOPEN"] == 1
+
+        survivor = pool.workers[1 - dead]
+        servers[1 - dead].stop()
+        survivor.session.transport.close()
+        with pytest.raises(NoWorkersAvailable):
+            pool.run("D:/parts/c.Z3PRT", dimension_part, "D:/parts/c.Z3PRT")
+    servers[:] = []
+
+
+def test_threads_and_tasks_of_a_job_use_its_instance(instances, monkeypatch):
+    sims, servers = instances
+    monkeypatch.setattr("tools.zw3d_session._session", None)
+    monkeypatch.delenv("ZW3D_REMOTE_ENDPOINT", raising=False)  # the shared session reaches no instance
+    wrapper = GPTToolWrapper(api_key="test")
+    wrapper._log_jsonl = lambda obj: None
+    wrapper.register_tool(zw3d.ZW3DCommandOpen())
+
+    def job(path):
+        plan_regions([{}] * 3, lambda k, region: open_part(f"{path}.{k}"), workers=3)
+        calls = [(SimpleNamespace(id=f"call_{i}"), "zw3d_open", {"filePath": f"{path}.t{i}"}) for i in range(2)]
+        assert all(r["return code"] == 0 for r in wrapper._execute_tool_calls(calls, [], concurrent=True))
+        return path
+
+    with ZW3DWorkerPool([servers[0].endpoint]) as pool:
+        assert pool.run("D:/parts/a.Z3PRT", job, "D:/parts/a.Z3PRT") == "D:/parts/a.Z3PRT"
+    assert sims[0].counts["FILEOPEN"] == 5
+
+
+def test_failed_command_does_not_kill_the_worker(tmp_path):
+    exe = tmp_path / "remote.py"
+    exe.write_text("import sys\nsys.exit(3)\n")  # FILEOPEN of a missing or corrupt part
+    worker = ZW3DWorker("127.0.0.1", ZW3DSession(ProcessTransport(str(exe)), verbose=False))
+    out = tmp_path / "req"
+    out.mkdir()
+    assert worker.execute("FILEOPEN", {"filePath": "D:/a.Z3PRT", "outputDir": str(out)})["return code"] == 3
+    (out / "zw3d_result.json").write_text(json.dumps({"return code": 1}))
+    assert worker.execute("FILEOPEN", {"filePath": "D:/a.Z3PRT", "outputDir": str(out)})["return code"] == 3
+    # ZW3dRemote.exe that cannot be started: the instance is unreachable
+    missing = ZW3DWorker("127.0.0.1", ZW3DSession(ProcessTransport(str(tmp_path / "missing.exe")), verbose=False))
+    with pytest.raises(WorkerDied):
+        missing.execute("FILEOPEN", {"filePath": "D:/a.Z3PRT"})
+
+
+def test_bad_part_leaves_the_pool_alive(instances):
+    sims, servers = instances
+
+    def bad_part(path):
+        assert zw3d.ZW3DCommandOpen().run(filePath=path)["return code"] != 0
+        return path
+
+    for sim in sims:
+        sim.failure_rate = 1.0
+    with ZW3DWorkerPool([s.endpoint for s in servers]) as pool:
+        pool.map(bad_part, [f"D:/parts/bad{i}.Z3PRT" for i in range(3)])
+        assert all(w.alive for w in pool.workers) and pool.stats["deaths"] == 0
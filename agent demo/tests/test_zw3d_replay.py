@@ -0,0 +1,107 @@
+"""Tests for replaying recorded tool-call logs against the simulator."""
+
+import json
+
+import autodim
+from tools.zw3d_replay import RecordedCall, Replayer, load_trace, slower_than
+from tools.zw3d_pool import session_for
+from tools.zw3d_session import SessionServer, use_session
+from tools.zw3d_simulator import ZW3DSimulator
+
+
+def write_trace(path):
+    events = []
+    calls = [
+        ("c1", "zw3d_open", {"filePath": "D:/parts/a.Z3PRT"}, 0.30, None),
+        ("c2", "web_search", {"query": "GB/T 14689"}, 1.00, None),
+        ("c3", "zw3d_exp", {"path": "D:/out/a.pdf", "type": 2, "subType": 0}, 0.50, None),
+        ("c4", "zw3d_exp", {"path": "D:/out/b.pdf", "type": 2, "subType": 0}, 0.40, "boom"),
+    ]
+    ts = 100.0
+    for call_id, name, args, latency, error in calls:
+        events.append({"event": "tool_start", "tool_call_id": call_id, "name": name, "args": args, "ts": ts})
+        events.append({"event": "tool_end", "tool_call_id": call_id, "name": name,
+                       "result": None if error else {"ok": True}, "error": error, "ts": ts + latency})
+        ts += latency + 2.0
+    with open(path, "w", encoding="utf-8") as f:
+        for e in events:
+            f.write(json.dumps(e) + "\n")
+        f.write('{"event": "tool_start", "tool_')  # torn last line
+
+
+def recorded(rows):
+    calls = []
+    for call_id, name, latency in rows:
+        call = RecordedCall(call_id, name, {}, 0.0)
+        call.end, call.ok = latency, True
+        calls.append(call)
+    return calls
+
+
+def test_load_trace_pairs_events(tmp_path):
+    path = tmp_path / "tool_calls.jsonl"
+    write_trace(path)
+    calls = load_trace(str(path))
+    assert [c.call_id for c in calls] == ["c1", "c2", "c3", "c4"]
+    assert abs(calls[0].latency - 0.30) < 1e-9
+    assert [c.ok for c in calls] == [True, True, True, False]
+
+
+def test_nonzero_return_codes_are_failures(tmp_path):
+    path = tmp_path / "tool_calls.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for i, code in enumerate((0, 1)):
+            f.write(json.dumps({"event": "tool_start", "tool_call_id": f"c{i}", "name": "zw3d_exp",
+                                "args": {"path": f"D:/out/{i}.pdf", "type": 2, "subType": 0}, "ts": i}) + "\n")
+            f.write(json.dumps({"event": "tool_end", "tool_call_id": f"c{i}", "name": "zw3d_exp", "error": None,
+                                "result": {"stdout": "", "stderr": "", "return code": code}, "ts": i + 0.5}) + "\n")
+    calls = load_trace(str(path))
+    assert [c.ok for c in calls] == [True, False]
+
+    calls = [RecordedCall(f"c{i}", "zw3d_exp", {"path": f"D:/out/{i}.pdf", "type": 2, "subType": 0}, 0.0)
+             for i in range(20)]
+    for call in calls:
+        call.end, call.ok = 0.1, True
+    sim = ZW3DSimulator(str(tmp_path / "sim"), failure_rate=0.5, seed=1)
+    with SessionServer(handler=sim) as server:
+        session = session_for(server.endpoint)
+        with use_session(session):
+            report = Replayer.report(Replayer().replay(calls))
+        session.close()
+    failed = sum(1 for c in calls if not c.replay_ok)
+    assert 0 < failed < 20
+    assert report["errors"] == report["regressions"] == failed
+
+
+def test_replay_skips_foreign_tools_and_reports_deltas():
+    class Fixed:
+        def __init__(self, ok=True):
+            self.ok = ok
+
+        def run(self, **kwargs):
+            return {"ok": self.ok, "error": None if self.ok else "failed"}
+
+    calls = recorded([("c1", "zw3d_open", 1.0), ("c2", "web_search", 1.0), ("c3", "zw3d_exp", 0.5)])
+    ticks = iter([0.0, 0.25, 1.0, 2.0])
+    replayer = Replayer({"zw3d_open": Fixed(), "zw3d_exp": Fixed(ok=False)}, clock=lambda: next(ticks))
+    report = Replayer.report(replayer.replay(calls))
+    assert report["calls"] == 2
+    assert report["tools"]["zw3d_open"]["delta"] == -0.75
+    assert report["tools"]["zw3d_exp"]["regressions"] == 1
+    assert slower_than(report, 0.2) == ["zw3d_exp"]
+
+
+def test_replay_cli_against_simulator(tmp_path):
+    trace = tmp_path / "tool_calls.jsonl"
+    write_trace(trace)
+    first = tmp_path / "first.json"
+    assert autodim.main(["replay", str(trace), "--simulator", "--report", str(first)]) == 0
+    report = json.loads(first.read_text())
+    assert report["calls"] == 3 and report["errors"] == 0
+    assert set(report["tools"]) == {"zw3d_open", "zw3d_exp"}
+    assert report["tools"]["zw3d_exp"]["delta"] < 0  # the simulator answers faster than the recording
+
+    second = tmp_path / "second.json"
+    assert autodim.main(["replay", str(trace), "--simulator", "--baseline", str(first),
+                         "--report", str(second)]) == 0
+    assert json.loads(second.read_text())["reference"] == "baseline"
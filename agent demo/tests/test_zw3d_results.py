@@ -0,0 +1,97 @@
+"""Tests for event-driven result pickup."""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from tools.zw3d_results import InotifyWatcher, PollingWatcher, read_with_done_check, write_atomic
+
+BACKENDS = [PollingWatcher]
+if sys.platform.startswith("linux"):
+    BACKENDS.append(InotifyWatcher)
+
+
+@pytest.fixture(params=BACKENDS, ids=lambda cls: cls.__name__)
+def watcher(request):
+    w = request.param()
+    yield w
+    w.stop()
+
+
+def publish_later(path, text="done", delay=0.05):
+    t = threading.Timer(delay, write_atomic, args=(path, text))
+    t.start()
+    return t
+
+
+def test_wakes_when_file_is_published(watcher, tmp_path):
+    done = str(tmp_path / "stdvu_output.done")
+    publish_later(done)
+    start = time.perf_counter()
+    watcher.wait(done, timeout=2)
+    assert time.perf_counter() - start < 0.5
+    assert watcher.pending == 0
+
+
+def test_file_already_present(watcher, tmp_path):
+    done = tmp_path / "x.done"
+    done.write_text("done")
+    watcher.wait(str(done), timeout=0.1)
+
+
+def test_timeout(watcher, tmp_path):
+    with pytest.raises(TimeoutError):
+        watcher.wait(str(tmp_path / "never.done"), timeout=0.1)
+    assert watcher.pending == 0
+
+
+def test_waiters_for_same_request_share_one_entry(watcher, tmp_path):
+    done = str(tmp_path / "shared.done")
+
+    async def main():
+        tasks = [asyncio.create_task(watcher.wait_async(done, timeout=2)) for _ in range(5)]
+        await asyncio.sleep(0.02)
+        assert watcher.pending == 1
+        write_atomic(done, "done")
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert watcher.pending == 0
+
+
+def test_directory_created_later_is_polled(watcher, tmp_path):
+    later = tmp_path / "later"
+
+    def publish():
+        later.mkdir()
+        write_atomic(str(later / "x.done"), "done")
+
+    threading.Timer(0.1, publish).start()
+    watcher.wait(str(later / "x.done"), timeout=2)
+    assert watcher.pending == 0 and not watcher._polled
+
+
+def test_no_wakeup_is_lost(watcher, tmp_path):
+    # publish while the coroutines subscribe
+    async def main(k):
+        done = str(tmp_path / f"{k}.done")
+        threading.Thread(target=write_atomic, args=(done, "done")).start()
+        await asyncio.gather(*(watcher.wait_async(done, timeout=2) for _ in range(3)))
+
+    for k in range(50):
+        asyncio.run(main(k))
+    assert watcher.pending == 0
+
+
+def test_read_with_done_check_consumes_marker(tmp_path):
+    geom = str(tmp_path / "stdvu_output.json")
+    done = str(tmp_path / "stdvu_output.done")
+    write_atomic(geom, '{"entities": []}')
+    publish_later(done)
+    assert read_with_done_check(geom, done, timeout=2) == '{"entities": []}'
+    assert not os.path.exists(done)
+    assert not os.path.exists(geom + ".tmp")
@@ -0,0 +1,119 @@
+"""Tests for the persistent ZW3D session and its local stand-in server."""
+
+import socket
+import threading
+
+import pytest
+
+from LLMWrappers.baseTool import discover_tools
+from tools import zw3d_command_tool
+from tools.zw3d_session import (ProcessTransport, SessionServer, SocketTransport, ZW3DSession, format_command,
+                                parse_command, parse_endpoint, set_session)
+
+
+@pytest.fixture
+def recorded():
+    calls = []
+
+    def handler(command, params):
+        calls.append((command, params))
+        return {"stdout": f"{command} ok", "stderr": "", "return code": 0}
+
+    with SessionServer(handler=handler) as server:
+        session = ZW3DSession(SocketTransport(*parse_endpoint(server.endpoint)), verbose=False)
+        old = set_session(session)
+        yield session, calls
+        set_session(old)
+        session.close()
+
+
+def test_command_round_trip():
+    cmd = format_command("FILEOPEN", {"filePath": "D:/parts/a.Z3PRT"})
+    assert cmd == 'cmd=~FILEOPEN({"filePath":"D:/parts/a.Z3PRT"})'
+    assert parse_command(cmd) == ("FILEOPEN", {"filePath": "D:/parts/a.Z3PRT"})
+    assert parse_command("~mycommand()") == ("mycommand", None)
+
+
+def test_parse_endpoint():
+    assert parse_endpoint("10.0.0.5:6000") == ("10.0.0.5", 6000)
+    assert parse_endpoint("127.0.0.1", 7000) == ("127.0.0.1", 7000)
+    assert parse_endpoint("127.0.0.1") == ("127.0.0.1", None)  # a ZW3dRemote.exe host
+    with pytest.raises(ValueError):
+        parse_endpoint("127.0.0.1:zw3d")
+    with pytest.raises(ValueError):
+        SocketTransport(*parse_endpoint("127.0.0.1"))
+
+
+def test_session_from_env(monkeypatch):
+    monkeypatch.setenv("ZW3D_REMOTE_ENDPOINT", "10.0.0.5")
+    transport = ZW3DSession.from_env().transport
+    assert isinstance(transport, ProcessTransport) and transport.host == "10.0.0.5"
+    monkeypatch.setenv("ZW3D_REMOTE_ENDPOINT", "10.0.0.5:6000")
+    transport = ZW3DSession.from_env().transport
+    assert isinstance(transport, SocketTransport) and transport.port == 6000
+
+
+def test_session_reuses_one_connection(recorded):
+    session, calls = recorded
+    for i in range(5):
+        assert session.execute("LINDIM", {"id": i})["return code"] == 0
+    assert [c[1]["id"] for c in calls] == list(range(5))
+    assert session.commands == 5
+    assert session.transport.reconnects == 0
+
+
+def test_session_reconnects_after_drop(recorded):
+    session, calls = recorded
+    session.execute("FILEOPEN", {"filePath": "a"})
+    session.transport._sock.shutdown(socket.SHUT_RDWR)
+    result = session.execute("FILEOPEN", {"filePath": "b"})
+    assert result["return code"] == 0
+    assert session.transport.reconnects == 1
+    assert calls[-1] == ("FILEOPEN", {"filePath": "b"})
+
+
+def test_handler_error_is_reported():
+    with SessionServer(handler=lambda c, p: 1 / 0) as server:
+        s = ZW3DSession(SocketTransport(*parse_endpoint(server.endpoint)), verbose=False)
+        result = s.execute("LINDIM", {})
+        s.close()
+    assert result["return code"] == -1
+    assert "ZeroDivisionError" in result["stderr"]
+
+
+def test_malformed_reply_is_reported():
+    listener = socket.create_server(("127.0.0.1", 0))
+    port = listener.getsockname()[1]
+    s = ZW3DSession(SocketTransport("127.0.0.1", port), verbose=False)
+
+    def serve():
+        conn, _ = listener.accept()
+        with conn:
+            conn.recv(4096)
+            conn.sendall(b"ZW3D: unknown command\n")
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    result = s.execute("LINDIM", {})
+    thread.join()
+    listener.close()
+    assert result["return code"] == -1
+    assert "malformed reply" in result["stderr"]
+    assert not s.transport.connected
+
+
+def test_tools_dispatch_through_shared_session(recorded):
+    _, calls = recorded
+    result = zw3d_command_tool.ZW3DCommandRadialDimension().run(
+        id=666, point={"x": 1, "y": 2}, text_point={"x": 3, "y": 4})
+    assert result["return code"] == 0
+    [(command, params)] = calls
+    assert command == "RADIALDIM"
+    assert params.pop("requestId") and params.pop("outputDir")
+    assert params == {"id": 666, "point": {"x": 1, "y": 2}, "text point": {"x": 3, "y": 4}}
+
+
+def test_abstract_base_is_not_registered():
+    names = [t.name for t in discover_tools(zw3d_command_tool)]
+    assert "base_tool" not in names
+    assert "zw3d_lineardim" in names
@@ -0,0 +1,63 @@
+"""Tests for the local ZW3D simulator."""
+
+import json
+import os
+
+from tools import zw3d_command_tool as zw3d
+from tools import zw3d_simulator
+from tools.zw3d_results import read_json_result
+from tools.zw3d_session import ProcessTransport, SessionServer, SocketTransport, ZW3DSession, parse_endpoint, set_session
+from tools.zw3d_simulator import ZW3DSimulator, synthetic_view
+
+
+def test_synthetic_view_format():
+    view = synthetic_view(entities=50, view_id=7, origin=(100, 0))
+    assert view["view id"] == 7
+    assert len(view["entities"]) == 50
+    assert {e["type"] for e in view["entities"]} <= {"line", "arc", "circle"}
+    ids = [e["id"] for e in view["entities"]]
+    assert len(set(ids)) == len(ids)
+    circle = next(e for e in view["entities"] if e["type"] == "circle")
+    assert set(circle["points"]) == {"center", "0degree", "90degree", "180degree", "270degree"}
+
+
+def test_agent_tools_against_simulator(tmp_path):
+    sim = ZW3DSimulator(str(tmp_path), entities=30, image_size=(64, 48), seed=1)
+    with SessionServer(handler=sim) as server:
+        session = ZW3DSession(SocketTransport(*parse_endpoint(server.endpoint)), verbose=False)
+        old = set_session(session)
+        try:
+            zw3d.ZW3DCommandOpen().run(filePath="D:/parts/plate.Z3PRT")
+            view = zw3d.ZW3DCommandStdVuDim().run(path="D:/parts/plate.Z3PRT", type=1, x=0, y=0)["data"]
+            geometry = read_json_result(view["geom_data"], view["done_path"], timeout=5)
+            with open(view["img_path"], "rb") as f:
+                assert f.read(8) == b"\x89PNG\r\n\x1a\n"
+            line = next(e for e in geometry["entities"] if e["type"] == "line")
+            batch = zw3d.ZW3DCommandBatchDim().run(operations=[
+                {"type": "linear", "args": {"id": line["id"], "start_point": {"x": 0, "y": 0},
+                                            "end_point": {"x": 1, "y": 0}, "text_point": {"x": 0, "y": 1}}}])
+        finally:
+            set_session(old)
+            session.close()
+    assert len(geometry["entities"]) == 30
+    assert batch["results"][0]["status"] == "ok"
+    assert sim.counts == {"FILEOPEN": 1, "STDVUDIM": 1, "BATCHDIM": 1}
+    assert len(sim.dimensions) == 1
+
+
+def test_failure_injection(tmp_path):
+    sim = ZW3DSimulator(str(tmp_path), failure_rate=1.0)
+    result = sim("LINDIM", {"outputDir": str(tmp_path)})
+    assert result["return code"] == -1
+    with open(tmp_path / "zw3d_result.json") as f:
+        assert json.load(f)["return code"] == 1
+    assert sim("NOSUCHCMD", {})["return code"] == -1
+
+
+def test_one_shot_exe(tmp_path):
+    session = ZW3DSession(ProcessTransport(zw3d_simulator.__file__), verbose=False)
+    result = session.execute("STDVUDIM", {"path": "a.Z3PRT", "type": 1, "x": 0, "y": 0,
+                                          "outputDir": str(tmp_path)})
+    assert result["return code"] == 0
+    assert sorted(os.listdir(tmp_path)) == ["stdvu_output.done", "stdvu_output.json",
+                                            "stdvu_output.png", "zw3d_result.json"]
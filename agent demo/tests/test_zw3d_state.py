@@ -0,0 +1,130 @@
+"""Tests for the client-side ZW3D session state mirror."""
+
+import asyncio
+import json
+
+import pytest
+
+from tools import zw3d_command_tool as zw3d
+from tools.zw3d_async import ZW3DAsyncExecutor
+from tools.zw3d_pool import session_for
+from tools.zw3d_session import SessionServer, SocketTransport, ZW3DSession, parse_endpoint, set_session
+from tools.zw3d_state import SessionState
+
+
+@pytest.fixture
+def session():
+    calls = []
+
+    def handler(command, params):
+        calls.append(command)
+        code = -1 if params and params.get("filePath") == "D:/parts/broken.Z3PRT" else 0
+        if params and params.get("outputDir"):
+            # like the DLL: the outcome goes to the request's result file
+            with open(f"{params['outputDir']}/zw3d_result.json", "w", encoding="utf-8") as f:
+                json.dump({"return code": 1 if code else 0}, f)
+        return {"stdout": "", "stderr": "", "return code": code}
+
+    with SessionServer(handler=handler) as server:
+        s = ZW3DSession(SocketTransport(*parse_endpoint(server.endpoint)), verbose=False)
+        old = set_session(s)
+        yield s, calls
+        set_session(old)
+        s.close()
+
+
+def test_reopening_active_file_is_skipped(session):
+    s, calls = session
+    tool = zw3d.ZW3DCommandOpen()
+    tool.run(filePath="D:/parts/a.Z3PRT")
+    result = tool.run(filePath="d:\\parts\\A.Z3PRT")
+    assert result["return code"] == 0 and result["skipped"]
+    assert calls == ["FILEOPEN"]
+    assert s.state.skipped == 1
+
+
+def test_open_of_non_active_file_is_sent(session):
+    s, calls = session
+    s.execute("FILEOPEN", {"filePath": "a"})
+    s.execute("FILEOPEN", {"filePath": "b"})
+    s.execute("FILEACTIVE", {"filePath": "a"})
+    s.execute("FILEACTIVE", {"filePath": "a"})
+    assert calls == ["FILEOPEN", "FILEOPEN", "FILEACTIVE"]
+    assert s.state.snapshot()["root"] == "b"
+
+
+def test_blocking_and_async_paths_share_the_state():
+    calls = []
+
+    def handler(command, params):
+        calls.append((command, params["filePath"]))
+        return {"stdout": "", "stderr": "", "return code": 0}
+
+    with SessionServer(handler=handler) as server:
+        s = session_for(server.endpoint)
+
+        async def main():
+            ex = ZW3DAsyncExecutor(default_target=server.endpoint, verbose=False)
+            try:
+                await ex.execute("FILEOPEN", {"filePath": "a"})
+                # the blocking session opens another file in the same instance
+                await asyncio.get_running_loop().run_in_executor(None, s.execute, "FILEOPEN", {"filePath": "b"})
+                return await ex.execute("FILEOPEN", {"filePath": "a"})
+            finally:
+                await ex.close()
+
+        result = asyncio.run(main())
+        assert s.execute("FILEOPEN", {"filePath": "a"})["skipped"]
+        s.close()
+    assert not result.get("skipped")
+    assert calls == [("FILEOPEN", "a"), ("FILEOPEN", "b"), ("FILEOPEN", "a")]
+
+
+def test_state_changing_commands_invalidate(session):
+    s, calls = session
+    s.execute("FILEOPEN", {"filePath": "a"})
+    s.execute("LINDIM", {"id": 1})
+    s.execute("FILEOPEN", {"filePath": "a"})
+    assert calls == ["FILEOPEN", "LINDIM"]
+    s.execute("COMPINSERT", {"path": "c"})
+    s.execute("FILEOPEN", {"filePath": "a"})
+    assert calls[-1] == "FILEOPEN" and len(calls) == 4
+
+
+def test_failed_command_invalidates(session):
+    s, calls = session
+    s.execute("FILEOPEN", {"filePath": "a"})
+    s.execute("FILEOPEN", {"filePath": "D:/parts/broken.Z3PRT"})
+    assert s.state.active is None
+    s.execute("FILEOPEN", {"filePath": "a"})
+    assert len(calls) == 3
+
+
+def test_outcome_comes_from_the_result_file(tmp_path):
+    state = SessionState()
+
+    def update(command, path, code):
+        out = tmp_path / str(len(list(tmp_path.iterdir())))
+        out.mkdir()
+        if code is not None:
+            (out / "zw3d_result.json").write_text(json.dumps({"return code": code}))
+        state.update(command, {"filePath": path, "outputDir": str(out)}, {"return code": 0})
+
+    update("FILEOPEN", "a", 0)
+    assert state.active == "a"
+    update("FILEOPEN", "b", 1)  # the call succeeded, the open did not
+    assert state.active is None
+    update("FILEOPEN", "a", 0)
+    update("FILEOPEN", "a", -1)  # "already open" may be a same-named part from another folder
+    assert state.active is None and state.lookup("FILEOPEN", {"filePath": "a"}) is None
+    update("FILEACTIVE", "b", None)  # no result written
+    assert state.active is None
+    update("FILEOPEN", "a", 0)
+    state.update("FILEEXPORT", {"path": "a.pdf"}, {"return code": 0})
+    assert state.active is None
+
+
+def test_disabled_state_sends_everything():
+    state = SessionState(enabled=False)
+    state.update("FILEOPEN", {"filePath": "a"}, {"return code": 0})
+    assert state.lookup("FILEOPEN", {"filePath": "a"}) is None
@@ -0,0 +1,138 @@
+"""Tests for splitting large views into regions and merging their plans."""
+
+import json
+import threading
+import time
+
+from LLMWrappers.AutoDimAgent import GPTAutoDimensionAgent
+from tools.zw3d_analysis import find_symmetry, representatives
+from tools.zw3d_geometry import ViewGeometry
+from tools.zw3d_planner import rule_plan
+from tools.zw3d_simulator import synthetic_view
+from tools.zw3d_tiling import merge_regions, partition, split_draft
+from tools.zw3d_topology import contours
+from zw3d_helpers import circle, line, plate as bare_plate, view, xy
+
+
+def test_regions_follow_features():
+    geometry = ViewGeometry.from_json(synthetic_view(entities=5000, seed=1))
+    symmetry = find_symmetry(geometry)
+    keep = representatives(geometry, symmetry)
+    draft = rule_plan(geometry, symmetry=symmetry)
+    datums = list(draft["datums"].values())
+    start = time.perf_counter()
+    tiles = partition(geometry, 400, keep=keep, datums=datums)
+    assert time.perf_counter() - start < 1.5  # ~0.4 s on a normal machine
+    regions = tiles["regions"]
+    assert len(regions) > 8 and all(len(r["entities"]) <= 400 for r in regions)
+    # every kept entity is planned exactly once, the datums go with every region
+    planned = [i for r in regions for i in r["entities"]]
+    assert sorted(planned + datums) == sorted(keep)
+    # no slot is cut in two
+    region_of = {i: r["id"] for r in regions for i in r["entities"]}
+    for c in contours(geometry)["contours"]:
+        if c["kind"] == "slot":
+            assert len({region_of[i] for i in c["entities"]}) == 1
+    shared, drafts = split_draft(draft, tiles)
+    assert len(shared) + sum(len(d["operations"]) for d in drafts) == len(draft["operations"])
+    assert all(len(d["labeled"]) == len(d["operations"]) for d in drafts)
+    # the overall width and height reach across all regions
+    assert {op["args"]["id"] for op in shared if op["type"] == "linear"} >= set(datums)
+
+
+def plate():
+    """200 x 50 plate (lines 1-4) with holes 10 and 11 near its ends."""
+    return bare_plate(circle(10, (30, 25), 5), circle(11, (170, 25), 8), width=200)
+
+
+def test_merge_drops_duplicates_and_closed_chains():
+    geometry = plate()
+    tiles = partition(geometry, 2, datums=[1, 4])
+    assert [r["entities"] for r in tiles["regions"]] == [[3, 10], [2, 11]]
+    width = {"type": "linear", "args": {"id": 1, "start_point": xy(0, 0), "end_point": xy(200, 0),
+                                        "text_point": xy(100, -10)}}
+
+    def locate(hole, x, y):
+        return {"type": "linearoffset", "args": {"id1": 4, "id2": hole, "first_point": xy(0, 25),
+                                                 "second_point": xy(x, 25), "text_point": xy(x / 2, y)}}
+
+    left = [width, locate(10, 30, 60), {"type": "holecallout", "args": {"hole_curve_id": 10, "view_id": 7,
+                                                                        "text_point": xy(40, 40)}}]
+    # the right region repeats the width and closes the chain 30 + 140 = 170
+    between = {"type": "linearoffset", "args": {"id1": 10, "id2": 11, "first_point": xy(30, 25),
+                                                "second_point": xy(170, 25), "text_point": xy(100, 70)}}
+    right = [width, locate(11, 170, 80), between]
+    merged = merge_regions(geometry, [left, right])
+    assert len(merged["operations"]) == 4
+    assert [(d["region"], d["ids"]) for d in merged["dropped"]] == [(1, [1]), (1, [10, 11])]
+    assert merged["dropped"][0]["reason"] == "duplicate"
+    assert merged["dropped"][1]["reason"].startswith("closes a chain")
+
+
+def test_tool_names_are_merged_as_plan_types():
+    geometry = plate()
+    radial = {"hole_curve_id": 10, "view_id": 7, "text_point": xy(40, 40)}
+    left = [{"type": "holecallout", "args": radial}]
+    # the same callout recorded by its tool name, and another hole, from a second region
+    right = [{"type": "zw3d_holecalloutdim", "args": radial},
+             {"type": "zw3d_holecalloutdim", "args": {**radial, "hole_curve_id": 11}}]
+    merged = merge_regions(geometry, [left, right], constraints=False)
+    assert [(op["type"], op["args"]["hole_curve_id"]) for op in merged["operations"]] == \
+        [("holecallout", 10), ("holecallout", 11)]
+    assert merged["dropped"] == [{"region": 1, "type": "holecallout", "ids": [10], "reason": "duplicate"}]
+
+
+def test_legs_of_one_line_are_different_dimensions():
+    # 10 x 10 chamfer (5) at the top right: its horizontal and vertical legs measure the same line
+    geometry = view(line(1, (0, 0), (100, 0)), line(2, (100, 0), (100, 40)), line(5, (100, 40), (90, 50)),
+                    line(3, (90, 50), (0, 50)), line(4, (0, 50), (0, 0)))
+    leg = lambda text: {"type": "linear", "args": {"id": 5, "start_point": xy(100, 40), "end_point": xy(90, 50),
+                                                   "text_point": xy(*text)}}
+    horizontal, vertical = leg((95, 60)), leg((110, 45))
+    merged = merge_regions(geometry, [[horizontal], [vertical, leg((95, 65))]], constraints=False)
+    assert merged["operations"] == [horizontal, vertical]
+    assert merged["dropped"] == [{"region": 1, "type": "linear", "ids": [5], "reason": "duplicate"}]
+    draft = {"labeled": ["h", "v"], "operations": [horizontal, vertical]}
+    assert GPTAutoDimensionAgent._uncovered(draft, [leg((95, 70))], geometry)["labeled"] == ["v"]
+
+
+def test_agent_plans_regions_in_parallel(tmp_path, monkeypatch):
+    monkeypatch.setattr("tools.zw3d_tiling.TILE_ENTITIES", 150)
+    monkeypatch.setenv("ZW3D_DIM_HISTORY", "0")
+    monkeypatch.setattr("LLMWrappers.AutoDimAgent.save_full_messages", lambda *args, **kwargs: None)
+    view = synthetic_view(entities=1000, seed=2)
+    (tmp_path / "v.json").write_text(json.dumps(view))
+    (tmp_path / "v.done").write_text("")
+    (tmp_path / "v.png").write_bytes(b"png")
+    applied, prompts, threads = [], [], set()
+
+    class Wrapper:
+        _registry = {"zw3d_batch_dim": lambda operations: applied.append(operations) or {"ok": True}}
+
+        def run_dialog(self, messages, validator=None, **kwargs):
+            # accept the rule draft of the region after an LLM-like delay
+            texts = [part["text"] for part in messages[1]["content"] if part["type"] == "text"]
+            prompts.append(texts)
+            threads.add(threading.get_ident())
+            time.sleep(0.2)
+            (draft,) = [t for t in texts if t.startswith("A rule-based planner")]
+            operations = json.loads(draft.split("\n", 1)[1])["operations"]
+            self._registry["zw3d_batch_dim"](operations=operations)
+            return {"response": "{}", "messages": messages}
+
+    agent = GPTAutoDimensionAgent(wrapper=Wrapper(), planner="review")
+    start = time.perf_counter()
+    res = agent.generate_dimension_plan({"geom_data": str(tmp_path / "v.json"),
+                                         "done_path": str(tmp_path / "v.done"), "img_path": str(tmp_path / "v.png")})
+    elapsed = time.perf_counter() - start
+    regions = res["regions"]
+    assert res["planner"] == "tiles" and len(regions) == len(prompts) > 4
+    assert elapsed < 0.2 * len(regions) and len(threads) > 1  # one after another would take longer
+    # bounded prompts: each region's entity table stays near the limit
+    assert all(r["entities"] <= 150 for r in regions)
+    assert all(t[0].startswith("The following is the metadata") and len(t[0].splitlines()) < 200
+               for t in prompts)
+    assert sum(any("this is region 1 (" in t for t in texts) for texts in prompts) == 1
+    # recorded, merged and applied once
+    assert applied == [res["operations"]] and sum(r["operations"] for r in regions) > 0
+    assert len(res["operations"]) + len(res["dropped"]) >= sum(r["operations"] for r in regions)
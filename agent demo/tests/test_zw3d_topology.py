@@ -0,0 +1,113 @@
+"""Tests for endpoint snapping and closed-contour extraction."""
+
+import math
+import time
+
+from tools.zw3d_geometry import ViewGeometry
+from tools.zw3d_simulator import synthetic_view
+from tools.zw3d_topology import contours, endpoint_graph, format_contours
+from zw3d_helpers import arc, circle, line, view
+
+
+class Sketch:
+    """Builds a view in the stdvu_output.json format."""
+
+    def __init__(self):
+        self.entities = []
+
+    def _id(self):
+        return len(self.entities) + 1
+
+    def line(self, a, b):
+        self.entities.append(line(self._id(), a, b))
+        return self.entities[-1]["id"]
+
+    def arc(self, c, r, a0, a1):
+        at = lambda a: (math.cos(a), math.sin(a))
+        self.entities.append(arc(self._id(), c, r, at(a0), at(a1), at((a0 + a1) / 2)))
+        return self.entities[-1]["id"]
+
+    def circle(self, c, r):
+        self.entities.append(circle(self._id(), c, r))
+        return self.entities[-1]["id"]
+
+    def geometry(self):
+        return view(*self.entities, view_id=1)
+
+
+def part():
+    """100 x 60 plate with R5 fillets, a hole, a slot, a pocket holding a boss, and a centre line."""
+    s = Sketch()
+    half = math.pi / 2
+    outer = [s.line((5, 0), (95, 0)), s.arc((95, 5), 5, -half, 0), s.line((100, 5), (100, 55)),
+             s.arc((95, 55), 5, 0, half), s.line((95, 60), (5, 60)), s.arc((5, 55), 5, half, 2 * half),
+             s.line((0, 55), (0, 5)), s.arc((5, 5), 5, 2 * half, 3 * half)]
+    hole = s.circle((15, 30), 4)
+    # slot drawn in a scrambled order, with end points a few nanometres apart
+    slot = [s.arc((40, 30), 3, half, 3 * half), s.line((50, 33), (40, 33 + 1e-9)),
+            s.line((40 - 1e-9, 27), (50, 27)), s.arc((50, 30), 3, -half, half)]
+    pocket = [s.line((65, 15), (90, 15)), s.line((90, 15), (90, 45)), s.line((90, 45), (65, 45)),
+              s.line((65, 45), (65, 15))]
+    boss = s.circle((77.5, 30), 5)
+    axis = s.line((-5, 30), (105, 30.0))
+    return s.geometry(), outer, hole, slot, pocket, boss, axis
+
+
+def by_kind(topology):
+    out = {}
+    for c in topology["contours"]:
+        out.setdefault(c["kind"], []).append(c)
+    return out
+
+
+def test_snapping_joins_points_across_cell_borders():
+    geometry, *_ = part()
+    graph = endpoint_graph(geometry, tol=1e-6)
+    # 8 outer corners, 4 slot corners, 4 pocket corners, 2 axis ends
+    assert len(graph["vertices"]) == 18
+    assert (graph["degree"][graph["ends"][graph["ends"] >= 0]] >= 1).all()
+
+
+def test_features_and_nesting():
+    geometry, outer, hole, slot, pocket, boss, axis = part()
+    topology = contours(geometry, tol=1e-6)
+    kinds = by_kind(topology)
+    (profile,) = kinds["outer"]
+    assert profile["entities"] == outer and profile["parent"] is None and profile["depth"] == 0
+    assert abs(profile["area"] - (100 * 60 - (4 - math.pi) * 25)) < 1e-6
+    assert kinds["hole"][0]["entities"] == [hole] and kinds["hole"][0]["parent"] == profile["id"]
+    (slot_loop,) = kinds["slot"]
+    assert sorted(slot_loop["entities"]) == sorted(slot) and slot_loop["parent"] == profile["id"]
+    (pocket_loop,) = kinds["pocket"]
+    assert pocket_loop["entities"] == pocket and pocket_loop["children"]
+    (island,) = kinds["island"]
+    assert island["entities"] == [boss] and island["parent"] == pocket_loop["id"] and island["depth"] == 2
+    assert topology["open"] == [[axis]]
+    assert [c["area"] for c in topology["contours"]] == sorted((c["area"] for c in topology["contours"]),
+                                                               reverse=True)
+    text = format_contours(topology)
+    assert text.splitlines()[0].startswith("C0 outer: 100 x 60, entities 1 2 3")
+    assert "slot in C0" in text and f"open chain: {axis}" in text
+
+
+def test_internal_lines_stay_members_not_boundary():
+    s = Sketch()
+    # a rectangle split by a vertical web: T-junctions at (40, 0) and (40, 30)
+    edges = [s.line((0, 0), (40, 0)), s.line((40, 0), (100, 0)), s.line((100, 0), (100, 30)),
+             s.line((100, 30), (40, 30)), s.line((40, 30), (0, 30)), s.line((0, 30), (0, 0))]
+    web = s.line((40, 0), (40, 30))
+    (loop,) = contours(s.geometry())["contours"]
+    assert loop["entities"] == edges and sorted(loop["members"]) == sorted(edges + [web])
+    assert abs(loop["area"] - 3000) < 1e-6
+
+
+def test_synthetic_view_is_fast_and_complete():
+    view = synthetic_view(entities=5000, seed=1)
+    geometry = ViewGeometry.from_json(view)
+    start = time.perf_counter()
+    topology = contours(geometry)
+    assert time.perf_counter() - start < 1.5  # ~0.3 s on a normal machine
+    kinds = by_kind(topology)
+    assert len(kinds["outer"]) == 1 and not topology["open"]
+    assert len(kinds["hole"]) == sum(e["type"] == "circle" for e in view["entities"])
+    assert len(kinds["slot"]) * 4 + len(kinds["hole"]) + 4 == len(view["entities"])
@@ -0,0 +1,142 @@
+"""Tests for the pre-execution check of dimension tool calls."""
+
+import json
+import time
+
+from LLMWrappers.GPT5Wrapper import GPTToolWrapper
+from tools.zw3d_validator import PlanValidator
+from zw3d_helpers import FakeToolCall, ScriptedClient, arc, circle, plate as bare_plate, xy
+
+
+def plate():
+    """100 x 50 plate (lines 1-4), a hole (10) and a fillet arc (20)."""
+    return bare_plate(circle(10, (30, 25), 5), arc(20, (80, 25), 8, (1, 0), (-1, 0), (0, 1)))
+
+
+def linear(start, end, text, eid=1):
+    return {"id": eid, "start_point": xy(*start), "end_point": xy(*end), "text_point": xy(*text)}
+
+
+def test_valid_call_passes_unchanged():
+    v = PlanValidator(plate())
+    args = linear((0, 0), (100, 0), (50, -10))
+    verdict = v.check("zw3d_lineardim", args)
+    assert verdict["ok"] and verdict["args"] == args and not verdict["fixes"]
+    assert v.check("zw3d_open", {"filePath": "x"})["ok"]
+
+
+def test_wrong_type_is_corrected_from_the_point():
+    v = PlanValidator(plate())
+    verdict = v.check("zw3d_radialdim", {"id": 3, "point": xy(80, 33), "text_point": xy(90, 40)})
+    assert verdict["ok"] and verdict["args"]["id"] == 20
+    assert "is a line" in verdict["fixes"][0]
+
+
+def test_hallucinated_id_far_from_geometry_is_rejected():
+    v = PlanValidator(plate())
+    verdict = v.check("zw3d_radialdim", {"id": 999, "point": xy(50, 40), "text_point": xy(60, 60)})
+    assert not verdict["ok"]
+    error = PlanValidator.rejection(verdict)["error"]
+    assert "999" in error and "candidates: 10, 20" in error
+
+
+def test_points_are_snapped_and_centres_accepted():
+    v = PlanValidator(plate())
+    verdict = v.check("zw3d_lineardim", linear((0.4, 0.3), (100, 0), (50, -10)))
+    assert verdict["ok"] and verdict["args"]["start_point"] == xy(0.4, 0.0)
+    offset = {"id1": 4, "id2": 10, "first_point": xy(0, 25), "second_point": xy(30, 25), "text_point": xy(15, 60)}
+    assert v.check("zw3d_linearoffsetdim", offset)["ok"]
+    far = v.check("zw3d_lineardim", linear((0, 20), (100, 0), (50, -10), eid=1))
+    assert not far["ok"] and "away from line 1" in far["errors"][0]
+
+
+def test_hole_callout_view_id_and_type():
+    v = PlanValidator(plate())
+    verdict = v.check("zw3d_holecalloutdim", {"hole_curve_id": 10, "view_id": 3, "text_point": xy(40, 40)})
+    assert verdict["ok"] and verdict["args"]["view_id"] == 7
+    assert not v.check("zw3d_holecalloutdim", {"hole_curve_id": 20, "view_id": 7, "text_point": [1, 1]})["ok"]
+
+
+def test_duplicates_in_dialog_and_batch():
+    v = PlanValidator(plate())
+    first = v.check("zw3d_lineardim", linear((0, 0), (100, 0), (50, -10)))
+    # same measurement, text elsewhere and points swapped
+    again = v.check("zw3d_lineardim", linear((100, 0), (0, 0), (30, -20)))
+    assert first["ok"] and not again["ok"] and "duplicate" in again["errors"][0]
+    # a failed dimension may be retried
+    v.done(first, {"stdout": "", "stderr": "LINDIM failed", "return code": 3})
+    assert v.applied == []
+    retry = v.check("zw3d_lineardim", linear((100, 0), (0, 0), (30, -20)))
+    assert retry["ok"]
+    v.done(retry, {"stdout": "", "stderr": "", "return code": 0})
+    assert len(v.applied) == 1
+    assert not v.check("zw3d_lineardim", linear((0, 0), (100, 0), (50, -20)))["ok"]
+
+    ops = [{"type": "radial", "args": {"id": 20, "point": xy(80, 33), "text_point": xy(90, 40)}},
+           {"type": "radial", "args": {"id": 20, "point": xy(88, 25), "text_point": xy(95, 30)}},
+           {"type": "holecallout", "args": {"hole_curve_id": 10, "view_id": 7, "text_point": xy(40, 40)}}]
+    batch = v.check("zw3d_batch_dim", {"operations": ops})
+    assert batch["ok"] and [op["type"] for op in batch["args"]["operations"]] == ["radial", "holecallout"]
+    assert "operation 1: duplicate" in batch["fixes"][0]
+    # one bad operation rejects the batch and releases what it claimed
+    bad = v.check("zw3d_batch_dim", {"operations": [
+        {"type": "radial", "args": {"id": 10, "point": xy(35, 25), "text_point": xy(45, 30)}},
+        {"type": "arclength", "args": {"arc_id": 1, "arc_point": xy(50, 0), "text_point": xy(50, -5)}}]})
+    assert not bad["ok"] and bad["errors"][0].startswith("operation 1:")
+    assert v.check("zw3d_radialdim", {"id": 10, "point": xy(35, 25), "text_point": xy(45, 30)})["ok"]
+
+
+def test_labels_are_placed_clear_of_applied_ones():
+    v = PlanValidator(plate(), place=True)
+    width = v.check("zw3d_lineardim", linear((0, 0), (100, 0), (50, -10)))
+    assert width["ok"] and width["args"]["text_point"] == xy(50, -10)  # nothing in the way
+    v.done(width, {"ok": True})
+    # the model puts the next label on top of the first one
+    offset = {"id1": 4, "id2": 10, "first_point": xy(0, 25), "second_point": xy(30, 25), "text_point": xy(15, 60)}
+    v.done(v.check("zw3d_linearoffsetdim", offset), {"ok": True})
+    batch = v.check("zw3d_batch_dim", {"operations": [
+        {"type": "linear", "args": linear((0, 0), (30, 0), (50, -10))}]})
+    assert batch["ok"] and "moved clear" in batch["fixes"][-1]
+    sent = batch["args"]["operations"][0]["args"]["text_point"]
+    assert sent != xy(50, -10) and sent["y"] < 0  # still below the edge it measures
+    assert batch["operations"][0]["args"]["text_point"] == sent
+
+
+def test_check_is_cheap():
+    v = PlanValidator(plate())
+    start = time.perf_counter()
+    for i in range(1000):
+        v.check("zw3d_linearoffsetdim", {"id1": 4, "id2": 10, "first_point": xy(0, 25),
+                                         "second_point": xy(30, 25), "text_point": xy(15, 60 + i)})
+    assert time.perf_counter() - start < 0.5  # ~50 us per call
+
+
+class RecordingRadial:
+    name = "zw3d_radialdim"
+
+    def __init__(self):
+        self.calls = []
+
+    def get_tool_definition(self):
+        return {"type": "function", "function": {"name": self.name, "parameters": {"type": "object"}}}
+
+    def run(self, **kwargs):
+        self.calls.append(kwargs)
+        return {"ok": True, "data": {"return code": 0}}
+
+
+def test_run_dialog_rejects_before_dispatch(monkeypatch):
+    monkeypatch.setattr("LLMWrappers.GPT5Wrapper.count_messages_tokens", lambda messages: 0)
+    turns = [("done", [FakeToolCall("c1", "zw3d_radialdim", {"id": 999, "point": xy(50, 40), "text_point": xy(1, 1)}),
+                       FakeToolCall("c2", "zw3d_radialdim", {"id": 3, "point": xy(80, 33), "text_point": xy(1, 1)})]),
+             ("done", None)]
+    tool = RecordingRadial()
+    wrapper = GPTToolWrapper(api_key="test")
+    wrapper._log_jsonl = lambda obj: None
+    wrapper.client = ScriptedClient(turns)
+    wrapper.register_tool(tool)
+    result = wrapper.run_dialog([{"role": "user", "content": "go"}], validator=PlanValidator(plate()))
+    assert [c["id"] for c in tool.calls] == [20]  # only the corrected call reached the tool
+    replies = [json.loads(m["content"]) for m in result["messages"] if m["role"] == "tool"]
+    assert replies[0]["ok"] is False and replies[0]["error"].startswith("rejected before execution")
+    assert replies[1]["ok"] and replies[1]["fixes"]
@@ -0,0 +1,77 @@
+"""Geometry and LLM stand-ins shared by the ZW3D tests.
+
+Entities are built in the ``stdvu_output.json`` format the DLL writes, so
+``view(...)`` goes through the same ``ViewGeometry.from_json`` as real
+extractions. Views whose exact ids and positions do not matter should use
+``tools.zw3d_simulator.synthetic_view`` instead.
+"""
+
+import json
+from types import SimpleNamespace
+
+from tools.zw3d_geometry import ViewGeometry
+
+
+def xy(x, y):
+    return {"x": x, "y": y}
+
+
+def line(i, a, b):
+    return {"id": i, "type": "line", "points": {
+        "start": list(a), "end": list(b), "middle": [(a[0] + b[0]) / 2, (a[1] + b[1]) / 2]}}
+
+
+def circle(i, c, r):
+    return {"id": i, "type": "circle", "points": {
+        "center": list(c), "0degree": [c[0] + r, c[1]], "90degree": [c[0], c[1] + r],
+        "180degree": [c[0] - r, c[1]], "270degree": [c[0], c[1] - r]}}
+
+
+def arc(i, c, r, start, end, mid):
+    """Arc of radius ``r`` around ``c``; ``start``, ``end`` and ``mid`` are unit directions from the centre."""
+    at = lambda d: [c[0] + r * d[0], c[1] + r * d[1]]
+    return {"id": i, "type": "arc", "points": {"center": list(c), "start": at(start), "end": at(end),
+                                               "middle": at(mid)}}
+
+
+def rectangle(first_id, origin, w, h):
+    """The four edges of a w x h rectangle, counter-clockwise from the bottom edge."""
+    ox, oy = origin
+    corners = [(ox, oy), (ox + w, oy), (ox + w, oy + h), (ox, oy + h)]
+    return [line(first_id + k, corners[k], corners[(k + 1) % 4]) for k in range(4)]
+
+
+def view(*entities, view_id=7, view_type=1):
+    return ViewGeometry.from_json({"view id": view_id, "view": view_type, "entities": list(entities)})
+
+
+def plate(*extra, width=100, height=50):
+    """width x height plate (lines 1-4) from the origin, with ``extra`` entities."""
+    return view(*rectangle(1, (0, 0), width, height), *extra)
+
+
+class FakeToolCall:
+    """A tool call of a chat completion message."""
+
+    def __init__(self, call_id, name, args):
+        self.id = call_id
+        self.function = SimpleNamespace(name=name, arguments=json.dumps(args))
+
+    def model_dump(self):
+        return {"id": self.id, "type": "function",
+                "function": {"name": self.function.name, "arguments": self.function.arguments}}
+
+
+class ScriptedClient:
+    """Chat client that plays back a fixed list of assistant turns."""
+
+    def __init__(self, turns):
+        self.turns = list(turns)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        content, tool_calls = self.turns[self.calls]
+        self.calls += 1
+        message = SimpleNamespace(content=content, tool_calls=tool_calls or None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
@@ -87,8 +87,8 @@ class GPTAutoDimensionAgent:
     def generate_dimension_plan(self, result: json) -> str:
         load_dotenv()
 
-        from tools.deepseek_wrapper import read_with_done_check
-        geometry_data = read_with_done_check(result["geom_data"], result["done_path"])
+        from tools.zw3d_geometry import ViewGeometry
+        geometry = ViewGeometry.load(result["geom_data"], result["done_path"])
 
         with open(result["img_path"], "rb") as f:
             img_base64 = base64.b64encode(f.read()).decode("utf-8")
@@ -104,7 +104,7 @@ class GPTAutoDimensionAgent:
             {
                 "role": "user",
                 "content": [
-                    {"type": "text", "text": f"以下是图元数据：\n{json.dumps(geometry_data, ensure_ascii=False, indent=2)}\n,请调用工具完成线性长度标注与距离标注"},
+                    {"type": "text", "text": f"以下是图元数据：\n{json.dumps(geometry.to_json(), ensure_ascii=False, indent=2)}\n,请调用工具完成线性长度标注与距离标注"},
                     image_content
                 ]
             }
@@ -8,22 +8,8 @@ from tools.tool_decorator import auto_fallback_if_incomplete
 from .auto_dimension_prompts import build_dimension_prompt, build_linear_dimension_prompt
 import tools.GPTAgent
 
-import time, os
-
-def wait_for_done(done_path: str, timeout=5.0):
-    import time
-    start = time.time()
-    while not os.path.exists(done_path):
-        if time.time() - start > timeout:
-            raise TimeoutError(f"Timeout waiting for {done_path}")
-        time.sleep(0.05)
-
-def read_with_done_check(json_path: str, done_path: str):
-    wait_for_done(done_path)
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = f.read()
-    os.remove(done_path)  # ✅ 删除 done 文件
-    return data
+# kept here for existing imports; result pickup now lives in tools.zw3d_results
+from tools.zw3d_results import wait_for_done, read_with_done_check
 
 
 class DeepseekToolWrapper:
@@ -0,0 +1,388 @@
+"""
+Geometric analysis of a view for dimension planning.
+
+``parallel_pairs`` finds LINOFFSETDIM candidates -- pairs of parallel lines
+with their perpendicular distance and overlap -- without an O(n^2) loop:
+
+1. every line gets its direction angle in [0, pi); lines are sorted by angle
+   and split into direction groups wherever the gap between consecutive
+   angles exceeds ``angle_tol`` (the group at pi wraps around to 0);
+2. inside a group, lines are sorted by their offset along the group normal,
+   so near-parallel neighbours are adjacent;
+3. each line is paired with its ``neighbors`` next lines in that order and
+   with the two outermost lines of its group (outer edges and datums, which
+   give overall and baseline dimensions);
+4. the pairs are filtered (exact angle check, collinear pairs dropped) and
+   ranked: largest overlap fraction first, then smallest distance.
+
+The result is a structured array (``PAIR_DTYPE``); ``format_pairs`` turns the
+top rows into a compact table for prompts.
+
+``find_symmetry`` finds vertical/horizontal mirror axes and repeated holes
+(linear rows, rectangular grids, bolt circles) from hashed, quantized
+coordinates, so repeated entities can be sent to the planner and the model
+as one representative plus a count (``representatives``,
+``format_symmetry``).
+"""
+from __future__ import annotations
+
+import math
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+from tools.zw3d_geometry import CIRCLE, ViewGeometry
+
+PAIR_DTYPE = np.dtype([
+    ("id1", "<i8"),
+    ("id2", "<i8"),
+    ("distance", "<f8"),     # perpendicular distance between the two lines
+    ("overlap", "<f8"),      # length of the common span along the lines (negative: gap)
+    ("overlap_frac", "<f8"),  # overlap / length of the shorter line
+    ("angle", "<f8"),        # direction of the pair, degrees in [0, 180)
+])
+
+
+def direction_groups(angles: np.ndarray, angle_tol: float):
+    """
+    Sort ``angles`` (radians in [0, pi)) and group them.
+
+    Returns (order, group, unwrapped): ``order`` sorts the input, ``group``
+    and ``unwrapped`` are per sorted position; angles of a group that wraps
+    around pi are shifted by -pi so a group is contiguous in ``unwrapped``.
+    """
+    order = np.argsort(angles, kind="stable")
+    a = angles[order]
+    if not len(a):
+        return order, np.zeros(0, dtype=np.int64), a
+    group = np.concatenate([[0], np.cumsum(np.diff(a) > angle_tol)])
+    unwrapped = a.copy()
+    if group[-1] > 0 and a[0] + math.pi - a[-1] <= angle_tol:
+        last = group == group[-1]
+        group[last] = 0
+        unwrapped[last] -= math.pi
+    return order, group, unwrapped
+
+
+def parallel_pairs(geometry: ViewGeometry, angle_tol: float = math.radians(0.5), neighbors: int = 8,
+                   min_distance: Optional[float] = None, max_distance: Optional[float] = None,
+                   min_overlap: Optional[float] = None) -> np.ndarray:
+    """
+    Ranked parallel line pairs of the view (see module docstring).
+
+    ``min_distance`` defaults to a tiny fraction of the view size (drops
+    collinear pairs); ``min_overlap`` (absolute length) is off by default.
+    """
+    lines = geometry.lines
+    n = len(lines)
+    if n < 2:
+        return np.zeros(0, dtype=PAIR_DTYPE)
+    start, end = lines["start"], lines["end"]
+    if min_distance is None:
+        pts = np.concatenate([start, end])
+        min_distance = 1e-6 * max(float(np.ptp(pts, axis=0).max()), 1e-9)
+
+    d = end - start
+    length = np.hypot(d[:, 0], d[:, 1])
+    angles = np.mod(np.arctan2(d[:, 1], d[:, 0]), math.pi)
+    order, group, unwrapped = direction_groups(angles, angle_tol)
+
+    # each group's mean direction; project the lines on it
+    counts = np.bincount(group)
+    mean = np.bincount(group, weights=unwrapped) / np.maximum(counts, 1)
+    phi = mean[group]
+    u = np.stack([np.cos(phi), np.sin(phi)], axis=1)
+    nrm = np.stack([-u[:, 1], u[:, 0]], axis=1)
+    start, end, mid = start[order], end[order], lines["mid"][order]
+    rho = np.einsum("ij,ij->i", nrm, mid)
+    t0 = np.einsum("ij,ij->i", u, start)
+    t1 = np.einsum("ij,ij->i", u, end)
+    lo, hi = np.minimum(t0, t1), np.maximum(t0, t1)
+
+    # sort by (group, offset): neighbours in offset are adjacent positions
+    pos = np.lexsort((rho, group))
+    inv = np.empty(n, dtype=np.int64)
+    inv[pos] = np.arange(n)
+    g_sorted = group[pos]
+    first = np.searchsorted(g_sorted, g_sorted, side="left")
+    last = np.searchsorted(g_sorted, g_sorted, side="right") - 1
+
+    a_parts, b_parts = [], []
+    idx = np.arange(n)
+    for s in range(1, max(1, neighbors) + 1):
+        ok = (idx + s < n)
+        ok[ok] &= g_sorted[idx[ok] + s] == g_sorted[idx[ok]]
+        a_parts.append(idx[ok])
+        b_parts.append(idx[ok] + s)
+    a_parts += [first, idx]
+    b_parts += [idx, last]
+    a = np.concatenate(a_parts)
+    b = np.concatenate(b_parts)
+    keep = a != b
+    a, b = np.minimum(a[keep], b[keep]), np.maximum(a[keep], b[keep])
+    pairs = np.unique(a * n + b)
+    a, b = pos[pairs // n], pos[pairs % n]  # back to positions in the angle order
+
+    dist = np.abs(rho[a] - rho[b])
+    overlap = np.minimum(hi[a], hi[b]) - np.maximum(lo[a], lo[b])
+    shorter = np.minimum(length[order][a], length[order][b])
+    frac = overlap / np.where(shorter > 0, shorter, 1.0)
+    ok = (np.abs(unwrapped[a] - unwrapped[b]) <= angle_tol) & (dist > min_distance)
+    if max_distance is not None:
+        ok &= dist <= max_distance
+    if min_overlap is not None:
+        ok &= overlap >= min_overlap
+    a, b, dist, overlap, frac = a[ok], b[ok], dist[ok], overlap[ok], frac[ok]
+
+    # rank on contiguous arrays; ties keep the (deterministic) pair order
+    rank = np.lexsort((dist, -np.round(frac, 6)))
+    a, b = a[rank], b[rank]
+    ids = lines["id"][order]
+    out = np.empty(len(a), dtype=PAIR_DTYPE)
+    out["id1"], out["id2"] = np.minimum(ids[a], ids[b]), np.maximum(ids[a], ids[b])
+    out["distance"], out["overlap"], out["overlap_frac"] = dist[rank], overlap[rank], frac[rank]
+    out["angle"] = np.degrees(np.mod(phi[a], math.pi))
+    return out
+
+
+def format_pairs(pairs: np.ndarray, limit: int = 40) -> str:
+    """Top ``limit`` pairs as a compact table (one line per pair) for prompts."""
+    rows = ["id1 id2 distance overlap angle"]
+    for p in pairs[:limit]:
+        rows.append(f"{int(p['id1'])} {int(p['id2'])} {p['distance']:.4g} {p['overlap']:.4g} {p['angle']:.1f}")
+    return "\n".join(rows)
+
+
+# symmetry and patterns
+
+def _tolerance(geometry: ViewGeometry, tol: Optional[float]) -> float:
+    if tol is not None:
+        return tol
+    xmin, ymin, xmax, ymax = geometry.bbox()
+    return max(1e-4 * max(xmax - xmin, ymax - ymin), 1e-6)
+
+
+def entity_keys(entities: np.ndarray, tol: float) -> np.ndarray:
+    """
+    (n, 8) int64 signature per entity from quantized coordinates: type,
+    radius, the two end points in sorted order and the mid point (the centre
+    for circles). Equal rows mean the same entity up to ``tol``; mirroring
+    swaps the end points, which the sorting absorbs.
+    """
+    q = lambda v: np.round(np.nan_to_num(v) / tol).astype(np.int64)
+    a, b = q(entities["start"]), q(entities["end"])
+    circle = entities["type"] == CIRCLE
+    a[circle] = b[circle] = 0  # quadrant points of a mirrored circle are not the same points
+    swap = (a[:, 0] > b[:, 0]) | ((a[:, 0] == b[:, 0]) & (a[:, 1] > b[:, 1]))
+    lo = np.where(swap[:, None], b, a)
+    hi = np.where(swap[:, None], a, b)
+    mid = np.where(circle[:, None], q(entities["center"]), q(entities["mid"]))
+    return np.column_stack([entities["type"].astype(np.int64), q(entities["radius"]), lo, hi, mid])
+
+
+def mirrored(entities: np.ndarray, axis: int, at: float) -> np.ndarray:
+    """Copy of ``entities`` reflected across x = at (axis 0) or y = at (axis 1)."""
+    out = entities.copy()
+    for field in ("start", "end", "mid", "center"):
+        out[field][:, axis] = 2 * at - out[field][:, axis]
+    return out
+
+
+def _key_set(keys: np.ndarray) -> Set[bytes]:
+    return set(map(bytes, np.ascontiguousarray(keys)))
+
+
+def mirror_axes(geometry: ViewGeometry, tol: Optional[float] = None, min_score: float = 0.9) -> List[Dict[str, Any]]:
+    """
+    Vertical and horizontal mirror axes through the view centre (and through
+    the hole centroid when it differs). ``score`` is the fraction of entities
+    whose mirror image is also in the view.
+    """
+    if not len(geometry):
+        return []
+    tol = _tolerance(geometry, tol)
+    e = geometry.entities
+    keys = entity_keys(e, tol)
+    present = _key_set(keys)
+    xmin, ymin, xmax, ymax = geometry.bbox()
+    holes = geometry.circles["center"]
+    found = []
+    for axis, name, center in ((0, "vertical", (xmin + xmax) / 2), (1, "horizontal", (ymin + ymax) / 2)):
+        candidates = [center]
+        if len(holes) and abs(holes[:, axis].mean() - center) > tol:
+            candidates.append(float(holes[:, axis].mean()))
+        for at in candidates:
+            mkeys = entity_keys(mirrored(e, axis, at), tol)
+            match = np.fromiter((bytes(k) in present for k in np.ascontiguousarray(mkeys)), dtype=bool, count=len(e))
+            score = float(match.mean())
+            if score >= min_score:
+                # entities on the far side whose mirror exists are redundant for dimensioning
+                side = e["mid"][:, axis] if axis == 0 else e["mid"][:, 1]
+                side = np.where(e["type"] == CIRCLE, e["center"][:, axis], side)
+                far = match & (side > at + tol)
+                found.append({"axis": name, "at": round(float(at), 6), "score": round(score, 4),
+                              "mirrored_ids": [int(i) for i in e["id"][far]]})
+                break
+    return found
+
+
+def _runs(values: np.ndarray, tol: float, min_count: int):
+    """(first, last, step) of every maximal run of equal steps in sorted ``values`` with >= min_count values."""
+    steps = np.diff(values)
+    i = 0
+    while i < len(steps):
+        j = i
+        while j + 1 < len(steps) and abs(steps[j + 1] - steps[i]) <= tol:
+            j += 1
+        if j - i + 2 >= min_count and steps[i] > tol:
+            yield i, j + 1, float(steps[i])
+            i = j + 1
+        else:
+            i += 1
+
+
+def _linear_patterns(ids: np.ndarray, centers: np.ndarray, tol: float, min_count: int) -> List[Dict[str, Any]]:
+    """Equally spaced runs along rows/columns; equal rows stacked at an equal pitch become one grid."""
+    qx = np.round(centers[:, 0] / tol).astype(np.int64)
+    qy = np.round(centers[:, 1] / tol).astype(np.int64)
+    lines = {0: defaultdict(list), 1: defaultdict(list)}
+    for i in range(len(ids)):
+        lines[0][qy[i]].append(i)  # a row: same y, runs along x
+        lines[1][qx[i]].append(i)  # a column: same x, runs along y
+    runs = {0: [], 1: []}
+    for axis in (0, 1):
+        for members in lines[axis].values():
+            if len(members) < min_count:
+                continue
+            members = sorted(members, key=lambda i: centers[i, axis])
+            for first, last, pitch in _runs(centers[members, axis], tol, min_count):
+                runs[axis].append((members[first:last + 1], pitch))
+
+    patterns = []
+    used = set()
+    # grid: rows with the same x positions, stacked at an equal pitch in y
+    by_shape = defaultdict(list)
+    for members, _ in runs[0]:
+        by_shape[tuple(qx[members])].append(members)
+    for rows in by_shape.values():
+        if len(rows) < 2:
+            continue
+        rows.sort(key=lambda m: centers[m[0], 1])
+        for first, last, pitch_y in _runs(np.array([centers[m[0], 1] for m in rows]), tol, 2):
+            block = rows[first:last + 1]
+            members = [i for m in block for i in m]
+            used.update(members)
+            patterns.append({"kind": "grid", "ids": [int(ids[i]) for i in members],
+                             "rows": len(block), "cols": len(block[0]),
+                             "pitch": [round(float(centers[block[0][1], 0] - centers[block[0][0], 0]), 6),
+                                       round(pitch_y, 6)]})
+    for axis in (0, 1):
+        for members, pitch in runs[axis]:
+            if used.intersection(members):
+                continue
+            used.update(members)
+            patterns.append({"kind": "linear", "ids": [int(ids[i]) for i in members],
+                             "direction": "x" if axis == 0 else "y", "pitch": round(pitch, 6)})
+    return patterns
+
+
+def _circumcenter(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> Optional[np.ndarray]:
+    d = 2 * (a[0] * (b[1] - c[1]) + b[0] * (c[1] - a[1]) + c[0] * (a[1] - b[1]))
+    if abs(d) < 1e-12:
+        return None
+    sa, sb, sc = a @ a, b @ b, c @ c
+    return np.array([sa * (b[1] - c[1]) + sb * (c[1] - a[1]) + sc * (a[1] - b[1]),
+                     sa * (c[0] - b[0]) + sb * (a[0] - c[0]) + sc * (b[0] - a[0])]) / d
+
+
+def _circular_pattern(ids: np.ndarray, centers: np.ndarray, pivots: Set[tuple], tol: float,
+                      min_count: int) -> Optional[Dict[str, Any]]:
+    """
+    All centres on one circle, equally spaced in angle: a full bolt circle,
+    or an open arc of equal steps around an existing arc/circle centre.
+    """
+    n = len(ids)
+    if n < min_count:
+        return None
+    pivot = _circumcenter(centers[0], centers[n // 3], centers[(2 * n) // 3])
+    if pivot is None:
+        return None
+    v = centers - pivot
+    dist = np.hypot(v[:, 0], v[:, 1])
+    if np.ptp(dist) > tol:
+        return None
+    angles = np.mod(np.arctan2(v[:, 1], v[:, 0]), 2 * math.pi)
+    order = np.argsort(angles)
+    steps = np.diff(np.concatenate([angles[order], [angles[order][0] + 2 * math.pi]]))
+    step = float(np.median(steps))
+    regular = np.abs(steps - step) <= tol / dist.mean()
+    if not regular.all():
+        known = tuple(np.round(pivot / tol).astype(np.int64)) in pivots
+        if not known or regular.sum() < len(steps) - 1:
+            return None
+        order = np.roll(order, -int(np.argmin(regular)) - 1)  # start after the gap
+    return {"kind": "circular", "ids": [int(ids[i]) for i in order],
+            "center": [round(float(pivot[0]), 6), round(float(pivot[1]), 6)],
+            "pitch_radius": round(float(dist.mean()), 6),
+            "angle_step": round(math.degrees(step), 4)}
+
+
+def hole_patterns(geometry: ViewGeometry, tol: Optional[float] = None, min_count: int = 3) -> List[Dict[str, Any]]:
+    """Repeated circles of the same radius: bolt circles, grids and rows. Largest patterns first."""
+    tol = _tolerance(geometry, tol)
+    circles = geometry.circles
+    centers = np.concatenate([circles["center"], geometry.arcs["center"]])
+    pivots = set(map(tuple, np.round(centers / tol).astype(np.int64).tolist()))
+    patterns = []
+    radius_key = np.round(circles["radius"] / tol).astype(np.int64)
+    for key in np.unique(radius_key):
+        group = circles[radius_key == key]
+        if len(group) < min_count:
+            continue
+        ids, centers = group["id"], group["center"]
+        circular = _circular_pattern(ids, centers, pivots, tol, min_count)
+        found = [circular] if circular else _linear_patterns(ids, centers, tol, min_count)
+        for p in found:
+            p["radius"] = round(float(group["radius"][0]), 6)
+            p["count"] = len(p["ids"])
+            p["representative"] = p["ids"][0]
+        patterns.extend(found)
+    patterns.sort(key=lambda p: -p["count"])
+    return patterns
+
+
+def find_symmetry(geometry: ViewGeometry, tol: Optional[float] = None) -> Dict[str, Any]:
+    """Mirror axes and hole patterns of a view."""
+    return {"mirror_axes": mirror_axes(geometry, tol), "patterns": hole_patterns(geometry, tol)}
+
+
+def representatives(geometry: ViewGeometry, findings: Dict[str, Any]) -> List[int]:
+    """Ids to keep when repeated entities are collapsed: pattern members and mirror images removed."""
+    drop: Set[int] = set()
+    for p in findings.get("patterns", []):
+        drop.update(p["ids"][1:])
+    for axis in findings.get("mirror_axes", []):
+        drop.update(axis["mirrored_ids"])
+    drop.difference_update(p["representative"] for p in findings.get("patterns", []))
+    ordered = geometry.entities["id"][np.argsort(geometry.entities["order"], kind="stable")]
+    return [int(i) for i in ordered if int(i) not in drop]
+
+
+def format_symmetry(findings: Dict[str, Any]) -> str:
+    """Short text of the findings for prompts."""
+    rows = []
+    for a in findings.get("mirror_axes", []):
+        rows.append(f"mirror axis: {a['axis']} at {a['at']:g} (score {a['score']:.2f}); "
+                    f"{len(a['mirrored_ids'])} mirrored entities omitted: {a['mirrored_ids']}")
+    for p in findings.get("patterns", []):
+        if p["kind"] == "circular":
+            detail = (f"center {p['center']}, pitch radius {p['pitch_radius']:g}, "
+                      f"angle step {p['angle_step']:g} deg")
+        elif p["kind"] == "grid":
+            detail = f"{p['rows']} rows x {p['cols']} cols, pitch {p['pitch']}"
+        else:
+            detail = f"along {p['direction']}, pitch {p['pitch']:g}"
+        rows.append(f"{p['kind']} pattern of {p['count']} holes R{p['radius']:g} ({detail}); "
+                    f"representative {p['representative']}, members {p['ids']}")
+    return "\n".join(rows)
@@ -0,0 +1,248 @@
+"""
+asyncio executor for ZW3D remote commands.
+
+``ZW3DCommand*.run`` blocks for up to the command timeout. ``ZW3DAsyncExecutor``
+runs commands as asyncio tasks instead, so non-conflicting work (exports of
+different files, several views, several parts) can overlap:
+
+- one transport per *target* (``host:port`` for the persistent session
+  protocol, anything else for one ``ZW3dRemote.exe`` process per command);
+- a per-target concurrency limit (``asyncio.Semaphore``);
+- an optional conflict key (usually the file path) that serialises commands
+  touching the same file;
+- the target's ``SessionState`` (``state_for``, shared with the blocking
+  ``ZW3DSession`` of the same instance) answers no-op open/activate
+  commands locally;
+- every command gets its own task/future and can be cancelled. A cancelled
+  process is killed; a cancelled socket command is only abandoned locally,
+  because ZW3D may already be executing it.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sys
+import time
+import weakref
+from typing import Any, Dict, Optional
+
+from tools.zw3d_session import DEFAULT_EXE, DEFAULT_HOST, DEFAULT_TIMEOUT, format_command, parse_endpoint
+from tools.zw3d_state import SessionState, state_for
+
+DEFAULT_TARGET_LIMIT = int(os.getenv("ZW3D_TARGET_CONCURRENCY", "1"))
+
+
+def _result(stdout: str = "", stderr: str = "", code: int = 0) -> Dict[str, Any]:
+    return {"stdout": stdout, "stderr": stderr, "return code": code}
+
+
+class AsyncProcessTransport:
+    """One ``ZW3dRemote.exe`` (or stand-in script) process per command."""
+
+    def __init__(self, exe: str = DEFAULT_EXE, host: str = DEFAULT_HOST):
+        self.exe = exe
+        self.host = host
+
+    async def execute(self, cmd: str, timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+        prefix = [sys.executable, self.exe] if self.exe.endswith(".py") else [self.exe]
+        proc = await asyncio.create_subprocess_exec(
+            *prefix, "-r", self.host, cmd,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            cwd=os.path.dirname(self.exe) or None)
+        try:
+            out, err = await asyncio.wait_for(proc.communicate(), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            proc.kill()
+            await proc.wait()
+            raise
+        return _result(out.decode(errors="replace").strip(), err.decode(errors="replace").strip(), proc.returncode)
+
+    async def close(self):
+        pass
+
+
+class AsyncSocketTransport:
+    """Pipelined commands over one persistent session connection.
+
+    Requests are tagged with a sequence number and replies are matched back to
+    their futures, so several commands can be in flight on the same socket.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reconnects = 0
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._seq = 0
+        self._connect_lock = asyncio.Lock()
+
+    async def _connect(self):
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            if self._reader_task is not None:
+                self.reconnects += 1
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            self._reader_task = asyncio.create_task(self._read_replies(self._reader))
+
+    async def _read_replies(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                fut = self._pending.pop(msg.get("seq"), None)
+                if fut is not None and not fut.done():
+                    fut.set_result(_result(msg.get("stdout", ""), msg.get("stderr", ""), msg.get("return code", 0)))
+        except (OSError, ValueError):
+            pass
+        finally:
+            if self._reader is reader:
+                self._drop("connection closed by ZW3D before reply")
+
+    def _drop(self, reason: str):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        pending, self._pending = self._pending, {}
+        for fut in pending.values():
+            if not fut.done():
+                fut.set_result(_result(stderr=reason, code=-1))
+
+    async def execute(self, cmd: str, timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+        await self._connect()
+        self._seq += 1
+        seq = self._seq
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[seq] = fut
+        line = json.dumps({"seq": seq, "cmd": cmd}, ensure_ascii=False) + "\n"
+        try:
+            self._writer.write(line.encode("utf-8"))
+            await self._writer.drain()
+            return await asyncio.wait_for(asyncio.shield(fut), timeout)
+        except asyncio.TimeoutError:
+            return _result(stderr=f"no reply within {timeout}s", code=-1)
+        except OSError as e:
+            self._drop(f"send failed: {e}")
+            return _result(stderr=f"send failed: {e}", code=-1)
+        finally:
+            self._pending.pop(seq, None)
+
+    async def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        self._drop("session closed")
+
+
+def make_transport(target: str):
+    """``host:port`` -> persistent session; bare host -> one process per command."""
+    host, port = parse_endpoint(target)
+    if port:
+        return AsyncSocketTransport(host, port)
+    return AsyncProcessTransport(host=host)
+
+
+class ZW3DAsyncExecutor:
+    """Run ZW3D commands concurrently with a per-target limit."""
+
+    def __init__(self, default_target: Optional[str] = None, limit: int = DEFAULT_TARGET_LIMIT,
+                 limits: Optional[Dict[str, int]] = None, transport_factory=make_transport,
+                 verbose: bool = True):
+        self.default_target = default_target or os.getenv("ZW3D_REMOTE_ENDPOINT") or DEFAULT_HOST
+        self.limit = limit
+        self.limits = dict(limits or {})
+        self.transport_factory = transport_factory
+        self.verbose = verbose
+        self.stats = {"submitted": 0, "completed": 0, "cancelled": 0, "busy_time": 0.0}
+        self._transports: Dict[str, Any] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.states: Dict[str, SessionState] = {}
+        self._key_locks: Dict[str, asyncio.Lock] = {}
+        self._tasks: set = set()
+
+    def _transport(self, target: str):
+        if target not in self._transports:
+            self._transports[target] = self.transport_factory(target)
+            self._semaphores[target] = asyncio.Semaphore(self.limits.get(target, self.limit))
+            self.states[target] = state_for(target)
+        return self._transports[target]
+
+    async def execute(self, command: str, payload: Any = None, target: Optional[str] = None,
+                      key: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+        """Run one command; commands sharing ``key`` never overlap."""
+        target = target or self.default_target
+        transport = self._transport(target)
+        cmd = format_command(command, payload)
+        lock = self._key_locks.setdefault(key, asyncio.Lock()) if key else None
+        if lock is not None:
+            await lock.acquire()
+        try:
+            async with self._semaphores[target]:
+                state = self.states[target]
+                skipped = state.lookup(command, payload)
+                if skipped is not None:
+                    return skipped
+                if self.verbose:
+                    print("SENT:", cmd)
+                start = time.perf_counter()
+                raw = None
+                try:
+                    raw = await transport.execute(cmd, timeout=timeout)
+                    return raw
+                finally:
+                    state.update(command, payload, raw or {"return code": -1})
+                    self.stats["busy_time"] += time.perf_counter() - start
+        finally:
+            if lock is not None:
+                lock.release()
+
+    def submit(self, command: str, payload: Any = None, **kwargs) -> asyncio.Task:
+        """Schedule a command and return its task (a future for the result dict)."""
+        task = asyncio.create_task(self.execute(command, payload, **kwargs))
+        self.stats["submitted"] += 1
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+        return task
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            self.stats["cancelled"] += 1
+        else:
+            self.stats["completed"] += 1
+
+    def cancel_all(self) -> int:
+        """Cancel every command that has not finished yet."""
+        n = 0
+        for task in list(self._tasks):
+            n += task.cancel()
+        return n
+
+    async def close(self):
+        self.cancel_all()
+        for transport in self._transports.values():
+            await transport.close()
+        self._transports.clear()
+        self._semaphores.clear()
+
+
+_executors: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ZW3DAsyncExecutor]" = weakref.WeakKeyDictionary()
+
+
+def get_executor() -> ZW3DAsyncExecutor:
+    """Executor shared by all tools on the running event loop."""
+    loop = asyncio.get_running_loop()
+    executor = _executors.get(loop)
+    if executor is None:
+        executor = _executors[loop] = ZW3DAsyncExecutor()
+    return executor
+
+
+def set_executor(executor: ZW3DAsyncExecutor):
+    """Use ``executor`` for all tools on the running event loop."""
+    _executors[asyncio.get_running_loop()] = executor
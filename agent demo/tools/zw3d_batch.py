@@ -0,0 +1,333 @@
+"""
+Headless batch auto-dimensioning.
+
+Runs open -> STDVUDIM -> plan -> dimension (BATCHDIM) -> FILEEXPORT for every
+part of a directory on a ``ZW3DWorkerPool``:
+
+- each part is one pool job, so parts run in parallel up to the number of
+  ZW3D instances (or ``jobs`` if smaller);
+- finished parts are appended to a JSONL manifest; a rerun with the same
+  manifest skips parts that already succeeded and retries the failed ones.
+  A part whose BATCHDIM reported failed operations is ``partial``: it was
+  exported, but it is not done and is retried like a failed one;
+- the report gives parts/hour and per-stage latency;
+- a stage fails on the ``return code`` the DLL wrote to the request's
+  ``zw3d_result.json`` (the exit code of the call only when there is none):
+  the command returns the status of whatever ran last, e.g. FILEEXPORT
+  re-activating the root after a failed export. BATCHDIM must report its
+  operations, failed ones are counted in ``failed_ops``;
+- the export mirrors the part's path relative to ``root`` (default: the
+  common directory of the parts) under ``out_dir``, so parts with the same
+  name in different folders do not overwrite each other.
+
+Planners turn a view (the StdVuDim result) into a list of
+``{"type": ..., "args": {...}}`` operations for ``execute_plan``. The ``llm``
+planner runs ``GPTAutoDimensionAgent`` with the dimension tools *recorded*
+instead of executed, so the whole plan is applied in one BATCHDIM call (the
+agent itself skips the LLM for simple views, see ``AUTO_DIM_PLANNER``). The
+``rules`` planner is ``tools.zw3d_planner`` alone. With a journal directory
+(``--journal-dir`` / ``AUTO_DIM_JOURNAL_DIR``) the dialog of every part and
+view is written to a ``tools.zw3d_journal.Journal``; a rerun after a crash
+replays it without the LLM and takes the operations recorded before the
+crash from the journal.
+
+With ``views`` (several STDVUDIM view types), the view and plan stages are
+``tools.zw3d_multiview.MultiViewPlanner``: every view is extracted, the views
+are planned concurrently and the merged plan, without dimensions repeated
+across views, is still one BATCHDIM.
+"""
+from __future__ import annotations
+
+import fnmatch
+import hashlib
+import json
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from tools import zw3d_command_tool as zw3d
+from tools.zw3d_multiview import MultiViewPlanner, extract_view
+from tools.zw3d_pool import ZW3DWorkerPool
+from tools.zw3d_state import ALREADY_OPEN, result_code
+from tools.zw3d_validator import plan_type
+
+STAGES = ("open", "view", "plan", "dimension", "export")
+JOURNAL_DIR = os.getenv("AUTO_DIM_JOURNAL_DIR")  # unset: no journal
+
+Planner = Callable[[Dict[str, Any]], List[Dict[str, Any]]]
+
+
+def find_parts(root: str, pattern: str = "*.Z3PRT") -> List[str]:
+    """All files under ``root`` matching ``pattern`` (case-insensitive), sorted."""
+    parts = []
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            if fnmatch.fnmatch(name.lower(), pattern.lower()):
+                parts.append(os.path.join(dirpath, name).replace("\\", "/"))
+    return sorted(parts)
+
+
+class Manifest:
+    """Append-only JSONL progress file; the last record of a part wins."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    self.records[rec["part"]] = rec
+
+    def done(self, part: str) -> bool:
+        return self.records.get(part, {}).get("status") == "ok"
+
+    def append(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.records[record["part"]] = record
+
+
+class _RecordingTool:
+    """Stands in for a dimension tool: records the call instead of sending it to ZW3D."""
+
+    def __init__(self, tool, ops: List[Dict[str, Any]]):
+        self.tool = tool
+        self.name = tool.name
+        self.ops = ops
+        self.kind = next((k for k, cls in zw3d.DIMENSION_TOOLS.items() if cls().name == tool.name), None)
+
+    def get_tool_definition(self):
+        return self.tool.get_tool_definition()
+
+    def run(self, **kwargs):
+        if self.kind is None:  # zw3d_batch_dim; the model may name the types by their tools
+            recorded = [{**op, "type": plan_type(op.get("type"))} for op in kwargs.get("operations", [])]
+        else:
+            recorded = [{"type": self.kind, "args": kwargs}]
+        self.ops.extend(recorded)
+        # the operations go into the result, so a journal keeps them for a resumed dialog
+        return {"ok": True, "data": {"recorded": True, "return code": 0, "operations": recorded}}
+
+
+def journal_path(journal_dir: str, view: Dict[str, Any]) -> str:
+    """``<journal_dir>/<part stem>_<path hash>.v<view type>.jsonl``, the same on every run of the part."""
+    part = os.path.abspath(view.get("path") or "").replace("\\", "/").lower()
+    stem = os.path.splitext(os.path.basename(part))[0]
+    digest = hashlib.sha1(part.encode("utf-8")).hexdigest()[:8]
+    return f"{journal_dir}/{stem}_{digest}.v{view.get('view type')}.jsonl"
+
+
+def llm_planner(view: Dict[str, Any], model: Optional[str] = None,
+                journal_dir: Optional[str] = JOURNAL_DIR) -> List[Dict[str, Any]]:
+    """Plan with GPTAutoDimensionAgent; its dimension tool calls, with text placed by TextPlacer, become the plan."""
+    from LLMWrappers.AutoDimAgent import GPTAutoDimensionAgent
+    from LLMWrappers.GPT5Wrapper import GPTToolWrapper
+    from tools.zw3d_geometry import ViewGeometry
+    from tools.zw3d_journal import Journal
+    from tools.zw3d_placement import place_texts
+
+    ops: List[Dict[str, Any]] = []
+    wrapper = GPTToolWrapper(model=model)
+    for cls in [*zw3d.DIMENSION_TOOLS.values(), zw3d.ZW3DCommandBatchDim]:
+        wrapper.register_tool(_RecordingTool(cls(), ops))
+    agent = GPTAutoDimensionAgent(wrapper=wrapper, model=model)
+    if not journal_dir:
+        agent.generate_dimension_plan(view)
+    else:
+        with Journal(journal_path(journal_dir, view)) as journal:
+            # calls acknowledged before a restart are not run again: their operations are in the journal
+            ops[:0] = [op for result in journal.results.values() if isinstance(result, dict)
+                       for op in (result.get("data") or {}).get("operations") or []]
+            agent.generate_dimension_plan(view, journal=journal)
+    if not ops:
+        return ops
+    # a resumed dialog does not read the view again
+    geometry = agent.geometry or ViewGeometry.load(view["geom_data"], view["done_path"])
+    return place_texts(geometry, ops)["operations"]
+
+
+def rules_planner(view: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Deterministic plan from ``tools.zw3d_planner``; no LLM call."""
+    from tools.zw3d_geometry import ViewGeometry
+    from tools.zw3d_placement import place_texts
+    from tools.zw3d_planner import rule_plan
+    geometry = ViewGeometry.load(view["geom_data"], view["done_path"])
+    return place_texts(geometry, rule_plan(geometry)["operations"])["operations"]
+
+
+PLANNERS: Dict[str, Planner] = {
+    "llm": llm_planner,
+    "rules": rules_planner,
+    "none": lambda view: [],
+}
+
+
+def check(tool, accept=(0,), **kwargs) -> Dict[str, Any]:
+    """Run ``tool``; RuntimeError unless the request's result file (or the exit code) is in ``accept``."""
+    raw, payload = tool.send(**kwargs)
+    code = result_code(payload)
+    if code is None:
+        code = raw.get("return code")
+    if code not in accept:
+        raise RuntimeError(f"{tool.command} failed ({code}): {raw.get('stderr') or raw.get('error') or raw}")
+    return tool.result(raw, payload)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[k]
+
+
+class BatchRunner:
+    """Auto-dimension many parts on a worker pool with a resumable manifest."""
+
+    def __init__(self, parts: Iterable[str], out_dir: str, pool: ZW3DWorkerPool, planner: Planner,
+                 manifest: Optional[Manifest] = None, jobs: Optional[int] = None,
+                 view_type: int = 1, export_type: int = 2, export_suffix: str = ".pdf",
+                 verbose: bool = True, views: Sequence[int] = (), root: Optional[str] = None):
+        self.parts = list(parts)
+        self.out_dir = out_dir
+        self.root = root if root is not None else _common_dir(self.parts)
+        self.pool = pool
+        self.planner = planner
+        self.manifest = manifest or Manifest(os.path.join(out_dir, "manifest.jsonl"))
+        self.jobs = jobs or len(pool.workers)
+        self.view_type = view_type
+        self.views = list(views)
+        self.export_type = export_type
+        self.export_suffix = export_suffix
+        self.verbose = verbose
+
+    def export_path(self, part: str) -> str:
+        """``out_dir`` + the part's path below ``root`` with ``export_suffix``; a path hash for parts outside it."""
+        try:
+            rel = os.path.relpath(part, self.root) if self.root else None
+        except ValueError:  # another drive
+            rel = None
+        if rel is None or rel.startswith(".."):
+            digest = hashlib.sha1(os.path.abspath(part).encode("utf-8")).hexdigest()[:8]
+            rel = f"{os.path.splitext(os.path.basename(part))[0]}_{digest}"
+        else:
+            rel = os.path.splitext(rel)[0]
+        return f"{self.out_dir}/{rel}{self.export_suffix}".replace("\\", "/")
+
+    def _log(self, msg: str):
+        if self.verbose:
+            print(msg, flush=True)
+
+    def process(self, part: str) -> Dict[str, Any]:
+        """One part, start to finish, on the pool instance running this job."""
+        timings: Dict[str, float] = {}
+        record: Dict[str, Any] = {"part": part, "stages": timings}
+
+        def stage(name, fn, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timings[name] = round(time.perf_counter() - start, 4)
+
+        # the DLL only reports ALREADY_OPEN when the full path of the open part matches
+        stage("open", check, zw3d.ZW3DCommandOpen(), accept=(0, ALREADY_OPEN), filePath=part)
+
+        if len(self.views) > 1:
+            merged = MultiViewPlanner(self.planner, self.views).plan(part)
+            timings.update(merged["timings"])
+            operations = merged["operations"]
+            record["views"] = [{"view type": v["view type"], "dimensions": v["operations"],
+                                "duplicates": len(v["duplicates"])} for v in merged["views"]]
+        else:
+            view_type = self.views[0] if self.views else self.view_type
+            view_data = stage("view", extract_view, part, view_type)
+            operations = stage("plan", self.planner, view_data)
+        record["dimensions"] = len(operations)
+        if operations:
+            result = stage("dimension", zw3d.execute_plan, operations)
+            if result["return code"] != 0 or any(r.get("status") == "unknown" for r in result["results"]):
+                raise RuntimeError(f"BATCHDIM failed: {result.get('stderr') or result}")
+            record["failed_ops"] = sum(1 for r in result["results"] if r.get("status") != "ok")
+        else:
+            timings["dimension"] = 0.0
+            record["failed_ops"] = 0
+
+        export_path = self.export_path(part)
+        os.makedirs(os.path.dirname(export_path), exist_ok=True)
+        stage("export", check, zw3d.ZW3DCommandExp(), path=export_path, type=self.export_type, subType=0)
+        record["export"] = export_path
+        return record
+
+    def _run_one(self, part: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            record = self.pool.run(part, self.process, part)
+            record["status"] = "partial" if record["failed_ops"] else "ok"
+        except Exception as e:
+            record = {"part": part, "status": "error", "error": f"{type(e).__name__}: {e}",
+                      "trace": traceback.format_exc(limit=3)}
+        record["elapsed"] = round(time.perf_counter() - start, 4)
+        record["ts"] = time.time()
+        self.manifest.append(record)
+        self._log(f"[{record['status']}] {part} ({record['elapsed']:.2f}s)")
+        return record
+
+    def run(self) -> Dict[str, Any]:
+        os.makedirs(self.out_dir, exist_ok=True)
+        todo = [p for p in self.parts if not self.manifest.done(p)]
+        skipped = len(self.parts) - len(todo)
+        self._log(f"{len(todo)} parts to process, {skipped} already done")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, self.jobs)) as ex:
+            records = list(ex.map(self._run_one, todo))
+        wall = time.perf_counter() - start
+        return self.report(records, wall, skipped)
+
+    @staticmethod
+    def report(records: List[Dict[str, Any]], wall: float, skipped: int = 0) -> Dict[str, Any]:
+        ok = [r for r in records if r["status"] == "ok"]
+        partial = [r for r in records if r["status"] == "partial"]
+        stages = {}
+        for name in STAGES:
+            values = [r["stages"][name] for r in ok + partial if name in r.get("stages", {})]
+            if values:
+                stages[name] = {"mean": sum(values) / len(values), "p50": _percentile(values, 0.5),
+                                "p95": _percentile(values, 0.95), "max": max(values)}
+        return {
+            "processed": len(records), "ok": len(ok), "partial": len(partial),
+            "failed": len(records) - len(ok) - len(partial), "skipped": skipped,
+            "wall_time": wall, "parts_per_hour": len(ok) / wall * 3600 if wall > 0 else 0.0,
+            "stages": stages,
+        }
+
+
+def _common_dir(parts: Sequence[str]) -> Optional[str]:
+    try:
+        return os.path.dirname(os.path.commonpath(parts)) if len(parts) == 1 else os.path.commonpath(parts)
+    except ValueError:  # no parts, or on different drives
+        return None
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"parts: {report['ok']} ok, {report['partial']} partial, {report['failed']} failed, "
+        f"{report['skipped']} skipped",
+        f"wall time: {report['wall_time']:.1f}s  throughput: {report['parts_per_hour']:.1f} parts/hour",
+        f"{'stage':<10}{'mean':>9}{'p50':>9}{'p95':>9}{'max':>9}",
+    ]
+    for name, s in report["stages"].items():
+        lines.append(f"{name:<10}{s['mean']:>8.3f}s{s['p50']:>8.3f}s{s['p95']:>8.3f}s{s['max']:>8.3f}s")
+    return "\n".join(lines)
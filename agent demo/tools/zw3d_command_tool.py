@@ -1,16 +1,101 @@
 from LLMWrappers.baseTool import Tool
+from tools.zw3d_session import DEFAULT_EXE, DEFAULT_TIMEOUT, bound_session, get_session, in_context
+from tools.zw3d_results import RequestStore
+from tools.zw3d_extract_cache import cache_from_env
+from abc import ABCMeta, abstractmethod
+import asyncio
 import subprocess
 import json
 from typing import Dict, Any
 import os, re
 from pathlib import Path
 
-exe = r"D:\ZW3D APIHW\Productionx64\ZW3dRemote.exe"
+exe = DEFAULT_EXE
 cwd = os.path.dirname(exe)
 
+DATA_DIR = os.getenv("ZW3D_DATA_DIR", "D:/AI_AUTODIM_DATA")
+RESULT_FILE = f"{DATA_DIR}/zw3d_result.json"
+# one output directory per command, see ZW3DRemoteTool.request
+REQUESTS = RequestStore(f"{DATA_DIR}/requests")
+# STDVUDIM extractions by part content, see tools.zw3d_extract_cache
+EXTRACT_CACHE = cache_from_env(DATA_DIR)
+
 def CommandRun(cmd):
     return subprocess.run(cmd, capture_output=True, text=True, check=True, shell=True)
 
+
+class ZW3DRemoteTool(Tool, metaclass=ABCMeta):
+    """
+    Base class for tools that send one ZW3D remote command.
+
+    Subclasses set ``command`` and build the JSON parameters in ``payload``;
+    ``run`` sends them through the shared ``ZW3DSession`` instead of spawning
+    ZW3dRemote.exe for every call. Every call gets its own request ID and
+    output directory, so results of concurrent commands never collide.
+    """
+    command: str = ""
+    timeout: float = 20
+
+    @abstractmethod
+    def payload(self, **kwargs) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def result(self, raw: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Post-process the raw ``{"stdout", "stderr", "return code"}`` result."""
+        return raw
+
+    def request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Tag ``payload`` with a new request ID and the directory ZW3D writes its results to.
+        The request stays open, and its directory safe from ``RequestStore.gc``, until ``send`` returns.
+        """
+        request_id, out_dir = REQUESTS.new()
+        return {**payload, "requestId": request_id, "outputDir": out_dir}
+
+    def send(self, **kwargs):
+        """Send the command; returns the raw result and the payload that was sent."""
+        payload = self.request(self.payload(**kwargs))
+        try:
+            return get_session().execute(self.command, payload, timeout=self.timeout), payload
+        finally:
+            REQUESTS.close(payload["requestId"])
+
+    def run(self, **kwargs):
+        return self.result(*self.send(**kwargs))
+
+    def conflict_key(self, payload: Dict[str, Any]):
+        """Commands with the same key are never run concurrently (default: the file they touch)."""
+        for field in ("filePath", "path", "savePath"):
+            if payload.get(field):
+                return str(payload[field]).lower()
+        return None
+
+    async def arun(self, executor=None, target=None, **kwargs):
+        """Async ``run`` on the shared ZW3DAsyncExecutor; awaiting it does not block the loop."""
+        payload = self.request(self.payload(**kwargs))
+        try:
+            raw = await aexecute(self.command, payload, executor, target,
+                                 key=self.conflict_key(payload), timeout=self.timeout)
+        finally:
+            REQUESTS.close(payload["requestId"])
+        return self.result(raw, payload)
+
+
+async def aexecute(command: str, payload: Any = None, executor=None, target=None, key=None,
+                   timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    """
+    Send one command from a coroutine. Inside ``use_session`` (a pool job) it goes to the bound
+    session on a thread, so async tool calls reach the same instance; otherwise to ``executor``
+    (default: the loop's shared ZW3DAsyncExecutor).
+    """
+    session = bound_session() if executor is None and target is None else None
+    if session is not None:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, in_context(session.execute), command, payload, timeout)
+    from tools.zw3d_async import get_executor
+    return await (executor or get_executor()).execute(command, payload, target=target, key=key, timeout=timeout)
+
+
 class ZW3DCommandTool(Tool):
     """
     Tool for running ZW3D command.
@@ -52,25 +137,17 @@ class ZW3DCommandTool(Tool):
         Returns:
             Dictionary containing command output, error message, and return code
         """
-        cmd = [
-            'zw3dremote',
-            '-r', 'local',
-            f'cmd=~{command}({params})'
-        ]
+        return get_session().execute(command, params)
 
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-
-        return {
-            "stdout": result.stdout.strip(),
-            "stderr": result.stderr.strip(),
-            "return code": result.returncode
-        }
+    async def arun(self, command: str, params: str = None, executor=None, target=None):
+        return await aexecute(command, params, executor, target)
 
 
-class ZW3DCommandOpen(Tool):
+class ZW3DCommandOpen(ZW3DRemoteTool):
     """
     Tool for running ZW3D command.
     """
+    command = "FILEOPEN"
     @property
     def name(self) -> str:
         return "zw3d_open"
@@ -92,7 +169,7 @@ class ZW3DCommandOpen(Tool):
             "required": ["filePath"]
         }
 
-    def run(self, filePath: str):
+    def payload(self, filePath) -> Dict[str, Any]:
         """
         Execute a ZW3D remote command.
 
@@ -101,26 +178,16 @@ class ZW3DCommandOpen(Tool):
                 filePath: file path for the command to open in JSON format
 
         Returns:
-            Dictionary containing command output, error message, and return code
+            Dictionary of JSON parameters sent with the command
         """
         path = f"{filePath}".replace("\\", "/")
-        json_str = json.dumps({"filePath": path}, ensure_ascii=False, separators=(",", ":"))
-        args = [exe, "-r", "127.0.0.1", f"cmd=~FILEOPEN({json_str})"]
-
-        print("SENT:", args[-1])
-        result = subprocess.run(args, capture_output=True, text=True, timeout=20, cwd=cwd)
-        # print("rc=", result.returncode, "\nstdout:", result.stdout, "\nstderr:", result.stderr)
+        return {"filePath": path}
 
-        return {
-            "stdout": result.stdout.strip(),
-            "stderr": result.stderr.strip(),
-            "return code": result.returncode
-        }
-
-class ZW3DCommandExp(Tool):
+class ZW3DCommandExp(ZW3DRemoteTool):
     """
     Tool for running ZW3D command for exporting.
     """
+    command = "FILEEXPORT"
     @property
     def name(self) -> str:
         return "zw3d_exp"
@@ -154,7 +221,7 @@ class ZW3DCommandExp(Tool):
             "required": ["path", "type", "subType"]
         }
 
-    def run(self, path:str, type:str, subType:str):
+    def payload(self, path, type, subType) -> Dict[str, Any]:
         """
         Execute a ZW3D remote command.
 
@@ -162,33 +229,28 @@ class ZW3DCommandExp(Tool):
             input: Dictionary containing:
 
         Returns:
-            Dictionary containing command output, error message, and return code
+            Dictionary of JSON parameters sent with the command
         """
         path = f"{path}".replace("\\", "/")
 
-        json_str = json.dumps({
+        return {
             "path": f"{path}",
             "type": type,
             "subType": subType
-        }, ensure_ascii=False, separators=(",", ":"))
-
-        args = [exe, "-r", "127.0.0.1", f"cmd=~FILEEXPORT({json_str})"]
-
-        print("SENT:", args[-1])
-        result = subprocess.run(args, capture_output=True, text=True, timeout=20, cwd=cwd)
-        # print("rc=", result.returncode, "\nstdout:", result.stdout, "\nstderr:", result.stderr)
-
-
-        return {
-            "stdout": result.stdout.strip(),
-            "stderr": result.stderr.strip(),
-            "return code": result.returncode
         }
 
-class ZW3DCommandStdVuDim(Tool):
+class ZW3DCommandStdVuDim(ZW3DRemoteTool):
     """
     Tool for running ZW3D command for creating a standard view on the active drawing and dimension the Parallel lines.
+
+    An extraction already in ``cache`` (same part file, content, view type and
+    location) is not sent again: the part's drawing is activated, ``ENTCHECK``
+    confirms the cached view is still in it, and the cached ``stdvu_output.*``
+    are copied into the request directory. If the view is gone, the entry is
+    dropped and the view extracted again.
     """
+    command = "STDVUDIM"
+    cache = EXTRACT_CACHE
     @property
     def name(self) -> str:
         return "zw3d_stdvucrt_dim"
@@ -223,7 +285,7 @@ class ZW3DCommandStdVuDim(Tool):
             "required": ["path", "type", "x", "y"]
         }
 
-    def run(self, path:str, type:str, x:str, y:str):
+    def payload(self, path, type, x, y) -> Dict[str, Any]:
         """
         Execute a ZW3D remote command.
 
@@ -231,40 +293,169 @@ class ZW3DCommandStdVuDim(Tool):
             input: Dictionary containing:
 
         Returns:
-            Dictionary containing command output, error message, and return code
+            Dictionary of JSON parameters sent with the command
         """
-        json_str = json.dumps({
+        return {
             "path": f"{path}",
             "type": type,
             "x": x,
             "y": y,
-        }, ensure_ascii=False, separators=(",", ":"))
-
-        args = [exe, "-r", "127.0.0.1", f"cmd=~STDVUDIM({json_str})"]
-
-        print("SENT:", args[-1])
-        result = subprocess.run(args, capture_output=True, text=True, timeout=20, cwd=cwd)
-        # # print("rc=", result.returncode, "\nstdout:", result.stdout, "\nstderr:", result.stderr)
+        }
 
+    def _cache_key(self, payload: Dict[str, Any]):
+        if self.cache is None:
+            return None
+        try:
+            return self.cache.key(payload["path"], payload["type"], payload["x"], payload["y"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def drawing(path: str) -> str:
+        """The drawing STDVUDIM puts the view in (the DLL opens ``<dir>/<root name>.Z3DRW`` next to the part)."""
+        return os.path.splitext(str(path).replace("\\", "/"))[0] + ".Z3DRW"
+
+    @staticmethod
+    def _probe(meta: Dict[str, Any]):
+        """Ids that must still exist in the drawing for a cached extraction to be used, or None."""
+        if meta.get("view id") is None or not meta.get("probe"):
+            return None  # entry written before probes were stored
+        return [meta["view id"], *meta["probe"]]
+
+    def _restore(self, key, payload: Dict[str, Any], opened: Dict[str, Any], check):
+        """Raw result of a cache hit once the drawing is active and holds the cached view, else None."""
+        if opened.get("return code") != 0 or check is None:
+            return None
+        if not check["ok"] or check["missing"]:
+            self.cache.discard(key)
+            return None
+        if self.cache.restore(key, payload["outputDir"]) is None:
+            return None
+        return {"stdout": f"STDVUDIM skipped: extraction of {payload['path']} cached", "stderr": "",
+                "return code": 0, "cached": True}
+
+    def send(self, **kwargs):
+        payload = self.request(self.payload(**kwargs))
+        try:
+            return self._send(payload)
+        finally:
+            REQUESTS.close(payload["requestId"])
+
+    def _send(self, payload):
+        key = self._cache_key(payload)
+        meta = self.cache.lookup(key) if key is not None else None
+        if meta is not None:
+            opened = ZW3DCommandOpen().send(filePath=self.drawing(payload["path"]))[0]
+            ids = self._probe(meta)
+            check = ZW3DCommandEntCheck().run(ids=ids) if ids and opened.get("return code") == 0 else None
+            raw = self._restore(key, payload, opened, check)
+            if raw is not None:
+                return raw, payload
+        raw = get_session().execute(self.command, payload, timeout=self.timeout)
+        if key is not None and raw.get("return code") == 0:
+            self.cache.put_when_done(key, payload["outputDir"], {"path": payload["path"], "type": payload["type"]})
+        return raw, payload
+
+    async def arun(self, executor=None, target=None, **kwargs):
+        payload = self.request(self.payload(**kwargs))
+        try:
+            return await self._arun(payload, executor, target)
+        finally:
+            REQUESTS.close(payload["requestId"])
+
+    async def _arun(self, payload, executor, target):
+        key = self._cache_key(payload)
+        meta = self.cache.lookup(key) if key is not None else None
+        if meta is not None:
+            opened = await ZW3DCommandOpen().arun(executor=executor, target=target,
+                                                  filePath=self.drawing(payload["path"]))
+            ids = self._probe(meta)
+            check = None
+            if ids and opened.get("return code") == 0:
+                check = await ZW3DCommandEntCheck().arun(executor=executor, target=target, ids=ids)
+            raw = self._restore(key, payload, opened, check)
+            if raw is not None:
+                return self.result(raw, payload)
+        raw = await aexecute(self.command, payload, executor, target,
+                             key=self.conflict_key(payload), timeout=self.timeout)
+        if key is not None and raw.get("return code") == 0:
+            self.cache.put_when_done(key, payload["outputDir"], {"path": payload["path"], "type": payload["type"]})
+        return self.result(raw, payload)
+
+    def result(self, raw: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
         # 调用 zw3dremote 后读取 JSON 文件
-        json_file_path = "D:/AI_AUTODIM_DATA/stdvu_output.json"
-        img_path = "D:/AI_AUTODIM_DATA/stdvu_output.png"
-        done_path = "D:/AI_AUTODIM_DATA/stdvu_output.done"
+        out_dir = payload.get("outputDir", DATA_DIR)
+        json_file_path = f"{out_dir}/stdvu_output.json"
+        img_path = f"{out_dir}/stdvu_output.png"
+        done_path = f"{out_dir}/stdvu_output.done"
 
         return self.ok({
+            "request_id": payload.get("requestId"),
             "img_path": img_path,
             "done_path": done_path,
             "geom_data": json_file_path, ###json data
-            "stderr": result.stderr.strip(),
+            "path": payload.get("path"),
+            "view type": payload.get("type"),
+            "cached": bool(raw.get("cached")),
+            "stderr": raw["stderr"],
             "return code": 1, ###return code 0: no error, 1: need response, <0: error
-            "message": "std view created; need auto-dimension.",
+            "message": "std view reused from cache; need auto-dimension." if raw.get("cached")
+                       else "std view created; need auto-dimension.",
         })
 
 
-class ZW3DCommandLinearDim(Tool):
+class ZW3DCommandEntCheck(ZW3DRemoteTool):
+    """
+    Reports which entity ids do not exist in the active file (ENTCHECK).
+    """
+    command = "ENTCHECK"
+
+    @property
+    def name(self) -> str:
+        return "zw3d_entity_check"
+
+    @property
+    def description(self) -> str:
+        return ("Check whether entities still exist in the active ZW3D file. Returns the ids that were not found "
+                "in 'missing'.")
+
+    @property
+    def parameters(self) -> Dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {
+                "ids": {
+                    "type": "array",
+                    "items": {"type": "integer"},
+                    "description": "entity ids to look up, e.g. a view id and curve ids of that view.",
+                },
+            },
+            "required": ["ids"]
+        }
+
+    def payload(self, ids) -> Dict[str, Any]:
+        return {"ids": [int(i) for i in ids]}
+
+    def result(self, raw: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            data = json.loads(_read_text(result_file(payload)) or "")
+        except ValueError:
+            data = None
+        missing = data.get("missing") if isinstance(data, dict) else None
+        # an endpoint without ENTCHECK reports nothing: the check failed, it did not pass
+        return {
+            "stderr": raw["stderr"],
+            "return code": raw["return code"],
+            "ok": raw["return code"] == 0 and isinstance(missing, list),
+            "missing": missing if isinstance(missing, list) else list(payload["ids"]),
+        }
+
+
+class ZW3DCommandLinearDim(ZW3DRemoteTool):
     """
     Tool for running ZW3D command: dimension the line length.
     """
+    command = "LINDIM"
     @property
     def name(self) -> str:
         return "zw3d_lineardim"
@@ -331,7 +522,7 @@ class ZW3DCommandLinearDim(Tool):
             "required": ["id", "start_point", "end_point", "text_point"]
         }
 
-    def run(self, id:str, start_point:str, end_point:str, text_point:str):
+    def payload(self, id, start_point, end_point, text_point) -> Dict[str, Any]:
         """
         Execute a ZW3D remote command.
 
@@ -339,31 +530,20 @@ class ZW3DCommandLinearDim(Tool):
             input: Dictionary containing:
 
         Returns:
-            Dictionary containing command output, error message, and return code
+            Dictionary of JSON parameters sent with the command
         """
-        json_str = json.dumps({
+        return {
             "id": id,
             "start point": start_point,
             "end point": end_point,
             "text point": text_point,
-        }, ensure_ascii=False, separators=(",", ":"))
-
-        args = [exe, "-r", "127.0.0.1", f"cmd=~LINDIM({json_str})"]
-
-        print("SENT:", args[-1])
-        result = subprocess.run(args, capture_output=True, text=True, timeout=20, cwd=cwd)
-        # print("rc=", result.returncode, "\nstdout:", result.stdout, "\nstderr:", result.stderr)
-
-        return {
-            "stdout": result.stdout.strip(),
-            "stderr": result.stderr.strip(),
-            "return code": result.returncode
         }
 
-class ZW3DCommandLinearOffsetDim(Tool):
+class ZW3DCommandLinearOffsetDim(ZW3DRemoteTool):
     """
     Tool for running ZW3D command: dimension the Parallel lines.
     """
+    command = "LINOFFSETDIM"
     @property
     def name(self) -> str:
         return "zw3d_linearoffsetdim"
@@ -434,7 +614,7 @@ class ZW3DCommandLinearOffsetDim(Tool):
             "required": ["id1", "id2", "first_point", "second_point", "text_point"]
         }
 
-    def run(self, id1:str, id2:str, first_point:str, second_point:str, text_point:str):
+    def payload(self, id1, id2, first_point, second_point, text_point) -> Dict[str, Any]:
         """
         Execute a ZW3D remote command.
 
@@ -442,33 +622,22 @@ class ZW3DCommandLinearOffsetDim(Tool):
             input: Dictionary containing:
 
         Returns:
-            Dictionary containing command output, error message, and return code
+            Dictionary of JSON parameters sent with the command
         """
-        json_str = json.dumps({
+        return {
             "id1": id1,
             "id2": id2,
             "first point": first_point,
             "second point": second_point,
             "text point": text_point,
-        }, ensure_ascii=False, separators=(",", ":"))
-
-        args = [exe, "-r", "127.0.0.1", f"cmd=~LINOFFSETDIM({json_str})"]
-
-        print("SENT:", args[-1])
-        result = subprocess.run(args, capture_output=True, text=True, timeout=20, cwd=cwd)
-        # print("rc=", result.returncode, "\nstdout:", result.stdout, "\nstderr:", result.stderr)
-
-        return {
-            "stdout": result.stdout.strip(),
-            "stderr": result.stderr.strip(),
-            "return code": result.returncode
         }
 
 
-class ZW3DCommandArcLengthDimension(Tool):
+class ZW3DCommandArcLengthDimension(ZW3DRemoteTool):
     """
     Creates an arc length dimension base on an arc curve in drawing.
     """
+    command = "ARCLENDIM"
 
     @property
     def name(self) -> str:
@@ -522,7 +691,7 @@ class ZW3DCommandArcLengthDimension(Tool):
             "required": ["arc_id", "arc_point", "text_point"]
         }
 
-    def run(self, arc_id:str, arc_point:str, text_point:str):
+    def payload(self, arc_id, arc_point, text_point) -> Dict[str, Any]:
         """
         Create an arc length Dimension.
 
@@ -533,32 +702,20 @@ class ZW3DCommandArcLengthDimension(Tool):
                 text point: The point {x,y} to locate the first dimension text.
 
         Returns:
-            Dictionary containing error message and return code
+            Dictionary of JSON parameters sent with the command
         """
-        command = 'ARCLENDIM'
-        json_str = json.dumps({
+        return {
             "arc id": arc_id,
             "arc point": arc_point,
             "text point": text_point,
-        }, ensure_ascii=False, separators=(",", ":"))
-
-        args = [exe, "-r", "127.0.0.1", f"cmd=~{command}({json_str})"]
-
-        print("SENT:", args[-1])
-        result = subprocess.run(args, capture_output=True, text=True, timeout=20, cwd=cwd)
-        # print("rc=", result.returncode, "\nstdout:", result.stdout, "\nstderr:", result.stderr)
-
-        return {
-            "stdout": result.stdout.strip(),
-            "stderr": result.stderr.strip(),
-            "return code": result.returncode
         }
 
 
-class ZW3DCommandRadialDimension(Tool):
+class ZW3DCommandRadialDimension(ZW3DRemoteTool):
     """
     Creates a radial dimension base on an arc or circle in drawing.
     """
+    command = "RADIALDIM"
 
     @property
     def name(self) -> str:
@@ -611,7 +768,7 @@ class ZW3DCommandRadialDimension(Tool):
             "required": ["id", "point", "text_point"]
         }
 
-    def run(self, id:str, point:str, text_point:str) -> Dict[str, Any]:
+    def payload(self, id, point, text_point) -> Dict[str, Any]:
         """
         Create a radial Dimension.
 
@@ -622,33 +779,21 @@ class ZW3DCommandRadialDimension(Tool):
                 text point: The point {x,y} to locate the first dimension text.
 
         Returns:
-            Dictionary containing error message and return code
+            Dictionary of JSON parameters sent with the command
         """
 
-        command = 'RADIALDIM'
-        json_str = json.dumps({
+        return {
             "id": id,
             "point": point,
             "text point": text_point,
-        }, ensure_ascii=False, separators=(",", ":"))
-
-        args = [exe, "-r", "127.0.0.1", f"cmd=~{command}({json_str})"]
-
-        print("SENT:", args[-1])
-        result = subprocess.run(args, capture_output=True, text=True, timeout=20, cwd=cwd)
-        # print("rc=", result.returncode, "\nstdout:", result.stdout, "\nstderr:", result.stderr)
-
-        return {
-            "stdout": result.stdout.strip(),
-            "stderr": result.stderr.strip(),
-            "return code": result.returncode
         }
 
 
-class ZW3DCommandHoleCalloutDimension(Tool):
+class ZW3DCommandHoleCalloutDimension(ZW3DRemoteTool):
     """
     Creates a hole callout dimension base on an circle curve that is projected by a hole in drawing.
     """
+    command = "HOLECALLOUTDIM"
 
     @property
     def name(self) -> str:
@@ -693,7 +838,7 @@ class ZW3DCommandHoleCalloutDimension(Tool):
             "required": ["hole_curve_id", "view_id", "text_point"]
         }
 
-    def run(self, hole_curve_id:str, view_id:str, text_point:str):
+    def payload(self, hole_curve_id, view_id, text_point) -> Dict[str, Any]:
         """
         Create a hole callout Dimension.
 
@@ -704,33 +849,176 @@ class ZW3DCommandHoleCalloutDimension(Tool):
                 text point: The point [x,y] to locate the first dimension text.
 
         Returns:
-            Dictionary containing error message and return code
+            Dictionary of JSON parameters sent with the command
         """
 
-        command = 'HOLECALLOUTDIM'
-        json_str = json.dumps({
+        return {
             "hole curve id": hole_curve_id,
             "view id": view_id,
             "text point": text_point,
-        }, ensure_ascii=False, separators=(",", ":"))
+        }
 
-        args = [exe, "-r", "127.0.0.1", f"cmd=~{command}({json_str})"]
 
-        print("SENT:", args[-1])
-        result = subprocess.run(args, capture_output=True, text=True, timeout=20, cwd=cwd)
-        # print("rc=", result.returncode, "\nstdout:", result.stdout, "\nstderr:", result.stderr)
+class ZW3DCommandBatchDim(ZW3DRemoteTool):
+    """
+    Applies a whole dimension plan in one BATCHDIM round trip.
 
+    Each operation reuses the payload of the matching single-dimension tool, so
+    the arguments are exactly those of zw3d_lineardim, zw3d_radialdim, etc.
+    """
+    command = "BATCHDIM"
+    timeout = 120
+
+    @property
+    def name(self) -> str:
+        return "zw3d_batch_dim"
+
+    @property
+    def description(self) -> str:
+        return ("Create several dimensions in one ZW3D call. 'operations' is an ordered list; each item has a "
+                "'type' (linear, linearoffset, radial, arclength, holecallout) and 'args' with the same arguments "
+                "as the matching single dimension tool (zw3d_lineardim, zw3d_linearoffsetdim, zw3d_radialdim, "
+                "zw3d_arclengthdim, zw3d_holecalloutdim). Returns one result per operation with status, "
+                "error code and the created dimension handle.")
+
+    @property
+    def parameters(self) -> Dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {
+                "operations": {
+                    "type": "array",
+                    "description": "ordered dimension operations to apply.",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "type": {
+                                "type": "string",
+                                "enum": list(DIMENSION_TOOLS),
+                                "description": "dimension type of this operation.",
+                            },
+                            "args": {
+                                "type": "object",
+                                "description": "arguments of the matching single dimension tool.",
+                            },
+                        },
+                        "required": ["type", "args"]
+                    }
+                },
+            },
+            "required": ["operations"]
+        }
+
+    def payload(self, operations) -> Dict[str, Any]:
+        """
+        Build the BATCHDIM payload.
+
+        Args:
+            operations: list of {"type": ..., "args": {...}}; 'type' may also be a tool name such as
+                "zw3d_radialdim".
+
+        Returns:
+            Dictionary of JSON parameters sent with the command: {"ops": [{"op": ..., "params": ...}]}
+        """
+        ops = []
+        for i, op in enumerate(operations):
+            tool = dimension_tool(op.get("type"))
+            if tool is None:
+                raise ValueError(f"operation {i}: unknown dimension type {op.get('type')!r}")
+            ops.append({"op": tool.command, "params": tool.payload(**op.get("args", {}))})
+        return {"ops": ops}
+
+    def result(self, raw: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        results = batch_results(raw, payload)
+        if results is None:
+            # the endpoint did not report per-operation results
+            results = [{"index": i, "op": op["op"], "status": "unknown", "error code": None, "handle": None}
+                       for i, op in enumerate(payload["ops"])]
         return {
-            "stdout": result.stdout.strip(),
-            "stderr": result.stderr.strip(),
-            "return code": result.returncode
+            "stderr": raw["stderr"],
+            "return code": raw["return code"],
+            "ok": raw["return code"] == 0 and all(r.get("status") == "ok" for r in results),
+            "results": results,
         }
 
 
-class ZW3DCommandAsmTree(Tool):
+DIMENSION_TOOLS = {
+    "linear": ZW3DCommandLinearDim,
+    "linearoffset": ZW3DCommandLinearOffsetDim,
+    "radial": ZW3DCommandRadialDimension,
+    "arclength": ZW3DCommandArcLengthDimension,
+    "holecallout": ZW3DCommandHoleCalloutDimension,
+}
+
+
+def dimension_tool(kind: str):
+    """Return a dimension tool instance for a plan type ("radial") or tool name ("zw3d_radialdim")."""
+    for cls in DIMENSION_TOOLS.values():
+        if cls().name == kind:
+            return cls()
+    cls = DIMENSION_TOOLS.get(kind)
+    return cls() if cls else None
+
+
+def result_file(payload: Dict[str, Any]) -> str:
+    """``zw3d_result.json`` written by the DLL for this request."""
+    if payload.get("outputDir"):
+        return f"{payload['outputDir']}/zw3d_result.json"
+    return RESULT_FILE
+
+
+def batch_results(raw: Dict[str, Any], payload: Dict[str, Any] = None):
+    """Per-operation BATCHDIM results from the reply, or from the DLL's result file."""
+    for text in (raw.get("stdout"), _read_text(result_file(payload or {}))):
+        try:
+            data = json.loads(text or "")
+        except ValueError:
+            continue
+        if isinstance(data, dict) and isinstance(data.get("results"), list):
+            return data["results"]
+    return None
+
+
+def _read_text(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def execute_plan(operations, chunk_size: int = 0) -> Dict[str, Any]:
+    """
+    Apply a dimension plan with as few round trips as possible.
+
+    Args:
+        operations: list of {"type": ..., "args": {...}} as accepted by zw3d_batch_dim.
+        chunk_size: maximum operations per BATCHDIM call, 0 for a single call.
+
+    Returns:
+        Dictionary with the merged per-operation "results", the worst "return code" and "ok", true when
+        every call returned 0 and every operation reported status "ok"
+    """
+    tool = ZW3DCommandBatchDim()
+    size = chunk_size or max(len(operations), 1)
+    results, code, errors = [], 0, []
+    for start in range(0, len(operations), size):
+        res = tool.run(operations=operations[start:start + size])
+        for r in res["results"]:
+            r["index"] = start + r["index"]
+        results.extend(res["results"])
+        code = res["return code"] if res["return code"] != 0 else code
+        if res["stderr"]:
+            errors.append(res["stderr"])
+    ok = code == 0 and all(r.get("status") == "ok" for r in results)
+    return {"stderr": "\n".join(errors), "return code": code, "ok": ok, "results": results}
+
+
+class ZW3DCommandAsmTree(ZW3DRemoteTool):
     """
     Tool for running ZW3D command.
     """
+    command = "ASMTREE"
     @property
     def name(self) -> str:
         return "zw3d_asmtree"
@@ -769,7 +1057,7 @@ class ZW3DCommandAsmTree(Tool):
         }
 
 
-    def run(self, partPath:str, saveDir:str, depth:str, totalInstances:str):
+    def payload(self, partPath, saveDir, depth, totalInstances) -> Dict[str, Any]:
         """
         Execute a ZW3D remote command.
 
@@ -781,35 +1069,24 @@ class ZW3DCommandAsmTree(Tool):
                 totalInstances: the number of parts needed to be inserted
 
         Returns:
-            Dictionary containing command output, error message, and return code
+            Dictionary of JSON parameters sent with the command
         """
         partPath = f"{partPath}".replace("\\", "/")
         saveDir = f"{saveDir}".replace("\\", "/")
 
-        json_str = json.dumps({
+        return {
             "partPath": partPath,
             "saveDir": saveDir,
             "depth": depth,
             "totalInstances": totalInstances,
-        }, ensure_ascii=False, separators=(",", ":"))
-
-        args = [exe, "-r", "127.0.0.1", f"cmd=~ASMTREE({json_str})"]
-
-        print("SENT:", args[-1])
-        result = subprocess.run(args, capture_output=True, text=True, timeout=20, cwd=cwd)
-        # print("rc=", result.returncode, "\nstdout:", result.stdout, "\nstderr:", result.stderr)
-
-        return {
-            "stdout": result.stdout.strip(),
-            "stderr": result.stderr.strip(),
-            "return code": result.returncode
         }
 
 
-class ZW3DCommandInsertComp(Tool):
+class ZW3DCommandInsertComp(ZW3DRemoteTool):
     """
     Tool for running ZW3D command.
     """
+    command = "COMPINSERT"
     @property
     def name(self) -> str:
         return "zw3d_insertcomp"
@@ -841,7 +1118,7 @@ class ZW3DCommandInsertComp(Tool):
                 }
 
 
-    def run(self, path:str, frame:str):
+    def payload(self, path, frame) -> Dict[str, Any]:
         """
         Execute a ZW3D remote command.
 
@@ -849,32 +1126,21 @@ class ZW3DCommandInsertComp(Tool):
             input: Dictionary containing:
 
         Returns:
-            Dictionary containing command output, error message, and return code
+            Dictionary of JSON parameters sent with the command
         """
         path = f"{path}".replace("\\", "/")
 
-        json_str = json.dumps({
+        return {
             "path": path,
             "frame": frame,
-        }, ensure_ascii=False, separators=(",", ":"))
-
-        args = [exe, "-r", "127.0.0.1", f"cmd=~COMPINSERT({json_str})"]
-
-        print("SENT:", args[-1])
-        result = subprocess.run(args, capture_output=True, text=True, timeout=20, cwd=cwd)
-        # print("rc=", result.returncode, "\nstdout:", result.stdout, "\nstderr:", result.stderr)
-
-        return {
-            "stdout": result.stdout.strip(),
-            "stderr": result.stderr.strip(),
-            "return code": result.returncode
         }
 
 
-class ZW3DCommandNewFile(Tool):
+class ZW3DCommandNewFile(ZW3DRemoteTool):
     """
     Tool for running ZW3D command.
     """
+    command = "FILENEW"
     @property
     def name(self) -> str:
         return "zw3d_newfile"
@@ -897,7 +1163,7 @@ class ZW3DCommandNewFile(Tool):
                 }
 
 
-    def run(self, savePath:str):
+    def payload(self, savePath) -> Dict[str, Any]:
         """
         Execute a ZW3D remote command.
 
@@ -905,31 +1171,20 @@ class ZW3DCommandNewFile(Tool):
             input: Dictionary containing:
 
         Returns:
-            Dictionary containing command output, error message, and return code
+            Dictionary of JSON parameters sent with the command
         """
         savePath = f"{savePath}".replace("\\", "/")
 
-        json_str = json.dumps({
-            "savePath": savePath,
-        }, ensure_ascii=False, separators=(",", ":"))
-
-        args = [exe, "-r", "127.0.0.1", f"cmd=~FILENEW({json_str})"]
-
-        print("SENT:", args[-1])
-        result = subprocess.run(args, capture_output=True, text=True, timeout=20, cwd=cwd)
-        # print("rc=", result.returncode, "\nstdout:", result.stdout, "\nstderr:", result.stderr)
-
         return {
-            "stdout": result.stdout.strip(),
-            "stderr": result.stderr.strip(),
-            "return code": result.returncode
+            "savePath": savePath,
         }
 
 
-class ZW3DCommandActiveFile(Tool):
+class ZW3DCommandActiveFile(ZW3DRemoteTool):
     """
     Tool for running ZW3D command.
     """
+    command = "FILEACTIVE"
     @property
     def name(self) -> str:
         return "zw3d_activefile"
@@ -952,7 +1207,7 @@ class ZW3DCommandActiveFile(Tool):
                 }
 
 
-    def run(self, filePath:str):
+    def payload(self, filePath) -> Dict[str, Any]:
         """
         Execute a ZW3D remote command.
 
@@ -960,22 +1215,10 @@ class ZW3DCommandActiveFile(Tool):
             input: Dictionary containing:
 
         Returns:
-            Dictionary containing command output, error message, and return code
+            Dictionary of JSON parameters sent with the command
         """
         filePath = f"{filePath}".replace("\\", "/")
 
-        json_str = json.dumps({
-            "filePath": filePath,
-        }, ensure_ascii=False, separators=(",", ":"))
-
-        args = [exe, "-r", "127.0.0.1", f"cmd=~FILEACTIVE({json_str})"]
-
-        print("SENT:", args[-1])
-        result = subprocess.run(args, capture_output=True, text=True, timeout=20, cwd=cwd)
-        # print("rc=", result.returncode, "\nstdout:", result.stdout, "\nstderr:", result.stderr)
-
         return {
-            "stdout": result.stdout.strip(),
-            "stderr": result.stderr.strip(),
-            "return code": result.returncode
+            "filePath": filePath,
         }
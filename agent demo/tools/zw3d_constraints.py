@@ -0,0 +1,450 @@
+"""
+Redundant and missing dimensions of a plan, by constraint counting.
+
+Every dimension fixes one distance of the view. A plan is over-dimensioned
+when a dimension already follows from others (a closed chain), and incomplete
+while a feature can still move or change size. ``ConstraintCounter`` keeps
+the plan as constraints on three sets of unknowns:
+
+- x and y positions. The x (y) coordinates of the reference points of the
+  view (line and arc end points, arc and circle centres, circle quadrants)
+  are clustered within the view tolerance. Points on one vertical
+  (horizontal) line share an unknown, like aligned features on a drawing.
+- sizes: one radius per group of circles (or arcs) of equal radius, the
+  "typical" convention of the rule planner.
+
+A horizontal or vertical dimension joins two x (or y) unknowns. With
+union-find over each axis, the rank of the system grows by one per dimension
+unless both ends are already in one component, which is exactly a redundant
+closed chain. The points of an arc or circle are tied to its centre through
+the radius of its group. These ties wait until the radius is given by a
+radial dimension or hole callout, or implied by a linear dimension that closes
+a path through them (a slot width, a diameter); further size dimensions of
+the group are then redundant. An aligned dimension (a slanted edge) fixes one
+axis of its end points once the other is known. Members of a hole pattern
+(``find_symmetry``) after the second follow the pitch and are tied to it.
+
+The degrees of freedom left are the components of each axis beyond the
+first, plus the unsized groups, minus the aligned dimensions still waiting.
+``status`` lists the features (by contour, ``tools.zw3d_topology``) that
+are not located or sized. Adding a dimension costs a few union-find steps,
+so the plan can be checked after every batch of tool calls.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tools.zw3d_analysis import _tolerance
+from tools.zw3d_geometry import ARC, CIRCLE, LINE, ViewGeometry
+from tools.zw3d_placement import span_axis
+from tools.zw3d_validator import plan_type
+
+AXES = ("x", "y")
+# dimension type -> (id argument, point argument) of its two ends; size dimensions have one id
+ENDS = {
+    "linear": (("id", "start_point"), ("id", "end_point")),
+    "linearoffset": (("id1", "first_point"), ("id2", "second_point")),
+}
+SIZES = {"radial": "id", "holecallout": "hole_curve_id", "arclength": "arc_id"}
+
+
+def _point(p) -> Optional[np.ndarray]:
+    try:
+        if isinstance(p, dict):
+            return np.array([float(p["x"]), float(p["y"])])
+        return np.array([float(p[0]), float(p[1])])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+def _clusters(values: np.ndarray, tol: float) -> Tuple[np.ndarray, np.ndarray]:
+    """(label per value, value per label); sorted values closer than ``tol`` share a label."""
+    if not len(values):
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    order = np.argsort(values, kind="stable")
+    v = values[order]
+    sorted_labels = np.concatenate([[0], np.cumsum(np.diff(v) > tol)])
+    labels = np.empty(len(values), dtype=np.int64)
+    labels[order] = sorted_labels
+    first = np.concatenate([[0], np.flatnonzero(np.diff(sorted_labels)) + 1])
+    return labels, v[first]
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, a: int) -> int:
+        parent = self.parent
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    def union(self, a: int, b: int) -> Tuple[int, int]:
+        """(root, absorbed root); equal when a and b were already joined."""
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a, a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return a, b
+
+    def copy(self) -> "_UnionFind":
+        other = _UnionFind(0)
+        other.parent, other.size = list(self.parent), list(self.size)
+        return other
+
+
+class ConstraintCounter:
+    """Incremental redundancy / completeness check of the dimensions of one view."""
+
+    def __init__(self, geometry: ViewGeometry, symmetry: Optional[Dict[str, Any]] = None,
+                 tol: Optional[float] = None):
+        self.geometry = geometry
+        self.tol = _tolerance(geometry, tol)
+        self.patterns = (symmetry or {}).get("patterns", [])
+        self._index()
+        self._topology = None
+        self._log: List[Tuple[Any, str, Dict[str, Any]]] = []
+        self._reset()
+
+    # setup
+    def _index(self):
+        """Reference points per entity, their x/y unknowns and the radius ties of every size group."""
+        e = self.geometry.entities
+        kind = e["type"]
+        center = e["center"]
+        radius = np.nan_to_num(e["radius"])[:, None]
+        quarter = np.array([[1.0, 0.0], [0.0, 1.0], [-1.0, 0.0], [0.0, -1.0]])
+        pts, rows, feature, centre_ref = [], [], [], []
+        for r in range(len(e)):
+            first = len(pts)
+            if kind[r] == LINE:
+                own = [e["start"][r], e["end"][r]]
+            elif kind[r] == ARC:
+                own = [e["center"][r], e["start"][r], e["end"][r]]
+            else:
+                own = [center[r]] + list(center[r] + radius[r] * quarter)
+            pts.extend(own)
+            rows.extend([r] * len(own))
+            feature.extend([True] * len(own) if kind[r] != CIRCLE else [True] + [False] * 4)
+            centre_ref.extend([-1] * len(own) if kind[r] == LINE else [-1] + [first] * (len(own) - 1))
+        self.ref_xy = np.array(pts, dtype=np.float64).reshape(-1, 2)
+        self.ref_row = np.array(rows, dtype=np.int64)
+        self.ref_feature = np.array(feature, dtype=bool)
+        self.row_refs = np.searchsorted(self.ref_row, np.arange(len(e) + 1))
+        self.node = []  # axis -> cluster of every reference point
+        self.value = []  # axis -> coordinate of every cluster
+        for axis in (0, 1):
+            labels, values = _clusters(self.ref_xy[:, axis], self.tol)
+            self.node.append(labels)
+            self.value.append(values)
+
+        # size groups: circles and arcs by type and radius
+        self.group = np.full(len(e), -1, dtype=np.int64)
+        self.group_rows: List[np.ndarray] = []
+        for k in (CIRCLE, ARC):
+            rows_k = np.flatnonzero(kind == k)
+            labels, _ = _clusters(e["radius"][rows_k], self.tol)
+            for label in range(int(labels.max()) + 1 if len(labels) else 0):
+                self.group[rows_k[labels == label]] = len(self.group_rows)
+                self.group_rows.append(rows_k[labels == label])
+        self.group_kind = ["radius"] * len(self.group_rows)
+        self.ties: List[List[Tuple[int, int, int]]] = [[] for _ in self.group_rows]  # (axis, node, node)
+        for ref in np.flatnonzero(np.array(centre_ref) >= 0):
+            c = centre_ref[ref]
+            g = int(self.group[self.ref_row[ref]])
+            for axis in (0, 1):
+                a, b = int(self.node[axis][ref]), int(self.node[axis][c])
+                if a != b:
+                    self.ties[g].append((axis, a, b))
+        self._pattern_groups()
+
+    def _pattern_groups(self):
+        """
+        One pitch group per direction of a hole pattern: consecutive members
+        are tied through the pitch (bolt circles: through their pitch circle).
+        """
+        g = self.geometry
+        for p in self.patterns:
+            ids = [i for i in p["ids"] if i in g]
+            if len(ids) < 3:
+                continue
+            centres = [int(self.row_refs[g.row(i)]) for i in ids]
+            directions = [(0, 1)] if p["kind"] == "circular" else [(0,), (1,)]
+            for axes in directions:
+                ties = []
+                for axis in axes:
+                    if p["kind"] == "circular":
+                        nodes = [int(self.node[axis][c]) for c in centres]
+                    else:
+                        nodes = sorted({int(self.node[axis][c]) for c in centres}, key=lambda n: self.value[axis][n])
+                    ties += [(axis, a, b) for a, b in zip(nodes, nodes[1:]) if a != b]
+                if len(ties) > 1:
+                    self.group_rows.append(g.rows(ids))
+                    self.group_kind.append("pitch")
+                    self.ties.append(ties)
+
+    def _reset(self):
+        self.uf = [_UnionFind(len(self.value[0])), _UnionFind(len(self.value[1]))]
+        self.sized = [None] * len(self.group_rows)  # group -> what gave its radius or pitch
+        self.aligned: List[Tuple[Any, Tuple[int, int], Tuple[int, int]]] = []
+        # root -> unsized groups with a tie in that component, per axis
+        self.waiting: List[Dict[int, set]] = [defaultdict(set), defaultdict(set)]
+        for g, ties in enumerate(self.ties):
+            for axis, a, b in ties:
+                self.waiting[axis][a].add(g)
+                self.waiting[axis][b].add(g)
+
+    # union-find with the radius ties
+    def _union(self, axis: int, a: int, b: int) -> bool:
+        """Join two unknowns; groups whose ties close as a result become sized. False if already joined."""
+        root, gone = self.uf[axis].union(a, b)
+        if root == gone:
+            return False
+        waiting = self.waiting[axis]
+        big, small = waiting.pop(root, set()), waiting.pop(gone, set())
+        if len(big) < len(small):
+            big, small = small, big
+        both = big & small
+        big |= small
+        if big:
+            waiting[root] = big
+        for g in both:
+            if self.sized[g] is None and self._closed(g):
+                self._size(g, "the other dimensions")
+        return True
+
+    def _closed(self, g: int) -> bool:
+        """A tie of the group with both ends in one component: its radius already follows."""
+        return any(self.uf[axis].find(a) == self.uf[axis].find(b) for axis, a, b in self.ties[g])
+
+    def _size(self, g: int, by: str):
+        self.sized[g] = by
+        for axis, a, b in self.ties[g]:
+            for n in (a, b):
+                self.waiting[axis].get(self.uf[axis].find(n), set()).discard(g)
+        for axis, a, b in self.ties[g]:
+            self._union(axis, a, b)
+
+    def _path(self, g: int, axis: int, a: int, b: int) -> bool:
+        """Do the ties of group g join the components of a and b on this axis?"""
+        find = self.uf[axis].find
+        adjacent = defaultdict(list)
+        for t_axis, u, v in self.ties[g]:
+            if t_axis == axis:
+                u, v = find(u), find(v)
+                adjacent[u].append(v)
+                adjacent[v].append(u)
+        start, goal = find(a), find(b)
+        seen, todo = {start}, [start]
+        while todo:
+            for n in adjacent[todo.pop()]:
+                if n == goal:
+                    return True
+                if n not in seen:
+                    seen.add(n)
+                    todo.append(n)
+        return False
+
+    # dimensions
+    def _ref(self, eid: Any, p) -> Optional[int]:
+        """Reference point of entity ``eid`` nearest to p."""
+        try:
+            row = self.geometry.row(int(eid))
+        except (KeyError, TypeError, ValueError):
+            return None
+        p = _point(p)
+        if p is None:
+            return None
+        lo, hi = self.row_refs[row], self.row_refs[row + 1]
+        d = np.hypot(*(self.ref_xy[lo:hi] - p).T)
+        return int(lo + np.argmin(d))
+
+    def _join(self, axis: int, a: int, b: int, what: str) -> Optional[str]:
+        find = self.uf[axis].find
+        name = AXES[axis]
+        if find(a) == find(b):
+            if a == b:
+                return f"both ends have the same {name} ({self.value[axis][a]:g})"
+            return (f"closes a chain: the {name} distance {self.value[axis][a]:g} to {self.value[axis][b]:g} "
+                    f"already follows from the other dimensions")
+        waiting = self.waiting[axis]
+        for g in sorted(waiting.get(find(a), set()) & waiting.get(find(b), set())):
+            if self.sized[g] is None and self._path(g, axis, a, b):
+                self._size(g, what)  # slot width, diameter: the dimension gives the radius
+                return None
+        self._union(axis, a, b)
+        return None
+
+    def _settle_aligned(self):
+        """Aligned dimensions fix the second axis of their ends once the first is known."""
+        changed = True
+        while changed:
+            changed = False
+            for item in list(self.aligned):
+                _, x, y = item
+                for axis, (a, b), (c, d) in ((1, y, x), (0, x, y)):
+                    if self.uf[1 - axis].find(c) == self.uf[1 - axis].find(d):
+                        self.aligned.remove(item)
+                        self._union(axis, a, b)
+                        changed = True
+                        break
+
+    def _apply(self, token: Any, kind: str, args: Dict[str, Any]) -> Optional[str]:
+        if kind in SIZES:
+            try:
+                row = self.geometry.row(int(args.get(SIZES[kind])))
+            except (KeyError, TypeError, ValueError):
+                return None
+            g = int(self.group[row])
+            if g < 0:
+                return None
+            if self.sized[g] is not None:
+                e = self.geometry.entities[row]
+                count = len(self.group_rows[g])
+                shape = "circle" if e["type"] == CIRCLE else "arc"
+                return (f"the radius {float(e['radius']):g} of {count} {shape}{'s' if count > 1 else ''} "
+                        f"already follows from {self.sized[g]}")
+            self._size(g, f"the {kind} dimension of {int(self.geometry.entities['id'][row])}")
+            self._settle_aligned()
+            return None
+        if kind not in ENDS:
+            return None
+        refs = [self._ref(args.get(id_arg), args.get(point_arg)) for id_arg, point_arg in ENDS[kind]]
+        points = [_point(args.get(point_arg)) for _, point_arg in ENDS[kind]]
+        text = _point(args.get("text_point"))
+        ids = sorted({int(self.geometry.entities["id"][self.ref_row[r]]) for r in refs if r is not None})
+        what = f"the {kind} dimension of {' and '.join(map(str, ids))}"
+        if None in refs or any(p is None for p in points) or text is None:
+            return None
+        x = (int(self.node[0][refs[0]]), int(self.node[0][refs[1]]))
+        y = (int(self.node[1][refs[0]]), int(self.node[1][refs[1]]))
+        axis = span_axis(points[0], points[1], text)
+        if axis == "aligned":
+            fixed = [self.uf[a].find(n[0]) == self.uf[a].find(n[1]) for a, n in ((0, x), (1, y))]
+            if all(fixed):
+                return "closes a chain: both its x and y distances already follow from the other dimensions"
+            if fixed[0] or fixed[1]:
+                self._join(1 if fixed[0] else 0, *(y if fixed[0] else x), what)
+            else:
+                self.aligned.append((token, x, y))
+        else:
+            axis = 0 if axis == "horizontal" else 1
+            reason = self._join(axis, *(x if axis == 0 else y), what)
+            if reason is not None:
+                return reason
+        self._settle_aligned()
+        return None
+
+    def add(self, kind: str, args: Dict[str, Any], token: Any = None) -> Optional[str]:
+        """
+        Add one dimension (``PlanValidator`` kinds: linear, linearoffset,
+        radial, arclength, holecallout). Returns why it is redundant (and
+        leaves the plan unchanged), or None once it is added.
+        """
+        kind = plan_type(kind)
+        reason = self._apply(token, kind, args)
+        if reason is None:
+            self._log.append((token, kind, args))
+        return reason
+
+    def add_all(self, operations: List[Dict[str, Any]], token: Any = None) -> List[Tuple[int, str]]:
+        """Add ``zw3d_batch_dim`` operations; returns (index, reason) of the redundant ones."""
+        redundant = []
+        for i, op in enumerate(operations):
+            reason = self.add(plan_type(op["type"]), op.get("args") or {}, token)
+            if reason is not None:
+                redundant.append((i, reason))
+        return redundant
+
+    def discard(self, token: Any):
+        """Forget the dimensions added with ``token`` (their call failed) by replaying the others."""
+        log = [item for item in self._log if item[0] != token]
+        if len(log) == len(self._log):
+            return
+        self._log = log
+        self._reset()
+        for t, kind, args in log:
+            self._apply(t, kind, args)
+
+    # completeness
+    def _features(self) -> Tuple[Dict[int, Dict[str, Any]], np.ndarray]:
+        """(entity id -> its contour, mask of the reference points that must be located)."""
+        if self._topology is None:
+            from tools.zw3d_topology import contours
+            topology = contours(self.geometry, self.tol)
+            contour_of = {}
+            for c in topology["contours"]:
+                for i in c["members"]:
+                    contour_of.setdefault(i, c)
+            # open chains (centre lines, construction lines) are not dimensioned themselves
+            loose = {i for chain in topology["open"] for i in chain}
+            on_chain = np.isin(self.geometry.entities["id"][self.ref_row], list(loose))
+            self._topology = contour_of, self.ref_feature & ~on_chain
+        return self._topology
+
+    def status(self) -> Dict[str, Any]:
+        """
+        ``{"dof", "unlocated": {"x": [ids], "y": [ids]}, "unsized": [ids],
+        "features": [text]}``. Positions are judged as if every radius and
+        pitch were given, so a missing one is counted once, as a size.
+        """
+        e = self.geometry.entities
+        contour_of, feature = self._features()
+        unlocated = {}
+        dof = 0
+        for axis in (0, 1):
+            uf = self.uf[axis].copy()
+            for g, ties in enumerate(self.ties):
+                if self.sized[g] is None:
+                    for t_axis, a, b in ties:
+                        if t_axis == axis:
+                            uf.union(a, b)
+            roots = np.array([uf.find(int(n)) for n in self.node[axis][feature]], dtype=np.int64)
+            unlocated[AXES[axis]] = []
+            if not len(roots):
+                continue
+            found = np.unique(roots)
+            # the datum is the left (bottom) edge, as in the rule planner
+            datum = roots[np.argmin(self.ref_xy[feature][:, axis])]
+            dof += len(found) - 1
+            rows = np.unique(self.ref_row[feature][roots != datum])
+            unlocated[AXES[axis]] = [int(i) for i in e["id"][rows]]
+        open_groups = [g for g in range(len(self.group_rows)) if self.sized[g] is None]
+        unsized = [int(e["id"][self.group_rows[g][0]]) for g in open_groups]
+        dof += len(open_groups) - len(self.aligned)
+
+        missing: Dict[Tuple[str, int], List[str]] = defaultdict(list)
+        where = lambda i: ("C", contour_of[i]["id"]) if i in contour_of else ("E", i)
+        for label, ids in (("x position", unlocated["x"]), ("y position", unlocated["y"])):
+            for i in ids:
+                if label not in missing[where(i)]:
+                    missing[where(i)].append(label)
+        for g, i in zip(open_groups, unsized):
+            rows = self.group_rows[g]
+            if self.group_kind[g] == "pitch":
+                label = "pitch of holes " + " ".join(str(int(j)) for j in e["id"][rows])
+            else:
+                label = f"radius {float(e['radius'][rows[0]]):g}" + (f" ({len(rows)}x)" if len(rows) > 1 else "")
+            missing[where(i)].append(label)
+        kinds = {c["id"]: c["kind"] for c in contour_of.values()}
+        features = [f"{f'C{n} {kinds[n]}' if tag == 'C' else f'entity {n}'}: {', '.join(labels)}"
+                    for (tag, n), labels in sorted(missing.items())]
+        return {"dof": max(dof, 0), "unlocated": unlocated, "unsized": unsized, "features": features}
+
+
+def format_status(status: Dict[str, Any], limit: int = 12) -> str:
+    """Short summary for tool results."""
+    if not status["features"]:
+        return "fully dimensioned"
+    more = len(status["features"]) - limit
+    return (f"{status['dof']} dimensions missing: " + "; ".join(status["features"][:limit])
+            + (f"; ... {more} more features" if more > 0 else ""))
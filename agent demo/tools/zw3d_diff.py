@@ -0,0 +1,218 @@
+"""
+Incremental re-dimensioning after a part edit.
+
+Re-running ``zw3d_stdvucrt_dim`` on an edited part projects a new view whose
+entities mostly equal the previous revision's, possibly with new ids and at a
+different sheet position. Instead of planning the whole view again:
+
+1. ``diff_views`` hashes every entity by its quantized content (type, radius,
+   end points, mid point; ``tools.zw3d_analysis.entity_keys``), finds the
+   sheet offset between the revisions (the candidate offset that matches the
+   most entities) and pairs the entities: ``unchanged`` (same content, id
+   possibly remapped), ``changed`` (same id or same position, different
+   content), ``added`` and ``removed``;
+2. ``remap_operations`` carries the previous dimension operations over to the
+   new ids and position; operations touching a changed or removed entity are
+   dropped;
+3. only ``ViewDiff.dirty`` (added and changed entities) goes to the planner or
+   the LLM.
+
+``DimensionHistory`` keeps the last view and its applied operations per part
+and view type (``ZW3D_DIM_HISTORY``, default ``<ZW3D_DATA_DIR>/dim_history``).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from tools.zw3d_analysis import _tolerance, entity_keys
+from tools.zw3d_geometry import CIRCLE, ViewGeometry
+from tools.zw3d_validator import plan_type
+
+MIN_REUSE = 0.5  # below this share of unchanged entities the whole view is planned again
+
+# operation type -> id arguments and point arguments it carries
+OPERATION_REFS = {
+    "linear": (("id",), ("start_point", "end_point", "text_point")),
+    "linearoffset": (("id1", "id2"), ("first_point", "second_point", "text_point")),
+    "radial": (("id",), ("point", "text_point")),
+    "arclength": (("arc_id",), ("arc_point", "text_point")),
+    "holecallout": (("hole_curve_id",), ("text_point",)),
+}
+
+
+class ViewDiff:
+    """Pairing of the entities of two revisions of a view."""
+
+    def __init__(self, offset: np.ndarray, unchanged: Dict[int, int], changed: Dict[int, int],
+                 added: List[int], removed: List[int], view_id: Optional[int] = None,
+                 old_view_id: Optional[int] = None):
+        self.offset = offset  # new position = old position + offset
+        self.unchanged = unchanged  # old id -> new id
+        self.changed = changed  # old id -> new id
+        self.added = added  # new ids
+        self.removed = removed  # old ids
+        self.view_id = view_id
+        self.old_view_id = old_view_id
+
+    @property
+    def dirty(self) -> List[int]:
+        """New ids that need dimensions: added and changed entities."""
+        return sorted(set(self.added) | set(self.changed.values()))
+
+    @property
+    def same_view(self) -> bool:
+        """Both revisions are the same drawing view (a cached extraction): its dimensions are still there."""
+        return self.view_id is not None and self.view_id == self.old_view_id
+
+    @property
+    def reuse(self) -> float:
+        """Fraction of the new entities that are unchanged."""
+        total = len(self.unchanged) + len(self.changed) + len(self.added)
+        return len(self.unchanged) / total if total else 1.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {"offset": [round(float(v), 6) for v in self.offset], "unchanged": len(self.unchanged),
+                "changed": len(self.changed), "added": len(self.added), "removed": len(self.removed)}
+
+
+def _shifted(entities: np.ndarray, offset: np.ndarray) -> np.ndarray:
+    out = entities.copy()
+    for field in ("start", "end", "mid", "center"):
+        out[field] += offset
+    return out
+
+
+def _key_rows(keys: np.ndarray) -> Dict[bytes, List[int]]:
+    rows = defaultdict(list)
+    for r, k in enumerate(map(bytes, np.ascontiguousarray(keys))):
+        rows[k].append(r)
+    return rows
+
+
+def diff_views(old: ViewGeometry, new: ViewGeometry, tol: Optional[float] = None) -> ViewDiff:
+    """Pair the entities of ``old`` and ``new`` by content; see the module docstring."""
+    tol = _tolerance(new, tol)
+    new_rows = _key_rows(entity_keys(new.entities, tol))
+    o, n = np.array(old.bbox()), np.array(new.bbox())
+    candidates = [np.zeros(2), n[:2] - o[:2], n[2:] - o[2:], (n[:2] + n[2:] - o[:2] - o[2:]) / 2]
+
+    best = None
+    for offset in candidates:
+        keys = list(map(bytes, np.ascontiguousarray(entity_keys(_shifted(old.entities, offset), tol))))
+        hits = sum(k in new_rows for k in keys)
+        if best is None or hits > best[0]:
+            best = (hits, offset, keys)
+    _, offset, old_keys = best
+
+    new_ids, old_ids = new.entities["id"], old.entities["id"]
+    taken = np.zeros(len(new), dtype=bool)
+    unchanged: Dict[int, int] = {}
+    left_old = []
+    for r, k in enumerate(old_keys):
+        free = [c for c in new_rows.get(k, ()) if not taken[c]]
+        if not free:
+            left_old.append(r)
+            continue
+        same = [c for c in free if new_ids[c] == old_ids[r]]
+        c = (same or free)[0]
+        taken[c] = True
+        unchanged[int(old_ids[r])] = int(new_ids[c])
+
+    # what is left: same id and type, or same type at the same place (a resized hole) -> changed
+    changed: Dict[int, int] = {}
+    left_new = {int(new_ids[c]): c for c in np.flatnonzero(~taken)}
+    where = defaultdict(list)
+    for c in left_new.values():
+        e = new.entities[c]
+        at = e["center"] if e["type"] == CIRCLE else e["mid"]
+        where[(int(e["type"]), *np.round(at / tol).astype(np.int64).tolist())].append(c)
+    removed = []
+    for r in left_old:
+        e = old.entities[r]
+        c = left_new.get(int(e["id"]))
+        if c is None or taken[c] or new.entities[c]["type"] != e["type"]:
+            at = (e["center"] if e["type"] == CIRCLE else e["mid"]) + offset
+            c = next((c for c in where[(int(e["type"]), *np.round(at / tol).astype(np.int64).tolist())]
+                      if not taken[c]), None)
+        if c is None:
+            removed.append(int(e["id"]))
+            continue
+        taken[c] = True
+        changed[int(e["id"])] = int(new_ids[c])
+    added = [int(i) for i in new_ids[~taken]]
+    return ViewDiff(np.asarray(offset, dtype=float), unchanged, changed, added, removed, new.view_id, old.view_id)
+
+
+def _moved(p, offset: np.ndarray):
+    dx, dy = float(offset[0]), float(offset[1])
+    if isinstance(p, dict):
+        return {**p, "x": round(float(p["x"]) + dx, 4), "y": round(float(p["y"]) + dy, 4)}
+    return [round(float(p[0]) + dx, 4), round(float(p[1]) + dy, 4)]
+
+
+def operation_ids(op: Dict[str, Any]) -> List[int]:
+    ids, _ = OPERATION_REFS.get(plan_type(op.get("type")), ((), ()))
+    args = op.get("args") or {}
+    return [int(args[a]) for a in ids if a in args]
+
+
+def remap_operations(operations: Iterable[Dict[str, Any]],
+                     diff: ViewDiff) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(kept, dropped): ``kept`` rewritten for the new view, ``dropped`` touch changed/removed entities."""
+    kept, dropped = [], []
+    for op in operations:
+        kind = plan_type(op.get("type"))
+        ids, points = OPERATION_REFS.get(kind, (None, None))
+        args = op.get("args") or {}
+        if ids is None or any(int(args.get(a, -1)) not in diff.unchanged for a in ids):
+            dropped.append(op)
+            continue
+        new = dict(args)
+        for a in ids:
+            new[a] = diff.unchanged[int(args[a])]
+        for a in points:
+            if a in new:
+                new[a] = _moved(new[a], diff.offset)
+        if kind == "holecallout" and diff.view_id is not None:
+            new["view_id"] = diff.view_id
+        kept.append({**op, "type": kind, "args": new})
+    return kept, dropped
+
+
+class DimensionHistory:
+    """Last dimensioned revision of each (part, view type): the view JSON and the applied operations."""
+
+    def __init__(self, root: Optional[str] = None):
+        if root is None:
+            data_dir = os.getenv("ZW3D_DATA_DIR", "D:/AI_AUTODIM_DATA")
+            root = os.getenv("ZW3D_DIM_HISTORY", f"{data_dir}/dim_history")
+        self.root = root
+
+    @staticmethod
+    def key(path: str, view_type: Any) -> str:
+        name = f"{os.path.normcase(os.path.normpath(str(path)))}|{view_type}"
+        return hashlib.sha1(name.encode("utf-8")).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def load(self, key: str) -> Optional[Tuple[ViewGeometry, List[Dict[str, Any]]]]:
+        try:
+            with open(self._file(key), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return ViewGeometry.from_json(data["view"]), data["operations"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, key: str, geometry: ViewGeometry, operations: List[Dict[str, Any]]) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self._file(key) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"view": geometry.to_json(), "operations": operations}, f, ensure_ascii=False)
+        os.replace(tmp, self._file(key))
@@ -0,0 +1,155 @@
+"""
+Token-compact text encoding of a view for prompts.
+
+``json.dumps(view, indent=2)`` repeats ``"points"``, ``"middle"``,
+``"0degree"`` ... for every entity and prints every float in full. The
+compact form is one table per entity type, numbers rounded to the drawing
+tolerance and trailing zeros dropped::
+
+    view 101 (view 1), 57 entities, coordinates in mm
+    lines: id x1 y1 x2 y2
+    7 0 0 200 0
+    arcs: id cx cy r x1 y1 x2 y2 (counter-clockwise from x1,y1 to x2,y2)
+    21 40 50 6 46 50 34 50
+    circles: id cx cy r
+    30 100 50 12.5
+
+Points that follow from the others are left out: line mid points, arc mid
+points (arcs are written counter-clockwise instead) and circle quadrant
+points. With ``relative=True`` coordinates are given from the lower-left
+corner of the view (``origin x y`` line), which shortens them further on
+sheets where the view sits far from 0,0.
+
+``decode_geometry`` reads the text back into a ``ViewGeometry``;
+``token_report`` compares the token counts of both forms with tiktoken.
+"""
+from __future__ import annotations
+
+import json
+import math
+import re
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from tools.zw3d_geometry import ARC, CIRCLE, ENTITY_DTYPE, LINE, GeometryError, ViewGeometry
+
+_HEADER = re.compile(r"view (\S+) \(view (\S+)\), (\d+) entities")
+
+
+def decimals_for(geometry: ViewGeometry, tol: Optional[float] = None) -> int:
+    """Decimal places that keep ``tol`` (default 1e-4 of the view size), between 0 and 4."""
+    if tol is None:
+        xmin, ymin, xmax, ymax = geometry.bbox()
+        tol = 1e-4 * max(xmax - xmin, ymax - ymin)
+    if tol <= 0:
+        return 4
+    return int(min(4, max(0, math.ceil(-math.log10(tol)))))
+
+
+def _fmt(values: np.ndarray, decimals: int):
+    """Rounded numbers without trailing zeros ("12.5", "0", "-3")."""
+    out = []
+    for v in np.round(values, decimals).tolist():
+        s = f"{v:.{decimals}f}".rstrip("0").rstrip(".") if decimals else f"{v:.0f}"
+        out.append("0" if s in ("-0", "") else s)
+    return out
+
+
+def ccw_arcs(arcs: np.ndarray):
+    """(start, end) of every arc row ordered so the arc runs counter-clockwise through its mid point."""
+    c = arcs["center"]
+    ang = lambda p: np.arctan2(p[:, 1] - c[:, 1], p[:, 0] - c[:, 0])
+    a0, a1, am = ang(arcs["start"]), ang(arcs["end"]), ang(arcs["mid"])
+    two_pi = 2 * math.pi
+    ccw = np.mod(am - a0, two_pi) < np.mod(a1 - a0, two_pi)
+    start = np.where(ccw[:, None], arcs["start"], arcs["end"])
+    end = np.where(ccw[:, None], arcs["end"], arcs["start"])
+    return start, end
+
+
+def encode_geometry(geometry: ViewGeometry, decimals: Optional[int] = None, relative: bool = False) -> str:
+    """The compact text form of ``geometry``."""
+    d = decimals_for(geometry) if decimals is None else decimals
+    origin = np.zeros(2)
+    rows = [f"view {geometry.view_id} (view {geometry.view}), {len(geometry)} entities, coordinates in mm"]
+    if relative and len(geometry):
+        xmin, ymin, _, _ = geometry.bbox()
+        origin = np.round([xmin, ymin], d)
+        x0, y0 = _fmt(origin, d)
+        rows.append(f"origin {x0} {y0} (add it to every coordinate below)")
+
+    def table(title, ids, cols):
+        rows.append(title)
+        rows.extend(" ".join(r) for r in zip(map(str, ids.tolist()), *(_fmt(c, d) for c in cols)))
+
+    lines, arcs, circles = geometry.lines, geometry.arcs, geometry.circles
+    if len(lines):
+        s, e = lines["start"] - origin, lines["end"] - origin
+        table("lines: id x1 y1 x2 y2", lines["id"], [s[:, 0], s[:, 1], e[:, 0], e[:, 1]])
+    if len(arcs):
+        s, e = ccw_arcs(arcs)
+        s, e, c = s - origin, e - origin, arcs["center"] - origin
+        table("arcs: id cx cy r x1 y1 x2 y2 (counter-clockwise from x1,y1 to x2,y2)",
+              arcs["id"], [c[:, 0], c[:, 1], arcs["radius"], s[:, 0], s[:, 1], e[:, 0], e[:, 1]])
+    if len(circles):
+        c = circles["center"] - origin
+        table("circles: id cx cy r", circles["id"], [c[:, 0], c[:, 1], circles["radius"]])
+    return "\n".join(rows)
+
+
+def decode_geometry(text: str) -> ViewGeometry:
+    """Parse ``encode_geometry`` output back (points rounded as encoded, original order lost)."""
+    lines = text.strip().splitlines()
+    m = _HEADER.match(lines[0]) if lines else None
+    if not m:
+        raise GeometryError("not an encoded view")
+    num = lambda s: None if s == "None" else int(s)
+    view_id, view = num(m.group(1)), num(m.group(2))
+    origin = np.zeros(2)
+    kind = None
+    out = []
+    for row in lines[1:]:
+        head = row.split(":", 1)[0]
+        if row.startswith("origin "):
+            origin = np.array([float(v) for v in row.split()[1:3]])
+            continue
+        if head in ("lines", "arcs", "circles"):
+            kind = {"lines": LINE, "arcs": ARC, "circles": CIRCLE}[head]
+            continue
+        f = row.split()
+        eid, v = int(f[0]), [float(x) for x in f[1:]]
+        if kind == LINE:
+            s, e = np.array(v[0:2]) + origin, np.array(v[2:4]) + origin
+            out.append((eid, LINE, s, e, (s + e) / 2, (np.nan, np.nan), np.nan, len(out)))
+        elif kind == ARC:
+            c, r = np.array(v[0:2]) + origin, v[2]
+            s, e = np.array(v[3:5]) + origin, np.array(v[5:7]) + origin
+            a0 = math.atan2(s[1] - c[1], s[0] - c[0])
+            sweep = math.atan2(e[1] - c[1], e[0] - c[0]) - a0
+            sweep = sweep % (2 * math.pi) or 2 * math.pi
+            am = a0 + sweep / 2
+            out.append((eid, ARC, s, e, c + r * np.array([math.cos(am), math.sin(am)]), c, r, len(out)))
+        elif kind == CIRCLE:
+            c, r = np.array(v[0:2]) + origin, v[2]
+            out.append((eid, CIRCLE, c + (r, 0), c + (0, r), c - (r, 0), c, r, len(out)))
+        else:
+            raise GeometryError(f"row outside a table: {row!r}")
+    return ViewGeometry(np.array(out, dtype=ENTITY_DTYPE), view_id, view)
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    import tiktoken
+    try:
+        enc = tiktoken.encoding_for_model(model)
+    except KeyError:
+        enc = tiktoken.get_encoding("o200k_base")
+    return len(enc.encode(text))
+
+
+def token_report(geometry: ViewGeometry, encoded: Optional[str] = None, model: str = "gpt-4o") -> Dict[str, Any]:
+    """Tokens of the indented JSON form vs the compact form."""
+    encoded = encode_geometry(geometry) if encoded is None else encoded
+    before = count_tokens(json.dumps(geometry.to_json(), ensure_ascii=False, indent=2), model)
+    after = count_tokens(encoded, model)
+    return {"json": before, "compact": after, "saved": round(1 - after / before, 4) if before else 0.0}
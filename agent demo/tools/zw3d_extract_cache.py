@@ -0,0 +1,213 @@
+"""
+Content-addressed cache of ``STDVUDIM`` extractions.
+
+``zw3d_stdvucrt_dim`` projects a standard view, walks
+``ZwDrawingViewGeometryListGet`` and exports a PNG on every call, even for a
+part that was processed an hour ago. ``ExtractCache`` keeps the
+``stdvu_output.json``/``.png`` of each extraction under a key made of
+
+- the SHA-256 of the part file (memoized per path, size and mtime) and its
+  full path, which names the drawing the view is created in (``STDVUDIM``
+  puts ``<dir>/<root name>.Z3DRW`` next to the part),
+- the view type and location sent to ``STDVUDIM`` (the view scale is fixed in
+  the DLL),
+- ``EXTRACTOR_VERSION`` (``ZW3D_EXTRACTOR_VERSION``), bumped whenever the
+  DLL's output changes.
+
+On a hit the command is not sent: the cached files are copied into the new
+request directory with their ``.done`` marker, so readers see the usual
+result. The entity ids are those of the view created by the cached run, which
+stays in the part's ``.Z3DRW`` drawing that ``STDVUDIM`` reopens; the tool
+activates that drawing and asks ZW3D (``ENTCHECK``) whether the cached view id
+and a sample of its entity ids (``probe``, stored with the entry) still exist.
+They do not when the drawing was closed without saving or edited since; the
+entry is then dropped and the view extracted again. Parts that Python cannot
+read are never cached.
+
+Entries are directories ``<root>/<key>/``; their mtime is the LRU clock
+(touched on every hit), and the least recently used entries are removed once
+the cache holds more than ``max_bytes`` (``ZW3D_EXTRACT_CACHE_MB``).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from tools.zw3d_results import get_watcher, write_atomic
+
+EXTRACTOR_VERSION = os.getenv("ZW3D_EXTRACTOR_VERSION", "stdvudim-2")
+FILES = ("stdvu_output.json", "stdvu_output.png")
+PROBE_SIZE = 8  # entity ids checked in the drawing on a hit, besides the view id
+
+_hashes: Dict[Tuple[str, int, int], str] = {}
+_hashes_lock = threading.Lock()
+
+
+def file_hash(path: str) -> Optional[str]:
+    """SHA-256 of a file, or None if it cannot be read from here."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    memo = (os.path.normcase(os.path.abspath(path)), st.st_size, st.st_mtime_ns)
+    with _hashes_lock:
+        if memo in _hashes:
+            return _hashes[memo]
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    except OSError:
+        return None
+    with _hashes_lock:
+        _hashes[memo] = h.hexdigest()
+    return _hashes[memo]
+
+
+class ExtractCache:
+    """LRU, size-bounded store of view extractions keyed by part content."""
+
+    def __init__(self, root: str, max_bytes: int = 512 << 20, version: str = EXTRACTOR_VERSION):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.version = version
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._pending: List[threading.Thread] = []
+
+    def key(self, path: str, view_type: Any, x: Any, y: Any) -> Optional[str]:
+        digest = file_hash(str(path))
+        if digest is None:
+            return None
+        where = os.path.normcase(os.path.abspath(str(path).replace("\\", "/"))).replace("\\", "/")
+        name = json.dumps([digest, where, int(view_type), float(x), float(y), self.version])
+        return hashlib.sha256(name.encode("utf-8")).hexdigest()
+
+    def _dir(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Metadata of a cached extraction, or None."""
+        try:
+            with open(os.path.join(self._dir(key), "meta.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def restore(self, key: str, out_dir: str) -> Optional[Dict[str, Any]]:
+        """Copy a cached extraction into ``out_dir`` (with its ``.done``); returns its metadata or None."""
+        entry = self._dir(key)
+        try:
+            with open(os.path.join(entry, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            os.makedirs(out_dir, exist_ok=True)
+            for name in FILES:
+                shutil.copyfile(os.path.join(entry, name), os.path.join(out_dir, name + ".tmp"))
+                os.replace(os.path.join(out_dir, name + ".tmp"), os.path.join(out_dir, name))
+            os.utime(entry)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        write_atomic(os.path.join(out_dir, "stdvu_output.done"), "done")
+        with self._lock:
+            self.hits += 1
+        return meta
+
+    def discard(self, key: str):
+        """Drop an entry whose view is gone from the drawing."""
+        with self._lock:
+            shutil.rmtree(self._dir(key), ignore_errors=True)
+
+    def put(self, key: str, src_dir: str, meta: Dict[str, Any]) -> bool:
+        """Store the extraction written to ``src_dir``; False if it is incomplete."""
+        if not all(os.path.exists(os.path.join(src_dir, name)) for name in FILES):
+            return False
+        try:
+            with open(os.path.join(src_dir, FILES[0]), "r", encoding="utf-8") as f:
+                meta = {**meta, **probe(json.load(f))}
+        except (ValueError, TypeError, KeyError):
+            return False
+        entry = self._dir(key)
+        tmp = f"{entry}.{threading.get_ident()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name in FILES:
+            shutil.copyfile(os.path.join(src_dir, name), os.path.join(tmp, name))
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        with self._lock:
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        self.evict()
+        return True
+
+    def put_when_done(self, key: str, src_dir: str, meta: Dict[str, Any], timeout: Optional[float] = None):
+        """``put`` once ZW3D has published the extraction (the reader may consume ``.done`` first)."""
+        def fill():
+            # the json is published after the png and before the marker
+            if not os.path.exists(os.path.join(src_dir, FILES[0])):
+                try:
+                    get_watcher().wait(os.path.join(src_dir, "stdvu_output.done"), timeout)
+                except (TimeoutError, OSError):
+                    pass
+            try:
+                self.put(key, src_dir, meta)
+            except OSError:
+                pass  # the cache is an optimisation only
+
+        thread = threading.Thread(target=fill, name="zw3d-extract-cache", daemon=True)
+        with self._lock:
+            self._pending = [t for t in self._pending if t.is_alive()] + [thread]
+        thread.start()
+
+    def join(self, timeout: Optional[float] = None):
+        """Wait for pending ``put_when_done`` copies."""
+        with self._lock:
+            pending = list(self._pending)
+        for thread in pending:
+            thread.join(timeout)
+
+    def evict(self) -> int:
+        """Remove least recently used entries beyond ``max_bytes``; returns how many were removed."""
+        with self._lock:
+            try:
+                entries = [e for e in os.scandir(self.root) if e.is_dir() and not e.name.endswith(".tmp")]
+            except FileNotFoundError:
+                return 0
+            sized = []
+            for e in entries:
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(e.path))
+                    sized.append((e.stat().st_mtime, size, e.path))
+                except OSError:
+                    continue
+            total = sum(size for _, size, _ in sized)
+            removed = 0
+            for _, size, path in sorted(sized):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                removed += 1
+            return removed
+
+
+def probe(view: Dict[str, Any], size: int = PROBE_SIZE) -> Dict[str, Any]:
+    """``{"view id", "probe"}``: the ids whose presence in the drawing confirms a cached extraction."""
+    ids = [int(e["id"]) for e in view.get("entities", []) if "id" in e]
+    step = max(1, -(-len(ids) // size))
+    return {"view id": view.get("view id"), "probe": ids[::step][:size]}
+
+
+def cache_from_env(data_dir: str) -> Optional[ExtractCache]:
+    """``ZW3D_EXTRACT_CACHE`` (directory, default ``<data dir>/extract_cache``, ``0`` disables)."""
+    root = os.getenv("ZW3D_EXTRACT_CACHE", f"{data_dir}/extract_cache")
+    if root == "0":
+        return None
+    return ExtractCache(root, max_bytes=int(float(os.getenv("ZW3D_EXTRACT_CACHE_MB", "512")) * (1 << 20)))
@@ -0,0 +1,209 @@
+"""
+Array-backed geometry of one drawing view (``stdvu_output.json``).
+
+The DLL writes the entities of a view as
+
+    {"view id": 101, "view": 1, "entities": [
+        {"id": 7, "type": "line",   "points": {"start": [x, y], "end": [...], "middle": [...]}},
+        {"id": 8, "type": "arc",    "points": {"center": ..., "start": ..., "end": ..., "middle": ...}},
+        {"id": 9, "type": "circle", "points": {"center": ..., "0degree": ..., "90degree": ...,
+                                               "180degree": ..., "270degree": ...}}]}
+
+``ViewGeometry`` parses that once into a NumPy structured array
+(``ENTITY_DTYPE``), one row per entity:
+
+- ``start``/``end``/``mid``: line and arc end points and mid point; for a
+  circle the 0, 90 and 180 degree points (270 is ``2 * center - end``);
+- ``center``/``radius``: arcs and circles (NaN for lines).
+
+Rows are grouped by type, so ``lines``/``arcs``/``circles`` are zero-copy
+slices of ``entities``; ``row(id)`` is a dict lookup. ``to_json()`` gives the
+original format back (in the original order) for prompts and logs.
+
+Splines, ellipses and points are written by the DLL as a bare ``{"id": n}``
+(no type, no points). They cannot be dimensioned by the tools, so they are
+left out of ``entities``; their ids are kept in ``unsupported``.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+TYPE_NAMES = ("line", "arc", "circle")
+TYPE_CODES = {name: code for code, name in enumerate(TYPE_NAMES)}
+LINE, ARC, CIRCLE = range(3)
+
+_POINT = ("<f8", (2,))
+ENTITY_DTYPE = np.dtype([
+    ("id", "<i8"),
+    ("type", "u1"),
+    ("start", *_POINT),
+    ("end", *_POINT),
+    ("mid", *_POINT),
+    ("center", *_POINT),
+    ("radius", "<f8"),
+    ("order", "<i4"),  # position in the original "entities" list
+])
+
+_NAN2 = (np.nan, np.nan)
+
+
+class GeometryError(ValueError):
+    """The view JSON does not have the expected shape."""
+
+
+def _point(points: Dict[str, Any], key: str) -> Tuple[float, float]:
+    p = points.get(key)
+    if p is None:
+        raise GeometryError(f"missing point {key!r}")
+    return float(p[0]), float(p[1])
+
+
+def _row(ent: Dict[str, Any], order: int) -> tuple:
+    kind = ent.get("type")
+    code = TYPE_CODES[kind]
+    pts = ent.get("points") or {}
+    try:
+        if code == LINE:
+            return (ent["id"], code, _point(pts, "start"), _point(pts, "end"), _point(pts, "middle"),
+                    _NAN2, np.nan, order)
+        center = _point(pts, "center")
+        if code == ARC:
+            start = _point(pts, "start")
+            radius = float(np.hypot(start[0] - center[0], start[1] - center[1]))
+            return (ent["id"], code, start, _point(pts, "end"), _point(pts, "middle"), center, radius, order)
+        p0 = _point(pts, "0degree")
+        radius = float(np.hypot(p0[0] - center[0], p0[1] - center[1]))
+        return (ent["id"], code, p0, _point(pts, "90degree"), _point(pts, "180degree"), center, radius, order)
+    except GeometryError as e:
+        raise GeometryError(f"entity {ent.get('id')} ({kind}): {e}") from None
+
+
+class ViewGeometry:
+    """The entities of one view as a structured array, grouped by type."""
+
+    def __init__(self, entities: np.ndarray, view_id: Optional[int] = None, view: Optional[int] = None,
+                 unsupported: Iterable[int] = ()):
+        if entities.dtype != ENTITY_DTYPE:
+            raise GeometryError(f"expected ENTITY_DTYPE, got {entities.dtype}")
+        # stable sort by type keeps the original order inside each group
+        order = np.argsort(entities["type"], kind="stable")
+        self.entities = entities[order] if len(entities) else entities
+        self.view_id = view_id
+        self.view = view
+        self.unsupported: List[int] = list(unsupported)  # ids of untyped entities (splines, ellipses, points)
+        self._bounds = np.searchsorted(self.entities["type"], np.arange(len(TYPE_NAMES) + 1))
+        self._index: Dict[int, int] = {int(i): r for r, i in enumerate(self.entities["id"])}
+
+    # construction
+    @classmethod
+    def from_json(cls, data: Union[str, bytes, Dict[str, Any]]) -> "ViewGeometry":
+        """Parse the view dict, or its JSON text as written by the DLL."""
+        if isinstance(data, (str, bytes)):
+            data = json.loads(data)
+        if not isinstance(data, dict) or not isinstance(data.get("entities"), list):
+            raise GeometryError("view JSON needs an 'entities' list")
+        rows, unsupported = [], []
+        for i, ent in enumerate(data["entities"]):
+            if ent.get("type") in TYPE_CODES:
+                rows.append(_row(ent, i))
+            else:
+                unsupported.append(ent.get("id"))
+        return cls(np.array(rows, dtype=ENTITY_DTYPE), data.get("view id"), data.get("view"), unsupported)
+
+    @classmethod
+    def from_file(cls, path: str) -> "ViewGeometry":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_json(f.read())
+
+    @classmethod
+    def load(cls, json_path: str, done_path: str, timeout: Optional[float] = None) -> "ViewGeometry":
+        """Wait for the STDVUDIM ``.done`` marker and parse the result."""
+        from tools.zw3d_results import read_with_done_check
+        return cls.from_json(read_with_done_check(json_path, done_path, timeout))
+
+    # access
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def __contains__(self, entity_id: int) -> bool:
+        return int(entity_id) in self._index
+
+    def of_type(self, kind: Union[str, int]) -> np.ndarray:
+        """All rows of one type, as a view into ``entities``."""
+        code = TYPE_CODES[kind] if isinstance(kind, str) else kind
+        return self.entities[self._bounds[code]:self._bounds[code + 1]]
+
+    @property
+    def lines(self) -> np.ndarray:
+        return self.of_type(LINE)
+
+    @property
+    def arcs(self) -> np.ndarray:
+        return self.of_type(ARC)
+
+    @property
+    def circles(self) -> np.ndarray:
+        return self.of_type(CIRCLE)
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self.entities["id"]
+
+    def row(self, entity_id: int) -> int:
+        """Row of ``entity_id`` in ``entities``; KeyError if unknown."""
+        return self._index[int(entity_id)]
+
+    def get(self, entity_id: int) -> np.void:
+        return self.entities[self._index[int(entity_id)]]
+
+    def type_name(self, entity_id: int) -> str:
+        return TYPE_NAMES[self.get(entity_id)["type"]]
+
+    def rows(self, ids: Iterable[int]) -> np.ndarray:
+        return np.fromiter((self._index[int(i)] for i in ids), dtype=np.intp)
+
+    def select(self, ids: Iterable[int]) -> "ViewGeometry":
+        """A new geometry with only ``ids`` (copies the rows)."""
+        return ViewGeometry(self.entities[np.sort(self.rows(ids))], self.view_id, self.view, self.unsupported)
+
+    def bbox(self) -> Tuple[float, float, float, float]:
+        """(xmin, ymin, xmax, ymax) of all end points, mid points and circle extents."""
+        if not len(self):
+            return (0.0, 0.0, 0.0, 0.0)
+        e = self.entities
+        pts = np.concatenate([e["start"], e["end"], e["mid"]])
+        circles = self.circles
+        if len(circles):
+            r = circles["radius"][:, None]
+            pts = np.concatenate([pts, circles["center"] - r, circles["center"] + r])
+        lo, hi = pts.min(axis=0), pts.max(axis=0)
+        return float(lo[0]), float(lo[1]), float(hi[0]), float(hi[1])
+
+    # back to the DLL format
+    def entity(self, entity_id: int) -> Dict[str, Any]:
+        return _entity_dict(self.get(entity_id))
+
+    def to_json(self) -> Dict[str, Any]:
+        """The view in the ``stdvu_output.json`` format, original entity order (unsupported entities left out)."""
+        ordered = self.entities[np.argsort(self.entities["order"], kind="stable")]
+        return {"view id": self.view_id, "view": self.view, "entities": [_entity_dict(r) for r in ordered]}
+
+
+def _xy(p) -> List[float]:
+    return [float(p[0]), float(p[1])]
+
+
+def _entity_dict(r: np.void) -> Dict[str, Any]:
+    code = int(r["type"])
+    if code == LINE:
+        points = {"start": _xy(r["start"]), "end": _xy(r["end"]), "middle": _xy(r["mid"])}
+    elif code == ARC:
+        points = {"center": _xy(r["center"]), "start": _xy(r["start"]), "end": _xy(r["end"]),
+                  "middle": _xy(r["mid"])}
+    else:
+        points = {"center": _xy(r["center"]), "0degree": _xy(r["start"]), "90degree": _xy(r["end"]),
+                  "180degree": _xy(r["mid"]), "270degree": _xy(2 * r["center"] - r["end"])}
+    return {"id": int(r["id"]), "type": TYPE_NAMES[code], "points": points}
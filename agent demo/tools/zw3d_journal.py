@@ -0,0 +1,162 @@
+"""
+Write-ahead journal for long tool-calling dialogs.
+
+If ZW3D or the Python process dies halfway through a 60-call ``run_dialog``,
+the model's work would be paid for again. ``Journal`` records, in order:
+
+- ``{"t":"start","h":...,"m":[...]}`` the initial messages and their hash
+  (guards against resuming a different session; lets a nested dialog resume
+  without re-reading its inputs);
+- ``{"t":"msg","m":{...}}``   every assistant message (text + tool_calls);
+- ``{"t":"plan","c":id,...}`` a tool call, written *before* it is executed;
+- ``{"t":"ack","c":id,"r":...}`` its final result.
+
+On restart ``run_dialog(..., journal=Journal(same_path))`` replays the
+recorded assistant messages instead of querying the model, reuses
+acknowledged results, and executes only the calls after the last
+acknowledged one (a call that was planned but not acknowledged may have run
+already; it is executed again).
+
+Records are flushed to the OS before each execution, which survives a crash
+of the Python process. ``fsync`` is batched (every ``sync_every`` records or
+``sync_interval`` seconds) so the journal stays off the hot path; a power loss
+can lose at most that window.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+
+class JournalMismatch(ValueError):
+    """The journal was written for a dialog with different initial messages."""
+
+
+def _digest(messages: List[Dict[str, Any]]) -> str:
+    text = json.dumps(messages, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+class Journal:
+    """Compact, fsync-batched JSONL journal of one dialog (see module docstring)."""
+
+    def __init__(self, path: str, sync_every: int = 32, sync_interval: float = 0.5):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.header: Optional[str] = None
+        self.initial: Optional[List[Dict[str, Any]]] = None
+        self.planned: Dict[str, Dict[str, Any]] = {}
+        self.results: Dict[str, Any] = {}
+        self.finished = False
+        self._replay: Deque[Dict[str, Any]] = deque()
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._load()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._f = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        good = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                good += len(line)
+                kind = rec.get("t")
+                if kind == "start":
+                    self.header = rec["h"]
+                    self.initial = rec.get("m")
+                elif kind == "msg":
+                    self._replay.append(rec["m"])
+                elif kind == "plan":
+                    self.planned[rec["c"]] = {"name": rec["n"], "args": rec["a"]}
+                elif kind == "ack":
+                    self.results[rec["c"]] = rec["r"]
+                elif kind == "end":
+                    self.finished = True
+        if good < os.path.getsize(self.path):
+            # torn tail from a crash: drop it so new records start on a clean line
+            with open(self.path, "r+b") as f:
+                f.truncate(good)
+
+    # writing
+    def _write(self, rec: Dict[str, Any], sync: bool = False):
+        line = json.dumps(rec, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            self._unsynced += 1
+            now = time.monotonic()
+            if sync or self._unsynced >= self.sync_every or now - self._last_sync >= self.sync_interval:
+                os.fsync(self._f.fileno())
+                self._unsynced = 0
+                self._last_sync = now
+
+    def begin(self, messages: List[Dict[str, Any]]):
+        """Start a new journal or check that an existing one belongs to ``messages``."""
+        digest = _digest(messages)
+        if self.header is None:
+            self.header = digest
+            self.initial = json.loads(json.dumps(messages, default=str))
+            self._write({"t": "start", "h": digest, "m": messages}, sync=True)
+        elif self.header != digest:
+            raise JournalMismatch(f"{self.path} was written for a different dialog")
+
+    def assistant(self, message: Dict[str, Any]):
+        self._write({"t": "msg", "m": message})
+
+    def plan(self, call_id: str, name: str, args: Dict[str, Any]):
+        self.planned[call_id] = {"name": name, "args": args}
+        self._write({"t": "plan", "c": call_id, "n": name, "a": args})
+
+    def ack(self, call_id: str, result: Any):
+        self.results[call_id] = result
+        self._write({"t": "ack", "c": call_id, "r": result})
+
+    def finish(self):
+        self.finished = True
+        self._write({"t": "end"}, sync=True)
+
+    # replay
+    def has_replay(self) -> bool:
+        return bool(self._replay)
+
+    def next_assistant(self) -> Dict[str, Any]:
+        return self._replay.popleft()
+
+    def acked(self, call_id: str) -> bool:
+        return call_id in self.results
+
+    def result(self, call_id: str) -> Any:
+        return self.results[call_id]
+
+    def child(self, name: str) -> "Journal":
+        """Journal for a nested dialog (e.g. the auto-dimension agent started by a tool call)."""
+        base, ext = os.path.splitext(self.path)
+        return Journal(f"{base}.{name}{ext or '.jsonl'}", self.sync_every, self.sync_interval)
+
+    def close(self):
+        with self._lock:
+            if not self._f.closed:
+                self._f.flush()
+                os.fsync(self._f.fileno())
+                self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
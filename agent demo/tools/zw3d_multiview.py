@@ -0,0 +1,281 @@
+"""
+Dimensioning every standard view of a part, planned in parallel.
+
+``STDVUDIM`` returns one view, so the LLM path plans one view at a time. A
+drawing with several views (front, top, side, ...) would otherwise take the
+sum of its planning times, nearly all of it waiting on the LLM.
+``MultiViewPlanner``:
+
+1. sends one ``STDVUDIM`` per view type, each at its own sheet location
+   (``layout``). ZW3D runs commands one at a time, so the views are
+   extracted in order; each view is handed to the planning pool as soon as
+   its command returns, and its planning thread waits for its own ``.done``
+   file;
+2. plans the views concurrently on a thread pool (``AUTO_DIM_VIEW_WORKERS``,
+   default one thread per view). Planners only record operations, so no
+   thread touches ZW3D and the drawing takes about as long as the extraction
+   plus its slowest view;
+3. merges the plans (``merge_plans``). A feature seen in several views must
+   be dimensioned once: every dimension is turned into keys in model
+   coordinates and a dimension whose key is already taken by an earlier view
+   is dropped.
+
+The keys rely on orthographic projection. Each principal view shows two
+model axes (``VIEW_AXES``); a coordinate on the sheet, measured from the
+edge of the view's outer contours, is the model coordinate measured from the
+edge of the part. A horizontal or vertical dimension is the distance between
+two model planes: ``("span", axis, lo, hi)``. A hole callout or radial
+dimension on a circle spans its diameter on both axes, so it also takes
+those spans; its own key is the radius with the model position of the
+centre. Size dimensions are merged before the spans, so a hole keeps its
+callout in the view showing the circle rather than a width between hidden
+lines in another view. Aligned dimensions and pictorial views (isometric,
+dimetric) have no keys and are always kept.
+
+The merged operations use entity ids of several views; ids are unique in
+the drawing, so the whole plan still goes to ZW3D in one BATCHDIM.
+"""
+from __future__ import annotations
+
+import itertools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tools import zw3d_command_tool as zw3d
+from tools.zw3d_analysis import _tolerance
+from tools.zw3d_constraints import ENDS, SIZES, _point
+from tools.zw3d_geometry import CIRCLE, LINE, ViewGeometry
+from tools.zw3d_placement import span_axis
+from tools.zw3d_results import get_watcher
+from tools.zw3d_session import in_context
+from tools.zw3d_state import result_code
+from tools.zw3d_topology import contours
+
+# STDVUDIM view types (see ``autoDimension`` in the DLL)
+TOP, FRONT, RIGHT, BACK, BOTTOM, LEFT, ISO, DIMETRIC = 1, 2, 3, 4, 5, 6, 7, 39
+VIEW_NAMES = {TOP: "top", FRONT: "front", RIGHT: "right", BACK: "back", BOTTOM: "bottom", LEFT: "left",
+              ISO: "iso", DIMETRIC: "dimetric"}
+# (model axis, direction) of the sheet x and y axes of each principal view
+VIEW_AXES = {
+    TOP: (("X", 1), ("Y", 1)),
+    FRONT: (("X", 1), ("Z", 1)),
+    RIGHT: (("Y", 1), ("Z", 1)),
+    BACK: (("X", -1), ("Z", 1)),
+    BOTTOM: (("X", 1), ("Y", -1)),
+    LEFT: (("Y", -1), ("Z", 1)),
+}
+# first-angle arrangement around the front view, in multiples of the view spacing
+LAYOUT = {FRONT: (0, 0), TOP: (0, -1), LEFT: (1, 0), RIGHT: (-1, 0), BOTTOM: (0, 1), BACK: (2, 0),
+          ISO: (1, -1), DIMETRIC: (-1, -1)}
+DEFAULT_VIEWS = (FRONT, TOP, LEFT)
+VIEW_SPACING = 200.0  # mm between view locations
+
+ViewPlanner = Callable[[Dict[str, Any]], List[Dict[str, Any]]]
+
+
+def layout(views: Iterable[int], spacing: float = VIEW_SPACING,
+           origin: Tuple[float, float] = (0.0, 0.0)) -> Dict[int, Tuple[float, float]]:
+    """Sheet location of each view type; types without a slot in ``LAYOUT`` are lined up below."""
+    out, spare = {}, 0
+    for view in views:
+        if view in LAYOUT:
+            i, j = LAYOUT[view]
+        else:
+            i, j, spare = spare, -2, spare + 1
+        out[view] = (origin[0] + i * spacing, origin[1] + j * spacing)
+    return out
+
+
+def extract_view(part: str, view_type: int, x: float = 0.0, y: float = 0.0, wait: bool = True) -> Dict[str, Any]:
+    """STDVUDIM of one view type; the ``data`` of its result. Raises RuntimeError when ZW3D fails."""
+    tool = zw3d.ZW3DCommandStdVuDim()
+    raw, payload = tool.send(path=part, type=view_type, x=x, y=y)
+    code = result_code(payload)
+    if (raw.get("return code") if code is None else code) != 0:
+        raise RuntimeError(f"STDVUDIM failed: {raw.get('stderr') or raw.get('error') or raw}")
+    data = tool.result(raw, payload)["data"]
+    if wait:
+        get_watcher().wait(data["done_path"])
+    return data
+
+
+def _frame(geometry: ViewGeometry, view_type: Optional[int]):
+    """(axes, origin, far corner) of the part in a principal view, or None."""
+    axes = VIEW_AXES.get(view_type)
+    if axes is None or not len(geometry):
+        return None
+    boxes = [c["bbox"] for c in contours(geometry)["contours"] if c["depth"] == 0]
+    if boxes:  # centre lines stick out of the part
+        b = np.array(boxes)
+        box = (b[:, 0].min(), b[:, 1].min(), b[:, 2].max(), b[:, 3].max())
+    else:
+        box = geometry.bbox()
+    return axes, np.array(box[:2], dtype=float), np.array(box[2:], dtype=float)
+
+
+def _model(frame, k: int, value: float) -> Tuple[str, float]:
+    """Model axis and coordinate (from the edge of the part) of a sheet coordinate on axis ``k``."""
+    (axis, sign), lo, hi = frame[0][k], frame[1], frame[2]
+    return axis, float(value - lo[k]) if sign > 0 else float(hi[k] - value)
+
+
+def dimension_keys(geometry: ViewGeometry, frame, op: Dict[str, Any]) -> Tuple[List[tuple], List[tuple]]:
+    """
+    (own keys, spans it also takes) of one operation, in model coordinates;
+    both empty when the operation cannot be compared across views.
+    """
+    if frame is None:
+        return [], []
+    kind, args = op.get("type"), op.get("args", {})
+    if kind in ENDS:
+        p, q = (_point(args.get(point)) for _, point in ENDS[kind])
+        text = _point(args.get("text_point"))
+        if p is None or q is None or text is None:
+            return [], []
+        axis = span_axis(p, q, text)
+        if axis == "aligned":
+            return [], []
+        k = 0 if axis == "horizontal" else 1
+        (m, a), (_, b) = _model(frame, k, p[k]), _model(frame, k, q[k])
+        return [("span", m, min(a, b), max(a, b))], []
+    if kind in SIZES:
+        try:
+            row = geometry.get(int(args.get(SIZES[kind])))
+        except (KeyError, TypeError, ValueError):
+            return [], []
+        if int(row["type"]) == LINE:
+            return [], []
+        r = float(row["radius"])
+        centre = [_model(frame, k, float(row["center"][k])) for k in (0, 1)]
+        shape = "circle" if int(row["type"]) == CIRCLE else "arc"
+        own = [("arclength" if kind == "arclength" else shape, r, *sorted(centre))]
+        spans = [("span", m, c - r, c + r) for m, c in centre] if shape == "circle" else []
+        return own, spans
+    return [], []
+
+
+class _Keys:
+    """Taken keys; numbers match within ``q`` (the neighbouring quantization cells are checked too)."""
+
+    def __init__(self, q: float):
+        self.q = q
+        self.taken: Dict[tuple, int] = {}
+
+    def _cell(self, key: tuple) -> tuple:
+        flat = []
+        for v in key:
+            for item in (v if isinstance(v, tuple) else (v,)):
+                flat.append(int(round(item / self.q)) if isinstance(item, float) else item)
+        return tuple(flat)
+
+    def owner(self, key: tuple) -> Optional[int]:
+        cell = self._cell(key)
+        steps = [(-1, 0, 1) if isinstance(c, int) else (0,) for c in cell]
+        for offset in itertools.product(*steps):
+            found = self.taken.get(tuple(c + d if d else c for c, d in zip(cell, offset)))
+            if found is not None:
+                return found
+        return None
+
+    def take(self, key: tuple, view: int):
+        self.taken.setdefault(self._cell(key), view)
+
+
+def merge_plans(plans: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge per-view plans, earlier views first. Each plan is ``{"view type",
+    "geometry", "operations", ...}``; returns ``{"operations", "views",
+    "duplicates"}`` where every view lists the operations dropped as
+    ``{"index", "type", "of"}`` (the view type already holding it).
+    """
+    q = max((_tolerance(p["geometry"], None) for p in plans if len(p["geometry"])), default=1e-6) * 10
+    keys = _Keys(q)
+    found = []
+    for plan in plans:
+        frame = _frame(plan["geometry"], plan.get("view type"))
+        found.append([dimension_keys(plan["geometry"], frame, op) for op in plan["operations"]])
+    dropped: List[Dict[int, Dict[str, Any]]] = [{} for _ in plans]
+    for sizes in (True, False):
+        for v, plan in enumerate(plans):
+            for i, op in enumerate(plan["operations"]):
+                if (op.get("type") in SIZES) != sizes:
+                    continue
+                own, spans = found[v][i]
+                owner = next((o for o in map(keys.owner, own) if o is not None), None)
+                if owner is not None:
+                    dropped[v][i] = {"index": i, "type": op.get("type"), "of": plans[owner]["view type"]}
+                    continue
+                for key in own + spans:
+                    keys.take(key, v)
+    operations, views = [], []
+    for v, plan in enumerate(plans):
+        kept = [op for i, op in enumerate(plan["operations"]) if i not in dropped[v]]
+        operations.extend(kept)
+        views.append({"view type": plan.get("view type"), "view id": plan["geometry"].view_id,
+                      "operations": len(kept), "duplicates": [dropped[v][i] for i in sorted(dropped[v])],
+                      **({"seconds": plan["seconds"]} if "seconds" in plan else {})})
+    return {"operations": operations, "views": views, "duplicates": sum(len(d) for d in dropped)}
+
+
+def _workers(views: int) -> int:
+    try:
+        return max(1, int(os.environ.get("AUTO_DIM_VIEW_WORKERS", "") or views))
+    except ValueError:
+        return max(1, views)
+
+
+class MultiViewPlanner:
+    """Extract several standard views of a part, plan them concurrently and merge the plans."""
+
+    def __init__(self, planner: ViewPlanner, views: Sequence[int] = DEFAULT_VIEWS,
+                 workers: Optional[int] = None, spacing: float = VIEW_SPACING,
+                 origin: Tuple[float, float] = (0.0, 0.0)):
+        self.planner = planner
+        self.views = list(dict.fromkeys(views))
+        self.workers = workers or _workers(len(self.views))
+        self.locations = layout(self.views, spacing, origin)
+
+    def _plan_view(self, view: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        get_watcher().wait(view["done_path"])
+        operations = self.planner(view)
+        geometry = ViewGeometry.from_file(view["geom_data"])  # the planner has consumed the marker
+        return {"view type": view.get("view type"), "geometry": geometry, "operations": operations,
+                "seconds": round(time.perf_counter() - start, 4)}
+
+    def plan(self, part: str) -> Dict[str, Any]:
+        """
+        ``merge_plans`` of all views of ``part`` plus ``"timings"``: ``view``
+        (extraction), ``plan`` (from the last extraction to the last plan).
+        Must run where ZW3D commands may be sent (a pool job or the session).
+        """
+        start = time.perf_counter()
+        plan_view = in_context(self._plan_view)  # the planners' tool calls go to the same instance
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = []
+            for view_type in self.views:
+                x, y = self.locations[view_type]
+                futures.append(pool.submit(plan_view, extract_view(part, view_type, x, y, wait=False)))
+            extracted = time.perf_counter()
+            plans = [f.result() for f in futures]
+        merged = merge_plans(plans)
+        merged["timings"] = {"view": round(extracted - start, 4),
+                             "plan": round(time.perf_counter() - extracted, 4)}
+        return merged
+
+
+def format_merge(merged: Dict[str, Any]) -> str:
+    """One line per view: operations kept, and which earlier view already had the dropped ones."""
+    lines = []
+    for v in merged["views"]:
+        name = VIEW_NAMES.get(v["view type"], f"view type {v['view type']}")
+        line = f"{name} (view {v['view id']}): {v['operations']} dimensions"
+        if v["duplicates"]:
+            of = sorted({VIEW_NAMES.get(d["of"], str(d["of"])) for d in v["duplicates"]})
+            line += f", {len(v['duplicates'])} already in {', '.join(of)}"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,302 @@
+"""
+Collision-free placement of dimension text.
+
+Every dimension operation of a plan (``zw3d_batch_dim`` format) carries a
+``text_point`` chosen without knowing where the other labels go. ``TextPlacer``
+moves them as one batch:
+
+1. candidates: for each operation a short list of text positions in order of
+   preference, starting with the requested one. Linear dimensions keep their
+   side class (a horizontal dimension stays above/below its span, a vertical
+   one left/right) so ZW3D does not switch the measured direction; radial
+   dimensions and hole callouts move around the curve;
+2. geometry: every candidate's text box is tested against the view with the
+   ``SpatialIndex`` (one box query per operation, then exact box/segment and
+   box/circle tests), candidates touching geometry are dropped when there is
+   any other choice;
+3. greedy: operations with the fewest free candidates are placed first, each
+   at the most preferred candidate that overlaps no placed box;
+4. local search: labels that still overlap are moved to their cheapest
+   candidate given all the others, for a few passes.
+
+Text boxes are estimated from the dimension value (``text_height`` per line,
+0.7 of it per character), which is enough to keep labels apart.
+"""
+from __future__ import annotations
+
+import copy
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tools.zw3d_geometry import CIRCLE, LINE, ViewGeometry
+from tools.zw3d_spatial import SpatialIndex
+
+TEXT_HEIGHT = 3.5  # mm, the usual drawing font
+CHAR_WIDTH = 0.7  # of the text height
+
+_GEOMETRY_COST = 1000.0
+_OVERLAP_COST = 100.0
+
+
+def _point(p) -> np.ndarray:
+    if isinstance(p, dict):
+        return np.array([float(p["x"]), float(p["y"])])
+    return np.array([float(p[0]), float(p[1])])
+
+
+def _like(p, xy: np.ndarray):
+    """``xy`` in the same form (dict or list) as ``p``."""
+    x, y = round(float(xy[0]), 4), round(float(xy[1]), 4)
+    return {"x": x, "y": y} if isinstance(p, dict) else [x, y]
+
+
+def _label(op: Dict[str, Any], geometry: ViewGeometry) -> Tuple[str, np.ndarray, Optional[np.ndarray], float]:
+    """(kind, anchor points, reference point, radius) of one operation; kind is 'span' or 'radial'."""
+    kind, args = op.get("type"), op.get("args", {})
+    if kind in ("linear", "zw3d_lineardim"):
+        return "span", np.array([_point(args["start_point"]), _point(args["end_point"])]), None, 0.0
+    if kind in ("linearoffset", "zw3d_linearoffsetdim"):
+        return "span", np.array([_point(args["first_point"]), _point(args["second_point"])]), None, 0.0
+    curve = args.get("id", args.get("arc_id", args.get("hole_curve_id")))
+    row = geometry.get(curve) if curve is not None and curve in geometry else None
+    if row is not None and int(row["type"]) != LINE:
+        center, radius = row["center"].copy(), float(row["radius"])
+    else:
+        center, radius = _point(args["text_point"]), 0.0
+    point = args.get("point", args.get("arc_point"))
+    if point is None:  # hole callout: leave the circle where the text already points
+        t = _point(args["text_point"]) - center
+        norm = math.hypot(*t)
+        point = center + (t / norm * radius if norm > 0 else np.array([radius, 0.0]))
+    else:
+        point = _point(point)
+    return "radial", np.array([point]), center, radius
+
+
+def span_axis(p: np.ndarray, q: np.ndarray, text: np.ndarray) -> str:
+    """
+    Which distance a linear dimension between p and q measures, judged like
+    ZW3D from where its text sits: "horizontal" (text above/below the span),
+    "vertical" (left/right of it) or "aligned".
+    """
+    lo, hi = np.minimum(p, q), np.maximum(p, q)
+    if lo[0] - 1e-9 <= text[0] <= hi[0] + 1e-9 and not lo[1] <= text[1] <= hi[1]:
+        return "horizontal"
+    if lo[1] - 1e-9 <= text[1] <= hi[1] + 1e-9 and not lo[0] <= text[0] <= hi[0]:
+        return "vertical"
+    return "aligned"
+
+
+def _text_size(op: Dict[str, Any], kind: str, anchors: np.ndarray, radius: float, h: float) -> Tuple[float, float]:
+    if kind == "span":
+        d = anchors[1] - anchors[0]
+        text = f"{max(abs(d[0]), abs(d[1]), math.hypot(*d)):.2f}".rstrip("0").rstrip(".")
+    else:
+        text = ("D" if op.get("type") in ("holecallout", "zw3d_holecalloutdim") else "R") + f"{radius:g}"
+    lines = 2 if op.get("type") in ("holecallout", "zw3d_holecalloutdim") else 1  # callouts add depth/thread
+    return (len(text) + 1) * CHAR_WIDTH * h, lines * h * 1.2
+
+
+def label_box(geometry: ViewGeometry, op: Dict[str, Any], text_height: float = TEXT_HEIGHT) -> np.ndarray:
+    """Estimated (xmin, ymin, xmax, ymax) of the text of one operation at its current ``text_point``."""
+    kind, anchors, _, radius = _label(op, geometry)
+    half = np.array(_text_size(op, kind, anchors, radius, text_height)) / 2
+    center = _point(op["args"]["text_point"])
+    return np.concatenate([center - half, center + half])
+
+
+class TextPlacer:
+    """Move the ``text_point`` of a whole plan so labels neither overlap each other nor the geometry."""
+
+    def __init__(self, geometry: ViewGeometry, text_height: float = TEXT_HEIGHT,
+                 index: Optional[SpatialIndex] = None, offsets: int = 4, shifts: Sequence[float] = (0, 0.3, -0.3),
+                 passes: int = 4):
+        self.geometry = geometry
+        self.h = text_height
+        self.index = index if index is not None else SpatialIndex(geometry)
+        self.offsets = offsets
+        self.shifts = shifts
+        self.passes = passes
+
+    # candidates
+    def _span_candidates(self, anchors: np.ndarray, text: np.ndarray, size) -> np.ndarray:
+        p, q = anchors
+        lo, hi = np.minimum(p, q), np.maximum(p, q)
+        mid = (p + q) / 2
+        axis = span_axis(p, q, text)
+        if axis == "horizontal":
+            along, normal = np.array([1.0, 0.0]), np.array([0.0, 1.0])  # horizontal dimension
+            span, base = hi[0] - lo[0], text[1] - (hi[1] if text[1] > hi[1] else lo[1])
+        elif axis == "vertical":
+            along, normal = np.array([0.0, 1.0]), np.array([1.0, 0.0])  # vertical dimension
+            span, base = hi[1] - lo[1], text[0] - (hi[0] if text[0] > hi[0] else lo[0])
+        else:
+            d = q - p
+            span = math.hypot(*d)
+            along = d / span if span > 0 else np.array([1.0, 0.0])
+            normal = np.array([-along[1], along[0]])
+            base = float(np.dot(text - mid, normal))
+        side = 1.0 if base >= 0 else -1.0
+        # where the far edge of the span sits along the normal, so the text clears both anchors
+        edge = {1.0: max(np.dot(p - mid, normal), np.dot(q - mid, normal)),
+                -1.0: min(np.dot(p - mid, normal), np.dot(q - mid, normal))}
+        start = float(np.dot(text - mid, along))
+        step = 2.0 * max(size[1], self.h)
+        out = [text]
+        for s, first in ((side, max(abs(base), step)), (-side, step)):
+            for k in range(self.offsets):
+                off = edge[s] + s * (first + k * step)
+                for f in self.shifts:
+                    # stay within the span so ZW3D keeps the measured direction
+                    shift = min(max(start + f * span, -span / 2), span / 2)
+                    out.append(mid + normal * off + along * shift)
+        return np.array(out)
+
+    def _radial_candidates(self, anchors: np.ndarray, center: np.ndarray, radius: float,
+                           text: np.ndarray, size) -> np.ndarray:
+        d = text - center
+        if math.hypot(*d) == 0:
+            d = anchors[0] - center
+        a0 = math.atan2(d[1], d[0])
+        r0 = max(math.hypot(*d), radius)
+        step = 1.5 * max(size)
+        out = [text]
+        for k in range(self.offsets):
+            for da in (0, 30, -30, 60, -60, 90, -90, 135, -135, 180):
+                a = a0 + math.radians(da)
+                out.append(center + (max(r0, radius + step) + k * step) * np.array([math.cos(a), math.sin(a)]))
+        return np.array(out)
+
+    # collisions
+    def _hits_geometry(self, boxes: np.ndarray) -> np.ndarray:
+        """Per box (n, 4: xmin ymin xmax ymax): does it touch any entity?"""
+        hit = np.zeros(len(boxes), dtype=bool)
+        ids = self.index.query_box(boxes[:, 0].min(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].max())
+        if not len(ids):
+            return hit
+        rows = self.geometry.rows(ids)
+        e, b = self.geometry.entities[rows], self.index.bounds[rows]
+        bx = boxes[:, None, :]
+        overlap = ((b[None, :, 0] <= bx[..., 2]) & (b[None, :, 2] >= bx[..., 0]) &
+                   (b[None, :, 1] <= bx[..., 3]) & (b[None, :, 3] >= bx[..., 1]))
+        lines = e["type"] == LINE
+        if lines.any():
+            # separating axis along the segment normal: the box corners all on one side -> no hit
+            p, q = e["start"][lines], e["end"][lines]
+            n = np.column_stack([-(q[:, 1] - p[:, 1]), q[:, 0] - p[:, 0]])
+            c = (n * p).sum(axis=1)
+            s = []
+            for cx, cy in ((0, 1), (2, 1), (0, 3), (2, 3)):
+                s.append(bx[..., cx] * n[None, :, 0] + bx[..., cy] * n[None, :, 1] - c[None, :])
+            s = np.stack(s)
+            straddle = (s.min(axis=0) <= 0) & (s.max(axis=0) >= 0)
+            hit |= (overlap[:, lines] & straddle).any(axis=1)
+        curves = ~lines
+        if curves.any():
+            # the circle through the curve crosses the box; arcs are clipped by their bounding box above
+            c, r = e["center"][curves], e["radius"][curves]
+            near = np.hypot(np.clip(c[None, :, 0], bx[..., 0], bx[..., 2]) - c[None, :, 0],
+                            np.clip(c[None, :, 1], bx[..., 1], bx[..., 3]) - c[None, :, 1])
+            far = np.hypot(np.maximum(np.abs(bx[..., 0] - c[None, :, 0]), np.abs(bx[..., 2] - c[None, :, 0])),
+                           np.maximum(np.abs(bx[..., 1] - c[None, :, 1]), np.abs(bx[..., 3] - c[None, :, 1])))
+            crosses = (near <= r[None, :]) & (far >= r[None, :])
+            full = (e["type"][curves] == CIRCLE)[None, :]
+            hit |= (crosses & (full | overlap[:, curves])).any(axis=1)
+        return hit
+
+    @staticmethod
+    def _overlap(boxes: np.ndarray, placed: np.ndarray) -> np.ndarray:
+        """Overlap area of every box with every placed box, summed per box."""
+        # only the placed boxes near the candidates matter
+        near = ((placed[:, 0] < boxes[:, 2].max()) & (placed[:, 2] > boxes[:, 0].min()) &
+                (placed[:, 1] < boxes[:, 3].max()) & (placed[:, 3] > boxes[:, 1].min()))
+        placed = placed[near]
+        if not len(placed):
+            return np.zeros(len(boxes))
+        w = np.minimum(boxes[:, None, 2], placed[None, :, 2]) - np.maximum(boxes[:, None, 0], placed[None, :, 0])
+        h = np.minimum(boxes[:, None, 3], placed[None, :, 3]) - np.maximum(boxes[:, None, 1], placed[None, :, 1])
+        return (np.clip(w, 0, None) * np.clip(h, 0, None)).sum(axis=1)
+
+    # solve
+    def place(self, operations: List[Dict[str, Any]], fixed: Sequence[Dict[str, Any]] = ()) -> Dict[str, Any]:
+        """
+        Returns {"operations": copies with new text points, "moved": indices of
+        the operations whose text moved, "overlaps": labels still overlapping
+        another label, "on_geometry": labels still touching geometry}.
+        Labels of ``fixed`` operations (already on the drawing) stay where they
+        are; the others keep clear of them.
+        """
+        ops = copy.deepcopy(operations)
+        todo = [i for i, op in enumerate(ops) if isinstance(op.get("args"), dict) and "text_point" in op["args"]]
+        cands, boxes, free = {}, {}, {}
+        for i in todo:
+            op = ops[i]
+            try:
+                kind, anchors, center, radius = _label(op, self.geometry)
+            except (KeyError, TypeError, ValueError):
+                continue  # malformed args are for the tool to report
+            text = _point(op["args"]["text_point"])
+            size = _text_size(op, kind, anchors, radius, self.h)
+            pts = (self._span_candidates(anchors, text, size) if kind == "span"
+                   else self._radial_candidates(anchors, center, radius, text, size))
+            half = np.array(size) / 2
+            bx = np.column_stack([pts - half, pts + half])
+            on_geometry = self._hits_geometry(bx)
+            cands[i], boxes[i] = pts, bx
+            # preference: list order, candidates on geometry last
+            free[i] = np.arange(len(pts)) + _GEOMETRY_COST * on_geometry
+
+        kept = []
+        for op in fixed:
+            try:
+                kept.append(label_box(self.geometry, op, self.h))
+            except (KeyError, TypeError, ValueError):
+                continue
+        f = len(kept)
+
+        chosen: Dict[int, int] = {}
+        owner = sorted(cands, key=lambda i: (int((free[i] < _GEOMETRY_COST).sum()), i))
+        placed = np.zeros((f + len(owner), 4))
+        if f:
+            placed[:f] = kept
+        for k, i in enumerate(owner, f):
+            cost = free[i] + _OVERLAP_COST * (self._overlap(boxes[i], placed[:k]) > 0)
+            chosen[i] = int(np.argmin(cost))
+            placed[k] = boxes[i][chosen[i]]
+
+        slot = {i: k for k, i in enumerate(owner, f)}
+        for _ in range(self.passes):
+            changed = False
+            for i in owner:
+                others = np.delete(placed, slot[i], axis=0)
+                area = self._overlap(boxes[i], others)
+                if area[chosen[i]] <= 0:
+                    continue
+                cost = free[i] + _OVERLAP_COST * (area > 0) + area / max(self.h * self.h, 1e-12)
+                best = int(np.argmin(cost))
+                if best != chosen[i] and cost[best] < cost[chosen[i]]:
+                    chosen[i] = best
+                    placed[slot[i]] = boxes[i][best]
+                    changed = True
+            if not changed:
+                break
+
+        moved = []
+        for i, c in chosen.items():
+            if c:
+                args = ops[i]["args"]
+                args["text_point"] = _like(args["text_point"], cands[i][c])
+                moved.append(i)
+        ours = placed[f:]
+        final = self._overlap(ours, placed) - (ours[:, 2] - ours[:, 0]) * (ours[:, 3] - ours[:, 1]) \
+            if len(ours) else np.zeros(0)
+        return {"operations": ops, "moved": sorted(moved),
+                "overlaps": int((final > 1e-9).sum()),
+                "on_geometry": int(sum(free[i][chosen[i]] >= _GEOMETRY_COST for i in chosen))}
+
+
+def place_texts(geometry: ViewGeometry, operations: List[Dict[str, Any]], fixed: Sequence[Dict[str, Any]] = (),
+                **kwargs) -> Dict[str, Any]:
+    return TextPlacer(geometry, **kwargs).place(operations, fixed)
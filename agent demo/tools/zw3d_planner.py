@@ -0,0 +1,302 @@
+"""
+Deterministic, rule-based dimension planner.
+
+Produces the same plan as ``GPTAutoDimensionAgent`` -- the labelled list
+``[{"id", "type", "desc"}]`` plus the dimension operations for
+``zw3d_batch_dim`` -- straight from a ``ViewGeometry``, following the stages
+of the agent's prompt:
+
+1. datums: the left-most vertical and the bottom-most horizontal line
+   (longest one on ties);
+2. overall extents: width and height of the outer contour, as a linear
+   dimension of the datum line when it spans the view, otherwise as a
+   linear offset from the datum to the opposite outer line;
+3. locating dimensions: circle centres, the first end of every slot
+   (``tools.zw3d_topology.contours``) and the centres of large arcs
+   (fillets excluded) relative to the datums, baseline style, one per
+   distinct x and one per distinct y;
+4. features: the length of every slot (its end centres), one hole callout
+   per distinct circle radius, one radial dimension per distinct arc radius
+   (the slot widths), and a linear dimension for slanted lines (chamfers).
+
+With ``symmetry`` (``tools.zw3d_analysis.find_symmetry``) a hole pattern is
+located by its representative only, plus one pitch dimension between its
+first two members; the other members are skipped.
+
+Text is stacked outside the view: horizontal dimensions below/above it,
+vertical ones to the left/right, ``spacing`` apart.
+
+``is_simple`` decides whether a view is plain enough to skip the LLM; the
+agent otherwise sends the rule plan as a draft for the model to review.
+"""
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tools.zw3d_geometry import ARC, CIRCLE, ViewGeometry
+
+RULES_MAX_ENTITIES = int(os.getenv("AUTO_DIM_RULES_MAX_ENTITIES", "80"))
+RULES_MAX_SLANTED = int(os.getenv("AUTO_DIM_RULES_MAX_SLANTED", "4"))
+
+AXIS_TOL = 1e-3  # |sin| of the angle to the axis below which a line counts as horizontal/vertical
+
+
+def _xy(p) -> Dict[str, float]:
+    return {"x": round(float(p[0]), 4), "y": round(float(p[1]), 4)}
+
+
+def line_directions(lines: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(horizontal, vertical, length) per line row."""
+    d = lines["end"] - lines["start"]
+    length = np.hypot(d[:, 0], d[:, 1])
+    safe = np.where(length > 0, length, 1.0)
+    horizontal = np.abs(d[:, 1]) / safe <= AXIS_TOL
+    vertical = np.abs(d[:, 0]) / safe <= AXIS_TOL
+    return horizontal, vertical, length
+
+
+def is_simple(geometry: ViewGeometry, max_entities: int = RULES_MAX_ENTITIES,
+              max_slanted: int = RULES_MAX_SLANTED) -> bool:
+    """Small, mostly axis-aligned views are planned by the rules alone."""
+    if not len(geometry) or len(geometry) > max_entities:
+        return False
+    horizontal, vertical, _ = line_directions(geometry.lines)
+    return int((~horizontal & ~vertical).sum()) <= max_slanted and bool(horizontal.any() and vertical.any())
+
+
+def _distinct(values: np.ndarray, tol: float) -> List[int]:
+    """Index of the first occurrence of every value, values closer than ``tol`` counting as equal."""
+    keep: List[int] = []
+    seen: List[float] = []
+    for i, v in enumerate(values):
+        if all(abs(v - s) > tol for s in seen):
+            seen.append(float(v))
+            keep.append(i)
+    return keep
+
+
+class RulePlanner:
+    """Plan one view; ``plan()`` returns labelled entities, skipped ones and operations."""
+
+    def __init__(self, geometry: ViewGeometry, spacing: Optional[float] = None, tol: Optional[float] = None,
+                 symmetry: Optional[Dict[str, Any]] = None):
+        self.geometry = geometry
+        self.patterns = (symmetry or {}).get("patterns", [])
+        xmin, ymin, xmax, ymax = geometry.bbox()
+        self.bbox = (xmin, ymin, xmax, ymax)
+        size = max(xmax - xmin, ymax - ymin, 1e-6)
+        self.spacing = spacing if spacing is not None else max(5.0, 0.06 * size)
+        self.tol = tol if tol is not None else 1e-4 * size
+        self.labeled: List[Dict[str, Any]] = []
+        self.skipped: List[Dict[str, Any]] = []
+        self.operations: List[Dict[str, Any]] = []
+        self._rows = {"below": 0, "above": 0, "left": 0, "right": 0}
+        self._done = set()
+
+    # helpers
+    def _text(self, side: str, along: float) -> Dict[str, float]:
+        """Next free text position on one side of the view."""
+        self._rows[side] += 1
+        off = self.spacing * self._rows[side]
+        xmin, ymin, xmax, ymax = self.bbox
+        if side == "below":
+            return _xy((along, ymin - off))
+        if side == "above":
+            return _xy((along, ymax + off))
+        if side == "left":
+            return _xy((xmin - off, along))
+        return _xy((xmax + off, along))
+
+    def _add(self, entity_id: int, kind: str, desc: str, args: Dict[str, Any]):
+        self.labeled.append({"id": int(entity_id), "type": kind, "desc": desc})
+        self.operations.append({"type": kind, "args": args})
+        self._done.add(int(entity_id))
+
+    def _skip(self, entity_id: int, reason: str):
+        if int(entity_id) not in self._done:
+            self.skipped.append({"id": int(entity_id), "reason": reason})
+            self._done.add(int(entity_id))
+
+    # stages
+    def _datums(self):
+        lines = self.geometry.lines
+        horizontal, vertical, length = line_directions(lines)
+        self.horizontal, self.vertical = horizontal, vertical
+        self.h_datum = self.v_datum = None
+        if horizontal.any():
+            rows = np.flatnonzero(horizontal)
+            y = lines["start"][rows, 1]
+            cand = rows[np.abs(y - y.min()) <= self.tol]
+            self.h_datum = lines[cand[np.argmax(length[cand])]]
+        if vertical.any():
+            rows = np.flatnonzero(vertical)
+            x = lines["start"][rows, 0]
+            cand = rows[np.abs(x - x.min()) <= self.tol]
+            self.v_datum = lines[cand[np.argmax(length[cand])]]
+
+    def _extent(self, axis: int):
+        """Overall width (axis 0, from the vertical datum) or height (axis 1)."""
+        lines = self.geometry.lines
+        datum_line = self.h_datum if axis == 0 else self.v_datum
+        across = self.v_datum if axis == 0 else self.h_datum
+        lo, hi = self.bbox[axis], self.bbox[axis + 2]
+        name = "width" if axis == 0 else "height"
+        side = "below" if axis == 0 else "left"
+        if datum_line is not None:
+            a, b = datum_line["start"][axis], datum_line["end"][axis]
+            if abs(min(a, b) - lo) <= self.tol and abs(max(a, b) - hi) <= self.tol:
+                self._add(datum_line["id"], "linear", f"Overall {name} of the outer contour", {
+                    "id": int(datum_line["id"]), "start_point": _xy(datum_line["start"]),
+                    "end_point": _xy(datum_line["end"]), "text_point": self._text(side, (lo + hi) / 2)})
+                return
+        if across is None:
+            return
+        # the datum line is shorter than the view: measure datum -> outermost parallel line
+        mask = self.vertical if axis == 0 else self.horizontal
+        rows = np.flatnonzero(mask)
+        pos = lines["start"][rows, axis]
+        far = lines[rows[np.argmax(pos)]]
+        if far["id"] == across["id"]:
+            return
+        self._add(far["id"], "linearoffset", f"Overall {name}: datum {int(across['id'])} to the far edge", {
+            "id1": int(across["id"]), "id2": int(far["id"]),
+            "first_point": _xy(across["start"]), "second_point": _xy(far["start"]),
+            "text_point": self._text(side, (lo + hi) / 2)})
+
+    def _locate(self, rows: np.ndarray, what: str):
+        """Baseline locating dimensions of centres from the datums."""
+        if not len(rows):
+            return
+        centers = self.geometry.entities["center"][rows]
+        ids = self.geometry.entities["id"][rows]
+        if self.v_datum is not None:
+            x0 = float(self.v_datum["start"][0])
+            for i in _distinct(centers[:, 0], self.tol):
+                cx, cy = centers[i]
+                if abs(cx - x0) <= self.tol:
+                    continue
+                self._add(ids[i], "linearoffset",
+                          f"Horizontal position of {what} {int(ids[i])} from datum {int(self.v_datum['id'])}", {
+                              "id1": int(self.v_datum["id"]), "id2": int(ids[i]),
+                              "first_point": _xy((x0, cy)), "second_point": _xy((cx, cy)),
+                              "text_point": self._text("above", (x0 + cx) / 2)})
+        if self.h_datum is not None:
+            y0 = float(self.h_datum["start"][1])
+            for i in _distinct(centers[:, 1], self.tol):
+                cx, cy = centers[i]
+                if abs(cy - y0) <= self.tol:
+                    continue
+                self._add(ids[i], "linearoffset",
+                          f"Vertical position of {what} {int(ids[i])} from datum {int(self.h_datum['id'])}", {
+                              "id1": int(self.h_datum["id"]), "id2": int(ids[i]),
+                              "first_point": _xy((cx, y0)), "second_point": _xy((cx, cy)),
+                              "text_point": self._text("right", (y0 + cy) / 2)})
+
+    def _slots(self) -> List[Tuple[int, int]]:
+        """(first, second) end arc ids of every slot, the first nearer the datums."""
+        from tools.zw3d_topology import contours
+        g = self.geometry
+        slots = []
+        for c in contours(g)["contours"]:
+            if c["kind"] != "slot":
+                continue
+            ends = sorted((i for i in c["entities"] if int(g.get(i)["type"]) == ARC),
+                          key=lambda i: tuple(g.get(i)["center"]))
+            slots.append((int(ends[0]), int(ends[1])))
+        return slots
+
+    def _slot_lengths(self, slots: List[Tuple[int, int]]):
+        g = self.geometry
+        for first, second in slots:
+            a, b = g.get(first)["center"], g.get(second)["center"]
+            side = "above" if abs(b[0] - a[0]) >= abs(b[1] - a[1]) else "right"
+            along = (a[0] + b[0]) / 2 if side == "above" else (a[1] + b[1]) / 2
+            self._add(second, "linearoffset", f"Length of slot {first}-{second} (end centre to end centre)", {
+                "id1": first, "id2": second, "first_point": _xy(a), "second_point": _xy(b),
+                "text_point": self._text(side, along)})
+
+    def _patterns(self) -> np.ndarray:
+        """Pitch dimension per linear pattern / grid; returns the rows of members not to locate."""
+        g = self.geometry
+        members = []
+        for p in self.patterns:
+            ids = [i for i in p["ids"] if i in g]
+            if len(ids) < 2:
+                continue
+            first, second = g.get(ids[0]), g.get(ids[1])
+            if p["kind"] != "circular":
+                a, b = first["center"], second["center"]
+                side = "above" if abs(b[0] - a[0]) >= abs(b[1] - a[1]) else "right"
+                along = (a[0] + b[0]) / 2 if side == "above" else (a[1] + b[1]) / 2
+                self._add(ids[1], "linearoffset",
+                          f"Pitch of the {p['kind']} pattern of {p['count']} holes ({int(ids[0])} to {int(ids[1])})", {
+                              "id1": int(ids[0]), "id2": int(ids[1]),
+                              "first_point": _xy(a), "second_point": _xy(b),
+                              "text_point": self._text(side, along)})
+            for i in ids[1:]:
+                self._skip(i, f"member of the {p['kind']} pattern of hole {int(ids[0])} ({p['count']} holes)")
+            members.extend(ids[1:])
+        return g.rows(members) if members else np.empty(0, dtype=np.intp)
+
+    def _sizes(self):
+        g = self.geometry
+        circles, arcs = g.circles, g.arcs
+        for i in _distinct(circles["radius"], self.tol):
+            c = circles[i]
+            self._add(c["id"], "holecallout", f"Hole, radius {float(c['radius']):g}", {
+                "hole_curve_id": int(c["id"]), "view_id": int(g.view_id if g.view_id is not None else -1),
+                "text_point": _xy(c["center"] + np.array([1.0, 1.0]) * (float(c["radius"]) + self.spacing))})
+        for c in circles:
+            self._skip(c["id"], "same size as a hole already called out")
+        for i in _distinct(arcs["radius"], self.tol):
+            a = arcs[i]
+            direction = a["mid"] - a["center"]
+            direction = direction / max(float(np.hypot(*direction)), 1e-12)
+            self._add(a["id"], "radial", f"Radius {float(a['radius']):g}", {
+                "id": int(a["id"]), "point": _xy(a["mid"]),
+                "text_point": _xy(a["mid"] + direction * self.spacing)})
+        for a in arcs:
+            self._skip(a["id"], "same radius as an arc already dimensioned")
+
+    def _slanted(self):
+        lines = self.geometry.lines
+        for row in np.flatnonzero(~self.horizontal & ~self.vertical):
+            ln = lines[row]
+            normal = np.array([-(ln["end"][1] - ln["start"][1]), ln["end"][0] - ln["start"][0]])
+            normal = normal / max(float(np.hypot(*normal)), 1e-12)
+            self._add(ln["id"], "linear", "Length of slanted edge (chamfer)", {
+                "id": int(ln["id"]), "start_point": _xy(ln["start"]), "end_point": _xy(ln["end"]),
+                "text_point": _xy(ln["mid"] + normal * self.spacing)})
+
+    def plan(self) -> Dict[str, Any]:
+        g = self.geometry
+        self._datums()
+        self._extent(0)
+        self._extent(1)
+        # holes first, then one end of every slot, then arcs that are not slot ends or fillets
+        kind = g.entities["type"]
+        members = self._patterns()
+        self._locate(np.setdiff1d(np.flatnonzero(kind == CIRCLE), members), "hole")
+        slots = self._slots()
+        ends = [i for slot in slots for i in slot]
+        if slots:
+            self._locate(g.rows([first for first, _ in slots]), "slot")
+        arc_rows = np.setdiff1d(np.flatnonzero(kind == ARC), g.rows(ends) if ends else [])
+        short_side = min(self.bbox[2] - self.bbox[0], self.bbox[3] - self.bbox[1])
+        self._locate(arc_rows[g.entities["radius"][arc_rows] >= 0.25 * short_side], "arc")
+        self._slot_lengths(slots)
+        self._sizes()
+        self._slanted()
+        for ln in g.lines:
+            self._skip(ln["id"], "covered by the overall and locating dimensions")
+        datums = {"horizontal": None if self.h_datum is None else int(self.h_datum["id"]),
+                  "vertical": None if self.v_datum is None else int(self.v_datum["id"])}
+        return {"datums": datums, "labeled": self.labeled, "skipped": self.skipped,
+                "operations": self.operations}
+
+
+def rule_plan(geometry: ViewGeometry, **kwargs) -> Dict[str, Any]:
+    return RulePlanner(geometry, **kwargs).plan()
@@ -0,0 +1,230 @@
+"""
+Worker pool over several ZW3D instances.
+
+One ZW3D instance processes one part at a time, so nightly batches scale by
+running N instances (on one or several hosts). ``ZW3DWorkerPool`` manages one
+``ZW3DSession`` per endpoint and runs *jobs* on them:
+
+- a job (usually one part or drawing, identified by its file path) runs on
+  a single idle instance; every ZW3D tool call made inside the job goes to
+  that instance (``use_session``);
+- affinity: a later job with the same key goes back to the instance that
+  already has the file open, and waits for it if it is busy;
+- an instance whose connection fails is marked dead, its affinities are
+  dropped, and the interrupted job is re-run on another instance. Dead
+  instances are probed again after ``revive_after`` seconds.
+
+Endpoints come from ``ZW3D_ENDPOINTS`` (comma separated ``host:port`` list).
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from tools.zw3d_session import (DEFAULT_HOST, DEFAULT_TIMEOUT, ProcessTransport, SocketTransport, ZW3DSession,
+                                ZW3DSessionError, parse_endpoint, use_session)
+from tools.zw3d_state import normalize_path, state_for
+
+
+class WorkerDied(ZW3DSessionError):
+    """The instance running a job stopped answering; the job can be re-run elsewhere."""
+
+
+class NoWorkersAvailable(ZW3DSessionError):
+    """Every instance in the pool is dead."""
+
+
+def endpoints_from_env() -> List[str]:
+    endpoints = os.getenv("ZW3D_ENDPOINTS") or os.getenv("ZW3D_REMOTE_ENDPOINT") or DEFAULT_HOST
+    return [e.strip() for e in endpoints.split(",") if e.strip()]
+
+
+def session_for(endpoint: str) -> ZW3DSession:
+    """``host:port`` -> persistent session; bare host -> one ZW3dRemote.exe process per command."""
+    host, port = parse_endpoint(endpoint)
+    if port:
+        return ZW3DSession(SocketTransport(host, port, retries=1, backoff=0.05), verbose=False,
+                           state=state_for(endpoint))
+    return ZW3DSession(ProcessTransport(host=host), verbose=False, state=state_for(endpoint))
+
+
+class ZW3DWorker:
+    """One ZW3D instance of the pool; used in place of the session inside a job."""
+
+    def __init__(self, endpoint: str, session: ZW3DSession):
+        self.endpoint = endpoint
+        self.session = session
+        self.alive = True
+        self.busy = False
+        self.died_at = 0.0
+        self.jobs = 0
+        self.deaths = 0
+
+    @property
+    def state(self):
+        return self.session.state
+
+    def execute(self, command: str, payload: Any = None, timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+        """``ZW3DSession.execute`` that raises WorkerDied when the instance is gone."""
+        try:
+            result = self.session.execute(command, payload, timeout=timeout)
+        except ZW3DSessionError as e:
+            self.state.invalidate()  # a restarted instance has nothing open
+            raise WorkerDied(f"{self.endpoint}: {e}") from e
+        transport = self.session.transport
+        if result.get("return code") == -1 and getattr(transport, "connected", True) is False:
+            # the connection dropped while the command was running
+            self.state.invalidate()
+            raise WorkerDied(f"{self.endpoint}: {result.get('stderr')}")
+        # any other non-zero code, with or without a result file, is the command's own failure (a bad
+        # part must not take the instance down); a ZW3dRemote.exe that cannot be spawned or gets no
+        # reply raises ZW3DSessionError above
+        return result
+
+    def probe(self) -> bool:
+        """Try to reconnect a dead instance."""
+        transport = self.session.transport
+        if not hasattr(transport, "connect"):
+            return True
+        try:
+            transport.close()
+            transport.connect()
+            return True
+        except (OSError, ZW3DSessionError):
+            return False
+
+    def __repr__(self):
+        state = "busy" if self.busy else "idle" if self.alive else "dead"
+        return f"ZW3DWorker({self.endpoint!r}, {state})"
+
+
+class ZW3DWorkerPool:
+    """Route jobs to idle ZW3D instances with file affinity and failover."""
+
+    def __init__(self, endpoints: Optional[Iterable[str]] = None,
+                 session_factory: Callable[[str], ZW3DSession] = session_for,
+                 retries: int = 2, revive_after: float = 30.0, max_affinity: int = 10000):
+        endpoints = list(endpoints or endpoints_from_env())
+        if not endpoints:
+            raise ValueError("ZW3DWorkerPool needs at least one endpoint")
+        self.workers = [ZW3DWorker(e, session_factory(e)) for e in endpoints]
+        self.retries = retries
+        self.revive_after = revive_after
+        self.max_affinity = max_affinity
+        self.stats = {"jobs": 0, "retried": 0, "affinity_hits": 0, "deaths": 0}
+        self._affinity: "OrderedDict[str, ZW3DWorker]" = OrderedDict()
+        self._cond = threading.Condition()
+
+    @property
+    def alive(self) -> List[ZW3DWorker]:
+        return [w for w in self.workers if w.alive]
+
+    def _revive(self):
+        now = time.monotonic()
+        for w in self.workers:
+            if not w.alive and now - w.died_at >= self.revive_after:
+                w.died_at = now
+                if w.probe():
+                    w.alive = True
+
+    def _pick(self, key: Optional[str]) -> Optional[ZW3DWorker]:
+        preferred = self._affinity.get(key) if key else None
+        if preferred is not None and preferred.alive:
+            return None if preferred.busy else preferred
+        idle = [w for w in self.workers if w.alive and not w.busy]
+        return min(idle, key=lambda w: w.jobs) if idle else None
+
+    def acquire(self, key: Optional[str] = None, timeout: Optional[float] = None) -> ZW3DWorker:
+        """Reserve an instance for a job with ``key`` (normally the part path)."""
+        key = normalize_path(key) if key else None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._revive()
+                if not self.alive:
+                    raise NoWorkersAvailable("no ZW3D instance is alive")
+                worker = self._pick(key)
+                if worker is not None:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"no idle ZW3D instance for {key}")
+                self._cond.wait(min(remaining, 1.0) if remaining is not None else 1.0)
+            worker.busy = True
+            worker.jobs += 1
+            if key:
+                if self._affinity.get(key) is worker:
+                    self.stats["affinity_hits"] += 1
+                self._affinity[key] = worker
+                self._affinity.move_to_end(key)
+                while len(self._affinity) > self.max_affinity:
+                    self._affinity.popitem(last=False)
+            return worker
+
+    def release(self, worker: ZW3DWorker, died: bool = False):
+        with self._cond:
+            worker.busy = False
+            if died:
+                self._mark_dead(worker)
+            self._cond.notify_all()
+
+    def _mark_dead(self, worker: ZW3DWorker):
+        worker.alive = False
+        worker.died_at = time.monotonic()
+        worker.deaths += 1
+        self.stats["deaths"] += 1
+        for key in [k for k, w in self._affinity.items() if w is worker]:
+            del self._affinity[key]
+
+    def run(self, key: Optional[str], fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run ``fn(*args, **kwargs)`` on one instance; its ZW3D tool calls go to
+        that instance. Re-runs the whole job elsewhere if the instance dies.
+        """
+        with self._cond:
+            self.stats["jobs"] += 1
+        for attempt in range(self.retries + 1):
+            worker = self.acquire(key)
+            try:
+                with use_session(worker):
+                    result = fn(*args, **kwargs)
+            except WorkerDied:
+                self.release(worker, died=True)
+                if attempt == self.retries:
+                    raise
+                with self._cond:
+                    self.stats["retried"] += 1
+                continue
+            except BaseException:
+                self.release(worker)
+                raise
+            self.release(worker)
+            return result
+
+    def map(self, fn: Callable[[Any], Any], items: Iterable[Any], key: Callable[[Any], str] = str,
+            parallel: Optional[int] = None) -> List[Any]:
+        """Run ``fn(item)`` for every item, one job per item, in order of ``items``."""
+        items = list(items)
+        with ThreadPoolExecutor(max_workers=parallel or len(self.workers)) as ex:
+            futures = [ex.submit(self.run, key(item), fn, item) for item in items]
+            return [f.result() for f in futures]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"workers": [{"endpoint": w.endpoint, "alive": w.alive, "busy": w.busy,
+                                 "jobs": w.jobs, "deaths": w.deaths} for w in self.workers],
+                    **self.stats}
+
+    def close(self):
+        for w in self.workers:
+            w.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,198 @@
+"""
+Replay a recorded tool-call log without the LLM.
+
+``GPTToolWrapper`` appends ``tool_start``/``tool_end`` events (name, args,
+timestamps, result) to ``AUTO_DIM_TOOL_LOG`` (``tool_calls.jsonl``).
+``Replayer`` feeds the recorded calls, in order, back through the ZW3D tools
+of ``tools.zw3d_command_tool`` -- against a real ZW3D endpoint or the
+simulator -- and reports per-tool latency against the recording:
+
+    python autodim.py replay tool_calls.jsonl --simulator
+    python autodim.py replay tool_calls.jsonl --endpoint 127.0.0.1:7000 --baseline last.json
+
+Calls to tools that are not ZW3D tools (web search, shell, ...) are skipped.
+A call failed when it raised, returned ``"ok": false`` or a non-zero
+``return code``; replayed commands are judged by the request's
+``zw3d_result.json``, like the batch runner does.
+With ``--baseline`` the deltas are taken against an earlier replay report
+instead, which makes simulator runs a deterministic throughput regression
+test for the Python side.
+"""
+from __future__ import annotations
+
+import json
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+
+from LLMWrappers.baseTool import discover_tools
+from tools import zw3d_command_tool
+from tools.zw3d_state import ALREADY_OPEN, result_code
+
+
+class RecordedCall:
+    """One tool call of the log; ``replay_*`` are filled in by ``Replayer``."""
+
+    def __init__(self, call_id: str, name: str, args: Dict[str, Any], start: float):
+        self.call_id = call_id
+        self.name = name
+        self.args = args
+        self.start = start
+        self.end: Optional[float] = None
+        self.ok: Optional[bool] = None
+        self.replay_latency: Optional[float] = None
+        self.replay_ok: Optional[bool] = None
+        self.error: Optional[str] = None
+
+    @property
+    def latency(self) -> Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+
+def load_trace(path: str) -> List[RecordedCall]:
+    """Pair the tool_start/tool_end events of a log into calls, in start order."""
+    calls: List[RecordedCall] = []
+    open_calls: Dict[str, Deque[RecordedCall]] = defaultdict(deque)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue  # torn last line
+            kind = event.get("event")
+            if kind == "tool_start":
+                call = RecordedCall(event.get("tool_call_id") or "", event["name"], event.get("args") or {},
+                                    event.get("ts", 0.0))
+                calls.append(call)
+                open_calls[call.call_id].append(call)
+            elif kind == "tool_end" and open_calls[event.get("tool_call_id") or ""]:
+                call = open_calls[event.get("tool_call_id") or ""].popleft()
+                call.end = event.get("ts")
+                call.ok = event.get("error") is None and _succeeded(event.get("result") or {})
+    return calls
+
+
+def zw3d_tools() -> Dict[str, Any]:
+    """Tool name -> instance for every ZW3D tool."""
+    return {t.name: t for t in discover_tools(zw3d_command_tool)}
+
+
+def _succeeded(result: Any) -> bool:
+    """ZW3D tools return a flat ``{"stdout", "stderr", "return code"}``, other tools ``{"ok", ...}``."""
+    return isinstance(result, dict) and result.get("ok", True) is not False and result.get("return code", 0) == 0
+
+
+def _run(tool, args: Dict[str, Any]):
+    """``(result, ok)`` of one call; commands are judged by their result file, as in ``zw3d_batch.check``."""
+    if not hasattr(tool, "send"):
+        result = tool.run(**args)
+        return result, _succeeded(result)
+    raw, payload = tool.send(**args)
+    code = result_code(payload)
+    if code is None:
+        code = raw.get("return code")
+    accept = (0, ALREADY_OPEN) if tool.command == "FILEOPEN" else (0,)
+    return tool.result(raw, payload), code in accept
+
+
+def _stats(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def pick(q):
+        return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+    return {"count": len(values), "mean": sum(values) / len(values), "p50": pick(0.5), "p95": pick(0.95),
+            "total": sum(values)}
+
+
+class Replayer:
+    """Re-execute recorded tool calls and measure them."""
+
+    def __init__(self, tools: Optional[Dict[str, Any]] = None, pace: bool = False,
+                 clock: Callable[[], float] = time.perf_counter):
+        self.tools = tools if tools is not None else zw3d_tools()
+        self.pace = pace
+        self.clock = clock
+
+    def replay(self, calls: Iterable[RecordedCall]) -> List[RecordedCall]:
+        """
+        Run the calls one after another. With ``pace`` the recorded gaps
+        between calls (model think time) are kept, otherwise calls go back to
+        back. Returns the calls that were replayed.
+        """
+        done: List[RecordedCall] = []
+        first_recorded = first_replayed = None
+        for call in calls:
+            tool = self.tools.get(call.name)
+            if tool is None:
+                continue
+            if self.pace:
+                if first_recorded is None:
+                    first_recorded, first_replayed = call.start, self.clock()
+                wait = (call.start - first_recorded) - (self.clock() - first_replayed)
+                if wait > 0:
+                    time.sleep(wait)
+            start = self.clock()
+            try:
+                result, call.replay_ok = _run(tool, call.args)
+                if not call.replay_ok:
+                    call.error = str(result.get("error") or result.get("stderr") or result.get("data")
+                                     or result.get("return code"))
+            except Exception as e:
+                call.replay_ok = False
+                call.error = f"{type(e).__name__}: {e}"
+            call.replay_latency = self.clock() - start
+            done.append(call)
+        return done
+
+    @staticmethod
+    def report(calls: List[RecordedCall], wall: float = 0.0,
+               baseline: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Per-tool latency of the replay next to the reference (the recording,
+        or the ``replayed`` figures of a ``baseline`` report) and the relative
+        delta of the p50.
+        """
+        by_tool: Dict[str, List[RecordedCall]] = defaultdict(list)
+        for call in calls:
+            by_tool[call.name].append(call)
+        tools = {}
+        for name, group in sorted(by_tool.items()):
+            replayed = _stats([c.replay_latency for c in group])
+            if baseline is not None:
+                reference = (baseline.get("tools", {}).get(name) or {}).get("replayed", {})
+            else:
+                reference = _stats([c.latency for c in group if c.latency is not None])
+            delta = None
+            if reference.get("p50"):
+                delta = (replayed["p50"] - reference["p50"]) / reference["p50"]
+            tools[name] = {
+                "replayed": replayed, "reference": reference, "delta": delta,
+                "errors": sum(1 for c in group if not c.replay_ok),
+                # recorded as successful but failed now: a behaviour change, not just a latency one
+                "regressions": sum(1 for c in group if c.ok and not c.replay_ok),
+            }
+        return {"calls": len(calls), "wall_time": wall, "reference": "baseline" if baseline else "recorded",
+                "errors": sum(t["errors"] for t in tools.values()),
+                "regressions": sum(t["regressions"] for t in tools.values()), "tools": tools}
+
+
+def slower_than(report: Dict[str, Any], threshold: float) -> List[str]:
+    """Tools whose p50 got slower than the reference by more than ``threshold`` (0.2 = 20 %)."""
+    return [name for name, t in report["tools"].items() if t["delta"] is not None and t["delta"] > threshold]
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"calls: {report['calls']}  errors: {report['errors']}  regressions: {report['regressions']}  "
+        f"wall time: {report['wall_time']:.2f}s  (reference: {report['reference']})",
+        f"{'tool':<32}{'n':>5}{'ref p50':>10}{'p50':>10}{'p95':>10}{'delta':>9}",
+    ]
+    for name, t in report["tools"].items():
+        ref = t["reference"].get("p50")
+        delta = "" if t["delta"] is None else f"{t['delta']:+.0%}"
+        lines.append(f"{name:<32}{t['replayed']['count']:>5}"
+                     f"{'-' if ref is None else f'{ref:.3f}s':>10}"
+                     f"{t['replayed']['p50']:>9.3f}s{t['replayed']['p95']:>9.3f}s{delta:>9}")
+    return "\n".join(lines)
@@ -0,0 +1,434 @@
+"""
+Event-driven pickup of ZW3D result files.
+
+ZW3D writes a command's output (``stdvu_output.json``/``.png``) and then
+publishes a ``.done`` marker. ``wait_for_done`` used to poll
+``os.path.exists`` every 50 ms with a fixed 5 s ceiling, which added latency
+to every pickup and failed on large views.
+
+``ResultWatcher`` waits for files to appear instead:
+
+- ``InotifyWatcher`` (Linux) is woken by ``IN_CREATE``/``IN_MOVED_TO`` events on
+  the result directory, so pickup latency is close to zero;
+- ``PollingWatcher`` is the fallback elsewhere; one background thread polls
+  all pending results instead of one busy loop per caller.
+
+Both keep a single waiter entry per result file: any number of threads or
+coroutines waiting for the same request share it. A waiter is fired and
+subscribed to under its own lock, so a wakeup between a coroutine's check
+and its subscription is not lost. When a directory cannot be watched (it
+does not exist yet, or the inotify watch limit is reached) its files are
+polled instead. Writers publish results
+with an atomic rename (write ``name.tmp``, then rename it into place), so a
+file that is visible is always complete.
+
+``RequestStore`` gives every command its own request ID and output directory
+(``<data dir>/requests/<id>/``) so several commands can be in flight without
+overwriting each other's ``zw3d_result.json``/``stdvu_output.*``, and removes
+old request directories. Age decides what goes: directories older than
+``max_age`` are removed, and beyond ``max_dirs`` only the oldest of those
+past a grace period ``min_age``, so a burst of requests cannot remove the
+output of a command that has just returned. A directory of an open request
+(sent, not yet answered) or with a pending waiter is never removed.
+"""
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import select
+import shutil
+import struct
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+RESULT_TIMEOUT = float(os.getenv("ZW3D_RESULT_TIMEOUT", "120"))
+REQUEST_MAX_AGE = float(os.getenv("ZW3D_REQUEST_MAX_AGE", "3600"))
+REQUEST_MAX_DIRS = int(os.getenv("ZW3D_REQUEST_MAX_DIRS", "256"))
+REQUEST_MIN_AGE = float(os.getenv("ZW3D_REQUEST_MIN_AGE", "300"))
+
+
+def write_atomic(path: str, data, encoding: str = "utf-8"):
+    """Write ``data`` to ``path`` so readers never observe a partial file."""
+    tmp = f"{path}.tmp"
+    mode = "wb" if isinstance(data, (bytes, bytearray)) else "w"
+    with open(tmp, mode, **({} if mode == "wb" else {"encoding": encoding})) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class _Waiter:
+    """Shared by every caller waiting for the same file."""
+
+    __slots__ = ("path", "event", "callbacks", "refs", "lock")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.event = threading.Event()
+        self.callbacks: List = []
+        self.refs = 0
+        self.lock = threading.Lock()
+
+    def fire(self):
+        with self.lock:
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for cb in callbacks:
+            cb()
+
+    def subscribe(self, cb):
+        """Call ``cb`` once the file exists (now, if it already does)."""
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(cb)
+                return
+        cb()
+
+
+class ResultWatcher:
+    """Base class: waiter bookkeeping shared by the inotify and polling backends."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, _Waiter] = {}
+        self._polled: set = set()  # paths whose directory could not be watched
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    # backend hooks
+    def _watch(self, waiter: _Waiter):
+        """Start watching for ``waiter.path``; OSError makes it polled instead."""
+
+    def _unwatch(self, waiter: _Waiter):
+        pass
+
+    def _run(self):
+        raise NotImplementedError
+
+    def _poll(self):
+        """Fire the waiters of polled paths that exist by now."""
+        with self._lock:
+            paths = list(self._polled)
+        for path in paths:
+            if os.path.exists(path):
+                self._notify(path)
+
+    def _ensure_thread(self):
+        if self._thread is None and not self._stopped:
+            self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+            self._thread.start()
+
+    def _acquire(self, path: str) -> _Waiter:
+        path = os.path.abspath(path)
+        with self._lock:
+            waiter = self._waiters.get(path)
+            if waiter is None:
+                waiter = _Waiter(path)
+                try:
+                    self._watch(waiter)
+                except OSError:
+                    self._polled.add(path)
+                self._waiters[path] = waiter
+            waiter.refs += 1
+            self._ensure_thread()
+        # the file may have been published before the watch was in place
+        if os.path.exists(path):
+            waiter.fire()
+        return waiter
+
+    def _release(self, waiter: _Waiter):
+        with self._lock:
+            waiter.refs -= 1
+            if waiter.refs <= 0 and self._waiters.get(waiter.path) is waiter:
+                del self._waiters[waiter.path]
+                if waiter.path in self._polled:
+                    self._polled.discard(waiter.path)
+                else:
+                    self._unwatch(waiter)
+
+    def _notify(self, path: str):
+        with self._lock:
+            waiter = self._waiters.get(path)
+        if waiter is not None:
+            waiter.fire()
+
+    @property
+    def pending(self) -> int:
+        return len(self._waiters)
+
+    def pending_dirs(self) -> set:
+        """Directories of the files being waited for."""
+        with self._lock:
+            return {os.path.dirname(path) for path in self._waiters}
+
+    def wait(self, path: str, timeout: Optional[float] = None):
+        """Block until ``path`` exists; raises TimeoutError."""
+        timeout = RESULT_TIMEOUT if timeout is None else timeout
+        waiter = self._acquire(path)
+        try:
+            if not waiter.event.wait(timeout):
+                raise TimeoutError(f"Timeout waiting for {path}")
+        finally:
+            self._release(waiter)
+
+    async def wait_async(self, path: str, timeout: Optional[float] = None):
+        """Coroutine version of ``wait``; does not block the event loop."""
+        timeout = RESULT_TIMEOUT if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        def _wake():
+            loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(None))
+
+        waiter = self._acquire(path)
+        try:
+            waiter.subscribe(_wake)
+            try:
+                await asyncio.wait_for(fut, timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Timeout waiting for {path}") from None
+        finally:
+            self._release(waiter)
+
+    def stop(self):
+        self._stopped = True
+
+
+class PollingWatcher(ResultWatcher):
+    """One thread polls every pending result file."""
+
+    def __init__(self, interval: float = 0.02):
+        super().__init__()
+        self.interval = interval
+        self._wakeup = threading.Event()
+
+    def _watch(self, waiter: _Waiter):
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped:
+            with self._lock:
+                paths = list(self._waiters)
+            for path in paths:
+                if os.path.exists(path):
+                    self._notify(path)
+            if not paths:
+                self._wakeup.wait(1.0)
+                self._wakeup.clear()
+            else:
+                self._wakeup.wait(self.interval)
+
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+_EVENT = struct.Struct("iIII")
+
+
+def _libc():
+    name = ctypes.util.find_library("c") or "libc.so.6"
+    libc = ctypes.CDLL(name, use_errno=True)
+    for fn in ("inotify_init1", "inotify_add_watch", "inotify_rm_watch"):
+        getattr(libc, fn)
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+class InotifyWatcher(ResultWatcher):
+    """Linux backend: one inotify watch per result directory; unwatchable ones are polled."""
+
+    def __init__(self, interval: float = 0.02):
+        super().__init__()
+        self.interval = interval
+        self._libc = _libc()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: Dict[str, List] = {}   # dir -> [wd, refcount]
+        self._wd_dirs: Dict[int, str] = {}
+
+    def _watch(self, waiter: _Waiter):
+        d = os.path.dirname(waiter.path)
+        entry = self._dirs.get(d)
+        if entry is None:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(d),
+                                              IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE | IN_ONLYDIR)
+            if wd < 0:
+                err = ctypes.get_errno()
+                raise OSError(err, f"inotify_add_watch({d}): {os.strerror(err)}")
+            entry = self._dirs[d] = [wd, 0]
+            self._wd_dirs[wd] = d
+        entry[1] += 1
+
+    def _unwatch(self, waiter: _Waiter):
+        d = os.path.dirname(waiter.path)
+        entry = self._dirs.get(d)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._dirs[d]
+            self._wd_dirs.pop(entry[0], None)
+            self._libc.inotify_rm_watch(self._fd, entry[0])
+
+    def _run(self):
+        try:
+            self._read_events()
+        finally:
+            self._close()
+
+    def _read_events(self):
+        while not self._stopped:
+            ready, _, _ = select.select([self._fd], [], [], self.interval if self._polled else 0.5)
+            self._poll()
+            if not ready:
+                continue
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    continue
+                raise
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _cookie, length = _EVENT.unpack_from(buf, offset)
+                offset += _EVENT.size
+                name = buf[offset:offset + length].rstrip(b"\0")
+                offset += length
+                d = self._wd_dirs.get(wd)
+                if d is not None and name:
+                    self._notify(os.path.join(d, os.fsdecode(name)))
+
+    def _close(self):
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+    def stop(self):
+        # a running thread closes the descriptor itself; closing it here could hand
+        # its number to another file while the thread still reads from it
+        with self._lock:
+            super().stop()
+            started = self._thread is not None
+        if not started:
+            self._close()
+
+
+_watcher: Optional[ResultWatcher] = None
+_watcher_lock = threading.Lock()
+
+
+def get_watcher() -> ResultWatcher:
+    """Process-wide watcher: inotify on Linux, polling otherwise."""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = PollingWatcher()
+            if sys.platform.startswith("linux") and os.getenv("ZW3D_RESULT_POLLING") != "1":
+                try:
+                    _watcher = InotifyWatcher()
+                except (OSError, AttributeError):
+                    pass
+        return _watcher
+
+
+def wait_for_done(done_path: str, timeout: Optional[float] = None):
+    get_watcher().wait(done_path, timeout)
+
+
+def read_with_done_check(json_path: str, done_path: str, timeout: Optional[float] = None) -> str:
+    """Wait for the ``.done`` marker, return the result text and consume the marker."""
+    wait_for_done(done_path, timeout)
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = f.read()
+    try:
+        os.remove(done_path)  # ✅ 删除 done 文件
+    except FileNotFoundError:
+        pass
+    return data
+
+
+def read_json_result(json_path: str, done_path: str, timeout: Optional[float] = None):
+    """``read_with_done_check`` followed by ``json.loads``."""
+    return json.loads(read_with_done_check(json_path, done_path, timeout))
+
+
+class RequestStore:
+    """Request IDs and their output directories under ``root``.
+
+    Garbage collection runs every ``gc_every`` new requests: directories older
+    than ``max_age`` seconds are removed, then the oldest ones beyond
+    ``max_dirs`` that are older than ``min_age``. Requests between ``new`` and
+    ``close`` and directories with a pending ``ResultWatcher`` waiter are kept.
+    """
+
+    def __init__(self, root: str, max_age: float = REQUEST_MAX_AGE, max_dirs: int = REQUEST_MAX_DIRS,
+                 gc_every: int = 32, min_age: float = REQUEST_MIN_AGE):
+        self.root = root
+        self.max_age = max_age
+        self.max_dirs = max_dirs
+        self.min_age = min_age
+        self.gc_every = gc_every
+        self._created = 0
+        self._open: set = set()
+        self._lock = threading.Lock()
+
+    def path(self, request_id: str) -> str:
+        return f"{self.root}/{request_id}"
+
+    def new(self) -> Tuple[str, str]:
+        """Create a request; returns ``(request_id, output_dir)``."""
+        request_id = uuid.uuid4().hex
+        out_dir = self.path(request_id)
+        os.makedirs(out_dir, exist_ok=True)
+        with self._lock:
+            self._open.add(request_id)
+            self._created += 1
+            run_gc = self.gc_every and self._created % self.gc_every == 0
+        if run_gc:
+            self.gc()
+        return request_id, out_dir
+
+    def close(self, request_id: str):
+        """ZW3D has answered the request; its directory may be collected once old enough."""
+        with self._lock:
+            self._open.discard(request_id)
+
+    def remove(self, request_id: str):
+        self.close(request_id)
+        shutil.rmtree(self.path(request_id), ignore_errors=True)
+
+    def gc(self, now: Optional[float] = None) -> int:
+        """Remove expired request directories; returns how many were removed."""
+        now = time.time() if now is None else now
+        try:
+            entries = [e for e in os.scandir(self.root) if e.is_dir()]
+        except FileNotFoundError:
+            return 0
+        with self._lock:
+            busy = set(self._open)
+        watched = _watcher.pending_dirs() if _watcher is not None else set()
+        aged = sorted(((e.stat().st_mtime, e.path) for e in entries if e.name not in busy
+                       and os.path.abspath(e.path) not in watched), reverse=True)
+        kept = len(entries) - len(aged)  # in use: always kept, but they count towards max_dirs
+        removed = 0
+        for mtime, path in aged:
+            age = now - mtime
+            if age > self.max_age or (kept >= self.max_dirs and age > self.min_age):
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+            else:
+                kept += 1
+        return removed
@@ -0,0 +1,419 @@
+"""
+Persistent ZW3D remote session.
+
+The ZW3D command tools used to spawn ``ZW3dRemote.exe`` once per command, so a
+drawing with 40 dimensions paid for 40 process spawns and 40 fresh
+connections. ``ZW3DSession`` keeps a single connection open and is shared by
+all command tools through ``get_session()``. ``use_session`` binds another
+session (a pool worker) to the current context; it is a ``ContextVar``, so
+it follows ``asyncio`` tasks, and ``in_context`` carries it into thread
+pools.
+
+Two transports are available:
+
+- ``SocketTransport``: one long-lived TCP connection speaking line-delimited
+  JSON (``{"seq": n, "cmd": "cmd=~NAME({...})"}`` -> ``{"seq": n, "return code":
+  rc, "stdout": ..., "stderr": ...}``). Used when ``ZW3D_REMOTE_ENDPOINT`` is set
+  to ``host:port``.
+- ``ProcessTransport``: the legacy one-process-per-command behaviour, used when
+  no endpoint is configured or the endpoint is a bare host.
+
+``Z3Demo.dll`` does not listen on a socket itself: the socket protocol needs a
+listener in front of ZW3D that forwards each line to ``ZW3dRemote``.
+``SessionServer`` is a local stand-in for that side of the protocol so the
+session can be exercised and benchmarked on Linux. Running this file as
+a script behaves like ``ZW3dRemote.exe -r HOST:PORT cmd=~NAME(...)`` against
+such a server.
+"""
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import re
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from tools.zw3d_state import SessionState, state_for, state_from_env
+
+DEFAULT_EXE = os.getenv("ZW3D_REMOTE_EXE", r"D:\ZW3D APIHW\Productionx64\ZW3dRemote.exe")
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_TIMEOUT = 20.0
+
+_CMD_RE = re.compile(r"^(?:cmd=)?~(\w+)\((.*)\)$", re.DOTALL)
+
+
+class ZW3DSessionError(RuntimeError):
+    """Raised when the remote endpoint cannot be reached."""
+
+
+def format_command(command: str, payload: Any = None) -> str:
+    """Build the ``cmd=~NAME({json})`` string understood by ZW3D."""
+    if payload is None:
+        body = ""
+    elif isinstance(payload, str):
+        body = payload
+    else:
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return f"cmd=~{command}({body})"
+
+
+def parse_command(cmd: str) -> Tuple[str, Any]:
+    """Split a ``cmd=~NAME({json})`` string into the command name and params."""
+    m = _CMD_RE.match(cmd.strip())
+    if not m:
+        raise ValueError(f"malformed ZW3D command: {cmd!r}")
+    name, body = m.group(1), m.group(2)
+    if not body:
+        return name, None
+    try:
+        return name, json.loads(body)
+    except json.JSONDecodeError:
+        return name, body
+
+
+def _result(stdout: str = "", stderr: str = "", code: int = 0) -> Dict[str, Any]:
+    return {"stdout": stdout, "stderr": stderr, "return code": code}
+
+
+def parse_endpoint(endpoint: str, default_port: Optional[int] = None) -> Tuple[str, Optional[int]]:
+    """Parse ``host[:port]`` into a ``(host, port)`` tuple.
+
+    A bare host has no port (``default_port``, ``None`` by default); callers
+    send its commands through ``ZW3dRemote.exe -r host``.
+    """
+    host, _, port = endpoint.strip().rpartition(":")
+    if not host:
+        return port or DEFAULT_HOST, default_port
+    try:
+        return host, int(port)
+    except ValueError:
+        raise ValueError(f"invalid ZW3D endpoint {endpoint!r}, expected host:port") from None
+
+
+class ProcessTransport:
+    """Spawn ``ZW3dRemote.exe`` (or a stand-in script) for every command."""
+
+    def __init__(self, exe: str = DEFAULT_EXE, host: str = DEFAULT_HOST):
+        self.exe = exe
+        self.host = host
+
+    def argv(self, cmd: str):
+        prefix = [sys.executable, self.exe] if self.exe.endswith(".py") else [self.exe]
+        return prefix + ["-r", self.host, cmd]
+
+    def execute(self, cmd: str, timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+        try:
+            result = subprocess.run(self.argv(cmd), capture_output=True, text=True,
+                                    timeout=timeout, cwd=os.path.dirname(self.exe) or None)
+        except subprocess.TimeoutExpired:
+            raise ZW3DSessionError(f"{os.path.basename(self.exe)} got no reply from {self.host} in {timeout}s")
+        except OSError as e:
+            raise ZW3DSessionError(f"cannot run {self.exe}: {e}") from e
+        return _result(result.stdout.strip(), result.stderr.strip(), result.returncode)
+
+    def close(self):
+        pass
+
+
+class SocketTransport:
+    """One persistent TCP connection; reconnects when the connection drops.
+
+    A command is only re-sent when the failure happened while *sending* it.
+    If the connection dies while waiting for the reply the command may already
+    have run in ZW3D, so an error result is returned instead of executing it a
+    second time; the next command reconnects.
+    """
+
+    def __init__(self, host: str, port: int, retries: int = 3, backoff: float = 0.2,
+                 connect_timeout: float = 5.0):
+        if not port:
+            raise ValueError(f"SocketTransport needs host:port, got {host!r} without a port")
+        self.host = host
+        self.port = port
+        self.retries = retries
+        self.backoff = backoff
+        self.connect_timeout = connect_timeout
+        self.reconnects = 0
+        self._sock: Optional[socket.socket] = None
+        self._rfile = None
+        self._seq = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def connect(self):
+        if self._sock is not None:
+            return
+        last_error = None
+        for attempt in range(self.retries + 1):
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self._sock = sock
+                self._rfile = sock.makefile("r", encoding="utf-8", newline="\n")
+                return
+            except OSError as e:
+                last_error = e
+                time.sleep(self.backoff * (2 ** attempt))
+        raise ZW3DSessionError(f"cannot connect to ZW3D at {self.host}:{self.port}: {last_error}")
+
+    def close(self):
+        if self._rfile is not None:
+            try:
+                self._rfile.close()
+            except OSError:
+                pass
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._rfile = None
+
+    def _reconnect(self):
+        self.close()
+        self.reconnects += 1
+        self.connect()
+
+    def execute(self, cmd: str, timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+        self._seq += 1
+        line = json.dumps({"seq": self._seq, "cmd": cmd}, ensure_ascii=False) + "\n"
+        data = line.encode("utf-8")
+
+        for attempt in range(self.retries + 1):
+            try:
+                self.connect()
+                self._sock.sendall(data)
+                break
+            except OSError:
+                if attempt == self.retries:
+                    self.close()
+                    raise ZW3DSessionError(f"send failed after {self.retries} reconnects")
+                self._reconnect()
+
+        try:
+            self._sock.settimeout(timeout)
+            reply = self._rfile.readline()
+        except (OSError, socket.timeout) as e:
+            self.close()
+            return _result(stderr=f"connection lost while waiting for reply: {e}", code=-1)
+        if not reply:
+            self.close()
+            return _result(stderr="connection closed by ZW3D before reply", code=-1)
+
+        try:
+            msg = json.loads(reply)
+            return _result(msg.get("stdout", ""), msg.get("stderr", ""), msg.get("return code", 0))
+        except (ValueError, AttributeError):
+            # the stream is out of step with the commands: start over on a fresh connection
+            self.close()
+            return _result(stderr=f"malformed reply from ZW3D: {reply[:200]!r}", code=-1)
+
+
+class ZW3DSession:
+    """Thread-safe wrapper around a transport, shared by all ZW3D command tools.
+
+    ``state`` mirrors the open/active files so that opening or activating a
+    file that is already active does not go to ZW3D at all.
+    """
+
+    def __init__(self, transport=None, verbose: bool = True, state: Optional[SessionState] = None):
+        self.transport = transport or ProcessTransport()
+        self.verbose = verbose
+        self.state = state if state is not None else state_from_env()
+        self.commands = 0
+        self.busy_time = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, exe: str = DEFAULT_EXE) -> "ZW3DSession":
+        endpoint = os.getenv("ZW3D_REMOTE_ENDPOINT") or DEFAULT_HOST
+        state = state_for(endpoint)  # shared with ZW3DAsyncExecutor's default target
+        host, port = parse_endpoint(endpoint)
+        if port is None:
+            return cls(ProcessTransport(exe, host=host), state=state)
+        return cls(SocketTransport(host, port), state=state)
+
+    def execute(self, command: str, payload: Any = None, timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+        """Run one ZW3D command and return ``{"stdout", "stderr", "return code"}``."""
+        cmd = format_command(command, payload)
+        with self._lock:
+            skipped = self.state.lookup(command, payload)
+            if skipped is not None:
+                if self.verbose:
+                    print("SKIPPED:", cmd)
+                return skipped
+            if self.verbose:
+                print("SENT:", cmd)
+            start = time.perf_counter()
+            raw = None
+            try:
+                raw = self.transport.execute(cmd, timeout=timeout)
+                return raw
+            finally:
+                self.state.update(command, payload, raw or {"return code": -1})
+                self.commands += 1
+                self.busy_time += time.perf_counter() - start
+
+    def close(self):
+        with self._lock:
+            self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_session: Optional[ZW3DSession] = None
+_session_lock = threading.Lock()
+_bound: contextvars.ContextVar[Optional[ZW3DSession]] = contextvars.ContextVar("zw3d_session", default=None)
+
+
+def bound_session() -> Optional[ZW3DSession]:
+    """The session bound by ``use_session`` in this context, if any."""
+    return _bound.get()
+
+
+def get_session() -> ZW3DSession:
+    """Return the session bound to this context by ``use_session``, else the process-wide one."""
+    global _session
+    session = _bound.get()
+    if session is not None:
+        return session
+    with _session_lock:
+        if _session is None:
+            _session = ZW3DSession.from_env()
+        return _session
+
+
+def set_session(session: Optional[ZW3DSession]) -> Optional[ZW3DSession]:
+    """Replace the shared session (e.g. with a simulator); returns the old one."""
+    global _session
+    with _session_lock:
+        old, _session = _session, session
+        return old
+
+
+@contextmanager
+def use_session(session: ZW3DSession):
+    """Send the tool calls made in this context through ``session`` (e.g. one pool worker)."""
+    token = _bound.set(session)
+    try:
+        yield session
+    finally:
+        _bound.reset(token)
+
+
+def in_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """``fn`` running in a copy of the caller's context, e.g. for ``ThreadPoolExecutor.submit``."""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)  # one context cannot be entered by two threads
+    return run
+
+
+Handler = Callable[[str, Any], Dict[str, Any]]
+
+
+def echo_handler(command: str, params: Any) -> Dict[str, Any]:
+    """Default stand-in handler: accept every command and report it back."""
+    return _result(stdout=f"{command} ok")
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        handler: Handler = self.server.command_handler
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            msg = json.loads(line)
+            try:
+                name, params = parse_command(msg["cmd"])
+                reply = dict(handler(name, params))
+            except Exception as e:
+                reply = _result(stderr=f"{type(e).__name__}: {e}", code=-1)
+            reply["seq"] = msg.get("seq")
+            self.wfile.write((json.dumps(reply, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+class SessionServer(socketserver.ThreadingTCPServer):
+    """Local stand-in for the ZW3D end of the session protocol."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = 0, handler: Handler = echo_handler):
+        super().__init__((host, port), _RequestHandler)
+        self.command_handler = handler
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self) -> "SessionServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None) -> int:
+    """One-shot client: ``zw3d_session.py -r HOST:PORT cmd=~NAME(...)``."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ZW3dRemote.exe stand-in client")
+    parser.add_argument("-r", dest="endpoint", default=os.getenv("ZW3D_REMOTE_ENDPOINT", DEFAULT_HOST))
+    parser.add_argument("cmd")
+    args = parser.parse_args(argv)
+
+    # ZW3dRemote.exe is always called with a bare host; take the port from the env.
+    default_port = parse_endpoint(os.getenv("ZW3D_REMOTE_ENDPOINT", ""))[1]
+    host, port = parse_endpoint(args.endpoint, default_port)
+    if port is None:
+        print(f"no port for {host}: pass -r HOST:PORT or set ZW3D_REMOTE_ENDPOINT", file=sys.stderr)
+        return -1
+    transport = SocketTransport(host, port, retries=0)
+    try:
+        result = transport.execute(args.cmd)
+    except ZW3DSessionError as e:
+        print(e, file=sys.stderr)
+        return -1
+    finally:
+        transport.close()
+    if result["stdout"]:
+        print(result["stdout"])
+    if result["stderr"]:
+        print(result["stderr"], file=sys.stderr)
+    return result["return code"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
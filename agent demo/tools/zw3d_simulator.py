@@ -0,0 +1,342 @@
+"""
+Local ZW3D simulator.
+
+A Python stand-in for ZW3D + ``Z3Demo.dll`` so the agent pipeline can be run
+and load-tested without a Windows ZW3D install. It understands the commands
+registered in ``ZW3D_V1Init`` (``cmd=~NAME({json})``) and produces the same
+files the DLL does:
+
+- ``STDVUDIM`` writes a synthetic ``stdvu_output.json`` (lines, arcs and
+  circles of a plate with holes and slots, size set by ``entities``), a PNG
+  of ``image_size`` and the ``.done`` marker;
+- every command writes ``zw3d_result.json`` to the request's ``outputDir``;
+- ``BATCHDIM`` also returns its per-operation results on stdout.
+
+Latency (fixed + random jitter, optionally per command) and a failure rate can
+be injected. Commands are executed one at a time, like a single ZW3D instance.
+
+Two ways to plug it in:
+
+- as a session endpoint: ``python tools/zw3d_simulator.py serve --port 7000``
+  and ``ZW3D_REMOTE_ENDPOINT=127.0.0.1:7000``;
+- as ``ZW3dRemote.exe``: ``ZW3D_REMOTE_EXE=tools/zw3d_simulator.py``. Every
+  command then runs in a fresh process (no state is kept between commands),
+  or is forwarded to a running simulator when ``ZW3D_SIMULATOR_ENDPOINT`` is set.
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+if __package__ in (None, ""):
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.zw3d_results import write_atomic
+from tools.zw3d_session import DEFAULT_HOST, SessionServer, parse_command
+
+DIMENSION_COMMANDS = ("LINDIM", "LINOFFSETDIM", "RADIALDIM", "ARCLENDIM", "HOLECALLOUTDIM")
+
+
+def _result(stdout: str = "", stderr: str = "", code: int = 0) -> Dict[str, Any]:
+    return {"stdout": stdout, "stderr": stderr, "return code": code}
+
+
+def synthetic_view(entities: int = 40, view_id: int = 100, view: int = 1,
+                   origin: Tuple[float, float] = (0.0, 0.0), seed: int = 0) -> Dict[str, Any]:
+    """
+    Geometry in the ``stdvu_output.json`` format: a rectangular plate with a
+    grid of round holes and slots, about ``entities`` entities in total.
+    """
+    rng = random.Random(seed)
+    ox, oy = origin
+    next_id = [view_id + 1]
+    out: List[Dict[str, Any]] = []
+
+    def pt(x, y):
+        return [round(ox + x, 4), round(oy + y, 4)]
+
+    def line(x1, y1, x2, y2):
+        out.append({"id": next_id[0], "type": "line", "points": {
+            "start": pt(x1, y1), "end": pt(x2, y2), "middle": pt((x1 + x2) / 2, (y1 + y2) / 2)}})
+        next_id[0] += 1
+
+    def arc(cx, cy, r, a0, a1):
+        am = (a0 + a1) / 2
+        out.append({"id": next_id[0], "type": "arc", "points": {
+            "center": pt(cx, cy),
+            "start": pt(cx + r * math.cos(a0), cy + r * math.sin(a0)),
+            "end": pt(cx + r * math.cos(a1), cy + r * math.sin(a1)),
+            "middle": pt(cx + r * math.cos(am), cy + r * math.sin(am))}})
+        next_id[0] += 1
+
+    def circle(cx, cy, r):
+        out.append({"id": next_id[0], "type": "circle", "points": {
+            "center": pt(cx, cy), "0degree": pt(cx + r, cy), "90degree": pt(cx, cy + r),
+            "180degree": pt(cx - r, cy), "270degree": pt(cx, cy - r)}})
+        next_id[0] += 1
+
+    # features: a hole is 1 entity, a slot 4; fill the plate on a square grid
+    features = max(0, entities - 4)
+    cols = max(1, math.ceil(math.sqrt(max(features, 1))))
+    rows = max(1, math.ceil(max(features, 1) / cols))
+    pitch = 30.0
+    width, height = (cols + 1) * pitch, (rows + 1) * pitch
+    line(0, 0, width, 0)
+    line(width, 0, width, height)
+    line(width, height, 0, height)
+    line(0, height, 0, 0)
+
+    remaining = features
+    for i in range(rows * cols):
+        if remaining <= 0:
+            break
+        cx, cy = (i % cols + 1) * pitch, (i // cols + 1) * pitch
+        if remaining >= 4 and rng.random() < 0.3:
+            r, half = 4.0, 6.0
+            line(cx - half, cy - r, cx + half, cy - r)
+            arc(cx + half, cy, r, -math.pi / 2, math.pi / 2)
+            line(cx + half, cy + r, cx - half, cy + r)
+            arc(cx - half, cy, r, math.pi / 2, 3 * math.pi / 2)
+            remaining -= 4
+        else:
+            circle(cx, cy, rng.choice((3.0, 4.5, 6.0)))
+            remaining -= 1
+    return {"view id": view_id, "view": view, "entities": out}
+
+
+def _png(width: int, height: int, pixels: bytearray) -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    raw = b"".join(b"\x00" + bytes(pixels[y * width:(y + 1) * width]) for y in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b""))
+
+
+def render_png(view: Dict[str, Any], width: int = 800, height: int = 600) -> bytes:
+    """Grayscale line drawing of ``view`` (enough to exercise image upload paths)."""
+    pixels = bytearray(b"\xff" * (width * height))
+    pts = [p for e in view["entities"] for p in e["points"].values()]
+    if not pts:
+        return _png(width, height, pixels)
+    xs, ys = [p[0] for p in pts], [p[1] for p in pts]
+    x0, y0 = min(xs), min(ys)
+    scale = 0.9 * min(width / max(max(xs) - x0, 1e-6), height / max(max(ys) - y0, 1e-6))
+
+    def plot(x, y):
+        px, py = int(width * 0.05 + (x - x0) * scale), int(height * 0.95 - (y - y0) * scale)
+        if 0 <= px < width and 0 <= py < height:
+            pixels[py * width + px] = 0
+
+    for e in view["entities"]:
+        p = e["points"]
+        if e["type"] == "line":
+            (xa, ya), (xb, yb) = p["start"], p["end"]
+            n = max(2, int(math.hypot(xb - xa, yb - ya) * scale))
+            for k in range(n + 1):
+                plot(xa + (xb - xa) * k / n, ya + (yb - ya) * k / n)
+        else:
+            (cx, cy), (sx, sy) = p["center"], p.get("start", p.get("0degree"))
+            r = math.hypot(sx - cx, sy - cy)
+            n = max(8, int(2 * math.pi * r * scale))
+            for k in range(n):
+                a = 2 * math.pi * k / n
+                plot(cx + r * math.cos(a), cy + r * math.sin(a))
+    return _png(width, height, pixels)
+
+
+class ZW3DSimulator:
+    """Command handler with the behaviour of ZW3D + Z3Demo.dll (``SessionServer`` handler signature)."""
+
+    def __init__(self, data_dir: Optional[str] = None, entities: int = 40,
+                 image_size: Tuple[int, int] = (800, 600), latency: float = 0.0, jitter: float = 0.0,
+                 latencies: Optional[Dict[str, float]] = None, failure_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.data_dir = data_dir or os.getenv("ZW3D_DATA_DIR", "D:/AI_AUTODIM_DATA")
+        self.entities = entities
+        self.image_size = image_size
+        self.latency = latency
+        self.jitter = jitter
+        self.latencies = dict(latencies or {})
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.open_files: List[str] = []
+        self.active: Optional[str] = None
+        self.dimensions: List[Dict[str, Any]] = []
+        self.drawings: Dict[str, set] = {}  # entity ids of the views in every drawing
+        self.counts: Dict[str, int] = {}
+        self._next_handle = 5000
+        self._next_view = 100
+        self._lock = threading.Lock()
+
+    def __call__(self, command: str, params: Any) -> Dict[str, Any]:
+        params = params if isinstance(params, dict) else {}
+        with self._lock:  # one ZW3D instance runs one command at a time
+            self.counts[command] = self.counts.get(command, 0) + 1
+            delay = self.latencies.get(command, self.latency) + self.rng.uniform(0, self.jitter)
+            if delay > 0:
+                time.sleep(delay)
+            out_dir = params.get("outputDir") or self.data_dir
+            if self.failure_rate and self.rng.random() < self.failure_rate:
+                self._write_result(out_dir, {"return code": 1})
+                return _result(stderr=f"simulated failure in {command}", code=-1)
+            method = getattr(self, f"cmd_{command.lower()}", None)
+            if method is None:
+                return _result(stderr=f"unknown command {command}", code=-1)
+            result, reply = method(params)
+            self._write_result(out_dir, result)
+            return reply or _result()
+
+    def _write_result(self, out_dir: str, result: Dict[str, Any]):
+        os.makedirs(out_dir, exist_ok=True)
+        write_atomic(f"{out_dir}/zw3d_result.json", json.dumps(result))
+
+    def _handle(self) -> int:
+        self._next_handle += 1
+        return self._next_handle
+
+    # files
+    def cmd_fileopen(self, params):
+        path = params["filePath"]
+        if path == self.active:
+            return {"return code": -1}, None   # "file already opened."
+        if path not in self.open_files:
+            self.open_files.append(path)
+        self.active = path
+        return {"return code": 0}, None
+
+    def cmd_fileactive(self, params):
+        path = params["filePath"]
+        if path not in self.open_files:
+            self.open_files.append(path)
+        self.active = path
+        return {"return code": 0}, None
+
+    def cmd_filenew(self, params):
+        return self.cmd_fileactive({"filePath": params["savePath"]})
+
+    def cmd_fileexport(self, params):
+        return {"return code": 0}, None
+
+    def cmd_asmtree(self, params):
+        root = f"{params.get('saveDir', '')}root.Z3ASM"
+        self.open_files.append(root)
+        self.active = root
+        return {"return code": 0}, None
+
+    def cmd_compinsert(self, params):
+        return {"return code": 0}, None
+
+    def cmd_mycommand(self, params):
+        return {"return code": 0}, None
+
+    # drawing
+    def cmd_stdvucreate(self, params):
+        self._next_view += 1
+        return {"return code": 0}, None
+
+    def cmd_stdvudim(self, params):
+        out_dir = params.get("outputDir") or self.data_dir
+        os.makedirs(out_dir, exist_ok=True)
+        self._next_view += 1000
+        view = synthetic_view(self.entities, view_id=self._next_view, view=int(params.get("type", 1)),
+                              origin=(float(params.get("x", 0)), float(params.get("y", 0))),
+                              seed=zlib.crc32(str(params.get("path", "")).encode()))
+        path = str(params.get("path", "part")).replace("\\", "/")
+        self.active = path.rsplit(".", 1)[0] + ".Z3DRW"
+        self.drawings.setdefault(self.active, set()).update(
+            [view["view id"]] + [e["id"] for e in view["entities"]])
+        write_atomic(f"{out_dir}/stdvu_output.png", render_png(view, *self.image_size))
+        write_atomic(f"{out_dir}/stdvu_output.json", json.dumps(view, indent=4))
+        write_atomic(f"{out_dir}/stdvu_output.done", "done")
+        return {"return code": 0}, None
+
+    def cmd_entcheck(self, params):
+        known = self.drawings.get(self.active, set())
+        return {"return code": 0, "missing": [i for i in params.get("ids", []) if i not in known]}, None
+
+    def _dimension(self, command, params) -> int:
+        handle = self._handle()
+        self.dimensions.append({"handle": handle, "command": command, "params": params})
+        return handle
+
+    def cmd_lindim(self, params):
+        self._dimension("LINDIM", params)
+        return {"return code": 0}, None
+
+    cmd_linoffsetdim = cmd_radialdim = cmd_arclendim = cmd_holecalloutdim = cmd_autodim = cmd_lindim
+
+    def cmd_batchdim(self, params):
+        results = []
+        for index, op in enumerate(params.get("ops", [])):
+            name = op.get("op")
+            if name in DIMENSION_COMMANDS:
+                entry = {"status": "ok", "error code": 0, "handle": self._dimension(name, op.get("params"))}
+            else:
+                entry = {"status": "error", "error code": -2, "handle": 0}
+            results.append({"index": index, "op": name, **entry})
+        result = {"results": results, "return code": 0}
+        return result, _result(stdout=json.dumps(result))
+
+
+def main(argv=None) -> int:
+    """``serve`` runs a session endpoint; ``-r HOST cmd=~NAME(...)`` behaves like ZW3dRemote.exe."""
+    import argparse
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "serve":
+        parser = argparse.ArgumentParser(description="ZW3D simulator session endpoint")
+        parser.add_argument("--host", default=DEFAULT_HOST)
+        parser.add_argument("--port", type=int, default=0)
+        parser.add_argument("--data-dir", default=None)
+        parser.add_argument("--entities", type=int, default=40)
+        parser.add_argument("--image-size", default="800x600")
+        parser.add_argument("--latency", type=float, default=0.0, help="seconds per command")
+        parser.add_argument("--jitter", type=float, default=0.0, help="extra random seconds per command")
+        parser.add_argument("--failure-rate", type=float, default=0.0)
+        parser.add_argument("--seed", type=int, default=None)
+        args = parser.parse_args(argv[1:])
+        w, h = (int(v) for v in args.image_size.lower().split("x"))
+        sim = ZW3DSimulator(args.data_dir, args.entities, (w, h), args.latency, args.jitter,
+                            failure_rate=args.failure_rate, seed=args.seed)
+        server = SessionServer(args.host, args.port, handler=sim)
+        print(f"ZW3D simulator listening on {server.endpoint}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return 0
+
+    parser = argparse.ArgumentParser(description="ZW3dRemote.exe stand-in backed by the simulator")
+    parser.add_argument("-r", dest="host", default=DEFAULT_HOST)
+    parser.add_argument("cmd")
+    args = parser.parse_args(argv)
+    endpoint = os.getenv("ZW3D_SIMULATOR_ENDPOINT")
+    if endpoint:
+        from tools import zw3d_session
+        return zw3d_session.main(["-r", endpoint, args.cmd])
+
+    name, params = parse_command(args.cmd)
+    sim = ZW3DSimulator(entities=int(os.getenv("ZW3D_SIMULATOR_ENTITIES", "40")),
+                        latency=float(os.getenv("ZW3D_SIMULATOR_LATENCY", "0")),
+                        failure_rate=float(os.getenv("ZW3D_SIMULATOR_FAILURE_RATE", "0")))
+    result = sim(name, params)
+    if result["stdout"]:
+        print(result["stdout"])
+    if result["stderr"]:
+        print(result["stderr"], file=sys.stderr)
+    return result["return code"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
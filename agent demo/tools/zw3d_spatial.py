@@ -0,0 +1,291 @@
+"""
+Spatial index over the entities of one view.
+
+Choosing text points, matching holes to edges and checking collisions all
+ask "which entities are near this point / in this box / on this segment".
+``SpatialIndex`` answers that for a ``ViewGeometry`` with a uniform grid:
+
+- every entity is registered in the cells its bounding box covers (CSR
+  layout: one sorted array of rows plus per-cell offsets, so a row of cells
+  is one contiguous slice);
+- entities covering more than ``max_cells`` cells (outer borders, long
+  center lines) go to a small list that every query checks directly;
+- candidates from the grid are filtered with exact, vectorised geometry:
+  point-to-segment / point-to-arc distance for ``nearest``, segment/segment
+  and segment/circle intersection for ``intersect_segment``.
+
+Arcs are taken from their start point through the mid point to the end point
+(either direction), so bounding boxes and distances follow the drawn arc.
+"""
+from __future__ import annotations
+
+import math
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tools.zw3d_geometry import ARC, CIRCLE, LINE, ViewGeometry
+
+TWO_PI = 2 * math.pi
+EPS = 1e-9
+
+
+def _angle(v: np.ndarray) -> np.ndarray:
+    return np.arctan2(v[..., 1], v[..., 0])
+
+
+def arc_sweeps(entities: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(start angle, counter-clockwise sweep) per row; full circles get (0, 2*pi), lines NaN."""
+    n = len(entities)
+    lo = np.full(n, np.nan)
+    sweep = np.full(n, np.nan)
+    circle = entities["type"] == CIRCLE
+    lo[circle], sweep[circle] = 0.0, TWO_PI
+    arc = entities["type"] == ARC
+    if arc.any():
+        e = entities[arc]
+        a0 = _angle(e["start"] - e["center"])
+        a1 = _angle(e["end"] - e["center"])
+        am = _angle(e["mid"] - e["center"])
+        ccw = np.mod(a1 - a0, TWO_PI)
+        forward = np.mod(am - a0, TWO_PI) <= ccw
+        lo[arc] = np.where(forward, a0, a1)
+        sweep[arc] = np.where(forward, ccw, TWO_PI - ccw)
+    return lo, sweep
+
+
+def _in_sweep(theta: np.ndarray, lo: np.ndarray, sweep: np.ndarray) -> np.ndarray:
+    return np.mod(theta - lo, TWO_PI) <= sweep + EPS
+
+
+def entity_bounds(entities: np.ndarray) -> np.ndarray:
+    """(n, 4) array of xmin, ymin, xmax, ymax per row."""
+    pts = np.stack([entities["start"], entities["end"], entities["mid"]], axis=1)
+    lo, hi = pts.min(axis=1), pts.max(axis=1)
+    round_ = entities["type"] != LINE
+    if round_.any():
+        e = entities[round_]
+        start, sweep = arc_sweeps(e)
+        c, r = e["center"], e["radius"]
+        rlo, rhi = lo[round_], hi[round_]
+        # a quadrant extreme inside the sweep extends the box past the end points
+        for k, (dx, dy) in enumerate(((1, 0), (0, 1), (-1, 0), (0, -1))):
+            hit = _in_sweep(np.full(len(e), k * math.pi / 2), start, sweep)
+            x, y = c[:, 0] + dx * r, c[:, 1] + dy * r
+            rlo[:, 0] = np.where(hit, np.minimum(rlo[:, 0], x), rlo[:, 0])
+            rlo[:, 1] = np.where(hit, np.minimum(rlo[:, 1], y), rlo[:, 1])
+            rhi[:, 0] = np.where(hit, np.maximum(rhi[:, 0], x), rhi[:, 0])
+            rhi[:, 1] = np.where(hit, np.maximum(rhi[:, 1], y), rhi[:, 1])
+        lo[round_], hi[round_] = rlo, rhi
+    return np.concatenate([lo, hi], axis=1)
+
+
+class SpatialIndex:
+    """Uniform-grid index over a ``ViewGeometry``; queries return entity ids."""
+
+    def __init__(self, geometry: ViewGeometry, cell_size: Optional[float] = None,
+                 per_cell: float = 2.0, max_cells: int = 64):
+        self.geometry = geometry
+        e = geometry.entities
+        self._type = e["type"]
+        self._start, self._end = e["start"], e["end"]
+        self._center, self._radius = e["center"], e["radius"]
+        self._lo, self._sweep = arc_sweeps(e)
+        self.bounds = entity_bounds(e) if len(e) else np.zeros((0, 4))
+        n = len(e)
+
+        if n:
+            xmin, ymin = self.bounds[:, 0].min(), self.bounds[:, 1].min()
+            xmax, ymax = self.bounds[:, 2].max(), self.bounds[:, 3].max()
+        else:
+            xmin = ymin = 0.0
+            xmax = ymax = 1.0
+        w, h = max(xmax - xmin, EPS), max(ymax - ymin, EPS)
+        if cell_size is None:
+            cell_size = math.sqrt(w * h * per_cell / max(n, 1))
+            cell_size = max(cell_size, max(w, h) / 4096)  # keep the grid size sane for thin views
+        self.cell = float(cell_size)
+        self.extent = (float(xmin), float(ymin), float(xmax), float(ymax))
+        self.origin = (float(xmin), float(ymin))
+        self.nx = int(w // self.cell) + 1
+        self.ny = int(h // self.cell) + 1
+
+        ix0, iy0 = self._cell_of(self.bounds[:, 0], self.bounds[:, 1])
+        ix1, iy1 = self._cell_of(self.bounds[:, 2], self.bounds[:, 3])
+        nxe, nye = ix1 - ix0 + 1, iy1 - iy0 + 1
+        big = nxe * nye > max_cells
+        self.big = np.flatnonzero(big)
+        rows = np.flatnonzero(~big)
+        counts = (nxe * nye)[rows]
+        ent = np.repeat(rows, counts)
+        local = np.arange(len(ent)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cx = ix0[ent] + local % nxe[ent]
+        cy = iy0[ent] + local // nxe[ent]
+        cells = cy * self.nx + cx
+        order = np.argsort(cells, kind="stable")
+        self._cell_rows = ent[order]
+        self._offsets = np.zeros(self.nx * self.ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self.nx * self.ny), out=self._offsets[1:])
+
+    def __len__(self) -> int:
+        return len(self.geometry)
+
+    def _cell_of(self, x, y) -> Tuple[np.ndarray, np.ndarray]:
+        ix = np.clip(((np.asarray(x) - self.origin[0]) // self.cell).astype(np.int64), 0, self.nx - 1)
+        iy = np.clip(((np.asarray(y) - self.origin[1]) // self.cell).astype(np.int64), 0, self.ny - 1)
+        return ix, iy
+
+    def _ids(self, rows: np.ndarray) -> np.ndarray:
+        return self.geometry.entities["id"][np.sort(rows)]
+
+    # candidates
+    def _box_rows(self, xmin: float, ymin: float, xmax: float, ymax: float) -> np.ndarray:
+        """Rows whose bounding box overlaps the box."""
+        ix0, iy0 = self._cell_of(xmin, ymin)
+        ix1, iy1 = self._cell_of(xmax, ymax)
+        parts = [self.big]
+        for y in range(int(iy0), int(iy1) + 1):
+            base = y * self.nx
+            parts.append(self._cell_rows[self._offsets[base + ix0]:self._offsets[base + ix1 + 1]])
+        rows = np.unique(np.concatenate(parts))
+        b = self.bounds[rows]
+        keep = (b[:, 0] <= xmax) & (b[:, 2] >= xmin) & (b[:, 1] <= ymax) & (b[:, 3] >= ymin)
+        return rows[keep]
+
+    def _segment_rows(self, p0: np.ndarray, p1: np.ndarray) -> np.ndarray:
+        """Rows registered in the cells the segment passes through (plus the big ones)."""
+        d = p1 - p0
+        ts = [np.array([0.0, 1.0])]
+        for axis, n in ((0, self.nx), (1, self.ny)):
+            if abs(d[axis]) > EPS:
+                lines = self.origin[axis] + self.cell * np.arange(1, n)
+                t = (lines - p0[axis]) / d[axis]
+                ts.append(t[(t > 0) & (t < 1)])
+        t = np.unique(np.concatenate(ts))
+        mid = p0 + d * ((t[:-1] + t[1:]) / 2)[:, None] if len(t) > 1 else p0[None, :]
+        ix, iy = self._cell_of(mid[:, 0], mid[:, 1])
+        cells = np.unique(iy * self.nx + ix)
+        parts = [self.big] + [self._cell_rows[self._offsets[c]:self._offsets[c + 1]] for c in cells]
+        return np.unique(np.concatenate(parts))
+
+    # exact geometry
+    def distances(self, x: float, y: float, rows: np.ndarray) -> np.ndarray:
+        """Distance from (x, y) to each entity of ``rows``."""
+        p = np.array([x, y], dtype=float)
+        out = np.empty(len(rows))
+        kind = self._type[rows]
+        line = rows[kind == LINE]
+        if len(line):
+            a, b = self._start[line], self._end[line]
+            ab = b - a
+            denom = np.einsum("ij,ij->i", ab, ab)
+            t = np.clip(np.einsum("ij,ij->i", p - a, ab) / np.where(denom > 0, denom, 1.0), 0.0, 1.0)
+            out[kind == LINE] = np.hypot(*(a + ab * t[:, None] - p).T)
+        round_ = rows[kind != LINE]
+        if len(round_):
+            c, r = self._center[round_], self._radius[round_]
+            v = p - c
+            on_arc = np.abs(np.hypot(v[:, 0], v[:, 1]) - r)
+            inside = _in_sweep(_angle(v), self._lo[round_], self._sweep[round_])
+            ends = np.minimum(np.hypot(*(self._start[round_] - p).T), np.hypot(*(self._end[round_] - p).T))
+            out[kind != LINE] = np.where(inside, on_arc, ends)
+        return out
+
+    def _hits_segment(self, p0: np.ndarray, p1: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        hit = np.zeros(len(rows), dtype=bool)
+        kind = self._type[rows]
+        d = p1 - p0
+
+        line = kind == LINE
+        if line.any():
+            a, b = self._start[rows[line]], self._end[rows[line]]
+
+            def cross(o, u, v):
+                return (u[..., 0] - o[..., 0]) * (v[..., 1] - o[..., 1]) - (u[..., 1] - o[..., 1]) * (v[..., 0] - o[..., 0])
+
+            d1, d2 = cross(a, b, p0), cross(a, b, p1)
+            d3, d4 = cross(p0, p1, a), cross(p0, p1, b)
+            proper = (d1 * d2 < 0) & (d3 * d4 < 0)
+
+            tol = EPS * max(1.0, float(d @ d))
+
+            def on(o, u, q, dd):
+                near = np.abs(dd) <= tol
+                return near & (np.minimum(o[..., 0], u[..., 0]) - EPS <= q[..., 0]) & \
+                    (q[..., 0] <= np.maximum(o[..., 0], u[..., 0]) + EPS) & \
+                    (np.minimum(o[..., 1], u[..., 1]) - EPS <= q[..., 1]) & \
+                    (q[..., 1] <= np.maximum(o[..., 1], u[..., 1]) + EPS)
+
+            p0b, p1b = np.broadcast_to(p0, a.shape), np.broadcast_to(p1, a.shape)
+            touch = on(a, b, p0b, d1) | on(a, b, p1b, d2) | on(p0b, p1b, a, d3) | on(p0b, p1b, b, d4)
+            hit[line] = proper | touch
+
+        round_ = ~line
+        if round_.any():
+            rr = rows[round_]
+            c, r = self._center[rr], self._radius[rr]
+            f = p0 - c
+            qa = float(d @ d)
+            qb = 2 * (f @ d)
+            qc = np.einsum("ij,ij->i", f, f) - r * r
+            disc = qb * qb - 4 * qa * qc
+            ok = disc >= 0
+            sq = np.sqrt(np.where(ok, disc, 0.0))
+            found = np.zeros(len(rr), dtype=bool)
+            if qa > 0:
+                for sign in (-1.0, 1.0):
+                    t = (-qb + sign * sq) / (2 * qa)
+                    pts = p0 + t[:, None] * d
+                    in_arc = _in_sweep(_angle(pts - c), self._lo[rr], self._sweep[rr])
+                    found |= ok & (t >= -EPS) & (t <= 1 + EPS) & in_arc
+            else:
+                found = np.abs(np.hypot(*f.T) - r) <= EPS
+            hit[round_] = found
+        return hit
+
+    # queries
+    def query_box(self, xmin: float, ymin: float, xmax: float, ymax: float) -> np.ndarray:
+        """Ids of entities whose bounding box overlaps the box, sorted by row."""
+        return self._ids(self._box_rows(xmin, ymin, xmax, ymax))
+
+    def nearest(self, x: float, y: float, k: int = 1, kinds: Optional[Iterable[int]] = None,
+                exclude: Sequence[int] = ()) -> List[Tuple[int, float]]:
+        """
+        The ``k`` entities closest to (x, y) as ``(id, distance)``, nearest
+        first; ``kinds`` restricts the types (``LINE``/``ARC``/``CIRCLE``).
+        """
+        n = len(self)
+        if not n or k <= 0:
+            return []
+        kinds = None if kinds is None else np.asarray(list(kinds))
+        excluded = np.asarray([self.geometry.row(i) for i in exclude if i in self.geometry], dtype=np.int64)
+        xmin, ymin, xmax, ymax = self.extent
+        # the smallest box around (x, y) that contains every entity
+        cover = max(x - xmin, xmax - x, y - ymin, ymax - y, 0.0)
+        radius = self.cell
+        while True:
+            rows = self._box_rows(x - radius, y - radius, x + radius, y + radius)
+            if kinds is not None:
+                rows = rows[np.isin(self._type[rows], kinds)]
+            if len(excluded):
+                rows = rows[~np.isin(rows, excluded)]
+            dist = self.distances(x, y, rows)
+            order = np.argsort(dist, kind="stable")[:k]
+            # an entity within ``radius`` overlaps the search box, so a k-th
+            # distance <= radius cannot be beaten by anything outside it
+            if (len(order) == k and dist[order[-1]] <= radius) or radius >= cover:
+                ids = self.geometry.entities["id"][rows[order]]
+                return [(int(i), float(dd)) for i, dd in zip(ids, dist[order])]
+            radius *= 2
+
+    def intersect_segment(self, p0: Sequence[float], p1: Sequence[float]) -> np.ndarray:
+        """Ids of entities the segment p0-p1 crosses or touches, sorted by row."""
+        p0, p1 = np.asarray(p0, dtype=float), np.asarray(p1, dtype=float)
+        rows = self._segment_rows(p0, p1)
+        if not len(rows):
+            return rows
+        b = self.bounds[rows]
+        lo, hi = np.minimum(p0, p1), np.maximum(p0, p1)
+        rows = rows[(b[:, 0] <= hi[0] + EPS) & (b[:, 2] >= lo[0] - EPS) &
+                    (b[:, 1] <= hi[1] + EPS) & (b[:, 3] >= lo[1] - EPS)]
+        return self._ids(rows[self._hits_segment(p0, p1, rows)])
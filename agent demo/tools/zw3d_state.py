@@ -0,0 +1,136 @@
+"""
+Client-side mirror of the ZW3D session state.
+
+The agent often re-issues ``zw3d_open``/``zw3d_activefile`` for a file that is
+already open and active. The DLL then closes and reopens the file (seconds for
+a large assembly) or reports -1. ``SessionState`` tracks the open files, the
+active file and the active root from command results, answers such no-op
+commands locally, and forgets what it knows after any command that may change
+state in a way it cannot follow. There is one ``SessionState`` per ZW3D
+instance (``state_for``): the blocking session and the asyncio executor
+both talk to it, so an open sent on one path is seen by the other.
+
+The outcome of a command is the ``return code`` the DLL writes to the
+request's ``zw3d_result.json`` (0 done, -1 "file already opened", 1 error),
+not the exit status of the call, which is 0 for "already opened" and for
+some failures alike. Commands sent without an output directory fall back to
+the exit status.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import Any, Dict, Optional, Set
+
+# commands that never change which files are open or active
+NEUTRAL_COMMANDS = frozenset({
+    "LINDIM", "LINOFFSETDIM", "RADIALDIM", "ARCLENDIM",
+    "HOLECALLOUTDIM", "BATCHDIM", "AUTODIM", "ENTCHECK",
+})
+# FILEOPEN of the file that is already open and active. DLLs before the full-path check
+# also returned it for a part of the same name in another folder, so the mirror does not
+# take it as proof that the requested path is active.
+ALREADY_OPEN = -1
+
+
+def normalize_path(path: str) -> str:
+    """ZW3D runs on Windows: paths compare case-insensitively and with either separator."""
+    return str(path).replace("\\", "/").lower()
+
+
+def result_code(payload: Dict[str, Any]) -> Optional[int]:
+    """``return code`` of the request's ``zw3d_result.json``; None if the DLL wrote none."""
+    try:
+        with open(f"{payload['outputDir']}/zw3d_result.json", "r", encoding="utf-8") as f:
+            return json.load(f).get("return code")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class SessionState:
+    """Open files, active file and active root as last reported by ZW3D."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.open_files: Set[str] = set()
+        self.active: Optional[str] = None
+        self.root: Optional[str] = None
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Forget everything; the next open/activate goes to ZW3D again."""
+        with self._lock:
+            self.open_files.clear()
+            self.active = self.root = None
+
+    def lookup(self, command: str, payload: Any) -> Optional[Dict[str, Any]]:
+        """Result for a command that would not change anything, or None to send it."""
+        if not self.enabled or not isinstance(payload, dict) or not payload.get("filePath"):
+            return None
+        path = normalize_path(payload["filePath"])
+        with self._lock:
+            if command == "FILEOPEN" and path in self.open_files and path == self.active:
+                reason = "already open and active"
+            elif command == "FILEACTIVE" and path == self.active:
+                reason = "already active"
+            else:
+                return None
+            self.skipped += 1
+        return {"stdout": f"{command} skipped: {payload['filePath']} {reason}", "stderr": "",
+                "return code": 0, "skipped": True}
+
+    def update(self, command: str, payload: Any, raw: Dict[str, Any]):
+        """Follow the effect of a command that was sent to ZW3D."""
+        if command in NEUTRAL_COMMANDS:
+            return
+        params = payload if isinstance(payload, dict) else {}
+        if params.get("outputDir"):
+            ok = result_code(params) == 0
+        else:
+            ok = raw.get("return code") == 0
+        if not ok:
+            self.invalidate()
+            return
+        with self._lock:
+            if command == "FILEOPEN" and params.get("filePath"):
+                path = normalize_path(params["filePath"])
+                self.open_files.add(path)
+                self.active = self.root = path
+            elif command == "FILEACTIVE" and params.get("filePath"):
+                path = normalize_path(params["filePath"])
+                self.open_files.add(path)
+                self.active = path
+            elif command == "FILENEW" and params.get("savePath"):
+                path = normalize_path(params["savePath"])
+                self.open_files.add(path)
+                self.active = self.root = path
+            else:
+                # ASMTREE, COMPINSERT, STDVUDIM (creates a drawing), FILEEXPORT, raw commands, ...
+                self.open_files.clear()
+                self.active = self.root = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"open_files": sorted(self.open_files), "active": self.active,
+                    "root": self.root, "skipped": self.skipped}
+
+
+def state_from_env() -> SessionState:
+    """``ZW3D_STATE_CACHE=0`` disables short-circuiting (e.g. when files are also opened by hand)."""
+    return SessionState(enabled=os.getenv("ZW3D_STATE_CACHE", "1") != "0")
+
+
+_states: Dict[str, SessionState] = {}
+_states_lock = threading.Lock()
+
+
+def state_for(endpoint: str) -> SessionState:
+    """The ``SessionState`` of the ZW3D instance at ``endpoint`` (``host:port`` or a ZW3dRemote.exe host)."""
+    key = endpoint.strip().lower()
+    with _states_lock:
+        state = _states.get(key)
+        if state is None:
+            state = _states[key] = state_from_env()
+        return state
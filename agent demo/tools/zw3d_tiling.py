@@ -0,0 +1,192 @@
+"""
+Very large views, split into regions that are planned side by side.
+
+A view with thousands of entities does not fit one dimensioning prompt: the
+prompt grows with the view and so does the time the LLM spends on it.
+``partition`` cuts the view into regions of at most ``max_entities``
+entities along feature boundaries rather than a grid:
+
+- the units are the features of ``tools.zw3d_topology.contours``: every
+  loop nested in an outer profile together with everything inside it (a
+  pocket with its islands), every open chain, and each entity of the outer
+  profile on its own, so a long outline is spread over the regions it runs
+  through;
+- the units are split recursively at the entity-weighted median of their
+  centres across the longer side of their extent (a k-d tree). Regions are
+  compact and balanced, and no hole, slot or pocket is cut in two;
+- entities ``representatives`` leaves out (pattern members, mirror images)
+  are not planned, as in the untiled prompt.
+
+Every region is planned with the datum lines of the whole view added, so all
+locating dimensions share one baseline. ``split_draft`` splits the rule
+draft the same way; its dimensions that reach across regions (the overall
+sizes) stay with the whole view. ``plan_regions`` runs one planner per
+region on a thread pool and ``merge_regions`` resolves the conflicts of the
+combined plan:
+
+1. the same dimension (type and entities) from two places is kept once;
+2. ``ConstraintCounter`` drops a dimension that closes a chain with the ones
+   before it, e.g. a feature located from the datum in one region and from
+   a neighbour in another;
+3. ``place_texts`` arranges the labels of the whole view, so labels near a
+   region border do not collide.
+
+The prompt size is bounded by ``max_entities``, and the latency by the
+slowest region as long as there are workers for all regions.
+"""
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tools.zw3d_geometry import LINE, ViewGeometry
+from tools.zw3d_session import in_context
+from tools.zw3d_topology import contours
+
+TILE_ENTITIES = int(os.getenv("AUTO_DIM_TILE_ENTITIES", "400"))  # 0: never tile
+TILE_WORKERS = int(os.getenv("AUTO_DIM_TILE_WORKERS", "8"))
+
+RegionPlanner = Callable[[int, Dict[str, Any]], Dict[str, Any]]
+
+
+def _units(geometry: ViewGeometry, topology: Dict[str, Any]) -> List[List[int]]:
+    """Entity ids of every unit that must stay in one region."""
+    loops = {c["id"]: c for c in topology["contours"]}
+
+    def subtree(c) -> List[int]:
+        ids = list(c["members"])
+        for child in c["children"]:
+            ids.extend(subtree(loops[child]))
+        return ids
+
+    units: List[List[int]] = []
+    for c in topology["contours"]:
+        if c["depth"] != 0:
+            continue
+        units.extend([i] for i in c["members"])
+        units.extend(subtree(loops[child]) for child in c["children"])
+    units.extend(list(chain) for chain in topology["open"])
+    seen = {i for unit in units for i in unit}
+    units.extend([int(i)] for i in geometry.entities["id"] if int(i) not in seen)
+    return units
+
+
+def _boxes(geometry: ViewGeometry, units: List[List[int]]) -> np.ndarray:
+    """(n, 4) bounding box of every unit."""
+    e = geometry.entities
+    line = (e["type"] == LINE)[:, None]
+    r = e["radius"][:, None]
+    lo = np.where(line, np.minimum(e["start"], e["end"]), e["center"] - r)
+    hi = np.where(line, np.maximum(e["start"], e["end"]), e["center"] + r)
+    out = np.empty((len(units), 4))
+    for k, unit in enumerate(units):
+        rows = geometry.rows(unit)
+        out[k, :2], out[k, 2:] = lo[rows].min(axis=0), hi[rows].max(axis=0)
+    return out
+
+
+def _split(index: np.ndarray, centres: np.ndarray, weights: np.ndarray, limit: int) -> List[np.ndarray]:
+    if len(index) <= 1 or weights[index].sum() <= limit:
+        return [index]
+    c = centres[index]
+    axis = int(np.argmax(np.ptp(c, axis=0)))
+    order = index[np.argsort(c[:, axis], kind="stable")]
+    cum = np.cumsum(weights[order])
+    cut = min(max(int(np.searchsorted(cum, cum[-1] / 2)) + 1, 1), len(order) - 1)
+    return _split(order[:cut], centres, weights, limit) + _split(order[cut:], centres, weights, limit)
+
+
+def partition(geometry: ViewGeometry, max_entities: int = TILE_ENTITIES, keep: Optional[Iterable[int]] = None,
+              datums: Sequence[int] = (), topology: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    ``{"datums", "regions"}``; every region is ``{"id", "entities", "bbox"}``
+    with the ids to plan in it, the datums excluded (they go with every
+    region). Only ids in ``keep`` (default all) are planned.
+    """
+    topology = topology or contours(geometry)
+    keep = None if keep is None else set(int(i) for i in keep)
+    datums = [int(i) for i in datums if i is not None]
+    skip = set(datums)
+    units = _units(geometry, topology)
+    boxes = _boxes(geometry, units)
+    units = [[i for i in unit if i not in skip and (keep is None or i in keep)] for unit in units]
+    index = np.array([k for k, unit in enumerate(units) if unit], dtype=np.int64)
+    if not len(index):
+        return {"datums": datums, "regions": []}
+    centres = (boxes[:, :2] + boxes[:, 2:]) / 2
+    weights = np.array([len(unit) for unit in units])
+    regions = []
+    for part in _split(index, centres, weights, max(1, max_entities)):
+        ids = sorted(i for k in part for i in units[k])
+        box = boxes[part]
+        regions.append({"id": len(regions), "entities": ids,
+                        "bbox": [round(float(v), 4) for v in (*box[:, :2].min(axis=0), *box[:, 2:].max(axis=0))]})
+    return {"datums": datums, "regions": regions}
+
+
+def split_draft(draft: Dict[str, Any], tiles: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    (operations kept for the whole view, one draft per region). An operation
+    goes to the region holding all of its entities besides the datums.
+    """
+    from tools.zw3d_diff import operation_ids
+    region_of = {i: r["id"] for r in tiles["regions"] for i in r["entities"]}
+    datums = set(tiles["datums"])
+    shared: List[Dict[str, Any]] = []
+    drafts = [{"datums": draft.get("datums"), "labeled": [], "operations": []} for _ in tiles["regions"]]
+    labeled = draft.get("labeled") or [None] * len(draft["operations"])
+    for item, op in zip(labeled, draft["operations"]):
+        owners = {region_of.get(i, -1) for i in operation_ids(op) if i not in datums}
+        if len(owners) != 1 or -1 in owners:
+            shared.append(op)
+            continue
+        target = drafts[owners.pop()]
+        target["operations"].append(op)
+        if item is not None:
+            target["labeled"].append(item)
+    return shared, drafts
+
+
+def plan_regions(regions: Sequence[Dict[str, Any]], plan_region: RegionPlanner,
+                 workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """``plan_region(k, region)`` of every region on a thread pool, in region order, with the caller's session."""
+    if not regions:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(len(regions), workers or TILE_WORKERS))) as pool:
+        return list(pool.map(in_context(plan_region), range(len(regions)), regions))
+
+
+def merge_regions(geometry: ViewGeometry, plans: Sequence[Sequence[Dict[str, Any]]],
+                  shared: Sequence[Dict[str, Any]] = (), symmetry: Optional[Dict[str, Any]] = None,
+                  constraints: bool = True) -> Dict[str, Any]:
+    """
+    ``{"operations", "dropped"}`` of ``shared`` followed by the region plans;
+    each dropped operation is ``{"region" (None for shared), "type", "ids",
+    "reason"}``.
+    """
+    from tools.zw3d_constraints import ConstraintCounter
+    from tools.zw3d_diff import operation_ids
+    from tools.zw3d_placement import place_texts
+    from tools.zw3d_validator import dimension_key, plan_type, view_tolerance
+
+    counter = ConstraintCounter(geometry, symmetry=symmetry) if constraints else None
+    tol = view_tolerance(geometry)
+    seen, kept, dropped = set(), [], []
+    tagged = [(None, op) for op in shared] + [(k, op) for k, ops in enumerate(plans) for op in ops]
+    for region, op in tagged:
+        op = {**op, "type": plan_type(op.get("type"))}  # tool names ("zw3d_radialdim") as plan types
+        ids = operation_ids(op)
+        key = dimension_key(op["type"], op.get("args") or {}, tol)
+        reason = "duplicate" if key in seen else None
+        if reason is None and counter is not None:
+            reason = counter.add(op["type"], op.get("args") or {})
+        if reason is not None:
+            dropped.append({"region": region, "type": op["type"], "ids": ids, "reason": reason})
+            continue
+        seen.add(key)
+        kept.append(op)
+    operations = place_texts(geometry, kept)["operations"] if kept else []
+    return {"operations": operations, "dropped": dropped}
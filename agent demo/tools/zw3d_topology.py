@@ -0,0 +1,289 @@
+"""
+Closed contours of a view and how they nest.
+
+``stdvu_output.json`` is a flat list of lines, arcs and circles. ``contours``
+recovers the features a drafter sees:
+
+1. ``endpoint_graph``: line and arc end points are snapped to shared vertices
+   through a hash map of quantized coordinates (the 3x3 neighbouring cells
+   are checked, so points on both sides of a cell border still meet);
+2. each connected component is walked as a planar graph: at every vertex the
+   outgoing edges are sorted by angle and each half-edge continues with the
+   next edge clockwise, which traces every face once. The face with the most
+   negative signed area is the component's outer boundary; components without
+   a cycle are open chains;
+3. loops (outer boundaries and circles) are sorted by area, and each loop's
+   parent is the smallest larger loop containing one of its points: larger
+   loops are bucketed by the grid cells their bounding boxes cover, so only
+   the loops over that point's cell get the exact test (crossing count on the
+   flattened loop, distance for a circle).
+
+Loops are classified by nesting depth and shape: ``outer`` (depth 0),
+``hole`` (a circle inside), ``slot`` (two equal arcs and two parallel lines),
+``pocket`` (any other inner loop) and ``island`` (inside a hole or pocket).
+Everything is linear in the number of entities apart from the sorts.
+"""
+from __future__ import annotations
+
+import math
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from tools.zw3d_analysis import _tolerance
+from tools.zw3d_geometry import ARC, CIRCLE, LINE, ViewGeometry
+from tools.zw3d_spatial import arc_sweeps
+
+ARC_STEP = math.pi / 8  # flattening of arcs for areas and containment
+
+
+def endpoint_graph(geometry: ViewGeometry, tol: Optional[float] = None) -> Dict[str, Any]:
+    """
+    ``{"vertices": (m, 2) snapped points, "ends": (n, 2) vertex of the start
+    and end of every row (-1 for circles), "degree": (m,) edges per vertex}``.
+    """
+    tol = _tolerance(geometry, tol)
+    e = geometry.entities
+    n = len(e)
+    ends = np.full((n, 2), -1, dtype=np.int64)
+    open_rows = np.flatnonzero(e["type"] != CIRCLE)
+    pts = np.concatenate([e["start"][open_rows], e["end"][open_rows]])
+    cells = np.floor(pts / tol).astype(np.int64)
+    grid: Dict[tuple, int] = {}
+    vertices: List[np.ndarray] = []
+    index = np.empty(len(pts), dtype=np.int64)
+    for k, (cx, cy) in enumerate(cells.tolist()):
+        found = grid.get((cx, cy))
+        if found is None:
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    v = grid.get((cx + dx, cy + dy))
+                    if v is not None and abs(vertices[v][0] - pts[k][0]) <= tol and \
+                            abs(vertices[v][1] - pts[k][1]) <= tol:
+                        found = v
+                        break
+                if found is not None:
+                    break
+        if found is None:
+            found = len(vertices)
+            vertices.append(pts[k])
+            grid[(cx, cy)] = found
+        index[k] = found
+    m = len(open_rows)
+    ends[open_rows, 0] = index[:m]
+    ends[open_rows, 1] = index[m:]
+    vertices = np.array(vertices).reshape(-1, 2)
+    degree = np.bincount(index, minlength=len(vertices))
+    return {"vertices": vertices, "ends": ends, "degree": degree, "tol": tol}
+
+
+def _polylines(entities: np.ndarray) -> List[Optional[np.ndarray]]:
+    """Flattened points of every line and arc from start to end (None for circles)."""
+    lo, sweep = arc_sweeps(entities)
+    out = []
+    for r, e in enumerate(entities):
+        if e["type"] == LINE:
+            out.append(np.array([e["start"], e["end"]]))
+            continue
+        if e["type"] == CIRCLE:
+            out.append(None)
+            continue
+        k = max(4, int(math.ceil(sweep[r] / ARC_STEP)))
+        a = lo[r] + np.linspace(0.0, sweep[r], k + 1)
+        pts = e["center"] + e["radius"] * np.column_stack([np.cos(a), np.sin(a)])
+        # arc_sweeps runs counter-clockwise from whichever end: orient start -> end
+        if np.hypot(*(pts[0] - e["start"])) > np.hypot(*(pts[0] - e["end"])):
+            pts = pts[::-1]
+        pts[0], pts[-1] = e["start"], e["end"]
+        out.append(pts)
+    return out
+
+
+def _area(pts: np.ndarray, center=None, radius: float = 0.0) -> float:
+    """
+    Shoelace term of an open polyline (summed over a closed walk it is the
+    signed area); for a flattened arc the circular segments cut off by its
+    chords are added back, so fillets and slot ends count exactly.
+    """
+    x, y = pts[:, 0], pts[:, 1]
+    area = 0.5 * float(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]))
+    if center is not None and len(pts) > 2:
+        a, b = pts[0] - center, pts[1] - center
+        step = math.atan2(abs(a[0] * b[1] - a[1] * b[0]), float(np.dot(a, b)))
+        segments = 0.5 * radius * radius * (step - math.sin(step)) * (len(pts) - 1)
+        area += segments if a[0] * b[1] - a[1] * b[0] > 0 else -segments
+    return area
+
+
+def _faces(graph: Dict[str, Any], rows: np.ndarray, polylines: List[np.ndarray],
+           entities: np.ndarray) -> List[Dict[str, Any]]:
+    """Faces of the planar graph of ``rows`` as half-edge walks: {"half": [(row, forward)...], "area"}."""
+    ends = graph["ends"]
+    terms = {}
+    for r in rows.tolist():
+        e = entities[r]
+        terms[r] = _area(polylines[r], e["center"], e["radius"]) if e["type"] == ARC else _area(polylines[r])
+    out_edges = defaultdict(list)  # vertex -> [(angle, half-edge)]
+    for k, r in enumerate(rows):
+        pts = polylines[r]
+        u, v = ends[r]
+        d0, d1 = pts[1] - pts[0], pts[-2] - pts[-1]
+        out_edges[u].append((math.atan2(d0[1], d0[0]), 2 * k))
+        out_edges[v].append((math.atan2(d1[1], d1[0]), 2 * k + 1))
+    position = {}
+    ring = {}
+    for vtx, items in out_edges.items():
+        items.sort()
+        hs = [h for _, h in items]
+        ring[vtx] = hs
+        for i, h in enumerate(hs):
+            position[h] = i
+
+    def dest(h):
+        r = rows[h >> 1]
+        return ends[r][1] if h % 2 == 0 else ends[r][0]
+
+    seen = np.zeros(2 * len(rows), dtype=bool)
+    faces = []
+    for start in range(2 * len(rows)):
+        if seen[start]:
+            continue
+        half, area, h = [], 0.0, start
+        while not seen[h]:
+            seen[h] = True
+            r = rows[h >> 1]
+            half.append((int(r), h % 2 == 0))
+            area += terms[r] if h % 2 == 0 else -terms[r]
+            twin = h ^ 1
+            hs = ring[dest(h)]
+            h = hs[(position[twin] - 1) % len(hs)]  # next edge clockwise from the way back
+        faces.append({"half": half, "area": area})
+    return faces
+
+
+def _components(graph: Dict[str, Any], rows: np.ndarray) -> List[np.ndarray]:
+    """Connected components of the open rows (union-find over their end vertices)."""
+    parent = list(range(len(graph["vertices"])))
+
+    def find(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    for u, v in graph["ends"][rows].tolist():
+        ru, rv = find(u), find(v)
+        if ru != rv:
+            parent[ru] = rv
+    groups = defaultdict(list)
+    for r, u in zip(rows.tolist(), graph["ends"][rows, 0].tolist()):
+        groups[find(u)].append(r)
+    return [np.array(g) for g in groups.values()]
+
+
+def _inside(p: np.ndarray, loop: Dict[str, Any]) -> bool:
+    if "circle" in loop:
+        center, radius = loop["circle"]
+        return math.hypot(p[0] - center[0], p[1] - center[1]) < radius
+    ring = loop["ring"]
+    x, y = ring[:, 0], ring[:, 1]
+    x2, y2 = np.append(x[1:], x[0]), np.append(y[1:], y[0])
+    crosses = (y > p[1]) != (y2 > p[1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        at = x + (p[1] - y) * (x2 - x) / (y2 - y)
+    return bool(np.count_nonzero(crosses & (p[0] < at)) % 2)
+
+
+def _is_slot(geometry: ViewGeometry, ids: List[int], tol: float) -> bool:
+    if len(ids) != 4:
+        return False
+    rows = geometry.entities[geometry.rows(ids)]
+    arcs, lines = rows[rows["type"] == ARC], rows[rows["type"] == LINE]
+    if len(arcs) != 2 or len(lines) != 2 or abs(arcs["radius"][0] - arcs["radius"][1]) > tol:
+        return False
+    (ax, ay), (bx, by) = (lines["end"] - lines["start"]).tolist()
+    return abs(ax * by - ay * bx) <= 1e-6 * math.hypot(ax, ay) * math.hypot(bx, by)
+
+
+def contours(geometry: ViewGeometry, tol: Optional[float] = None) -> Dict[str, Any]:
+    """
+    ``{"contours": [...], "open": [[ids], ...]}``. Each contour is
+    ``{"id", "kind", "entities" (boundary, in walking order), "members" (all
+    entities of its component), "area", "bbox", "parent", "children", "depth"}``.
+    """
+    graph = endpoint_graph(geometry, tol)
+    tol = graph["tol"]
+    e = geometry.entities
+    polylines = _polylines(e)
+    loops, open_chains = [], []
+    for rows in _components(graph, np.flatnonzero(e["type"] != CIRCLE)):
+        faces = _faces(graph, rows, polylines, e)
+        outer = min(faces, key=lambda f: f["area"])
+        if outer["area"] > -tol * tol:  # no enclosed area: an open chain
+            open_chains.append([int(i) for i in e["id"][np.sort(rows)]])
+            continue
+        boundary, ring = [], []
+        for r, forward in reversed(outer["half"]):  # counter-clockwise
+            if int(e["id"][r]) not in boundary:
+                boundary.append(int(e["id"][r]))
+            ring.append(polylines[r][::-1] if forward else polylines[r])
+        first = min(range(len(boundary)), key=lambda i: geometry.get(boundary[i])["order"])
+        ring = np.concatenate(ring)
+        loops.append({"entities": boundary[first:] + boundary[:first],
+                      "members": [int(i) for i in e["id"][np.sort(rows)]], "area": -outer["area"],
+                      "ring": ring, "point": ring[0], "box": (*ring.min(axis=0), *ring.max(axis=0))})
+    for r in np.flatnonzero(e["type"] == CIRCLE):
+        c, radius = e["center"][r], float(e["radius"][r])
+        loops.append({"entities": [int(e["id"][r])], "members": [int(e["id"][r])],
+                      "area": math.pi * radius ** 2, "circle": (c, radius), "point": e["end"][r],
+                      "box": (c[0] - radius, c[1] - radius, c[0] + radius, c[1] + radius)})
+
+    loops.sort(key=lambda c: -c["area"])
+    xmin, ymin, xmax, ymax = geometry.bbox()
+    cell = max(xmax - xmin, ymax - ymin, tol) / max(1.0, math.sqrt(len(loops)))
+    buckets: Dict[tuple, List[int]] = defaultdict(list)  # grid cell -> larger loops over it, by area
+    for k, c in enumerate(loops):
+        c["id"], c["parent"], c["children"] = k, None, []
+        c["bbox"] = [round(float(v), 6) for v in c["box"]]
+        p = c["point"]
+        for j in reversed(buckets.get((int(p[0] // cell), int(p[1] // cell)), ())):
+            b = loops[j]["box"]
+            if b[0] <= p[0] <= b[2] and b[1] <= p[1] <= b[3] and _inside(p, loops[j]):
+                c["parent"] = j
+                loops[j]["children"].append(k)
+                break
+        x0, y0, x1, y1 = (int(v // cell) for v in c["box"])
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                buckets[(cx, cy)].append(k)
+    for c in loops:
+        c["depth"] = 0 if c["parent"] is None else loops[c["parent"]]["depth"] + 1
+        if c["depth"] % 2 == 0:
+            c["kind"] = "outer" if c["depth"] == 0 else "island"
+        elif len(c["entities"]) == 1 and c["members"] == c["entities"] and \
+                geometry.get(c["entities"][0])["type"] == CIRCLE:
+            c["kind"] = "hole"
+        elif _is_slot(geometry, c["entities"], tol):
+            c["kind"] = "slot"
+        else:
+            c["kind"] = "pocket"
+        c["area"] = round(c["area"], 6)
+        for key in ("ring", "circle", "point", "box"):
+            c.pop(key, None)
+    return {"contours": loops, "open": open_chains}
+
+
+def format_contours(topology: Dict[str, Any], limit: int = 60, ids: int = 24) -> str:
+    """One line per contour for the dimensioning prompt (at most ``limit`` lines)."""
+    lines = []
+    for c in topology["contours"][:limit]:
+        where = "" if c["parent"] is None else f" in C{c['parent']}"
+        x0, y0, x1, y1 = c["bbox"]
+        members = " ".join(map(str, c["entities"][:ids])) + (" ..." if len(c["entities"]) > ids else "")
+        lines.append(f"C{c['id']} {c['kind']}{where}: {x1 - x0:g} x {y1 - y0:g}, entities {members}")
+    if len(topology["contours"]) > limit:
+        lines.append(f"... {len(topology['contours']) - limit} more contours")
+    for chain in topology["open"][:10]:
+        lines.append("open chain: " + " ".join(map(str, chain[:ids])) + (" ..." if len(chain) > ids else ""))
+    return "\n".join(lines)
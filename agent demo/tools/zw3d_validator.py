@@ -0,0 +1,332 @@
+"""
+Local checks of dimension tool calls before they go to ZW3D.
+
+A wrong id (a line passed to ``zw3d_radialdim``, an id the model made up) or
+a point that is not on its curve otherwise fails only after a ZW3D round trip
+and another paid LLM round. ``PlanValidator`` checks each call against the
+view geometry first:
+
+- every referenced id exists and has a type the dimension accepts
+  (``ACCEPTS``);
+- every point lies on its entity (or on the centre of an arc/circle);
+- the same dimension is not created twice in the dialog or in one batch.
+
+Small mistakes are corrected in place: a point within ``snap`` of its entity
+is moved onto it, a wrong or unknown id is replaced by the only entity of an
+accepted type under its point, a wrong ``view_id`` is replaced, and duplicate
+operations of a batch are dropped. Anything else rejects the call with a
+message for the model. All lookups are dict/array lookups on the indexed
+geometry, so a check costs microseconds.
+
+With a ``constraints`` counter (``tools.zw3d_constraints``) a dimension that
+follows from the others (a closed chain, a second radius of a group) is
+treated like a duplicate: dropped from a batch, refused as a single call. After
+each successful call the verdict carries a short ``constraints`` summary of
+what is still not located or sized.
+
+With ``place`` the text points of an accepted call are moved by
+``TextPlacer`` clear of the view and of the labels in ``applied``, as a
+recorded plan is placed before its BATCHDIM, so dimensions the model sends
+one call at a time do not stack on top of each other either.
+
+``check`` returns ``{"ok", "args", "errors", "fixes", "keys", "operations"}``;
+call ``done(verdict, result)`` after executing so failed dimensions may be
+retried. ``applied`` collects the (corrected) operations of every successful
+call in ``zw3d_batch_dim`` form.
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tools.zw3d_geometry import ARC, CIRCLE, LINE, TYPE_NAMES, ViewGeometry
+from tools.zw3d_placement import TextPlacer, span_axis
+from tools.zw3d_spatial import SpatialIndex
+
+# per dimension type: (id argument, point argument or None, accepted entity types)
+ACCEPTS = {
+    "linear": [("id", "start_point", (LINE, ARC, CIRCLE)), ("id", "end_point", (LINE, ARC, CIRCLE))],
+    "linearoffset": [("id1", "first_point", (LINE, ARC, CIRCLE)), ("id2", "second_point", (LINE, ARC, CIRCLE))],
+    "radial": [("id", "point", (ARC, CIRCLE))],
+    "arclength": [("arc_id", "arc_point", (ARC,))],
+    "holecallout": [("hole_curve_id", None, (CIRCLE,))],
+}
+TOOL_TYPES = {
+    "zw3d_lineardim": "linear",
+    "zw3d_linearoffsetdim": "linearoffset",
+    "zw3d_radialdim": "radial",
+    "zw3d_arclengthdim": "arclength",
+    "zw3d_holecalloutdim": "holecallout",
+}
+
+
+def plan_type(kind: Optional[str]) -> Optional[str]:
+    """The plan type of a dimension type or tool name ("zw3d_radialdim" -> "radial")."""
+    return TOOL_TYPES.get(kind, kind)
+
+
+def _point(p) -> Optional[np.ndarray]:
+    try:
+        if isinstance(p, dict):
+            return np.array([float(p["x"]), float(p["y"])])
+        return np.array([float(p[0]), float(p[1])])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+def _like(p, xy: np.ndarray):
+    x, y = round(float(xy[0]), 4), round(float(xy[1]), 4)
+    return {"x": x, "y": y} if isinstance(p, dict) else [x, y]
+
+
+def view_tolerance(geometry: ViewGeometry) -> float:
+    """Distance below which two points of the view are the same point (1e-4 of its size)."""
+    xmin, ymin, xmax, ymax = geometry.bbox()
+    return 1e-4 * max(xmax - xmin, ymax - ymin, 1e-6)
+
+
+def dimension_key(kind: str, args: Dict[str, Any], tol: float) -> tuple:
+    """
+    What the dimension measures, independent of its text position and
+    argument order: a linear dimension is its entity, its two end points
+    (rounded to ``tol``) and the axis it measures, so the horizontal and
+    vertical legs of a chamfer are different dimensions.
+    """
+    q = lambda p: tuple(np.round(_point(p) / max(tol, 1e-12)).astype(np.int64).tolist())
+    try:
+        if kind == "linear":
+            a, b = _point(args["start_point"]), _point(args["end_point"])
+            return (kind, int(args["id"]), *sorted((q(args["start_point"]), q(args["end_point"]))),
+                    span_axis(a, b, _point(args["text_point"])))
+        if kind == "linearoffset":
+            a, b = _point(args["first_point"]), _point(args["second_point"])
+            ends = sorted(((int(args["id1"]), q(args["first_point"])), (int(args["id2"]), q(args["second_point"]))))
+            return (kind, *ends, span_axis(a, b, _point(args["text_point"])))
+        id_arg = ACCEPTS[kind][0][0]
+        return (kind, int(args[id_arg]))
+    except (KeyError, TypeError, ValueError):
+        # not a checked dimension: only an identical one is the same
+        return (kind, json.dumps(args, sort_keys=True, default=str))
+
+
+class PlanValidator:
+    """Checks and corrects dimension tool calls for one view."""
+
+    def __init__(self, geometry: ViewGeometry, tol: Optional[float] = None, snap: Optional[float] = None,
+                 index: Optional[SpatialIndex] = None, constraints=None, place: bool = False):
+        self.geometry = geometry
+        xmin, ymin, xmax, ymax = geometry.bbox()
+        size = max(xmax - xmin, ymax - ymin, 1e-6)
+        self.tol = tol if tol is not None else view_tolerance(geometry)
+        self.snap = snap if snap is not None else 0.01 * size
+        self.index = index if index is not None else SpatialIndex(geometry)
+        self._made: Dict[tuple, str] = {}  # dimension key -> description of the call that made it
+        self.applied: List[Dict[str, Any]] = []
+        self.constraints = constraints
+        self.placer = TextPlacer(geometry, index=self.index) if place else None
+        self._calls = itertools.count()
+
+    # geometry helpers
+    def _distance(self, row: int, p: np.ndarray) -> float:
+        """Distance from p to the entity, or to its centre if that is closer."""
+        d = float(self.index.distances(p[0], p[1], np.array([row]))[0])
+        e = self.geometry.entities[row]
+        if e["type"] != LINE:
+            d = min(d, math.hypot(*(p - e["center"])))
+        return d
+
+    def _project(self, row: int, p: np.ndarray) -> np.ndarray:
+        """Nearest point of the entity (or its centre) to p."""
+        e = self.geometry.entities[row]
+        if e["type"] == LINE:
+            a, ab = e["start"], e["end"] - e["start"]
+            t = float(np.clip(np.dot(p - a, ab) / max(float(np.dot(ab, ab)), 1e-300), 0.0, 1.0))
+            return a + t * ab
+        v = p - e["center"]
+        r = math.hypot(*v)
+        if r < e["radius"] / 2:
+            return e["center"].copy()
+        on_circle = e["center"] + v / max(r, 1e-300) * e["radius"]
+        if self._distance(row, on_circle) <= self.tol:
+            return on_circle
+        # outside the arc's sweep: the nearer end point
+        return min((e["start"], e["end"]), key=lambda q: math.hypot(*(p - q))).copy()
+
+    def _candidates(self, p: np.ndarray, kinds) -> List[Tuple[int, float]]:
+        return [(i, d) for i, d in self.index.nearest(p[0], p[1], k=3, kinds=kinds) if d <= self.snap]
+
+    # checks
+    def _check_op(self, kind: str, args: Dict[str, Any], where: str) -> Tuple[Dict[str, Any], List[str], List[str]]:
+        args = dict(args)
+        errors: List[str] = []
+        fixes: List[str] = []
+        if _point(args.get("text_point")) is None:
+            errors.append(f"{where}missing or malformed 'text_point' (expected {{'x': ..., 'y': ...}})")
+        for id_arg, point_arg, kinds in ACCEPTS[kind]:
+            wanted = "/".join(TYPE_NAMES[k] for k in kinds)
+            p = _point(args.get(point_arg)) if point_arg else None
+            if point_arg and p is None:
+                errors.append(f"{where}missing or malformed '{point_arg}' (expected {{'x': ..., 'y': ...}})")
+                continue
+            eid = args.get(id_arg)
+            try:
+                eid = int(eid)
+            except (TypeError, ValueError):
+                eid = None
+            g = self.geometry
+            bad = None
+            if eid is None or eid not in g:
+                bad = f"'{id_arg}' {args.get(id_arg)!r} is not an entity of view {g.view_id}"
+            elif int(g.get(eid)["type"]) not in kinds:
+                bad = f"'{id_arg}' {eid} is a {g.type_name(eid)}, {kind} needs a {wanted}"
+            if bad is not None:
+                near = self._candidates(p, kinds) if p is not None else []
+                if len(near) == 1 or (len(near) > 1 and near[1][1] > self.tol >= near[0][1]):
+                    fixes.append(f"{where}{bad}; using {TYPE_NAMES[int(g.get(near[0][0])['type'])]} {near[0][0]} "
+                                 f"under '{point_arg}'")
+                    args[id_arg] = eid = near[0][0]
+                else:
+                    if p is not None:
+                        near = self.index.nearest(p[0], p[1], k=5, kinds=kinds)
+                        hint = ", ".join(str(i) for i, _ in near)
+                    else:
+                        hint = ", ".join(str(int(i)) for i in np.concatenate([g.of_type(k)["id"] for k in kinds])[:10])
+                    errors.append(f"{where}{bad} (candidates: {hint})")
+                    continue
+            if p is None:
+                continue
+            row = g.row(eid)
+            d = self._distance(row, p)
+            if d <= self.tol:
+                continue
+            if d <= self.snap:
+                q = self._project(row, p)
+                args[point_arg] = _like(args[point_arg], q)
+                fixes.append(f"{where}'{point_arg}' moved {d:.3g} onto entity {eid}")
+            else:
+                errors.append(f"{where}'{point_arg}' ({p[0]:g}, {p[1]:g}) is {d:.3g} away from "
+                              f"{g.type_name(eid)} {eid}")
+        if kind == "holecallout" and self.geometry.view_id is not None:
+            if args.get("view_id") != self.geometry.view_id:
+                fixes.append(f"{where}'view_id' {args.get('view_id')!r} replaced by {self.geometry.view_id}")
+                args["view_id"] = self.geometry.view_id
+        return args, errors, fixes
+
+    def _key(self, kind: str, args: Dict[str, Any]) -> tuple:
+        return dimension_key(kind, args, self.tol)
+
+    def check(self, name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Check one tool call. Calls that are not dimension tools pass
+        unchanged; ``zw3d_batch_dim`` is checked operation by operation.
+        """
+        verdict = {"ok": True, "args": args, "errors": [], "fixes": [], "keys": [], "operations": [],
+                   "call": next(self._calls)}
+        if name == "zw3d_batch_dim":
+            ops = []
+            for i, op in enumerate(args.get("operations") or []):
+                kind = plan_type(op.get("type"))
+                if kind not in ACCEPTS:
+                    verdict["errors"].append(f"operation {i}: unknown dimension type {op.get('type')!r}")
+                    continue
+                checked, errors, fixes = self._check_op(kind, op.get("args") or {}, f"operation {i}: ")
+                verdict["errors"] += errors
+                verdict["fixes"] += fixes
+                if not errors and self._claim(verdict, kind, checked, f"zw3d_batch_dim operation {i}", batch=True) \
+                        and self._counts(verdict, kind, checked, f"operation {i}: ", batch=True):
+                    ops.append({**op, "args": checked})
+                    verdict["operations"].append({"type": kind, "args": checked})
+            verdict["args"] = {**args, "operations": ops}
+            if verdict["errors"] or not ops:
+                self.done(verdict, None)
+                if not verdict["errors"]:
+                    verdict["errors"].append("nothing left to dimension: every operation is a duplicate or redundant")
+                verdict["ok"] = False
+            else:
+                self._place(verdict, verdict["args"]["operations"])
+            return verdict
+        kind = TOOL_TYPES.get(name)
+        if kind is None:
+            return verdict
+        checked, errors, fixes = self._check_op(kind, args, "")
+        verdict.update(args=checked, errors=errors, fixes=fixes)
+        if errors or not self._claim(verdict, kind, checked, f"{name} call") or \
+                not self._counts(verdict, kind, checked, ""):
+            verdict["ok"] = False
+        else:
+            verdict["operations"].append({"type": kind, "args": checked})
+            self._place(verdict, [verdict])
+        return verdict
+
+    def _place(self, verdict: Dict[str, Any], targets: List[Dict[str, Any]]) -> None:
+        """Move the labels of ``verdict["operations"]`` clear of the applied ones; ``targets`` hold the args sent."""
+        if self.placer is None:
+            return
+        placed = self.placer.place(verdict["operations"], fixed=self.applied)
+        for i in placed["moved"]:
+            args = placed["operations"][i]["args"]
+            verdict["operations"][i] = placed["operations"][i]
+            targets[i]["args"] = {**targets[i]["args"], "text_point": args["text_point"]}
+        if placed["moved"]:
+            verdict["fixes"].append(f"text of {len(placed['moved'])} dimension(s) moved clear of the drawing "
+                                    "and the other labels")
+
+    def _claim(self, verdict: Dict[str, Any], kind: str, args: Dict[str, Any], what: str,
+               batch: bool = False) -> bool:
+        """Register the dimension; False if it was made before (dropped from a batch, refused otherwise)."""
+        key = self._key(kind, args)
+        if key in self._made:
+            if batch:
+                verdict["fixes"].append(f"{what}: duplicate of the {self._made[key]}, dropped")
+            else:
+                verdict["errors"].append(f"duplicate of the {self._made[key]}")
+            return False
+        self._made[key] = what
+        verdict["keys"].append(key)
+        return True
+
+    def _counts(self, verdict: Dict[str, Any], kind: str, args: Dict[str, Any], where: str,
+                batch: bool = False) -> bool:
+        """Add the dimension to the constraint count; False (and unclaimed) if it is redundant."""
+        if self.constraints is None:
+            return True
+        reason = self.constraints.add(kind, args, token=verdict["call"])
+        if reason is None:
+            return True
+        self._made.pop(verdict["keys"].pop(), None)
+        if batch:
+            verdict["fixes"].append(f"{where}redundant, {reason}; dropped")
+        else:
+            verdict["errors"].append(f"redundant: {reason}")
+        return False
+
+    def done(self, verdict: Dict[str, Any], result: Any) -> None:
+        """Record a successful call in ``applied``; forget the dimensions of a failed one so they can be retried.
+
+        ``result`` is what the tool returned: the flat ``{"stdout", "stderr",
+        "return code"}`` of the ZW3D command tools, or an ``{"ok", "data"}``
+        envelope around it.
+        """
+        ok = isinstance(result, dict) and result.get("ok", True) and result.get("return code", 0) == 0 and \
+            (result.get("data") or {}).get("return code", 0) == 0
+        if ok:
+            self.applied.extend(verdict.get("operations", []))
+            if self.constraints is not None and verdict.get("operations"):
+                from tools.zw3d_constraints import format_status
+                verdict["constraints"] = format_status(self.constraints.status())
+            return
+        for key in verdict.get("keys", []):
+            self._made.pop(key, None)
+        verdict["keys"] = []
+        if self.constraints is not None and "call" in verdict:
+            self.constraints.discard(verdict["call"])
+
+    @staticmethod
+    def rejection(verdict: Dict[str, Any]) -> Dict[str, Any]:
+        """Tool result sent back instead of executing a rejected call."""
+        return {"ok": False, "error": "rejected before execution: " + "; ".join(verdict["errors"]),
+                "fixes": verdict["fixes"]}